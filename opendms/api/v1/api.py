@@ -5,10 +5,15 @@ Main API router for v1 endpoints.
 from fastapi import APIRouter
 
 from opendms.api.v1.endpoints import (
+    audit,
     auth,
     customer,
     dealership,
+    event,
+    image,
     inventory,
+    job,
+    report,
     sale,
     service,
     user,
@@ -26,3 +31,8 @@ api_router.include_router(inventory.router, prefix="/inventory", tags=["inventor
 api_router.include_router(customer.router, prefix="/customers", tags=["customers"])
 api_router.include_router(sale.router, prefix="/sales", tags=["sales"])
 api_router.include_router(service.router, prefix="/service", tags=["service"])
+api_router.include_router(report.router, prefix="/reports", tags=["reports"])
+api_router.include_router(job.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(event.router, prefix="/events", tags=["events"])
+api_router.include_router(image.router, prefix="/images", tags=["images"])
+api_router.include_router(audit.router, prefix="/audit", tags=["audit"])
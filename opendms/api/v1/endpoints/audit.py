@@ -0,0 +1,67 @@
+"""
+Audit log endpoints for API v1.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from opendms.core.config import settings
+from opendms.core.database import get_db
+from opendms.schemas.audit import AuditEntry, AuditWriterStatus
+from opendms.services import audit
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[AuditEntry])
+def get_audit_entries(
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(default=100, gt=0, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Get audit entries newest first; page with ``before_id`` set to the last id seen."""
+    if entity_id is not None and entity is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="entity_id requires entity",
+        )
+    return audit.query_audit(
+        db,
+        entity=entity,
+        entity_id=entity_id,
+        user_id=user_id,
+        start=start,
+        end=end,
+        before_id=before_id,
+        limit=limit,
+    )
+
+
+@router.get("/status", response_model=AuditWriterStatus)
+def get_audit_status():
+    """Get this process's audit write backlog."""
+    return AuditWriterStatus(
+        enabled=settings.ENABLE_AUDIT_LOGGING, **audit.writer.status()
+    )
+
+
+@router.get("/{entity}/{entity_id}", response_model=List[AuditEntry])
+def get_entity_history(
+    entity: str,
+    entity_id: str,
+    before_id: Optional[int] = None,
+    limit: int = Query(default=100, gt=0, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Get one row's change history, newest first."""
+    return audit.query_audit(
+        db, entity=entity, entity_id=entity_id, before_id=before_id, limit=limit
+    )
@@ -51,7 +51,9 @@ async def login(
 
     return {
         "access_token": create_access_token(
-            subject=user.id, expires_delta=access_token_expires
+            subject=user.id,
+            expires_delta=access_token_expires,
+            dealership_id=user.dealership_id,
         ),
         "refresh_token": create_refresh_token(
             subject=user.id, expires_delta=refresh_token_expires
@@ -92,7 +94,9 @@ async def refresh_token(
 
     return {
         "access_token": create_access_token(
-            subject=user.id, expires_delta=access_token_expires
+            subject=user.id,
+            expires_delta=access_token_expires,
+            dealership_id=user.dealership_id,
         ),
         "refresh_token": create_refresh_token(
             subject=user.id, expires_delta=refresh_token_expires
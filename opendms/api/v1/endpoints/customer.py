@@ -2,14 +2,33 @@
 Customer endpoints for API v1.
 """
 
-from typing import List
+from dataclasses import asdict
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
+from opendms.core.config import settings
 from opendms.core.database import get_db
 from opendms.models.customer import Customer
-from opendms.schemas.customer import CustomerCreate, CustomerResponse, CustomerUpdate
+from opendms.schemas.customer import (
+    CallerLookupResponse,
+    CustomerCreate,
+    CustomerMergeRequest,
+    CustomerMergeResponse,
+    CustomerOverview,
+    CustomerResponse,
+    CustomerUpdate,
+    DuplicateReport,
+    NoteSearchResponse,
+)
+from opendms.services import caller_id, customer_overview, note_search
+from opendms.services.dedup import (
+    CustomerRecord,
+    find_matches,
+    merge_customers,
+    scan_dealership,
+)
 
 router = APIRouter()
 
@@ -25,12 +44,100 @@ def get_customers(
     return customers
 
 
+@router.get("/duplicates", response_model=DuplicateReport)
+def get_duplicate_customers(
+    dealership_id: int,
+    min_score: Optional[float] = None,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+):
+    """Scan a dealership for likely duplicate customers."""
+    return scan_dealership(db, dealership_id, min_score=min_score, limit=limit)
+
+
+@router.get("/lookup", response_model=CallerLookupResponse)
+def lookup_customer(
+    dealership_id: int,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Identify a caller by phone number or email."""
+    try:
+        matches = caller_id.lookup(db, dealership_id, phone=phone, email=email)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+    return CallerLookupResponse(
+        dealership_id=dealership_id, phone=phone, email=email, matches=matches
+    )
+
+
+@router.get("/notes/search", response_model=NoteSearchResponse)
+def search_customer_notes(
+    dealership_id: int,
+    q: str,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    """Search customer notes by words, "phrases" and prefix* terms."""
+    try:
+        hits = note_search.search_notes(db, dealership_id, q, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+    return NoteSearchResponse(dealership_id=dealership_id, query=q, hits=hits)
+
+
+@router.get("/overviews", response_model=List[CustomerOverview])
+def get_customer_overviews(
+    ids: List[int] = Query(...),
+    db: Session = Depends(get_db),
+):
+    """Get overviews for several customers, e.g. a page of a list."""
+    if len(ids) > settings.CUSTOMER_OVERVIEW_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.CUSTOMER_OVERVIEW_MAX_BATCH} customers per request",
+        )
+    return list(customer_overview.get_overviews(db, ids).values())
+
+
 @router.post("/", response_model=CustomerResponse)
 def create_customer(
     customer: CustomerCreate,
+    allow_duplicate: bool = False,
     db: Session = Depends(get_db),
 ):
-    """Create a new customer."""
+    """Create a new customer, refusing likely duplicates unless allowed."""
+    if not allow_duplicate:
+        candidate = CustomerRecord.from_values(
+            None,
+            customer.first_name,
+            customer.last_name,
+            customer.email,
+            customer.phone,
+            customer.address_line_1,
+            customer.zip_code,
+        )
+        matches = find_matches(
+            db,
+            customer.dealership_id,
+            candidate,
+            raw_last_name=customer.last_name,
+            min_score=settings.DEDUP_BLOCK_SCORE,
+        )
+        if matches:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={
+                    "message": "Customer appears to already exist",
+                    "matches": [asdict(match) for match in matches],
+                },
+            )
+
     db_customer = Customer(**customer.model_dump())
     db.add(db_customer)
     db.commit()
@@ -52,6 +159,20 @@ def get_customer(
     return customer
 
 
+@router.get("/{customer_id}/overview", response_model=CustomerOverview)
+def get_customer_overview(
+    customer_id: int,
+    db: Session = Depends(get_db),
+):
+    """Get a customer's profile, sales, service history, notes and totals."""
+    overview = customer_overview.get_overviews(db, [customer_id]).get(customer_id)
+    if overview is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found"
+        )
+    return overview
+
+
 @router.put("/{customer_id}", response_model=CustomerResponse)
 def update_customer(
     customer_id: int,
@@ -74,6 +195,31 @@ def update_customer(
     return db_customer
 
 
+@router.post("/{customer_id}/merge", response_model=CustomerMergeResponse)
+def merge_customer(
+    customer_id: int,
+    merge: CustomerMergeRequest,
+    db: Session = Depends(get_db),
+):
+    """Merge duplicate customers into this one."""
+    customer = db.query(Customer).filter(Customer.id == customer_id).first()
+    if customer is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found"
+        )
+    try:
+        result = merge_customers(db, customer, merge.duplicate_ids)
+    except ValueError as exc:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+
+    db.commit()
+    db.refresh(customer)
+    return CustomerMergeResponse(customer=customer, **result)
+
+
 @router.delete("/{customer_id}")
 def delete_customer(
     customer_id: int,
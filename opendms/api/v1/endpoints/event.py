@@ -0,0 +1,90 @@
+"""
+Real-time change event endpoints for API v1.
+"""
+
+import itertools
+import json
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from opendms.core.config import settings
+from opendms.core.events import hub
+from opendms.services import change_feed  # noqa: F401  registers session hooks
+
+router = APIRouter()
+
+_event_ids = itertools.count(1)
+
+
+def _ensure_enabled() -> None:
+    if not settings.ENABLE_REAL_TIME_UPDATES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Real-time updates are disabled",
+        )
+
+
+def _format_sse(batch: List[Dict[str, Any]]) -> str:
+    """Render a batch as one SSE event per entity type."""
+    by_entity: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for change in batch:
+        by_entity[change["entity"]].append(change)
+    return "".join(
+        f"id: {next(_event_ids)}\nevent: {entity}\ndata: {json.dumps(changes)}\n\n"
+        for entity, changes in by_entity.items()
+    )
+
+
+@router.get("/stats")
+def get_event_stats():
+    """Get open stream counts for this process."""
+    return hub.stats()
+
+
+@router.get("/stream")
+async def stream_events(dealership_id: int):
+    """Stream a dealership's vehicle, sale, service and customer changes (SSE)."""
+    _ensure_enabled()
+
+    async def events():
+        # Subscribed only once the response is streaming; a client that
+        # disconnects before then never runs the ``finally``
+        subscription = hub.subscribe(dealership_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                batch = await subscription.get(settings.REALTIME_HEARTBEAT_SECONDS)
+                # Comments keep proxies from closing idle streams
+                yield ": keep-alive\n\n" if batch is None else _format_sse(batch)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(websocket: WebSocket, dealership_id: int):
+    """Push a dealership's change batches over a WebSocket."""
+    if not settings.ENABLE_REAL_TIME_UPDATES:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = hub.subscribe(dealership_id)
+    try:
+        while True:
+            batch = await subscription.get(settings.REALTIME_HEARTBEAT_SECONDS)
+            if batch is None:
+                await websocket.send_json({"type": "ping"})
+            else:
+                await websocket.send_json({"type": "changes", "changes": batch})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscription)
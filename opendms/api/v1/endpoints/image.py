@@ -0,0 +1,61 @@
+"""
+Image delivery endpoints for API v1.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from opendms.core.compression import etag_matches
+from opendms.services import image_delivery
+
+router = APIRouter()
+
+# Renditions are addressed by content hash and never change
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.get("/{digest}")
+async def get_image(
+    digest: str,
+    request: Request,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    fit: str = "contain",
+    format: Optional[str] = None,
+    quality: int = 80,
+):
+    """Get a stored image resized, cropped or transcoded (cached after first use).
+
+    ``width``/``height`` must be one of ``IMAGE_SIZES`` and ``quality`` one
+    of ``IMAGE_QUALITIES``.
+    """
+    headers = {"Cache-Control": IMMUTABLE}
+    if format is None:
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        headers["Vary"] = "Accept"
+    try:
+        image_delivery.validate_digest(digest)
+        spec = image_delivery.parse_spec(width, height, fit, format, quality)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+    headers["ETag"] = f'"{digest}-{spec.name}"'
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        # Only images that still exist are confirmed as unchanged
+        if await run_in_threadpool(image_delivery.find_original, digest) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
+            )
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    path = await image_delivery.get_rendition(digest, spec)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
+        )
+    # Handles Range requests, and hands the file to the server (pathsend)
+    # where it supports zero-copy sends
+    return FileResponse(path, media_type=spec.media_type, headers=headers)
@@ -2,14 +2,32 @@
 Inventory endpoints for API v1.
 """
 
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from opendms.core.config import settings
 from opendms.core.database import get_db
-from opendms.models.inventory import Vehicle
-from opendms.schemas.inventory import VehicleCreate, VehicleResponse, VehicleUpdate
+from opendms.core.media import UploadError, discard, receive_files
+from opendms.models.inventory import Vehicle, VehicleImage, VehicleStatus
+from opendms.schemas.inventory import (
+    ImageUploadResponse,
+    InventoryAnalyticsResponse,
+    UploadRejection,
+    VehicleCreate,
+    VehicleImageResponse,
+    VehicleResponse,
+    VehicleUpdate,
+    VinBatchResponse,
+    VinDecodeRequest,
+    VinDecodeResponse,
+)
+from opendms.services import vehicle_images
+from opendms.services.inventory_analytics import compute_analytics, get_snapshot
+from opendms.services.vehicle_features import has_features, parse_feature_filter
+from opendms.services.vin import decode, decode_many, fill_vehicle_fields
 
 router = APIRouter()
 
@@ -18,26 +36,95 @@ router = APIRouter()
 def get_vehicles(
     skip: int = 0,
     limit: int = 100,
+    dealership_id: Optional[int] = None,
+    make: Optional[str] = None,
+    body_style: Optional[str] = None,
+    vehicle_status: Optional[VehicleStatus] = Query(default=None, alias="status"),
+    features: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    """Get all vehicles."""
-    vehicles = db.query(Vehicle).offset(skip).limit(limit).all()
+    """Get vehicles, optionally filtered (``features`` is comma-separated, all required)."""
+    query = db.query(Vehicle)
+    if dealership_id is not None:
+        query = query.filter(Vehicle.dealership_id == dealership_id)
+    if make:
+        query = query.filter(Vehicle.make == make)
+    if body_style:
+        query = query.filter(Vehicle.body_style == body_style)
+    if vehicle_status is not None:
+        query = query.filter(Vehicle.status == vehicle_status)
+    wanted = parse_feature_filter(features)
+    if wanted:
+        query = query.filter(has_features(db, wanted))
+    vehicles = query.offset(skip).limit(limit).all()
     return vehicles
 
 
 @router.post("/", response_model=VehicleResponse)
 def create_vehicle(
     vehicle: VehicleCreate,
+    allow_invalid_vin: bool = False,
     db: Session = Depends(get_db),
 ):
-    """Create a new vehicle."""
-    db_vehicle = Vehicle(**vehicle.model_dump())
+    """Create a new vehicle, filling year, make and model from the VIN if omitted."""
+    decoded = decode(vehicle.vin)
+    if not decoded.valid and not allow_invalid_vin:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid VIN: {'; '.join(decoded.errors)}",
+        )
+    data = fill_vehicle_fields(vehicle.model_dump())
+    if decoded.valid:
+        data["vin"] = decoded.vin
+    missing = [name for name in ("year", "make", "model") if data.get(name) is None]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not decode from the VIN, provide: {', '.join(missing)}",
+        )
+    db_vehicle = Vehicle(**data)
     db.add(db_vehicle)
     db.commit()
     db.refresh(db_vehicle)
     return db_vehicle
 
 
+@router.get("/analytics", response_model=InventoryAnalyticsResponse)
+def get_inventory_analytics(
+    dealership_id: int,
+    stale_days: Optional[int] = None,
+    stale_limit: int = 50,
+    db: Session = Depends(get_db),
+):
+    """Get aging buckets, turn, spread and stale units for a dealership."""
+    snapshot = get_snapshot(db, dealership_id)
+    return InventoryAnalyticsResponse(
+        dealership_id=dealership_id,
+        **compute_analytics(snapshot, stale_days=stale_days, stale_limit=stale_limit),
+    )
+
+
+@router.get("/vin/{vin}", response_model=VinDecodeResponse)
+def decode_vin(vin: str):
+    """Decode a VIN offline (invalid VINs are reported, not rejected)."""
+    return decode(vin).as_dict()
+
+
+@router.post("/vin/decode", response_model=VinBatchResponse)
+def decode_vins(request: VinDecodeRequest):
+    """Decode a batch of VINs, returned in request order."""
+    if len(request.vins) > settings.VIN_DECODE_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.VIN_DECODE_MAX_BATCH} VINs per request",
+        )
+    results = [decoded.as_dict() for decoded in decode_many(request.vins)]
+    invalid = sum(not result["valid"] for result in results)
+    return VinBatchResponse(
+        results=results, decoded=len(results) - invalid, invalid=invalid
+    )
+
+
 @router.get("/{vehicle_id}", response_model=VehicleResponse)
 def get_vehicle(
     vehicle_id: int,
@@ -52,6 +139,95 @@ def get_vehicle(
     return vehicle
 
 
+def _image_response(image: VehicleImage) -> VehicleImageResponse:
+    response = VehicleImageResponse.model_validate(image)
+    response.renditions = vehicle_images.image_renditions(image)
+    return response
+
+
+@router.get("/{vehicle_id}/images", response_model=List[VehicleImageResponse])
+def get_vehicle_images(
+    vehicle_id: int,
+    db: Session = Depends(get_db),
+):
+    """Get a vehicle's photos in display order."""
+    images = (
+        db.query(VehicleImage)
+        .filter(VehicleImage.vehicle_id == vehicle_id)
+        .order_by(VehicleImage.sort_order, VehicleImage.id)
+        .all()
+    )
+    return [_image_response(image) for image in images]
+
+
+@router.post(
+    "/{vehicle_id}/images",
+    response_model=ImageUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_vehicle_images(
+    vehicle_id: int,
+    request: Request,
+    image_type: Optional[str] = None,
+    primary: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """Upload photos for a vehicle as multipart/form-data."""
+    exists = await run_in_threadpool(db.get, Vehicle, vehicle_id)
+    if exists is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found"
+        )
+
+    allowed = [
+        t for t in settings.ALLOWED_FILE_TYPES if t in vehicle_images.IMAGE_TYPES
+    ]
+    try:
+        files, rejected, _ = await receive_files(
+            request, allowed, settings.IMAGE_UPLOAD_MAX_FILES
+        )
+    except UploadError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+    if primary is not None and not 0 <= primary < len(files):
+        await run_in_threadpool(discard, files)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="primary must index one of the accepted files",
+        )
+
+    def attach():
+        try:
+            result = vehicle_images.attach_images(
+                db, vehicle_id, files, image_type=image_type, primary=primary
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            discard(files)
+            raise
+        try:
+            vehicle_images.store_attached(result["files"])
+        finally:
+            # Skipped duplicates, and anything left by a failed move
+            discard(files)
+        result["images"] = [_image_response(image) for image in result["images"]]
+        return result
+
+    result = await run_in_threadpool(attach)
+    if result["originals"]:
+        vehicle_images.schedule_renditions(result["originals"])
+    return ImageUploadResponse(
+        images=result["images"],
+        duplicates=result["duplicates"],
+        rejected=[
+            UploadRejection(filename=item.filename, reason=item.reason)
+            for item in rejected
+        ],
+    )
+
+
 @router.put("/{vehicle_id}", response_model=VehicleResponse)
 def update_vehicle(
     vehicle_id: int,
@@ -0,0 +1,132 @@
+"""
+Background job endpoints for API v1.
+"""
+
+import asyncio
+from time import monotonic
+from typing import List
+
+from celery.result import AsyncResult
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from opendms.core.config import settings
+from opendms.schemas.job import (
+    JobCreate,
+    JobMetrics,
+    JobStatus,
+    JobSubmitted,
+    JobTypeInfo,
+)
+from opendms.services.jobs import JOB_TYPES, validate_params
+from opendms.worker import celery_app, collect_metrics, submit_job
+
+router = APIRouter()
+
+
+def _job_status(job_id: str) -> JobStatus:
+    """Read a job's state from the result backend."""
+    result = AsyncResult(job_id, app=celery_app)
+    job = JobStatus(job_id=job_id, status=result.state, ready=result.ready())
+    if result.successful():
+        payload = result.result or {}
+        job.job_type = payload.get("job_type")
+        job.result = payload.get("result")
+        job.runtime_seconds = payload.get("runtime_seconds")
+        job.wait_seconds = payload.get("wait_seconds")
+    elif result.failed():
+        job.error = repr(result.result)
+    if job.ready:
+        job.completed_at = result.date_done
+    return job
+
+
+@router.get("/types", response_model=List[JobTypeInfo])
+def get_job_types():
+    """List the job types that can be submitted."""
+    return [
+        JobTypeInfo(name=job.name, queue=job.queue, description=job.description)
+        for job in JOB_TYPES.values()
+    ]
+
+
+@router.get("/metrics", response_model=List[JobMetrics])
+def get_job_metrics():
+    """Get per-job-type queue wait and runtime across workers."""
+    metrics = []
+    for job_type, entry in sorted(collect_metrics().items()):
+        count = entry["count"] or 1
+        metrics.append(
+            JobMetrics(
+                job_type=job_type,
+                count=entry["count"],
+                failures=entry["failures"],
+                average_runtime_seconds=entry["total_runtime_seconds"] / count,
+                max_runtime_seconds=entry["max_runtime_seconds"],
+                average_wait_seconds=entry["total_wait_seconds"] / count,
+                max_wait_seconds=entry["max_wait_seconds"],
+            )
+        )
+    return metrics
+
+
+@router.post("/", response_model=JobSubmitted, status_code=status.HTTP_202_ACCEPTED)
+def create_job(job_in: JobCreate, request: Request, response: Response):
+    """Queue a background job and return where to follow it."""
+    job = JOB_TYPES.get(job_in.job_type)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job type: {job_in.job_type}",
+        )
+    try:
+        validate_params(job, job_in.params)
+    except TypeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+
+    job_id = submit_job(job.name, job_in.params)
+    status_url = str(request.url_for("get_job", job_id=job_id))
+    response.headers["Location"] = status_url
+    return JobSubmitted(
+        job_id=job_id,
+        job_type=job.name,
+        queue=job.queue,
+        status=AsyncResult(job_id, app=celery_app).state,
+        status_url=status_url,
+        events_url=str(request.url_for("stream_job", job_id=job_id)),
+    )
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    """Get a job's status, and its result once finished."""
+    return _job_status(job_id)
+
+
+@router.get("/{job_id}/events")
+async def stream_job(job_id: str):
+    """Stream a job's status changes as server-sent events until it finishes."""
+
+    async def events():
+        deadline = monotonic() + settings.JOB_STREAM_TIMEOUT_SECONDS
+        last_status = None
+        while True:
+            job = await run_in_threadpool(_job_status, job_id)
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {job.model_dump_json()}\n\n"
+            if job.ready:
+                return
+            if monotonic() >= deadline:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            await asyncio.sleep(settings.JOB_STATUS_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
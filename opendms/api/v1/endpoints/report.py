@@ -0,0 +1,68 @@
+"""
+Report endpoints for API v1.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from opendms.core.database import get_db
+from opendms.schemas.report import (
+    SalesReportResponse,
+    SalesReportRow,
+    SalesTrendPoint,
+    SalesTrendResponse,
+)
+from opendms.services.reporting import (
+    GROUP_BY_FIELDS,
+    load_sales_cube,
+    monthly_trend,
+    summarize,
+)
+
+router = APIRouter()
+
+
+@router.get("/sales", response_model=SalesReportResponse)
+def get_sales_report(
+    group_by: List[str] = Query(default=["month"]),
+    dealership_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Get units, revenue and gross profit grouped by the requested fields."""
+    unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown group_by field(s): {', '.join(unknown)}",
+        )
+
+    cube = load_sales_cube(
+        db, dealership_id=dealership_id, start_date=start_date, end_date=end_date
+    )
+    totals = summarize(cube, [])
+    return SalesReportResponse(
+        group_by=group_by,
+        rows=[SalesReportRow(**row) for row in summarize(cube, group_by)],
+        totals=SalesReportRow(**totals[0]) if totals else None,
+    )
+
+
+@router.get("/sales/trend", response_model=SalesTrendResponse)
+def get_sales_trend(
+    dealership_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
+    """Get monthly sales totals with month-over-month change."""
+    cube = load_sales_cube(
+        db, dealership_id=dealership_id, start_date=start_date, end_date=end_date
+    )
+    return SalesTrendResponse(
+        points=[SalesTrendPoint(**point) for point in monthly_trend(cube)]
+    )
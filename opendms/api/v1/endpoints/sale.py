@@ -2,26 +2,76 @@
 Sales endpoints for API v1.
 """
 
-from typing import List
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, RedirectResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from opendms.core.config import settings
 from opendms.core.database import get_db
-from opendms.models.sale import Sale
-from opendms.schemas.sale import SaleCreate, SaleResponse, SaleUpdate
+from opendms.core.media import (
+    UploadConflict,
+    UploadError,
+    UploadNotFound,
+    UploadSession,
+    discard,
+    receive_files,
+)
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import Sale, SaleDocument
+from opendms.schemas.inventory import UploadRejection
+from opendms.schemas.sale import (
+    DocumentUploadResponse,
+    DocumentUploadStart,
+    DocumentUploadStatus,
+    PaymentGridRequest,
+    PaymentGridResponse,
+    SaleCreate,
+    SaleDocumentResponse,
+    SaleResponse,
+    SaleUpdate,
+)
+from opendms.services import sale_documents
+from opendms.services.deal_desk import monthly_payment, payment_grid
+from opendms.services.numbering import next_number
 
 router = APIRouter()
 
+# Schema field -> Sale column where the names differ
+SALE_COLUMNS = {
+    "salesperson_id": "sales_person_id",
+    "sale_price": "vehicle_price",
+    "financing_amount": "finance_amount",
+    "loan_term": "term_months",
+}
+# Schema fields without a Sale column yet
+NO_COLUMN = {"trade_in_vehicle", "sale_type", "payment_method"}
+
 
 @router.get("/", response_model=List[SaleResponse])
 def get_sales(
     skip: int = 0,
     limit: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
 ):
-    """Get all sales."""
-    sales = db.query(Sale).offset(skip).limit(limit).all()
+    """
+    Get all sales.
+
+    Bounding ``sale_date`` with ``start_date``/``end_date`` lets PostgreSQL
+    prune the monthly partitions outside the range.
+    """
+    query = db.query(Sale)
+    if start_date is not None:
+        query = query.filter(Sale.sale_date >= start_date)
+    if end_date is not None:
+        query = query.filter(Sale.sale_date < end_date)
+    sales = query.offset(skip).limit(limit).all()
     return sales
 
 
@@ -31,13 +81,76 @@ def create_sale(
     db: Session = Depends(get_db),
 ):
     """Create a new sale."""
-    db_sale = Sale(**sale.model_dump())
+    vehicle = db.get(Vehicle, sale.vehicle_id)
+    if vehicle is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vehicle not found",
+        )
+
+    financed = sale.financing_amount
+    if financed is None and sale.loan_term:
+        financed = (
+            sale.sale_price - (sale.down_payment or 0) - (sale.trade_in_value or 0)
+        )
+    payment = sale.monthly_payment
+    if payment is None and sale.loan_term:
+        payment = monthly_payment(
+            float(financed), float(sale.interest_rate or 0), sale.loan_term
+        )
+
+    def optional(value: Optional[Decimal]) -> Optional[float]:
+        return None if value is None else float(value)
+
+    db_sale = Sale(
+        sale_number=next_number(db, vehicle.dealership_id, "sale"),
+        dealership_id=vehicle.dealership_id,
+        customer_id=sale.customer_id,
+        sales_person_id=sale.salesperson_id,
+        vehicle_id=sale.vehicle_id,
+        sale_date=datetime.utcnow(),
+        vehicle_price=float(sale.sale_price),
+        trade_in_value=optional(sale.trade_in_value),
+        down_payment=optional(sale.down_payment),
+        finance_amount=optional(financed),
+        total_amount=float(sale.sale_price),
+        interest_rate=optional(sale.interest_rate),
+        term_months=sale.loan_term,
+        monthly_payment=optional(payment),
+        notes=sale.notes,
+    )
     db.add(db_sale)
     db.commit()
     db.refresh(db_sale)
     return db_sale
 
 
+@router.post("/payment-grid", response_model=PaymentGridResponse)
+def get_payment_grid(grid: PaymentGridRequest):
+    """Compute payments for every down payment x term x rate combination."""
+    if any(term <= 0 for term in grid.terms) or any(rate < 0 for rate in grid.rates):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Terms must be positive and rates non-negative",
+        )
+
+    result = payment_grid(
+        vehicle_price=float(grid.vehicle_price),
+        down_payments=[float(down) for down in grid.down_payments],
+        terms=grid.terms,
+        rates=[float(rate) for rate in grid.rates],
+        trade_in_value=float(grid.trade_in_value),
+        taxes_and_fees=float(grid.taxes_and_fees),
+        vehicle_value=float(grid.vehicle_value) if grid.vehicle_value else None,
+    )
+    return PaymentGridResponse(
+        down_payments=[float(down) for down in grid.down_payments],
+        terms=grid.terms,
+        rates=[float(rate) for rate in grid.rates],
+        **{name: values.tolist() for name, values in result.items()},
+    )
+
+
 @router.get("/{sale_id}", response_model=SaleResponse)
 def get_sale(
     sale_id: int,
@@ -52,6 +165,273 @@ def get_sale(
     return sale
 
 
+def _require_sale(db: Session, sale_id: int) -> None:
+    if db.query(Sale.id).filter(Sale.id == sale_id).first() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Sale not found"
+        )
+
+
+def _get_document(db: Session, sale_id: int, document_id: int) -> SaleDocument:
+    document = (
+        db.query(SaleDocument)
+        .filter(SaleDocument.id == document_id, SaleDocument.sale_id == sale_id)
+        .first()
+    )
+    if document is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Document not found"
+        )
+    return document
+
+
+def _upload_status(
+    session: Optional[UploadSession],
+    document: Optional[SaleDocument] = None,
+) -> DocumentUploadStatus:
+    if document is not None:
+        return DocumentUploadStatus(
+            upload_id=session.upload_id if session else None,
+            offset=document.size or 0,
+            size=document.size or 0,
+            chunk_size=settings.DOCUMENT_CHUNK_SIZE,
+            complete=True,
+            document=SaleDocumentResponse.model_validate(document),
+        )
+    return DocumentUploadStatus(
+        upload_id=session.upload_id,
+        offset=session.offset,
+        size=session.size,
+        chunk_size=settings.DOCUMENT_CHUNK_SIZE,
+        complete=False,
+    )
+
+
+def _upload_error(exc: UploadError) -> HTTPException:
+    if isinstance(exc, UploadNotFound):
+        return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(exc))
+    if isinstance(exc, UploadConflict):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc),
+            headers={"Upload-Offset": str(exc.offset)},
+        )
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+
+@router.get("/{sale_id}/documents", response_model=List[SaleDocumentResponse])
+def get_sale_documents(
+    sale_id: int,
+    db: Session = Depends(get_db),
+):
+    """Get a deal's documents."""
+    _require_sale(db, sale_id)
+    return sale_documents.list_documents(db, sale_id)
+
+
+@router.post(
+    "/{sale_id}/documents",
+    response_model=DocumentUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_sale_documents(
+    sale_id: int,
+    request: Request,
+    document_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Upload documents for a deal as multipart/form-data."""
+    await run_in_threadpool(_require_sale, db, sale_id)
+    try:
+        files, rejected, _ = await receive_files(
+            request,
+            settings.ALLOWED_FILE_TYPES,
+            settings.DOCUMENT_UPLOAD_MAX_FILES,
+            max_size=settings.DOCUMENT_MAX_FILE_SIZE,
+            temp_dir=await run_in_threadpool(sale_documents.temp_dir),
+        )
+    except UploadError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+
+    def attach():
+        documents, duplicates, to_store = [], [], []
+        try:
+            for received in files:
+                document, created = sale_documents.add_document(
+                    db, sale_id, received, document_type
+                )
+                if created:
+                    documents.append(document)
+                    to_store.append(received)
+                else:
+                    duplicates.append(received.filename)
+            db.commit()
+        except Exception:
+            db.rollback()
+            discard(files)
+            raise
+        try:
+            for received in to_store:
+                sale_documents.store_file(received)
+        finally:
+            # Duplicates, and anything left by a failed move
+            discard(files)
+        return (
+            [SaleDocumentResponse.model_validate(document) for document in documents],
+            duplicates,
+        )
+
+    documents, duplicates = await run_in_threadpool(attach)
+    return DocumentUploadResponse(
+        documents=documents,
+        duplicates=duplicates,
+        rejected=[
+            UploadRejection(filename=item.filename, reason=item.reason)
+            for item in rejected
+        ],
+    )
+
+
+@router.post(
+    "/{sale_id}/documents/uploads",
+    response_model=DocumentUploadStatus,
+    status_code=status.HTTP_201_CREATED,
+)
+def start_document_upload(
+    sale_id: int,
+    upload: DocumentUploadStart,
+    response: Response,
+    db: Session = Depends(get_db),
+):
+    """
+    Start a resumable chunked upload.
+
+    Send ``sha256`` to skip the upload when the file is already stored; the
+    response is then 200 with the document.
+    """
+    _require_sale(db, sale_id)
+    try:
+        document, session = sale_documents.start_upload(
+            db,
+            sale_id,
+            upload.filename,
+            upload.size,
+            document_type=upload.document_type,
+            sha256=upload.sha256,
+        )
+    except UploadError as exc:
+        raise _upload_error(exc) from exc
+    if document is not None:
+        db.commit()
+        response.status_code = status.HTTP_200_OK
+    return _upload_status(session, document)
+
+
+@router.get(
+    "/{sale_id}/documents/uploads/{upload_id}", response_model=DocumentUploadStatus
+)
+def get_document_upload(sale_id: int, upload_id: str):
+    """Get the offset to resume a chunked upload from."""
+    try:
+        return _upload_status(sale_documents.get_upload(sale_id, upload_id))
+    except UploadError as exc:
+        raise _upload_error(exc) from exc
+
+
+@router.put(
+    "/{sale_id}/documents/uploads/{upload_id}", response_model=DocumentUploadStatus
+)
+async def put_document_chunk(
+    sale_id: int,
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    db: Session = Depends(get_db),
+):
+    """
+    Append the request body at ``Upload-Offset``.
+
+    The upload is finished when the last byte arrives. A 409 carries the
+    offset to resume from in its ``Upload-Offset`` header.
+    """
+    try:
+        await run_in_threadpool(sale_documents.get_upload, sale_id, upload_id)
+        session = await sale_documents.uploads().append(
+            upload_id, upload_offset, request.stream()
+        )
+    except UploadError as exc:
+        raise _upload_error(exc) from exc
+    if session.offset < session.size:
+        return _upload_status(session)
+
+    def complete():
+        try:
+            document, created, received = sale_documents.complete_upload(db, session)
+        except Exception:
+            db.rollback()
+            raise
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            discard([received])
+            raise
+        if created:
+            sale_documents.store_file(received)
+        else:
+            discard([received])
+        return _upload_status(session, document)
+
+    try:
+        return await run_in_threadpool(complete)
+    except UploadError as exc:
+        raise _upload_error(exc) from exc
+
+
+@router.delete("/{sale_id}/documents/uploads/{upload_id}")
+def abort_document_upload(sale_id: int, upload_id: str):
+    """Abandon a chunked upload."""
+    try:
+        sale_documents.get_upload(sale_id, upload_id)
+    except UploadError as exc:
+        raise _upload_error(exc) from exc
+    sale_documents.uploads().abort(upload_id)
+    return {"message": "Upload aborted"}
+
+
+@router.get("/{sale_id}/documents/{document_id}")
+def download_sale_document(
+    sale_id: int,
+    document_id: int,
+    db: Session = Depends(get_db),
+):
+    """Download a deal document (streamed, with Range support)."""
+    document = _get_document(db, sale_id, document_id)
+    path = sale_documents.document_path(document)
+    if path is None:
+        return RedirectResponse(document.url)
+    return FileResponse(
+        path,
+        media_type=document.content_type,
+        filename=document.filename,
+        headers={"ETag": f'"{document.sha256}"', "Cache-Control": "private"},
+    )
+
+
+@router.delete("/{sale_id}/documents/{document_id}")
+def delete_sale_document(
+    sale_id: int,
+    document_id: int,
+    db: Session = Depends(get_db),
+):
+    """Delete a deal document."""
+    document = _get_document(db, sale_id, document_id)
+    sale_documents.delete_document(db, document)
+    return {"message": "Document deleted successfully"}
+
+
 @router.put("/{sale_id}", response_model=SaleResponse)
 def update_sale(
     sale_id: int,
@@ -67,7 +447,12 @@ def update_sale(
 
     update_data = sale.model_dump(exclude_unset=True)
     for field, value in update_data.items():
-        setattr(db_sale, field, value)
+        column = SALE_COLUMNS.get(field, field)
+        if column in NO_COLUMN:
+            continue
+        if isinstance(value, Decimal):
+            value = float(value)
+        setattr(db_sale, column, value)
 
     db.commit()
     db.refresh(db_sale)
@@ -79,13 +464,12 @@ def delete_sale(
     sale_id: int,
     db: Session = Depends(get_db),
 ):
-    """Delete a sale."""
+    """Delete a sale, and the files of its documents no other deal uses."""
     sale = db.query(Sale).filter(Sale.id == sale_id).first()
     if sale is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Sale not found"
         )
 
-    db.delete(sale)
-    db.commit()
+    sale_documents.delete_documents(db, list(sale.documents), also=[sale])
     return {"message": "Sale deleted successfully"}
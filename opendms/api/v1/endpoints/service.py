@@ -2,30 +2,79 @@
 Service endpoints for API v1.
 """
 
-from typing import List
+import hashlib
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 
+from opendms.core.compression import etag_matches
 from opendms.core.database import get_db
-from opendms.models.service import ServiceAppointment
+from opendms.models.inventory import Vehicle
+from opendms.models.service import (
+    AppointmentStatus,
+    ServiceAppointment,
+    ServiceWorkOrder,
+)
 from opendms.schemas.service import (
+    AvailableSlot,
+    AvailableSlotsResponse,
+    DispatchAssignment,
+    DispatchPlanResponse,
     ServiceAppointmentCreate,
     ServiceAppointmentResponse,
     ServiceAppointmentUpdate,
+    WorkOrderAssign,
+)
+from opendms.services.dispatch import (
+    apply_suggestions,
+    get_plan,
+    optimal_suggestions,
+    schedule_plan,
+)
+from opendms.services.numbering import next_number
+from opendms.services.scheduling import (
+    BLOCKING_STATUSES,
+    find_conflict,
+    find_open_slots,
+    get_schedule,
 )
 
 router = APIRouter()
 
 
+def _raise_conflict(conflict: ServiceAppointment) -> None:
+    """Reject a booking that overlaps an existing appointment."""
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=(
+            "Service advisor is already booked "
+            f"(appointment {conflict.appointment_number})"
+        ),
+    )
+
+
 @router.get("/", response_model=List[ServiceAppointmentResponse])
 def get_service_appointments(
     skip: int = 0,
     limit: int = 100,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     db: Session = Depends(get_db),
 ):
-    """Get all service appointments."""
-    appointments = db.query(ServiceAppointment).offset(skip).limit(limit).all()
+    """
+    Get all service appointments.
+
+    Bounding ``appointment_date`` with ``start_date``/``end_date`` lets
+    PostgreSQL prune the monthly partitions outside the range.
+    """
+    query = db.query(ServiceAppointment)
+    if start_date is not None:
+        query = query.filter(ServiceAppointment.appointment_date >= start_date)
+    if end_date is not None:
+        query = query.filter(ServiceAppointment.appointment_date < end_date)
+    appointments = query.offset(skip).limit(limit).all()
     return appointments
 
 
@@ -35,13 +84,144 @@ def create_service_appointment(
     db: Session = Depends(get_db),
 ):
     """Create a new service appointment."""
-    db_appointment = ServiceAppointment(**appointment.model_dump())
+    conflict = find_conflict(
+        db,
+        advisor_id=appointment.service_advisor_id,
+        start=appointment.appointment_date,
+        duration_minutes=appointment.estimated_duration,
+    )
+    if conflict is not None:
+        _raise_conflict(conflict)
+
+    vehicle = db.get(Vehicle, appointment.vehicle_id)
+    if vehicle is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Vehicle not found",
+        )
+
+    # estimated_cost and priority have no columns yet
+    data = appointment.model_dump(exclude={"estimated_cost", "priority"})
+    data["status"] = AppointmentStatus(data["status"])
+    db_appointment = ServiceAppointment(
+        **data,
+        dealership_id=vehicle.dealership_id,
+        appointment_number=next_number(db, vehicle.dealership_id, "appointment"),
+    )
     db.add(db_appointment)
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
 
 
+@router.get("/slots", response_model=AvailableSlotsResponse)
+def get_available_slots(
+    dealership_id: int,
+    duration: int = Query(default=60, gt=0),
+    count: int = Query(default=5, gt=0, le=100),
+    after: Optional[datetime] = None,
+    advisor_id: Optional[List[int]] = Query(default=None),
+    db: Session = Depends(get_db),
+):
+    """Get the next open appointment slots of the requested length."""
+    schedule = get_schedule(db, dealership_id)
+    slots = find_open_slots(
+        schedule,
+        duration_minutes=duration,
+        count=count,
+        after=after,
+        advisor_ids=advisor_id,
+    )
+    return AvailableSlotsResponse(
+        dealership_id=dealership_id,
+        duration=duration,
+        slots=[AvailableSlot(**slot) for slot in slots],
+    )
+
+
+def _dispatch_response(db: Session, dealership_id: int, mode: str):
+    """Build a dispatch plan response for the requested solver mode."""
+    plan = get_plan(db, dealership_id)
+    suggestions = optimal_suggestions(plan) if mode == "optimal" else plan.suggested
+    assignments, hours = schedule_plan(plan, suggestions)
+    return plan, DispatchPlanResponse(
+        dealership_id=dealership_id,
+        version=plan.version,
+        mode=mode,
+        assignments=[DispatchAssignment(**item) for item in assignments],
+        technician_hours=hours,
+        unassignable=sorted(
+            job.id
+            for job in plan.jobs.values()
+            if job.technician_id not in plan.technicians
+            and not job.in_progress
+            and job.id not in suggestions
+        ),
+    )
+
+
+@router.get("/dispatch", response_model=DispatchPlanResponse)
+def get_dispatch_plan(
+    request: Request,
+    response: Response,
+    dealership_id: int,
+    mode: str = Query(default="greedy", pattern="^(greedy|optimal)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Get the technician dispatch plan for a dealership.
+
+    Send the returned ``ETag`` as ``If-None-Match`` to get a cheap ``304``
+    while the plan is unchanged. Plans are cached per worker process, so the
+    tag is a digest of the plan itself rather than its per-process version.
+    """
+    _, body = _dispatch_response(db, dealership_id, mode)
+    digest = hashlib.blake2b(
+        body.model_dump_json(exclude={"version"}).encode(), digest_size=12
+    ).hexdigest()
+    etag = f'"{dealership_id}-{mode}-{digest}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers["ETag"] = etag
+    return body
+
+
+@router.post("/dispatch/apply", response_model=DispatchPlanResponse)
+def apply_dispatch_plan(
+    dealership_id: int,
+    mode: str = Query(default="greedy", pattern="^(greedy|optimal)$"),
+    db: Session = Depends(get_db),
+):
+    """Assign every unassigned work order to its suggested technician."""
+    plan = get_plan(db, dealership_id)
+    suggestions = optimal_suggestions(plan) if mode == "optimal" else plan.suggested
+    apply_suggestions(db, suggestions)
+    return _dispatch_response(db, dealership_id, mode)[1]
+
+
+@router.put(
+    "/work-orders/{work_order_id}/technician", response_model=DispatchPlanResponse
+)
+def assign_work_order(
+    work_order_id: int,
+    assignment: WorkOrderAssign,
+    db: Session = Depends(get_db),
+):
+    """Manually (re)assign a work order and return the re-solved plan."""
+    work_order = (
+        db.query(ServiceWorkOrder).filter(ServiceWorkOrder.id == work_order_id).first()
+    )
+    if work_order is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Work order not found"
+        )
+
+    dealership_id = work_order.appointment.dealership_id
+    work_order.technician_id = assignment.technician_id
+    db.commit()
+    return _dispatch_response(db, dealership_id, "greedy")[1]
+
+
 @router.get("/{appointment_id}", response_model=ServiceAppointmentResponse)
 def get_service_appointment(
     appointment_id: int,
@@ -80,6 +260,35 @@ def update_service_appointment(
         )
 
     update_data = appointment.model_dump(exclude_unset=True)
+    if update_data.get("status") is not None:
+        try:
+            update_data["status"] = AppointmentStatus(update_data["status"])
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid status: {update_data['status']}",
+            ) from exc
+    new_status = update_data.get("status", db_appointment.status)
+    # Also check when a cancelled or no-show appointment is reopened
+    if new_status in BLOCKING_STATUSES and (
+        new_status != db_appointment.status
+        or update_data.keys()
+        & {"appointment_date", "estimated_duration", "service_advisor_id"}
+    ):
+        conflict = find_conflict(
+            db,
+            advisor_id=update_data.get(
+                "service_advisor_id", db_appointment.service_advisor_id
+            ),
+            start=update_data.get("appointment_date", db_appointment.appointment_date),
+            duration_minutes=update_data.get(
+                "estimated_duration", db_appointment.estimated_duration
+            ),
+            exclude_id=db_appointment.id,
+        )
+        if conflict is not None:
+            _raise_conflict(conflict)
+
     for field, value in update_data.items():
         setattr(db_appointment, field, value)
 
@@ -0,0 +1,246 @@
+"""
+Command-line tools: ``python -m opendms.cli <command>``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+def _inventory_page(count: int) -> bytes:
+    """A JSON inventory page shaped like ``GET /api/v1/inventory/``."""
+    rng = random.Random(0)
+    makes = {
+        "Toyota": ["Camry", "Corolla", "RAV4", "Tacoma"],
+        "Ford": ["F-150", "Escape", "Explorer", "Mustang"],
+        "Honda": ["Civic", "Accord", "CR-V", "Pilot"],
+        "Chevrolet": ["Silverado 1500", "Equinox", "Malibu", "Tahoe"],
+    }
+    features = [
+        "backup camera", "bluetooth", "heated seats", "sunroof", "navigation",
+        "apple carplay", "android auto", "leather seats", "tow package",
+        "blind spot monitor", "adaptive cruise control", "third row seating",
+    ]  # fmt: skip
+    created = datetime(2025, 1, 1)
+    vehicles = []
+    for index in range(count):
+        make = rng.choice(list(makes))
+        vehicles.append(
+            {
+                "id": 1000 + index,
+                "dealership_id": 1,
+                "vin": "".join(
+                    rng.choice("0123456789ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(17)
+                ),
+                "stock_number": f"A{rng.randint(10000, 99999)}",
+                "year": rng.randint(2015, 2026),
+                "make": make,
+                "model": rng.choice(makes[make]),
+                "trim": rng.choice(["Base", "LE", "XLT", "EX-L", "LT", "Limited"]),
+                "body_style": rng.choice(["Sedan", "SUV", "Pickup", "Coupe"]),
+                "exterior_color": rng.choice(
+                    ["White", "Black", "Silver", "Blue", "Red"]
+                ),
+                "interior_color": rng.choice(["Black", "Gray", "Tan"]),
+                "mileage": rng.randint(5, 120000),
+                "fuel_type": rng.choice(["gasoline", "hybrid", "diesel"]),
+                "transmission": "automatic",
+                "msrp": round(rng.uniform(22000, 68000), 2),
+                "selling_price": round(rng.uniform(18000, 65000), 2),
+                "status": rng.choice(["available", "available", "pending", "sold"]),
+                "features": sorted(rng.sample(features, rng.randint(2, 8))),
+                "description": None,
+                "created_at": (created + timedelta(hours=index * 7)).isoformat(),
+                "updated_at": None,
+            }
+        )
+    return json.dumps(vehicles).encode()
+
+
+def run_precompress_static(args: argparse.Namespace) -> int:
+    """Write .gz/.br/.zst variants of static files."""
+    from opendms.core.compression import (
+        STATIC_DIR,
+        available_encodings,
+        precompress_static,
+    )
+
+    counts = precompress_static(args.directory or STATIC_DIR)
+    print(
+        f"{counts['written']} written, {counts['current']} up to date, "
+        f"{counts['skipped']} skipped ({', '.join(available_encodings())})"
+    )
+    return 0
+
+
+def run_benchmark_compression(args: argparse.Namespace) -> int:
+    """Print CPU time against bytes saved for each encoding and level."""
+    from opendms.core.compression import STATIC_DIR, benchmark, installed_encodings
+
+    samples: Dict[str, bytes] = {
+        "inventory-20.json": _inventory_page(20),
+        "inventory-100.json": _inventory_page(100),
+    }
+    paths = args.files or [
+        os.path.join(root, name)
+        for root, _, names in os.walk(STATIC_DIR)
+        for name in sorted(names)
+        if name.endswith((".css", ".js", ".json", ".html", ".svg"))
+    ]
+    for path in paths:
+        with open(path, "rb") as source:
+            samples[os.path.relpath(path)] = source.read()
+
+    print(f"Encodings: {', '.join(installed_encodings())}; best of {args.rounds} runs")
+    print(
+        f"{'sample':<36} {'enc':<5} {'lvl':>3} {'bytes':>9} {'out':>8} {'saved':>6} {'ms/MB':>8}"
+    )
+    for sample, encoding, level, size, out, ms_per_mb in benchmark(
+        samples, args.rounds
+    ):
+        saved = 100 * (1 - out / size)
+        print(
+            f"{sample[-36:]:<36} {encoding:<5} {level:>3} {size:>9} "
+            f"{out:>8} {saved:>5.1f}% {ms_per_mb:>8.2f}"
+        )
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """Run the production server."""
+    from opendms.server import serve
+
+    serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=args.backlog,
+        keep_alive=args.keep_alive,
+        graceful_timeout=args.graceful_timeout,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+    )
+    return 0
+
+
+def _wait_until_up(url: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_benchmark_server(args: argparse.Namespace) -> int:
+    """Start ``opendms serve`` per configuration and load test each one."""
+    from opendms.server import default_workers, load_test
+
+    configurations = [
+        ("1 worker, keep-alive", ["--workers", "1"], True),
+        ("1 worker, no keep-alive", ["--workers", "1"], False),
+    ]
+    for workers in sorted({default_workers(), args.workers or 1} - {1}):
+        configurations.append(
+            (f"{workers} workers, keep-alive", ["--workers", str(workers)], True)
+        )
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false", LOG_LEVEL="WARNING")
+
+    print(
+        f"{args.concurrency} clients, {args.duration:g}s per run, "
+        f"paths: {', '.join(args.paths)}"
+    )
+    print(
+        f"{'configuration':<28} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for name, flags, keep_alive in configurations:
+        command = [sys.executable, "-m", "opendms.cli", "serve"]
+        command += ["--host", "127.0.0.1", "--port", str(args.port), *flags]
+        server = subprocess.Popen(command, env=env)
+        try:
+            if not _wait_until_up(f"http://127.0.0.1:{args.port}{args.paths[0]}", 30):
+                print(f"{name:<28} server did not start")
+                continue
+            result = asyncio.run(
+                load_test(
+                    "127.0.0.1",
+                    args.port,
+                    args.paths,
+                    args.concurrency,
+                    args.duration,
+                    keep_alive=keep_alive,
+                )
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        if not result["requests"]:
+            print(f"{name:<28} no responses ({result['errors']} errors)")
+            continue
+        print(
+            f"{name:<28} {result['rps']:>8.0f} {result['p50_ms']:>8.1f} "
+            f"{result['p99_ms']:>8.1f} {result['errors']:>7}"
+        )
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="opendms")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "precompress-static", help="compress static files for serving as-is"
+    )
+    command.add_argument("--directory", help="defaults to opendms/static")
+    command.set_defaults(handler=run_precompress_static)
+
+    command = commands.add_parser(
+        "benchmark-compression", help="compare encodings and levels"
+    )
+    command.add_argument("files", nargs="*", help="defaults to opendms/static")
+    command.add_argument("--rounds", type=int, default=5)
+    command.set_defaults(handler=run_benchmark_compression)
+
+    command = commands.add_parser("serve", help="run the production server")
+    command.add_argument("--host")
+    command.add_argument("--port", type=int)
+    command.add_argument("--workers", type=int, help="defaults to one per CPU")
+    command.add_argument("--backlog", type=int)
+    command.add_argument("--keep-alive", type=int, help="idle connection timeout (s)")
+    command.add_argument("--graceful-timeout", type=int)
+    command.add_argument(
+        "--max-requests", type=int, help="recycle workers after this many (0: never)"
+    )
+    command.add_argument("--max-requests-jitter", type=int)
+    command.set_defaults(handler=run_serve)
+
+    command = commands.add_parser(
+        "benchmark-server", help="load test server configurations"
+    )
+    command.add_argument(
+        "--paths", nargs="+", default=["/sw.js", "/static/manifest.json"]
+    )
+    command.add_argument(
+        "--workers", type=int, help="worker count to try besides 1 and one per CPU"
+    )
+    command.add_argument("--concurrency", type=int, default=64)
+    command.add_argument("--duration", type=float, default=10.0)
+    command.add_argument("--port", type=int, default=8765)
+    command.set_defaults(handler=run_benchmark_server)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Admission control and load shedding.
+
+When the database slows down, requests pile up waiting for pool connections
+and threadpool slots until they all time out together. Instead, each worker
+tracks three saturation signals:
+
+- requests in flight (received, response not started yet; a streaming
+  response stops counting once its headers are sent)
+- time spent checking out a database connection, including checkouts still
+  waiting
+- event loop lag: how late a periodic timer fires
+
+Each signal is divided by its target (``ADMISSION_MAX_IN_FLIGHT``,
+``ADMISSION_POOL_WAIT_TARGET_MS``, ``ADMISSION_LOOP_LAG_TARGET_MS``) and
+the largest ratio is the worker's pressure. Requests are sorted into
+priority classes by ``ADMISSION_ROUTE_PRIORITIES``. A class is shed, with
+an immediate 503 and ``Retry-After``, once pressure reaches its
+``ADMISSION_SHED_AT`` threshold, so reports and list pages go first and
+logins and sale writes last. Classes without a threshold are never shed.
+
+Pool waits and loop lag rise as soon as they are sampled and decay
+gradually, so shedding does not flap on and off as load drops.
+``GET /ready`` fails while the default class is being shed.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.pool import QueuePool
+
+from opendms.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Share of the previous pool wait / loop lag kept per sample while it falls
+DECAY = 0.8
+
+
+def _route_priorities() -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    """Exact and prefix (trailing ``*``) entries of ``ADMISSION_ROUTE_PRIORITIES``."""
+    exact: Dict[str, str] = {}
+    prefixes: List[Tuple[str, str]] = []
+    for route, priority in settings.ADMISSION_ROUTE_PRIORITIES.items():
+        if route.endswith("*"):
+            prefixes.append((route[:-1], priority))
+        else:
+            exact[route] = priority
+    # Longest prefix wins
+    prefixes.sort(key=lambda entry: len(entry[0]), reverse=True)
+    return exact, prefixes
+
+
+class AdmissionController:
+    """Saturation signals and shedding decisions for this process."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.pool_wait = 0.0  # seconds
+        self.loop_lag = 0.0  # seconds
+        self.shed: Dict[str, int] = {}  # priority -> requests shed
+        # Checkouts happen on threadpool threads
+        self._lock = threading.Lock()
+        self._checkout_ids = itertools.count()
+        self._waiting: Dict[int, float] = {}  # checkout id -> start time
+        self._waited = 0.0
+        self._checkouts = 0
+        self._monitor: Optional[asyncio.Task] = None
+
+    def checkout_started(self) -> int:
+        checkout_id = next(self._checkout_ids)
+        with self._lock:
+            self._waiting[checkout_id] = monotonic()
+        return checkout_id
+
+    def checkout_finished(self, checkout_id: int) -> None:
+        with self._lock:
+            self._waited += monotonic() - self._waiting.pop(checkout_id)
+            self._checkouts += 1
+
+    def _sample_pool_wait(self) -> float:
+        """Mean wait since the last sample, or the oldest pending one if longer."""
+        now = monotonic()
+        with self._lock:
+            waited, checkouts = self._waited, self._checkouts
+            self._waited, self._checkouts = 0.0, 0
+            oldest = min(self._waiting.values(), default=now)
+        return max(waited / checkouts if checkouts else 0.0, now - oldest)
+
+    async def start(self) -> None:
+        """Start sampling pool waits and loop lag on the running loop."""
+        if settings.ADMISSION_ENABLED:
+            self._monitor = asyncio.create_task(self._sample())
+
+    async def stop(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        interval = settings.ADMISSION_INTERVAL
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - expected)
+            self.loop_lag = max(lag, self.loop_lag * DECAY)
+            self.pool_wait = max(self._sample_pool_wait(), self.pool_wait * DECAY)
+
+    def pressure(self) -> float:
+        """Worst signal relative to its target; 1.0 means at target."""
+        return max(
+            self.in_flight / settings.ADMISSION_MAX_IN_FLIGHT,
+            self.pool_wait * 1000 / settings.ADMISSION_POOL_WAIT_TARGET_MS,
+            self.loop_lag * 1000 / settings.ADMISSION_LOOP_LAG_TARGET_MS,
+        )
+
+    def admits(self, priority: str) -> bool:
+        threshold = settings.ADMISSION_SHED_AT.get(priority)
+        return threshold is None or self.pressure() < threshold
+
+    def status(self) -> Dict[str, Any]:
+        """Signals and shedding state for the readiness endpoint."""
+        pressure = self.pressure()
+        return {
+            "ready": self.admits(settings.ADMISSION_DEFAULT_PRIORITY),
+            "pressure": round(pressure, 3),
+            "shedding": sorted(
+                priority
+                for priority, threshold in settings.ADMISSION_SHED_AT.items()
+                if pressure >= threshold
+            ),
+            "in_flight": self.in_flight,
+            "pool_wait_ms": round(self.pool_wait * 1000, 1),
+            "pool_waiting": len(self._waiting),
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "shed": dict(self.shed),
+        }
+
+
+controller = AdmissionController()
+
+
+class MeteredQueuePool(QueuePool):
+    """``QueuePool`` that reports checkout times to the admission controller."""
+
+    def connect(self) -> Any:
+        checkout_id = controller.checkout_started()
+        try:
+            return super().connect()
+        finally:
+            controller.checkout_finished(checkout_id)
+
+
+class AdmissionMiddleware:
+    """Sheds requests by priority class with 503 while the worker is saturated."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.exempt = tuple(settings.ADMISSION_EXEMPT_PATHS)
+        self.priorities, self.priority_prefixes = _route_priorities()
+
+    def priority(self, method: str, path: str) -> str:
+        """Priority class of a request (``ADMISSION_ROUTE_PRIORITIES``)."""
+        route = f"{method} {path}"
+        priority = self.priorities.get(route)
+        if priority is not None:
+            return priority
+        for prefix, priority in self.priority_prefixes:
+            if route.startswith(prefix):
+                return priority
+        return settings.ADMISSION_DEFAULT_PRIORITY
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.ADMISSION_ENABLED
+            or scope["path"].startswith(self.exempt)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        priority = self.priority(scope["method"], scope["path"])
+        if not controller.admits(priority):
+            await self._shed(scope, priority, send)
+            return
+
+        waiting = True
+
+        async def send_started(message: Dict[str, Any]) -> None:
+            nonlocal waiting
+            if waiting and message["type"] == "http.response.start":
+                waiting = False
+                controller.in_flight -= 1
+            await send(message)
+
+        controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send_started)
+        finally:
+            if waiting:
+                controller.in_flight -= 1
+
+    async def _shed(self, scope: Dict[str, Any], priority: str, send: Any) -> None:
+        controller.shed[priority] = controller.shed.get(priority, 0) + 1
+        logger.info(
+            "Shed %s %s (%s, pressure %.2f)",
+            scope["method"],
+            scope["path"],
+            priority,
+            controller.pressure(),
+        )
+        body = json.dumps(
+            {"detail": "Server is overloaded, retry later", "priority": priority}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(settings.ADMISSION_RETRY_AFTER).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
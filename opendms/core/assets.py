@@ -0,0 +1,166 @@
+"""
+Fingerprinted static assets.
+
+Every file under ``opendms/static`` gets a content hash, computed once at
+startup. Templates link to ``asset_url("css/app.css")``, which returns
+``/static/css/app.<hash>.css``. ``AssetStaticFiles`` serves those URLs from
+the original file, including its precompressed variants, with
+``Cache-Control: immutable``. A changed file gets a new URL, so browsers
+never need to revalidate a hashed URL and repeat page loads make no static
+requests. Unhashed URLs are still served, with ``no-cache``.
+
+The service worker (``GET /sw.js``, rendered from ``templates/sw.js``)
+precaches the hashed URLs under a cache named after ``asset_version()``.
+Any asset change therefore installs a new worker that replaces the
+precache.
+
+A URL whose hash does not match the current file (e.g. a page rendered by
+an older release during a rolling deploy) is served the current file
+without ``immutable``, so it neither 404s nor poisons caches.
+"""
+
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+from opendms.core.compression import STATIC_DIR, SUFFIXES, PrecompressedStaticFiles
+from opendms.core.config import settings
+
+STATIC_URL = "/static/"
+
+HASH_LENGTH = 12
+
+# name.<hash>.ext
+_HASHED = re.compile(r"^(.+)\.([0-9a-f]{%d})(\.[^./]+)$" % HASH_LENGTH)
+
+_SKIPPED_SUFFIXES = tuple(SUFFIXES.values()) + (".tmp",)
+
+
+def _hashed_name(path: str, digest: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Content hashes of the files in a static directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        # relative path -> (hash, size, mtime_ns)
+        self._files: Dict[str, Tuple[str, int, int]] = {}
+        self.version = ""
+        self.scan()
+
+    def scan(self) -> None:
+        """Hash every file (``.gz``/``.br``/``.zst`` variants excluded)."""
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(_SKIPPED_SUFFIXES):
+                    continue
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                files[path] = self._hash(full_path)
+        self._files = files
+        self._update_version()
+
+    def _hash(self, full_path: str) -> Tuple[str, int, int]:
+        digest = hashlib.sha256()
+        with open(full_path, "rb") as source:
+            for block in iter(lambda: source.read(1 << 16), b""):
+                digest.update(block)
+        stat_result = os.stat(full_path)
+        return (
+            digest.hexdigest()[:HASH_LENGTH],
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        )
+
+    def _update_version(self) -> None:
+        combined = hashlib.sha256()
+        for path in sorted(self._files):
+            combined.update(f"{path}:{self._files[path][0]}\n".encode())
+        self.version = combined.hexdigest()[:HASH_LENGTH]
+
+    def refresh(self, path: str) -> Optional[str]:
+        """Re-hash ``path`` if it changed on disk; returns its current hash."""
+        full_path = os.path.join(self.directory, path)
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            if self._files.pop(path, None) is not None:
+                self._update_version()
+            return None
+        entry = self._files.get(path)
+        if entry is None or entry[1:] != (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        ):
+            entry = self._files[path] = self._hash(full_path)
+            self._update_version()
+        return entry[0]
+
+    def digest(self, path: str) -> Optional[str]:
+        entry = self._files.get(path)
+        return entry[0] if entry else None
+
+    def url(self, path: str) -> str:
+        """Hashed URL of a static file; unknown files keep their plain URL."""
+        path = path.lstrip("/")
+        digest = self.refresh(path) if settings.DEBUG else self.digest(path)
+        if digest is None:
+            return STATIC_URL + path
+        return STATIC_URL + _hashed_name(path, digest)
+
+    def urls(self) -> List[str]:
+        """Hashed URLs of every file, for the service worker to precache."""
+        return [
+            STATIC_URL + _hashed_name(path, entry[0])
+            for path, entry in sorted(self._files.items())
+        ]
+
+
+manifest = AssetManifest(STATIC_DIR)
+
+
+def asset_url(path: str) -> str:
+    """
+    URL of a static file for templates (``{{ asset_url("css/app.css") }}``).
+
+    Args:
+        path: Path relative to ``opendms/static``
+
+    Returns:
+        str: The fingerprinted URL, cacheable forever
+    """
+    return manifest.url(path)
+
+
+def asset_version() -> str:
+    """Hash over all static files; changes whenever any of them does."""
+    return manifest.version
+
+
+class AssetStaticFiles(PrecompressedStaticFiles):
+    """Serves hashed asset URLs as immutable, plain ones as ``no-cache``."""
+
+    async def get_response(self, path: str, scope: Dict[str, Any]) -> Response:
+        match = _HASHED.match(path.replace(os.sep, "/"))
+        if match is not None:
+            original = match.group(1) + match.group(3)
+            current = manifest.refresh(original)
+            if current is not None:
+                response = await super().get_response(original, scope)
+                if current == match.group(2):
+                    response.headers["cache-control"] = (
+                        f"public, max-age={settings.STATIC_MAX_AGE}, immutable"
+                    )
+                else:
+                    response.headers["cache-control"] = "no-cache"
+                return response
+        response = await super().get_response(path, scope)
+        response.headers["cache-control"] = "no-cache"
+        return response
@@ -0,0 +1,428 @@
+"""
+Response compression.
+
+``CompressionMiddleware`` compresses responses whose content type is in
+``COMPRESSION_TYPES`` and whose body is at least ``COMPRESSION_MIN_SIZE``,
+using the best encoding the client accepts: zstd and Brotli when the
+``zstandard`` / ``brotli`` packages are installed, gzip always. Complete
+bodies are compressed in one go. Streaming responses are compressed chunk
+by chunk and each chunk is flushed, so nothing is buffered and clients see
+data as soon as the app sends it.
+
+Files under ``opendms/static`` are compressed ahead of time at the highest
+levels, by ``python -m opendms.cli precompress-static`` in a deploy step or
+at startup for any file whose variants are missing or stale.
+``PrecompressedStaticFiles`` serves the ``.zst`` / ``.br`` / ``.gz`` file
+next to the original when there is one, so static files cost no CPU per
+request.
+"""
+
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+from opendms.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+
+# File suffixes of precompressed variants
+SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+
+# Levels used by precompress_static(), where time does not matter
+MAX_LEVELS = {"zstd": 19, "br": 11, "gzip": 9}
+
+
+class Encoder:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding: str, level: int) -> None:
+        self.encoding = encoding
+        if encoding == "gzip":
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._compress = compressor.compress
+            self._flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = compressor.flush
+        elif encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self._compress = compressor.process
+            self._flush = compressor.flush
+            self._finish = compressor.finish
+        elif encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress = compressor.compress
+            self._flush = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = compressor.flush
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress a chunk; ``flush`` makes everything so far decodable."""
+        output = self._compress(data)
+        return output + self._flush() if flush else output
+
+    def finish(self) -> bytes:
+        """End the stream."""
+        return self._finish()
+
+
+def installed_encodings() -> List[str]:
+    """Encodings this process can produce."""
+    installed = ["gzip"]
+    if brotli is not None:
+        installed.append("br")
+    if zstandard is not None:
+        installed.append("zstd")
+    return installed
+
+
+def available_encodings() -> List[str]:
+    """Installed ``COMPRESSION_ENCODINGS``, in preference order."""
+    installed = installed_encodings()
+    return [name for name in settings.COMPRESSION_ENCODINGS if name in installed]
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Compress a complete body.
+
+    Args:
+        data: Bytes to compress
+        encoding: ``gzip``, ``br`` or ``zstd``
+        level: Compression level; defaults to ``COMPRESSION_LEVELS``
+
+    Returns:
+        bytes: The encoded body
+    """
+    if level is None:
+        level = settings.COMPRESSION_LEVELS[encoding]
+    encoder = Encoder(encoding, level)
+    return encoder.compress(data) + encoder.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """
+    Encodings to use for a request, best first.
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header
+
+    Returns:
+        List[str]: Available encodings the client accepts, ordered by its
+        q-values and then by server preference
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name] = weight
+    wildcard = weights.get("*", 0.0)
+    ranked = []
+    for preference, name in enumerate(available_encodings()):
+        weight = weights.get(name, wildcard)
+        if weight > 0:
+            ranked.append((-weight, preference, name))
+    return [name for _, _, name in sorted(ranked)]
+
+
+def _compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    return content_type.split(";")[0].strip().lower() in settings.COMPRESSION_TYPES
+
+
+def _vary(headers: MutableHeaders) -> None:
+    """Caches must keep one copy per encoding."""
+    if "accept-encoding" not in headers.get("vary", "").lower():
+        headers.add_vary_header("Accept-Encoding")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an ``If-None-Match`` header matches ``etag``.
+
+    Uses the weak comparison RFC 9110 prescribes for ``If-None-Match``, so a
+    tag that compression made weak still matches the strong one it came from.
+
+    Args:
+        if_none_match: The request's If-None-Match header, if any
+        etag: The current ETag of the resource
+
+    Returns:
+        bool: True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == current for tag in if_none_match.split(",")
+    )
+
+
+def _encoded_headers(headers: MutableHeaders, encoding: str) -> None:
+    """Headers of a response whose body is now encoded."""
+    headers["content-encoding"] = encoding
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        # Same resource, different bytes
+        headers["etag"] = f"W/{etag}"
+    if "content-length" in headers:
+        del headers["content-length"]
+
+
+class CompressionMiddleware:
+    """Compresses eligible responses without buffering streamed bodies."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressingResponder(
+            send, encodings[0] if encodings else None, scope["method"] == "HEAD"
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """Wraps ``send`` for one response."""
+
+    def __init__(self, send: Callable, encoding: Optional[str], head: bool) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.head = head
+        self.start: Optional[Dict[str, Any]] = None
+        self.encoder: Optional[Encoder] = None
+        self.passthrough = False
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=list(message.get("headers", [])))
+            if (
+                message["status"] in (204, 206, 304)
+                or "content-encoding" in headers
+                or "content-range" in headers
+                or not _compressible(headers.get("content-type"))
+            ):
+                self.passthrough = True
+                await self._send(message)
+                return
+            _vary(headers)
+            length = headers.get("content-length")
+            if (
+                self.encoding is None
+                or self.head
+                or (length is not None and int(length) < settings.COMPRESSION_MIN_SIZE)
+            ):
+                self.passthrough = True
+                await self._send({**message, "headers": headers.raw})
+                return
+            # Wait for the first body chunk to see how big the body is
+            self.start = {**message, "headers": headers.raw}
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if not more_body:
+                # Complete body: compress at once, or send as is if small
+                if len(body) >= settings.COMPRESSION_MIN_SIZE:
+                    body = compress(body, self.encoding)
+                    _encoded_headers(headers, self.encoding)
+                    headers["content-length"] = str(len(body))
+                await self._send(start)
+                await self._send({**message, "body": body})
+                return
+            # Streaming: encode and flush every chunk as it arrives
+            self.encoder = Encoder(
+                self.encoding, settings.COMPRESSION_LEVELS[self.encoding]
+            )
+            _encoded_headers(headers, self.encoding)
+            await self._send(start)
+
+        if self.encoder is None:
+            await self._send(message)
+            return
+        if more_body:
+            data = self.encoder.compress(body, flush=True)
+            if data:
+                await self._send(
+                    {"type": "http.response.body", "body": data, "more_body": True}
+                )
+        else:
+            data = self.encoder.compress(body) + self.encoder.finish()
+            await self._send({"type": "http.response.body", "body": data})
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves ``.zst`` / ``.br`` / ``.gz`` variants if present."""
+
+    def file_response(
+        self,
+        full_path: Any,
+        stat_result: os.stat_result,
+        scope: Dict[str, Any],
+        status_code: int = 200,
+    ) -> Response:
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        if status_code == 200 and _compressible(media_type):
+            encodings = accepted_encodings(
+                Headers(scope=scope).get("accept-encoding", "")
+            )
+            for encoding in encodings:
+                variant = f"{full_path}{SUFFIXES[encoding]}"
+                try:
+                    variant_stat = os.stat(variant)
+                except OSError:
+                    continue
+                if variant_stat.st_mtime < stat_result.st_mtime:
+                    continue  # stale: the original changed since the build
+                response = super().file_response(variant, variant_stat, scope)
+                response.headers["content-type"] = media_type
+                response.headers["content-encoding"] = encoding
+                _vary(response.headers)
+                return response
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _compressible(media_type):
+            _vary(response.headers)
+        return response
+
+
+def precompress_static(directory: str) -> Dict[str, int]:
+    """
+    Write compressed variants of the compressible files in ``directory``.
+
+    Variants are only kept when smaller than the original, and are rebuilt
+    when the original is newer.
+
+    Args:
+        directory: Root of the static files
+
+    Returns:
+        Dict[str, int]: Counts of ``written``, ``current`` and ``skipped`` files
+    """
+    counts = {"written": 0, "current": 0, "skipped": 0}
+    suffixes = tuple(SUFFIXES.values())
+    encodings = available_encodings()
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith(suffixes):
+                continue
+            path = os.path.join(root, name)
+            source_stat = os.stat(path)
+            if source_stat.st_size < settings.COMPRESSION_MIN_SIZE or not _compressible(
+                mimetypes.guess_type(name)[0]
+            ):
+                counts["skipped"] += 1
+                continue
+            with open(path, "rb") as source:
+                data = source.read()
+            for encoding in encodings:
+                variant = path + SUFFIXES[encoding]
+                if (
+                    os.path.exists(variant)
+                    and os.stat(variant).st_mtime >= source_stat.st_mtime
+                ):
+                    counts["current"] += 1
+                    continue
+                encoded = compress(data, encoding, MAX_LEVELS[encoding])
+                if len(encoded) >= len(data):
+                    if os.path.exists(variant):
+                        os.remove(variant)
+                    counts["skipped"] += 1
+                    continue
+                handle, temp_path = tempfile.mkstemp(dir=root, suffix=".tmp")
+                with os.fdopen(handle, "wb") as output:
+                    output.write(encoded)
+                os.chmod(temp_path, source_stat.st_mode & 0o777)
+                os.replace(temp_path, variant)
+                counts["written"] += 1
+    return counts
+
+
+def ensure_precompressed_static() -> None:
+    """Build missing or stale static variants; read-only deployments skip it."""
+    try:
+        counts = precompress_static(STATIC_DIR)
+    except OSError as exc:
+        logger.warning("Could not precompress static files: %s", exc)
+        return
+    if counts["written"]:
+        logger.info("Precompressed %d static file variants", counts["written"])
+
+
+def benchmark(
+    samples: Dict[str, bytes], rounds: int = 5
+) -> List[Tuple[str, str, int, int, int, float]]:
+    """
+    CPU time and size for each sample, encoding and level.
+
+    Args:
+        samples: Name -> body
+        rounds: Timed runs per combination; the fastest is reported
+
+    Returns:
+        List[Tuple[str, str, int, int, int, float]]: Sample, encoding, level,
+        original size, compressed size and milliseconds per MB
+    """
+    levels = {
+        "gzip": [1, 4, 6, 9],
+        "br": [1, 4, 6, 9, 11],
+        "zstd": [1, 3, 6, 12, 19],
+    }
+    results = []
+    for sample, data in samples.items():
+        for encoding in installed_encodings():
+            for level in levels[encoding]:
+                best = float("inf")
+                for _ in range(rounds):
+                    started = time.process_time()
+                    encoded = compress(data, encoding, level)
+                    best = min(best, time.process_time() - started)
+                ms_per_mb = best * 1000 / (len(data) / 1_000_000)
+                results.append(
+                    (sample, encoding, level, len(data), len(encoded), ms_per_mb)
+                )
+    return results
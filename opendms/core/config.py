@@ -84,6 +84,173 @@ class Settings(BaseSettings):
 
         return f"redis://{auth}{values.get('VALKEY_HOST')}:{values.get('VALKEY_PORT')}/{values.get('VALKEY_DB')}"
 
+    # Table partitioning (PostgreSQL only)
+    PARTITION_PRECREATE_MONTHS: int = 3
+    PARTITION_RETENTION_MONTHS: Optional[int] = None  # None keeps all history
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
+
+    # Inventory analytics
+    INVENTORY_STALE_DAYS: int = 90
+    INVENTORY_FLOORPLAN_RATE: float = 7.0  # annual %, used for holding cost
+    INVENTORY_TURN_LOOKBACK_DAYS: int = 365
+    INVENTORY_ANALYTICS_CACHE_SECONDS: int = 300
+
+    # Service scheduling
+    SERVICE_DEFAULT_APPOINTMENT_MINUTES: int = 60
+    SERVICE_MAX_APPOINTMENT_MINUTES: int = 600
+    SERVICE_SLOT_INCREMENT_MINUTES: int = 15
+    SERVICE_BOOKING_HORIZON_DAYS: int = 60
+    SERVICE_SCHEDULE_CACHE_SECONDS: int = 300
+    # Zone of appointment times and operating hours (stored as local wall time)
+    SERVICE_TIME_ZONE: str = "UTC"
+
+    # Technician dispatch
+    DISPATCH_DEFAULT_JOB_HOURS: float = 1.0
+    DISPATCH_OPTIMAL_MAX_JOBS: int = 10
+    DISPATCH_PLAN_CACHE_SECONDS: int = 600
+
+    # Service reminders
+    REMINDER_LEAD_HOURS: int = 24
+    REMINDER_BATCH_SIZE: int = 200
+    REMINDER_INTERVAL_SECONDS: int = 300
+
+    # Customer deduplication (scores are 0-1)
+    DEDUP_MIN_SCORE: float = 0.75
+    DEDUP_BLOCK_SCORE: float = 0.9  # inline create rejects matches at or above
+    DEDUP_MAX_BLOCK_SIZE: int = 50
+
+    # Caller ID
+    CALLER_ID_CACHE_SECONDS: int = 900
+    CALLER_ID_WARM_ON_STARTUP: bool = True
+
+    # Customer note search (PostgreSQL text search configuration)
+    NOTE_SEARCH_LANGUAGE: str = "english"
+
+    # Customer overview
+    CUSTOMER_OVERVIEW_CACHE_SECONDS: int = 300
+    CUSTOMER_OVERVIEW_CACHE_SIZE: int = 5000
+    CUSTOMER_OVERVIEW_RECENT_NOTES: int = 10
+    CUSTOMER_OVERVIEW_MAX_BATCH: int = 100
+
+    # Real-time updates ("valkey" fans out across processes, "local" is
+    # in-process only)
+    REALTIME_BROKER: str = "valkey"
+    REALTIME_COALESCE_SECONDS: float = 1.0
+    REALTIME_HEARTBEAT_SECONDS: int = 25
+    REALTIME_MAX_PENDING_BATCHES: int = 100
+
+    # VIN decoding
+    VIN_DECODE_CACHE_SIZE: int = 65536
+    VIN_DECODE_MAX_BATCH: int = 10000
+
+    # Audit log (written in batches off the request path)
+    AUDIT_QUEUE_SIZE: int = 10000  # committed transactions awaiting write
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_SECONDS: float = 1.0
+    AUDIT_ENQUEUE_TIMEOUT: float = 0.05  # wait for queue space, then spill
+    AUDIT_SPILL_DIR: str = "audit_spill"
+    AUDIT_RETENTION_DAYS: Optional[int] = None  # None keeps all history
+
+    # Rate limiting ("valkey" shares buckets across processes, "local" is
+    # per-process). Limits are requests per minute, which is also the burst.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "valkey"
+    RATE_LIMIT_PER_IP: int = 300  # anonymous requests
+    RATE_LIMIT_PER_USER: int = 600
+    RATE_LIMIT_PER_DEALERSHIP: int = 3000
+    # Dealership id -> requests per minute, overriding RATE_LIMIT_PER_DEALERSHIP
+    RATE_LIMIT_DEALERSHIP_QUOTAS: Dict[int, int] = {}
+    # "METHOD /path" (trailing * matches a prefix) -> tokens taken, default 1
+    RATE_LIMIT_ROUTE_COSTS: Dict[str, int] = {
+        "POST /api/v1/auth/login": 20,
+        "POST /auth/login": 20,
+        "GET /api/v1/inventory/": 2,
+    }
+    # Images are immutable and cached by clients; a page of listings would
+    # otherwise spend a token per photo
+    RATE_LIMIT_EXEMPT_PATHS: List[str] = [
+        "/static/",
+        "/media/",
+        "/api/v1/images/",
+        "/health",
+        "/ready",
+    ]
+    RATE_LIMIT_TIMEOUT: float = 0.05  # Valkey wait before using local buckets
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 100000
+
+    # Compression ("br" and "zstd" need the brotli / zstandard packages)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller bodies are sent as is
+    COMPRESSION_ENCODINGS: List[str] = ["zstd", "br", "gzip"]  # preferred first
+    COMPRESSION_LEVELS: Dict[str, int] = {"zstd": 3, "br": 4, "gzip": 6}
+    COMPRESSION_TYPES: List[str] = [
+        "text/html",
+        "text/css",
+        "text/plain",
+        "text/csv",
+        "text/javascript",
+        "application/javascript",
+        "application/json",
+        "application/manifest+json",
+        "application/xml",
+        "image/svg+xml",
+    ]
+
+    # Static assets (fingerprinted URLs are cached this long, as immutable)
+    STATIC_MAX_AGE: int = 365 * 24 * 3600
+
+    # Server (opendms serve)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None  # None: one per CPU
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEP_ALIVE: int = 5  # seconds an idle connection is kept open
+    SERVER_GRACEFUL_TIMEOUT: int = 30  # seconds to finish in-flight requests
+    SERVER_MAX_REQUESTS: int = 0  # recycle a worker after this many; 0: never
+    SERVER_MAX_REQUESTS_JITTER: int = 1000  # so workers do not recycle together
+    SERVER_THREADPOOL_SIZE: int = 40  # threads for sync endpoints, per worker
+    SERVER_FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # proxies trusted for client IPs
+
+    # Admission control (per worker). Pressure is the worst of the signals
+    # below relative to its target; a priority class gets 503s once pressure
+    # reaches its ADMISSION_SHED_AT value. Classes not listed are never shed.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = 100  # requests without a response yet
+    ADMISSION_POOL_WAIT_TARGET_MS: float = 100.0  # database connection checkout
+    ADMISSION_LOOP_LAG_TARGET_MS: float = 100.0
+    ADMISSION_INTERVAL: float = 0.25  # seconds between pool wait/loop lag samples
+    ADMISSION_SHED_AT: Dict[str, float] = {"low": 1.0, "normal": 2.0, "high": 4.0}
+    ADMISSION_DEFAULT_PRIORITY: str = "normal"  # also decides readiness
+    # "METHOD /path" (trailing * matches a prefix) -> priority class
+    ADMISSION_ROUTE_PRIORITIES: Dict[str, str] = {
+        "POST /api/v1/auth/login": "high",
+        "POST /api/v1/auth/refresh": "high",
+        "POST /auth/login": "high",
+        "POST /api/v1/sales/*": "high",
+        "PUT /api/v1/sales/*": "high",
+        "PUT /api/v1/service/*": "high",
+        "GET /api/v1/reports/*": "low",
+        "GET /api/v1/inventory/analytics": "low",
+        "GET /api/v1/customers/duplicates": "low",
+        "GET /api/v1/audit/": "low",
+        "GET /api/v1/inventory/": "low",
+        "GET /api/v1/customers/": "low",
+        "GET /api/v1/sales/": "low",
+        "GET /api/v1/service/": "low",
+        "GET /inventory": "low",
+        "GET /customers": "low",
+        "GET /sales": "low",
+        "GET /service": "low",
+    }
+    ADMISSION_EXEMPT_PATHS: List[str] = ["/static/", "/media/", "/health", "/ready"]
+    ADMISSION_RETRY_AFTER: int = 5  # seconds, sent with 503s
+
+    # Notifications ("smtp" delivers for real, "memory" records to an outbox)
+    NOTIFICATION_BACKEND: str = "smtp"
+    SMS_GATEWAY_URL: Optional[str] = None
+    SMS_GATEWAY_API_KEY: Optional[str] = None
+    SMS_FROM_NUMBER: Optional[str] = None
+
     # Email
     SMTP_TLS: bool = True
     SMTP_PORT: Optional[int] = None
@@ -95,6 +262,10 @@ class Settings(BaseSettings):
 
     # File Storage
     UPLOAD_DIR: str = "uploads"
+    # Uploads being received; outside UPLOAD_DIR so partial files are never
+    # served, but it must share its filesystem (files are renamed into place).
+    # Defaults to "<UPLOAD_DIR>.tmp" next to it.
+    UPLOAD_TEMP_DIR: Optional[str] = None
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = [
         "image/jpeg",
@@ -106,14 +277,36 @@ class Settings(BaseSettings):
         "application/vnd.ms-excel",
         "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     ]
+    MEDIA_URL: str = "/media"
+
+    # Vehicle images
+    IMAGE_UPLOAD_MAX_FILES: int = 60
+    IMAGE_RENDITION_WORKERS: int = 2
+    # Widths/heights and encoder qualities /images/ renders; anything else
+    # is rejected so arbitrary parameters cannot each trigger a fresh encode
+    IMAGE_SIZES: List[int] = [160, 320, 480, 640, 800, 1024, 1280, 1600, 2048, 2400]
+    IMAGE_QUALITIES: List[int] = [60, 80, 90]
+    IMAGE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024  # 2GB
+
+    # Sale documents (kept outside UPLOAD_DIR: never served publicly)
+    DOCUMENT_DIR: str = "documents"
+    DOCUMENT_MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
+    DOCUMENT_CHUNK_SIZE: int = 5 * 1024 * 1024  # 5MB
+    DOCUMENT_UPLOAD_MAX_FILES: int = 20
+    DOCUMENT_UPLOAD_EXPIRE_HOURS: int = 24
 
     # Pagination
     DEFAULT_PAGE_SIZE: int = 20
     MAX_PAGE_SIZE: int = 100
 
-    # Logging
+    # Logging (see opendms.core.log)
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_JSON: bool = True  # LOG_FORMAT is used when off
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped and counted
+    # Logger name -> share of its INFO/DEBUG records kept, sampled per request
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    LOG_SLOW_REQUEST_MS: int = 1000  # slower requests log at WARNING
 
     # Celery
     CELERY_BROKER_URL: Optional[str] = None
@@ -134,6 +327,12 @@ class Settings(BaseSettings):
             return v
         return info.data.get("VALKEY_URL")
 
+    # Run jobs inline with in-memory results (local runs and tests)
+    CELERY_TASK_ALWAYS_EAGER: bool = False
+    JOB_RESULT_TTL_HOURS: int = 24
+    JOB_STATUS_POLL_SECONDS: float = 0.5
+    JOB_STREAM_TIMEOUT_SECONDS: int = 300
+
     # Third-party integrations
     CDK_API_URL: Optional[str] = None
     CDK_API_KEY: Optional[str] = None
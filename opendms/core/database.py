@@ -2,18 +2,22 @@
 Database configuration and session management.
 """
 
-from typing import Generator
+from contextlib import contextmanager
+from typing import Generator, Iterator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from opendms.core.admission import MeteredQueuePool
 from opendms.core.config import settings
 
 # Create database engine
 engine = create_engine(
     str(settings.SQLALCHEMY_DATABASE_URI),
+    # Checkout waits feed admission control
+    poolclass=MeteredQueuePool,
     pool_pre_ping=True,
     pool_recycle=300,
     pool_size=10,
@@ -27,6 +31,31 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
+# Advisory lock key held while the schema is created or migrated
+SCHEMA_LOCK_KEY = 0x6F646D73
+
+
+@contextmanager
+def schema_lock() -> Iterator[None]:
+    """
+    Hold a PostgreSQL advisory lock for the duration of schema changes.
+
+    Servers started side by side (several hosts, or ``uvicorn --workers``)
+    then run the startup DDL one after another instead of racing. Other
+    databases are used by a single process and need no lock.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY}
+            )
+
 
 def get_db() -> Generator[Session, None, None]:
     """
@@ -44,9 +73,31 @@ def get_db() -> Generator[Session, None, None]:
 
 def init_db() -> None:
     """
-    Initialize database tables.
+    Create the schema and bring existing tables up to date.
+
+    Idempotent; serialized across processes by ``schema_lock``.
     """
     # Import all models here to ensure they are registered with SQLAlchemy
-    from opendms.models import customer, dealership, inventory, sale, service, user
+    from opendms.core.partitioning import (
+        convert_partitioned_tables,
+        maintain_partitions,
+    )
+    from opendms.models import (
+        audit,
+        customer,
+        dealership,
+        inventory,
+        numbering,
+        sale,
+        service,
+        user,
+    )
+    from opendms.services.note_search import ensure_search_index
+    from opendms.services.vehicle_features import ensure_features_column
 
-    Base.metadata.create_all(bind=engine)
+    with schema_lock():
+        Base.metadata.create_all(bind=engine)
+        convert_partitioned_tables(engine)
+        maintain_partitions(engine)
+        ensure_search_index(engine)
+        ensure_features_column(engine)
@@ -0,0 +1,228 @@
+"""
+Per-dealership change events for live pages.
+
+Committed changes are published once per dealership to Valkey pub/sub. Each
+web process holds a single pattern subscription and fans events out to its
+own SSE/WebSocket clients, so Valkey sees one connection per process no
+matter how many browsers are open. Without Valkey (``REALTIME_BROKER =
+"local"`` or Valkey unreachable) events are delivered in-process only.
+
+Changes are coalesced per dealership: the first change opens a
+``REALTIME_COALESCE_SECONDS`` window, later changes to the same entity inside
+it overwrite the pending one, and the window is flushed to subscribers as a
+single batch. Clients therefore see at most one event per entity per window.
+Idle subscribers cost one small object and a parked coroutine, which is what
+lets a single worker hold tens of thousands of open streams.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from time import monotonic
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from opendms.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "opendms:events:"
+
+# Seconds to stay on the in-process fallback after a Valkey error
+VALKEY_RETRY_SECONDS = 5.0
+
+
+def _merge(
+    previous: Optional[Dict[str, Any]], change: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Combine two changes to the same entity inside one window."""
+    if previous is None or change["action"] == "deleted":
+        return change
+    if previous["action"] == "created":
+        # Still new to anyone who has not seen it yet
+        return {**change, "action": "created"}
+    return change
+
+
+class Subscription:
+    """One connected client's queue of pending change batches."""
+
+    __slots__ = ("dealership_id", "_batches", "_ready")
+
+    def __init__(self, dealership_id: int, max_pending: int) -> None:
+        self.dealership_id = dealership_id
+        # A stalled client loses its oldest batches instead of growing memory
+        self._batches: Deque[List[Dict[str, Any]]] = deque(maxlen=max_pending)
+        self._ready = asyncio.Event()
+
+    def push(self, batch: List[Dict[str, Any]]) -> None:
+        self._batches.append(batch)
+        self._ready.set()
+
+    async def get(self, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """
+        Wait for the next batch.
+
+        Args:
+            timeout: Seconds to wait before returning None (heartbeat)
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: The batch, or None on timeout
+        """
+        if not self._batches:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                return None
+        return self._batches.popleft()
+
+
+class EventHub:
+    """Publishes change events and fans them out to local subscribers."""
+
+    def __init__(self) -> None:
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._pending: Dict[int, Dict[Tuple[str, int], Dict[str, Any]]] = {}
+        self._publisher: Optional[redis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._valkey_down_until = 0.0
+        self._listening = False
+
+    @property
+    def use_valkey(self) -> bool:
+        return settings.REALTIME_BROKER == "valkey" and bool(settings.VALKEY_URL)
+
+    async def start(self) -> None:
+        """Bind to the running loop and start the Valkey listener."""
+        self._loop = asyncio.get_running_loop()
+        if self.use_valkey:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop the listener and release connections."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._publisher is not None:
+            self._publisher.close()
+            self._publisher = None
+        self._loop = None
+
+    async def _listen(self) -> None:
+        """Relay Valkey messages to local subscribers, reconnecting on error."""
+        failed = False
+        while True:
+            client = aioredis.from_url(str(settings.VALKEY_URL))
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self._listening = True
+                logger.info("Real-time events subscribed to Valkey")
+                async for message in pubsub.listen():
+                    channel = message["channel"].decode()
+                    dealership_id = int(channel[len(CHANNEL_PREFIX) :])
+                    self._receive(dealership_id, json.loads(message["data"]))
+            except (redis.RedisError, OSError) as exc:
+                # Log once per outage rather than on every retry
+                log = logger.warning if self._listening or not failed else logger.debug
+                log("Real-time Valkey listener failed, using in-process: %s", exc)
+                failed = True
+            else:
+                failed = False
+            finally:
+                self._listening = False
+                await pubsub.aclose()
+                await client.aclose()
+            await asyncio.sleep(VALKEY_RETRY_SECONDS)
+
+    def publish(self, dealership_id: int, changes: List[Dict[str, Any]]) -> None:
+        """
+        Publish committed changes for a dealership. Safe from any thread.
+
+        Args:
+            dealership_id: Dealership the changes belong to
+            changes: Dicts with ``entity``, ``id`` and ``action``
+        """
+        # Processes without a running hub (e.g. Celery workers) can only
+        # reach subscribers through Valkey
+        local_only = self._loop is not None and not self._listening
+        if (
+            self.use_valkey
+            and not local_only
+            and monotonic() >= self._valkey_down_until
+        ):
+            try:
+                if self._publisher is None:
+                    self._publisher = redis.Redis.from_url(
+                        str(settings.VALKEY_URL), socket_timeout=0.5
+                    )
+                self._publisher.publish(
+                    f"{CHANNEL_PREFIX}{dealership_id}", json.dumps(changes)
+                )
+                return
+            except (redis.RedisError, OSError) as exc:
+                logger.warning("Real-time publish to Valkey failed: %s", exc)
+                self._valkey_down_until = monotonic() + VALKEY_RETRY_SECONDS
+
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._receive, dealership_id, changes)
+
+    def _receive(self, dealership_id: int, changes: List[Dict[str, Any]]) -> None:
+        """Add changes to the dealership's coalescing window (loop thread)."""
+        if dealership_id not in self._subscribers:
+            return
+        pending = self._pending.get(dealership_id)
+        if pending is None:
+            pending = self._pending[dealership_id] = {}
+            self._loop.call_later(
+                settings.REALTIME_COALESCE_SECONDS, self._flush, dealership_id
+            )
+        for change in changes:
+            key = (change["entity"], change["id"])
+            pending[key] = _merge(pending.get(key), change)
+
+    def _flush(self, dealership_id: int) -> None:
+        """Deliver a dealership's coalesced window to its subscribers."""
+        pending = self._pending.pop(dealership_id, None)
+        if not pending:
+            return
+        batch = list(pending.values())
+        for subscription in self._subscribers.get(dealership_id, ()):
+            subscription.push(batch)
+
+    def subscribe(self, dealership_id: int) -> Subscription:
+        """Register a client for a dealership's events (loop thread)."""
+        subscription = Subscription(
+            dealership_id, settings.REALTIME_MAX_PENDING_BATCHES
+        )
+        self._subscribers.setdefault(dealership_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a client registered with ``subscribe``."""
+        subscribers = self._subscribers.get(subscription.dealership_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.dealership_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection counts for this process."""
+        return {
+            "broker": "valkey" if self._listening else "local",
+            "connections": sum(len(subs) for subs in self._subscribers.values()),
+            "dealerships": len(self._subscribers),
+        }
+
+
+hub = EventHub()
@@ -0,0 +1,88 @@
+"""
+Commit-time hand-off of changed rows to in-process caches and feeds.
+
+Services that derive state from table rows (caches, the change feed, the
+audit log) subscribe here instead of each registering their own session
+listeners. After every flush a subscriber's ``collect`` callback records
+what it cares about into a per-session container; when the session commits
+the containers are passed to ``apply``, and on rollback they are dropped,
+so nothing ever sees uncommitted work.
+
+Bulk ``UPDATE``/``DELETE`` statements do not go through the flush, so code
+issuing them adds the affected keys with ``pending`` before committing.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+INFO_KEY = "invalidation"
+
+
+@dataclass(frozen=True)
+class Subscriber:
+    """Callbacks of one service registered with ``subscribe``."""
+
+    collect: Callable[[Session, Any], None]
+    apply: Callable[[Any], None]
+    factory: Callable[[], Any]
+
+
+_subscribers: Dict[str, Subscriber] = {}
+
+
+def subscribe(
+    name: str,
+    collect: Callable[[Session, Any], None],
+    apply: Callable[[Any], None],
+    factory: Callable[[], Any] = set,
+) -> None:
+    """
+    Register a service for committed changes.
+
+    Args:
+        name: Unique subscriber name, also used with ``pending``
+        collect: Called after each flush with the session and the
+            subscriber's pending container
+        apply: Called after commit with the container, if it is not empty
+        factory: Creates an empty container, ``set`` by default
+    """
+    _subscribers[name] = Subscriber(collect, apply, factory)
+
+
+def pending(session: Session, name: str) -> Any:
+    """The container a subscriber is collecting into for ``session``."""
+    containers = session.info.setdefault(INFO_KEY, {})
+    container = containers.get(name)
+    if container is None:
+        container = containers[name] = _subscribers[name].factory()
+    return container
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session: Session, flush_context: Any) -> None:
+    for name, subscriber in _subscribers.items():
+        subscriber.collect(session, pending(session, name))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply(session: Session) -> None:
+    containers = session.info.pop(INFO_KEY, None)
+    for name, container in (containers or {}).items():
+        if not container:
+            continue
+        # One failing subscriber must not keep the others stale
+        try:
+            _subscribers[name].apply(container)
+        except Exception:
+            logger.exception("Applying committed changes to %s failed", name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session) -> None:
+    session.info.pop(INFO_KEY, None)
@@ -0,0 +1,313 @@
+"""
+Logging pipeline.
+
+Log calls only build the record: the message is interpolated in the calling
+thread (arguments may be ORM objects that must not be touched from another
+thread), request context is attached, and the record is put on a bounded
+queue. A ``QueueListener`` thread does the rest (timestamps, JSON encoding,
+tracebacks and writing to stdout), so neither the event loop nor threadpool
+workers wait on log I/O. If the listener falls behind and the queue fills,
+records are dropped and counted rather than blocking a request; the count
+is logged once there is room again.
+
+``RequestLogMiddleware`` gives every HTTP request an id (taken from a valid
+``X-Request-ID`` header or generated, and echoed in the response) and writes
+one ``opendms.access`` record per request with its status and latency.
+Records logged while a request is handled carry its request id, method,
+path, route template, dealership and user.
+
+``LOG_SAMPLE_RATES`` keeps a share of a logger's INFO and DEBUG records.
+Sampling is decided per request, so a sampled request keeps all of its
+records; warnings and errors are never sampled, and requests slower than
+``LOG_SLOW_REQUEST_MS`` or failing with 5xx log at WARNING.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+from opendms.core.config import settings
+
+access_logger = logging.getLogger("opendms.access")
+
+# Context fields added to every record (None outside a request)
+CONTEXT_FIELDS = ("request_id", "method", "path", "route", "dealership_id", "user_id")
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName", *CONTEXT_FIELDS}
+
+_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_log_context(**fields: Any) -> None:
+    """
+    Add fields (``user_id``, ``dealership_id``) to the current request's logs.
+
+    The context is a dict shared by the request's task and any threadpool
+    work it runs, so values bound in a sync dependency are seen by later
+    log calls of the same request.
+    """
+    context = _context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def _dealership_id(context: Dict[str, Any]) -> Any:
+    """Dealership from the bound context, path or query string."""
+    if context.get("dealership_id") is not None:
+        return context["dealership_id"]
+    scope = context["scope"]
+    value = scope.get("path_params", {}).get("dealership_id")
+    if value is None:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        value = (query.get("dealership_id") or [None])[0]
+    if value is not None and "route" in scope:
+        context["dealership_id"] = value
+    return value
+
+
+def _sampled(name: str, request_id: Optional[str]) -> bool:
+    """Whether an INFO/DEBUG record of logger ``name`` is kept."""
+    rates = settings.LOG_SAMPLE_RATES
+    while name:
+        rate = rates.get(name)
+        if rate is not None:
+            break
+        name = name.rpartition(".")[0]
+    else:
+        return True
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    # Same decision for every record of a request
+    key = request_id if request_id is not None else uuid.uuid4().hex
+    return zlib.crc32(f"{name}:{key}".encode()) % 10000 < rate * 10000
+
+
+def _route_template(scope: Dict[str, Any], route: Any) -> Optional[str]:
+    """Full path template of the matched route, including router prefixes."""
+    if route is None:
+        return None
+    # The route may be the one declared on an included router, without its
+    # prefix; router prefixes are static, so take them from the request path
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[: len(segments) - route.path.count("/")])
+    return prefix + route.path
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room: the queue may be full when the process stops
+        self.queue.put(self._sentinel)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """Puts records on a bounded queue; drops them when it is full."""
+
+    def __init__(self, log_queue: "queue.Queue[Any]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Interpolate here; formatting and tracebacks are left to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        context = _context.get()
+        if context is None:
+            for field in CONTEXT_FIELDS:
+                setattr(record, field, None)
+            return record
+        scope = context["scope"]
+        route = scope.get("route")
+        record.request_id = context["request_id"]
+        record.method = scope.get("method")
+        record.path = scope.get("path")
+        record.route = _route_template(scope, route)
+        record.dealership_id = _dealership_id(context)
+        record.user_id = context.get("user_id")
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING:
+            context = _context.get()
+            request_id = context["request_id"] if context else None
+            if not _sampled(record.name, request_id):
+                return
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        if self.dropped:
+            self._report_dropped()
+
+    def _report_dropped(self) -> None:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if not dropped:
+            return
+        record = logging.LogRecord(
+            __name__,
+            logging.WARNING,
+            __file__,
+            0,
+            "Dropped %d log records: queue full",
+            (dropped,),
+            None,
+        )
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += dropped
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields are included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """
+    Route all logging through the queue. Safe to call more than once.
+
+    Uvicorn's own loggers are sent through the same pipeline; its access log
+    is switched off because ``RequestLogMiddleware`` replaces it.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(
+        JsonFormatter() if settings.LOG_JSON else logging.Formatter(settings.LOG_FORMAT)
+    )
+    log_queue: "queue.Queue[Any]" = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _listener = _Listener(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueingHandler(log_queue))
+    root.setLevel(getattr(logging, settings.LOG_LEVEL.upper()))
+
+    for name in ("uvicorn", "uvicorn.error"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    uvicorn_access = logging.getLogger("uvicorn.access")
+    uvicorn_access.handlers.clear()
+    uvicorn_access.propagate = False
+    uvicorn_access.disabled = True
+
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestLogMiddleware:
+    """Request ids, log context and one access record per HTTP request."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = _context.set({"request_id": request_id, "scope": scope})
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            if status_code >= 500 or latency_ms > settings.LOG_SLOW_REQUEST_MS:
+                level = logging.WARNING
+            else:
+                level = logging.INFO
+            access_logger.log(
+                level,
+                "%s %s %d",
+                scope["method"],
+                scope["path"],
+                status_code,
+                extra={"status": status_code, "latency_ms": latency_ms},
+            )
+            _context.reset(token)
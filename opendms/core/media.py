@@ -0,0 +1,655 @@
+"""
+Uploaded file storage.
+
+Multipart request bodies are parsed incrementally: each file part is written
+to a temporary file in ``UPLOAD_DIR`` as its chunks arrive, hashed on the
+way, and abandoned as soon as it passes ``MAX_FILE_SIZE``, so no upload is
+ever held in memory whole. The type is sniffed from the first bytes with
+libmagic rather than trusted from the client.
+
+Files are stored content-addressed by SHA-256, so the same photo uploaded
+twice (or for two vehicles) is kept once.
+
+Large files can instead be sent in chunks through ``ResumableUploads``, which
+lets a client pick up an interrupted upload where it stopped.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import magic
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from opendms.core.config import settings
+
+# Bytes handed to libmagic to identify a file
+SNIFF_BYTES = 2048
+
+# Form fields that are not files are small; anything larger is refused
+MAX_FIELD_SIZE = 64 * 1024
+
+# Resumable uploads are written and hashed in blocks of this size
+WRITE_BLOCK = 1024 * 1024
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "application/pdf": "pdf",
+    "application/msword": "doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.ms-excel": "xls",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+}
+
+
+class UploadError(ValueError):
+    """The request body is not a usable multipart upload."""
+
+
+@dataclass
+class ReceivedFile:
+    """A file part written to a temporary file."""
+
+    field_name: str
+    filename: str
+    temp_path: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+@dataclass
+class RejectedFile:
+    """A file part that was refused, and why."""
+
+    filename: str
+    reason: str
+
+
+@dataclass
+class _Part:
+    field_name: str = ""
+    filename: Optional[str] = None
+    data: bytearray = field(default_factory=bytearray)
+    handle: Optional[BinaryIO] = None
+    temp_path: Optional[str] = None
+    digest: "hashlib._Hash" = field(default_factory=hashlib.sha256)
+    size: int = 0
+    content_type: Optional[str] = None
+    rejected: Optional[str] = None
+
+
+def media_root() -> str:
+    """Absolute path of the upload directory."""
+    return os.path.abspath(settings.UPLOAD_DIR)
+
+
+def media_url(path: str) -> str:
+    """Public URL of a stored file, given its absolute path."""
+    relative = os.path.relpath(path, media_root()).replace(os.sep, "/")
+    return f"{settings.MEDIA_URL.rstrip('/')}/{relative}"
+
+
+def media_path(url: str) -> str:
+    """Absolute path of a stored file, given its public URL."""
+    prefix = settings.MEDIA_URL.rstrip("/") + "/"
+    if not url.startswith(prefix):
+        raise ValueError(f"Not a media URL: {url}")
+    return os.path.join(media_root(), *url[len(prefix) :].split("/"))
+
+
+def temp_root() -> str:
+    """Absolute path of the directory uploads are received into.
+
+    It is outside the public ``UPLOAD_DIR`` mount, so files still being
+    written or later rejected cannot be fetched.
+    """
+    return os.path.abspath(settings.UPLOAD_TEMP_DIR or f"{media_root()}.tmp")
+
+
+def ensure_media_dirs() -> None:
+    """Create the upload and temporary directories."""
+    os.makedirs(media_root(), exist_ok=True)
+    os.makedirs(temp_root(), exist_ok=True)
+
+
+def stored_path(
+    received: ReceivedFile,
+    namespace: str,
+    name: str = "original",
+    root: Optional[str] = None,
+) -> str:
+    """
+    Content-addressed location of a received file, stored or not.
+
+    Files land in ``<root>/<namespace>/<sha[:2]>/<sha>/<name>.<ext>``.
+
+    Args:
+        received: File from ``receive_files``
+        namespace: Top-level directory, e.g. ``images``
+        name: File name without extension
+        root: Storage directory, defaults to the public ``UPLOAD_DIR``
+
+    Returns:
+        str: Absolute path of the stored file
+    """
+    directory = os.path.join(
+        root or media_root(), namespace, received.sha256[:2], received.sha256
+    )
+    extension = EXTENSIONS.get(received.content_type, "bin")
+    return os.path.join(directory, f"{name}.{extension}")
+
+
+def store(
+    received: ReceivedFile,
+    namespace: str,
+    name: str = "original",
+    root: Optional[str] = None,
+) -> str:
+    """
+    Move a received file to its content-addressed location (``stored_path``).
+
+    If that file already exists the temporary copy is discarded.
+
+    Returns:
+        str: Absolute path of the stored file
+    """
+    path = stored_path(received, namespace, name, root)
+    if os.path.exists(path):
+        os.unlink(received.temp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(received.temp_path, path)
+    return path
+
+
+def discard(files: Sequence[ReceivedFile]) -> None:
+    """Delete temporary files that will not be stored."""
+    for received in files:
+        if os.path.exists(received.temp_path):
+            os.unlink(received.temp_path)
+
+
+class _StreamingParser:
+    """Callbacks for ``MultipartParser`` that stream file parts to disk."""
+
+    def __init__(
+        self,
+        allowed_types: Sequence[str],
+        max_files: int,
+        max_size: int,
+        temp_dir: str,
+    ) -> None:
+        self.allowed_types = allowed_types
+        self.temp_dir = temp_dir
+        self.max_files = max_files
+        self.max_size = max_size
+        self.files: List[ReceivedFile] = []
+        self.rejected: List[RejectedFile] = []
+        self.fields: Dict[str, str] = {}
+        self.part = _Part()
+        self.file_count = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        # File writes are queued by the synchronous callbacks and flushed
+        # from a threadpool between request chunks
+        self.pending: List[Tuple[_Part, bytes]] = []
+        self.finished: List[_Part] = []
+        self.open_parts: List[_Part] = []
+
+    def on_part_begin(self) -> None:
+        self.part = _Part()
+        self._disposition = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        self.part.field_name = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            self.part.filename = options[b"filename"].decode("utf-8", "replace")
+            self.file_count += 1
+            if self.file_count > self.max_files:
+                self.part.rejected = f"More than {self.max_files} files"
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        part = self.part
+        chunk = data[start:end]
+        if part.filename is None:
+            if len(part.data) + len(chunk) > MAX_FIELD_SIZE:
+                raise UploadError(f"Form field {part.field_name!r} is too large")
+            part.data.extend(chunk)
+            return
+        if part.rejected:
+            return
+
+        part.size += len(chunk)
+        if part.size > self.max_size:
+            part.rejected = f"Larger than {self.max_size} bytes"
+            return
+        if part.content_type is None:
+            # Hold the first bytes until there are enough to sniff
+            part.data.extend(chunk)
+            if len(part.data) < SNIFF_BYTES:
+                return
+            chunk = self._sniff(part)
+            if chunk is None:
+                return
+        self.pending.append((part, chunk))
+
+    def on_part_end(self) -> None:
+        part = self.part
+        if part.filename is None:
+            self.fields[part.field_name] = part.data.decode("utf-8", "replace")
+            return
+        if not part.rejected and part.content_type is None:
+            chunk = self._sniff(part)
+            if chunk:
+                self.pending.append((part, chunk))
+        self.finished.append(part)
+
+    def _sniff(self, part: _Part) -> Optional[bytes]:
+        """Identify a part from its buffered head; return the head to write."""
+        head = bytes(part.data)
+        part.data = bytearray()
+        part.content_type = magic.from_buffer(head[:SNIFF_BYTES], mime=True)
+        if part.content_type not in self.allowed_types:
+            part.rejected = f"Type {part.content_type} is not allowed"
+            return None
+        return head
+
+    def flush(self) -> None:
+        """Write queued chunks and close finished parts (runs in a thread)."""
+        for part, chunk in self.pending:
+            if part.rejected:
+                continue
+            if part.handle is None:
+                handle, part.temp_path = tempfile.mkstemp(dir=self.temp_dir)
+                part.handle = os.fdopen(handle, "wb")
+                self.open_parts.append(part)
+            part.handle.write(chunk)
+            part.digest.update(chunk)
+        self.pending.clear()
+
+        for part in self.finished:
+            self._close(part)
+            if part.rejected or part.temp_path is None:
+                self.rejected.append(
+                    RejectedFile(part.filename or "", part.rejected or "Empty file")
+                )
+                continue
+            self.files.append(
+                ReceivedFile(
+                    field_name=part.field_name,
+                    filename=part.filename or "",
+                    temp_path=part.temp_path,
+                    size=part.size,
+                    sha256=part.digest.hexdigest(),
+                    content_type=part.content_type or "",
+                )
+            )
+        self.finished.clear()
+
+    def _close(self, part: _Part) -> None:
+        if part.handle is not None:
+            part.handle.close()
+            part.handle = None
+        if part.rejected and part.temp_path and os.path.exists(part.temp_path):
+            os.unlink(part.temp_path)
+        if part in self.open_parts:
+            self.open_parts.remove(part)
+
+    def abort(self) -> None:
+        """Remove everything written so far."""
+        for part in list(self.open_parts):
+            part.rejected = part.rejected or "aborted"
+            self._close(part)
+        discard(self.files)
+
+
+async def receive_files(
+    request: Request,
+    allowed_types: Sequence[str],
+    max_files: int,
+    max_size: Optional[int] = None,
+    temp_dir: Optional[str] = None,
+) -> Tuple[List[ReceivedFile], List[RejectedFile], Dict[str, str]]:
+    """
+    Stream the files of a ``multipart/form-data`` request to disk.
+
+    Files that are too large, of a disallowed type, or beyond ``max_files``
+    are skipped and reported rather than failing the whole upload.
+
+    Args:
+        request: Incoming request
+        allowed_types: MIME types accepted after sniffing
+        max_files: Most files accepted from one request
+        max_size: Per-file byte limit, defaults to ``MAX_FILE_SIZE``
+        temp_dir: Directory for the temporary files, defaults to
+            ``temp_root()``; use one on the same filesystem as the final
+            location
+
+    Returns:
+        Tuple: Received files, rejected files, and plain form fields
+
+    Raises:
+        UploadError: If the body is not valid multipart data
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data body")
+
+    if temp_dir is None:
+        ensure_media_dirs()
+        temp_dir = temp_root()
+    sink = _StreamingParser(
+        allowed_types, max_files, max_size or settings.MAX_FILE_SIZE, temp_dir
+    )
+    parser = MultipartParser(
+        params[b"boundary"],
+        {
+            "on_part_begin": sink.on_part_begin,
+            "on_part_data": sink.on_part_data,
+            "on_part_end": sink.on_part_end,
+            "on_header_field": sink.on_header_field,
+            "on_header_value": sink.on_header_value,
+            "on_header_end": sink.on_header_end,
+            "on_headers_finished": sink.on_headers_finished,
+        },
+    )
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if sink.pending or sink.finished:
+                await run_in_threadpool(sink.flush)
+        parser.finalize()
+        await run_in_threadpool(sink.flush)
+    except FormParserError as exc:
+        await run_in_threadpool(sink.abort)
+        raise UploadError("Invalid multipart data") from exc
+    except BaseException:
+        await run_in_threadpool(sink.abort)
+        raise
+    return sink.files, sink.rejected, sink.fields
+
+
+class UploadNotFound(UploadError):
+    """No upload session with that id (never started, finished or expired)."""
+
+
+class UploadConflict(UploadError):
+    """A chunk does not start where the upload left off."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(message)
+        self.offset = offset
+
+
+@dataclass
+class UploadSession:
+    """State of a resumable upload."""
+
+    upload_id: str
+    filename: str
+    size: int
+    offset: int = 0
+    sha256: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+
+
+class ResumableUploads:
+    """
+    Resumable uploads sent as a series of chunks.
+
+    Each session is a ``<id>.json`` description and a ``<id>.part`` file in
+    ``directory``. The part file's size is the upload offset, so a client
+    that lost its connection asks for the offset and continues from there,
+    and any process sharing the directory can take the next chunk. Chunks
+    are appended under an exclusive lock, so two requests cannot write the
+    same upload at once.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        if not _UPLOAD_ID.match(upload_id):
+            raise UploadNotFound("Upload not found")
+        base = os.path.join(self.directory, upload_id)
+        return f"{base}.json", f"{base}.part"
+
+    def start(
+        self,
+        filename: str,
+        size: int,
+        max_size: int,
+        sha256: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> UploadSession:
+        """
+        Open an upload session.
+
+        Args:
+            filename: Client file name
+            size: Total size in bytes
+            max_size: Largest size accepted
+            sha256: Digest the finished file must match, if known
+            metadata: Caller data returned with the session
+
+        Returns:
+            UploadSession: The new session, at offset 0
+
+        Raises:
+            UploadError: If the size is out of range
+        """
+        if not 0 < size <= max_size:
+            raise UploadError(f"Size must be between 1 and {max_size} bytes")
+        os.makedirs(self.directory, exist_ok=True)
+        session = UploadSession(
+            upload_id=secrets.token_hex(16),
+            filename=filename,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+            metadata=metadata or {},
+        )
+        info_path, part_path = self._paths(session.upload_id)
+        open(part_path, "xb").close()
+        temp_path = f"{info_path}.tmp"
+        with open(temp_path, "w") as handle:
+            json.dump(asdict(session), handle)
+        os.replace(temp_path, info_path)
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        """
+        Load a session with its current offset.
+
+        Raises:
+            UploadNotFound: If there is no such session
+        """
+        info_path, part_path = self._paths(upload_id)
+        try:
+            with open(info_path) as handle:
+                session = UploadSession(**json.load(handle))
+            session.offset = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found") from None
+        return session
+
+    async def append(
+        self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]
+    ) -> UploadSession:
+        """
+        Append a chunk streamed from the request body.
+
+        Data is written in blocks as it arrives. If the client disconnects
+        part-way, what arrived is kept and the client resumes from the new
+        offset.
+
+        Args:
+            upload_id: Session id
+            offset: Where the client believes the chunk starts
+            chunks: Body stream, e.g. ``request.stream()``
+
+        Returns:
+            UploadSession: The session with its new offset
+
+        Raises:
+            UploadNotFound: If there is no such session
+            UploadConflict: If ``offset`` is not the current offset, or
+                another request is writing this upload
+            UploadError: If the chunk runs past the declared size
+        """
+        session = await run_in_threadpool(self.get, upload_id)
+        _, part_path = self._paths(upload_id)
+        handle = await run_in_threadpool(self._lock_part, part_path, session.offset)
+        try:
+            current = os.fstat(handle.fileno()).st_size
+            if offset != current:
+                raise UploadConflict(
+                    f"Upload is at offset {current}, not {offset}", current
+                )
+            buffer = bytearray()
+            try:
+                async for chunk in chunks:
+                    if current + len(buffer) + len(chunk) > session.size:
+                        buffer.clear()
+                        raise UploadError("Chunk runs past the declared size")
+                    buffer.extend(chunk)
+                    if len(buffer) >= WRITE_BLOCK:
+                        await run_in_threadpool(handle.write, bytes(buffer))
+                        current += len(buffer)
+                        buffer.clear()
+            finally:
+                if buffer:
+                    await run_in_threadpool(handle.write, bytes(buffer))
+                    current += len(buffer)
+        finally:
+            await run_in_threadpool(handle.close)
+        session.offset = current
+        return session
+
+    @staticmethod
+    def _lock_part(part_path: str, offset: int) -> BinaryIO:
+        try:
+            handle = open(part_path, "ab")
+        except FileNotFoundError:
+            raise UploadNotFound("Upload not found") from None
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            raise UploadConflict(
+                "Upload is being written by another request", offset
+            ) from None
+        return handle
+
+    def finish(self, upload_id: str, allowed_types: Sequence[str]) -> ReceivedFile:
+        """
+        Close a complete upload and hand over its file.
+
+        The type is sniffed and the digest computed from the assembled
+        file; the session is removed either way once it is complete.
+
+        Args:
+            upload_id: Session id
+            allowed_types: MIME types accepted after sniffing
+
+        Returns:
+            ReceivedFile: The assembled file, ready for ``store``
+
+        Raises:
+            UploadNotFound: If there is no such session
+            UploadError: If the upload is incomplete, of a disallowed type,
+                or does not match the declared digest
+        """
+        session = self.get(upload_id)
+        info_path, part_path = self._paths(upload_id)
+        if session.offset != session.size:
+            raise UploadError(f"Upload has {session.offset} of {session.size} bytes")
+
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as handle:
+            content_type = magic.from_buffer(handle.read(SNIFF_BYTES), mime=True)
+            handle.seek(0)
+            for block in iter(lambda: handle.read(WRITE_BLOCK), b""):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        os.unlink(info_path)
+
+        if content_type not in allowed_types:
+            os.unlink(part_path)
+            raise UploadError(f"Type {content_type} is not allowed")
+        if session.sha256 and session.sha256 != sha256:
+            os.unlink(part_path)
+            raise UploadError("Upload does not match the declared sha256")
+        return ReceivedFile(
+            field_name="",
+            filename=session.filename,
+            temp_path=part_path,
+            size=session.size,
+            sha256=sha256,
+            content_type=content_type,
+        )
+
+    def abort(self, upload_id: str) -> None:
+        """Remove a session and its data."""
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def purge(self, max_age: float) -> int:
+        """
+        Remove sessions not written to for ``max_age`` seconds.
+
+        Returns:
+            int: Number of sessions removed
+        """
+        cutoff = time.time() - max_age
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".part":
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) < cutoff:
+                    self.abort(upload_id)
+                    removed += 1
+            except (FileNotFoundError, UploadNotFound):
+                continue
+        return removed
@@ -0,0 +1,171 @@
+"""
+Outbound email and SMS transports.
+
+Transports keep their connection open for the lifetime of a batch: one SMTP
+session (reconnected if the server drops it) and one keep-alive HTTP client
+for the SMS gateway. ``NOTIFICATION_BACKEND = "memory"`` swaps both for an
+in-process sink that records messages in ``OUTBOX`` for tests and local runs.
+"""
+
+import logging
+import smtplib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Dict, List, Optional
+
+import httpx
+
+from opendms.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EMAIL = "email"
+SMS = "sms"
+
+
+@dataclass
+class Message:
+    """A rendered notification ready to hand to a transport."""
+
+    channel: str  # EMAIL or SMS
+    recipient: str
+    body: str
+    subject: Optional[str] = None
+
+
+class Transport(ABC):
+    """Base class for pooled transports; usable as a context manager."""
+
+    channel: str = ""
+
+    @abstractmethod
+    def send(self, message: Message) -> None:
+        """Deliver one message, raising if it could not be handed over."""
+
+    def close(self) -> None:  # noqa: B027  no-op default for connectionless transports
+        """Release the transport's connection, if it keeps one."""
+
+    def __enter__(self) -> "Transport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class SMTPTransport(Transport):
+    """Sends email over a single reused SMTP session."""
+
+    channel = EMAIL
+
+    def __init__(self) -> None:
+        self._smtp: Optional[smtplib.SMTP] = None
+        sender = settings.EMAILS_FROM_EMAIL or settings.SMTP_USER or ""
+        self._sender = (
+            formataddr((settings.EMAILS_FROM_NAME, sender))
+            if settings.EMAILS_FROM_NAME
+            else sender
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT or 0, timeout=30)
+        if settings.SMTP_TLS:
+            smtp.starttls()
+        if settings.SMTP_USER and settings.SMTP_PASSWORD:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        return smtp
+
+    def send(self, message: Message) -> None:
+        email = EmailMessage()
+        email["From"] = self._sender
+        email["To"] = message.recipient
+        email["Subject"] = message.subject or ""
+        email.set_content(message.body)
+
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(email)
+        except smtplib.SMTPServerDisconnected:
+            # Idle sessions get dropped by the server; reconnect once
+            self._smtp = self._connect()
+            self._smtp.send_message(email)
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+
+class SMSTransport(Transport):
+    """Posts text messages to an HTTP SMS gateway over a keep-alive client."""
+
+    channel = SMS
+
+    def __init__(self) -> None:
+        headers = {}
+        if settings.SMS_GATEWAY_API_KEY:
+            headers["Authorization"] = f"Bearer {settings.SMS_GATEWAY_API_KEY}"
+        self._client = httpx.Client(
+            base_url=str(settings.SMS_GATEWAY_URL), headers=headers, timeout=10.0
+        )
+
+    def send(self, message: Message) -> None:
+        response = self._client.post(
+            "",
+            json={
+                "to": message.recipient,
+                "from": settings.SMS_FROM_NUMBER,
+                "body": message.body,
+            },
+        )
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+# Messages delivered through MemoryTransport, oldest first
+OUTBOX: List[Message] = []
+
+
+class MemoryTransport(Transport):
+    """Records messages in ``OUTBOX`` instead of delivering them."""
+
+    def __init__(self, channel: str) -> None:
+        self.channel = channel
+
+    def send(self, message: Message) -> None:
+        OUTBOX.append(message)
+
+
+def open_transports() -> Dict[str, Transport]:
+    """
+    Open one transport per configured channel.
+
+    Returns:
+        Dict[str, Transport]: Transports keyed by channel; channels without
+        configuration are absent
+    """
+    if settings.NOTIFICATION_BACKEND == "memory":
+        return {EMAIL: MemoryTransport(EMAIL), SMS: MemoryTransport(SMS)}
+
+    transports: Dict[str, Transport] = {}
+    if settings.SMTP_HOST:
+        transports[EMAIL] = SMTPTransport()
+    if settings.SMS_GATEWAY_URL:
+        transports[SMS] = SMSTransport()
+    return transports
+
+
+def close_transports(transports: Dict[str, Transport]) -> None:
+    """Close every transport, logging rather than raising on failure."""
+    for transport in transports.values():
+        try:
+            transport.close()
+        except Exception:
+            logger.exception("Failed to close %s transport", transport.channel)
@@ -0,0 +1,439 @@
+"""
+Monthly range partition management for high-volume history tables.
+
+``sales``, ``service_appointments`` and ``service_work_orders`` are declared
+with ``PARTITION BY RANGE`` on PostgreSQL. This module creates the monthly
+partitions ahead of time, keeps a DEFAULT partition as a safety net, and
+detaches old partitions into an archive schema so the hot tables only hold
+recent history.
+
+Other databases (SQLite in development) get plain tables keyed by ``id``.
+``convert_partitioned_tables()`` upgrades tables created before this
+layout.
+"""
+
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import PrimaryKeyConstraint, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.compiler import compiles
+
+from opendms.core.config import settings
+from opendms.core.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> partition key column
+PARTITIONED_TABLES: Dict[str, str] = {
+    "sales": "sale_date",
+    "service_appointments": "appointment_date",
+    "service_work_orders": "created_at",
+}
+
+
+def partitioned_by(column: str) -> Dict[str, Any]:
+    """
+    Table options for a table range-partitioned by month on ``column``.
+
+    Args:
+        column: Partition key column
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for ``__table_args__``
+    """
+    return {
+        "postgresql_partition_by": f"RANGE ({column})",
+        "info": {"partition_key": column},
+    }
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _compile_primary_key(constraint: PrimaryKeyConstraint, compiler: Any, **kw) -> str:
+    """
+    Add the partition key to the primary key of partitioned tables.
+
+    PostgreSQL requires the partition key in every unique constraint. The
+    mapped primary key stays ``id`` alone, so other databases keep an
+    autoincrementing single-column key.
+    """
+    key = constraint.table.info.get("partition_key")
+    if key is None:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [column.name for column in constraint.columns]
+    if key not in columns:
+        columns.append(key)
+    ddl = ""
+    if constraint.name is not None:
+        ddl += f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} "
+    quoted = ", ".join(compiler.preparer.quote(name) for name in columns)
+    ddl += f"PRIMARY KEY ({quoted})"
+    return ddl + compiler.define_constraint_deferrability(constraint)
+
+
+def month_start(value: date) -> date:
+    """Return the first day of the month containing ``value``."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    """
+    Shift a month start by a number of months.
+
+    Args:
+        value: First day of a month
+        months: Months to add (may be negative)
+
+    Returns:
+        date: First day of the resulting month
+    """
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Return the partition table name for ``table`` and ``month``."""
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def parse_partition_month(table: str, name: str) -> Optional[date]:
+    """
+    Recover the month a partition covers from its name.
+
+    Args:
+        table: Parent table name
+        name: Partition table name
+
+    Returns:
+        Optional[date]: Month start, or None for DEFAULT/foreign partitions
+    """
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})_(\d{{2}})", name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioning_supported(bind: Union[Engine, Connection]) -> bool:
+    """Declarative partitioning is only available on PostgreSQL."""
+    return bind.dialect.name == "postgresql"
+
+
+def list_partitions(conn: Connection, table: str) -> List[str]:
+    """
+    List the partitions currently attached to ``table``.
+
+    Args:
+        conn: Database connection
+        table: Parent table name
+
+    Returns:
+        List[str]: Attached partition names
+    """
+    rows = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    )
+    return [row[0] for row in rows]
+
+
+def create_default_partition(conn: Connection, table: str) -> None:
+    """Create the DEFAULT partition catching rows outside every monthly range."""
+    conn.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    )
+
+
+def create_partition(conn: Connection, table: str, month: date) -> str:
+    """
+    Create the partition of ``table`` for ``month``.
+
+    Rows for that month already in the DEFAULT partition would make a plain
+    ``CREATE TABLE ... PARTITION OF`` fail, so when there are any the
+    partition is created detached, the rows are moved into it, and it is
+    then attached.
+
+    Args:
+        conn: Database connection
+        table: Parent table name
+        month: First day of the month
+
+    Returns:
+        str: Partition name
+    """
+    name = partition_name(table, month)
+    key = PARTITIONED_TABLES[table]
+    bounds = {"lower": month, "upper": add_months(month, 1)}
+    values = (
+        f"FOR VALUES FROM ('{bounds['lower'].isoformat()}') "
+        f"TO ('{bounds['upper'].isoformat()}')"
+    )
+    in_range = f"{key} >= :lower AND {key} < :upper"
+    default = f"{table}_default"
+    stranded = (
+        default in list_partitions(conn, table)
+        and conn.execute(
+            text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1"), bounds
+        ).first()
+    )
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {values}"))
+        return name
+
+    columns = ", ".join(
+        row[0]
+        for row in conn.execute(
+            text(
+                "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) "
+                "AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+            ),
+            {"table": table},
+        )
+    )
+    conn.execute(
+        text(
+            f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    moved = conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING {columns}) "
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        ),
+        bounds,
+    ).rowcount
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {values}"))
+    logger.info("Moved %d rows from %s to %s", moved, default, name)
+    return name
+
+
+def default_partition_months(conn: Connection, table: str) -> List[date]:
+    """Months that have rows in the DEFAULT partition of ``table``."""
+    key = PARTITIONED_TABLES[table]
+    rows = conn.execute(
+        text(
+            f"SELECT DISTINCT CAST(date_trunc('month', {key}) AS date) "
+            f"FROM {table}_default ORDER BY 1"
+        )
+    )
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(
+    conn: Connection, table: str, start: date, end: date
+) -> List[str]:
+    """
+    Create monthly partitions covering ``[start, end]`` if they are missing.
+
+    Args:
+        conn: Database connection
+        table: Parent table name
+        start: First month to cover
+        end: Last month to cover (inclusive)
+
+    Returns:
+        List[str]: Names of partitions that were created
+    """
+    existing = set(list_partitions(conn, table))
+    created = []
+    month = month_start(start)
+    last = month_start(end)
+    while month <= last:
+        if partition_name(table, month) not in existing:
+            created.append(create_partition(conn, table, month))
+        month = add_months(month, 1)
+    return created
+
+
+def detach_partitions(
+    conn: Connection, table: str, older_than: date, archive_schema: str
+) -> List[str]:
+    """
+    Detach monthly partitions that end before ``older_than`` and archive them.
+
+    Detached partitions are moved into ``archive_schema`` where they remain
+    queryable (and can be dumped or dropped) without being scanned or vacuumed
+    as part of the parent table.
+
+    Args:
+        conn: Database connection
+        table: Parent table name
+        older_than: Archive partitions whose range ends on or before this date
+        archive_schema: Schema that receives detached partitions
+
+    Returns:
+        List[str]: Names of partitions that were detached
+    """
+    cutoff = month_start(older_than)
+    detached = []
+    for name in sorted(list_partitions(conn, table)):
+        month = parse_partition_month(table, name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {archive_schema}"))
+        detached.append(name)
+    return detached
+
+
+def _copy_rows(conn: Connection, source: str, target: Table) -> None:
+    """Copy the columns ``source`` and ``target`` have in common."""
+    existing = {column["name"] for column in inspect(conn).get_columns(source)}
+    columns = ", ".join(
+        column.name for column in target.columns if column.name in existing
+    )
+    conn.execute(
+        text(f"INSERT INTO {target.name} ({columns}) SELECT {columns} FROM {source}")
+    )
+
+
+def _convert_postgresql_table(conn: Connection, table: Table) -> None:
+    """Replace a plain PostgreSQL table with a partitioned copy of its rows."""
+    name = table.name
+    old = f"{name}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {name} RENAME TO {old}"))
+    # Free the primary key, unique and index names for the new table
+    indexes = conn.execute(
+        text(
+            "SELECT indexname FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = :table"
+        ),
+        {"table": old},
+    ).scalars()
+    for number, index in enumerate(list(indexes)):
+        conn.execute(text(f"ALTER INDEX {index} RENAME TO {old}_index_{number}"))
+
+    table.create(conn, checkfirst=True)
+    create_default_partition(conn, name)
+    key = PARTITIONED_TABLES[name]
+    first, last = conn.execute(text(f"SELECT min({key}), max({key}) FROM {old}")).one()
+    if first is not None:
+        ensure_partitions(conn, name, first, last)
+    _copy_rows(conn, old, table)
+    conn.execute(
+        text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"(SELECT COALESCE(max(id), 0) + 1 FROM {name}), false)"
+        )
+    )
+    # CASCADE drops foreign keys other tables still have to the old table
+    conn.execute(text(f"DROP TABLE {old} CASCADE"))
+
+
+def _convert_sqlite_table(conn: Connection, table: Table) -> None:
+    """Rebuild a SQLite table that has the composite primary key."""
+    name = table.name
+    # Copied into the same metadata so its foreign keys resolve
+    new = table.to_metadata(table.metadata, name=f"{name}_new")
+    table.metadata.remove(new)
+    # Indexes are recreated under their own names after the swap
+    new.indexes.clear()
+    indexes = conn.execute(
+        text(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"
+        ),
+        {"table": name},
+    ).scalars()
+    for index in list(indexes):
+        conn.execute(text(f"DROP INDEX {index}"))
+    new.create(conn)
+    _copy_rows(conn, name, new)
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {new.name} RENAME TO {name}"))
+    for index in table.indexes:
+        index.create(conn)
+
+
+def convert_partitioned_tables(engine: Engine) -> List[str]:
+    """
+    Upgrade partitioned tables created before the current layout.
+
+    ``create_all`` skips tables that already exist. On PostgreSQL a plain
+    (unpartitioned) table is renamed, a partitioned table is created with
+    partitions for the months its rows cover, the rows are copied and the
+    old table is dropped. On SQLite a table created with the composite
+    primary key is rebuilt keyed by ``id``. Each runs in one transaction;
+    tables already converted are left alone.
+
+    Args:
+        engine: Database engine
+
+    Returns:
+        List[str]: Names of tables that were converted
+    """
+    converted = []
+    with engine.begin() as conn:
+        for name in PARTITIONED_TABLES:
+            table = Base.metadata.tables[name]
+            if is_partitioning_supported(conn):
+                relkind = conn.execute(
+                    text(
+                        "SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"
+                    ),
+                    {"table": name},
+                ).scalar()
+                if relkind != "r":
+                    continue
+                _convert_postgresql_table(conn, table)
+            elif conn.dialect.name == "sqlite":
+                primary_key = inspect(conn).get_pk_constraint(name)
+                if len(primary_key["constrained_columns"]) <= 1:
+                    continue
+                _convert_sqlite_table(conn, table)
+            else:
+                continue
+            logger.info("Converted table %s to the partitioned layout", name)
+            converted.append(name)
+    return converted
+
+
+def maintain_partitions(engine: Engine, today: Optional[date] = None) -> None:
+    """
+    Bring every partitioned table up to date.
+
+    Creates partitions from the current month through
+    ``PARTITION_PRECREATE_MONTHS`` ahead, plus a partition for every month
+    that has rows in the DEFAULT partition (appointments booked further
+    ahead, backdated sales), moving those rows into it. When
+    ``PARTITION_RETENTION_MONTHS`` is set, partitions older than the
+    retention window are archived. Safe to run repeatedly (startup, beat schedule).
+
+    Args:
+        engine: Database engine
+        today: Reference date, defaults to the current UTC date
+    """
+    if not is_partitioning_supported(engine):
+        return
+
+    current = month_start(today or datetime.utcnow().date())
+    horizon = add_months(current, settings.PARTITION_PRECREATE_MONTHS)
+
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            create_default_partition(conn, table)
+            created = ensure_partitions(conn, table, current, horizon)
+            for month in default_partition_months(conn, table):
+                created += ensure_partitions(conn, table, month, month)
+            if created:
+                logger.info("Created partitions %s", ", ".join(created))
+
+            if settings.PARTITION_RETENTION_MONTHS is None:
+                continue
+            cutoff = add_months(current, -settings.PARTITION_RETENTION_MONTHS)
+            detached = detach_partitions(
+                conn, table, cutoff, settings.PARTITION_ARCHIVE_SCHEMA
+            )
+            if detached:
+                logger.info(
+                    "Archived partitions %s to schema %s",
+                    ", ".join(detached),
+                    settings.PARTITION_ARCHIVE_SCHEMA,
+                )
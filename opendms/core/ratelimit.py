@@ -0,0 +1,294 @@
+"""
+Rate limiting at the API edge.
+
+Every request takes tokens from one or more buckets before it reaches the
+app. Authenticated requests are charged to their user and their dealership,
+so one tenant's integrations cannot use up the capacity everyone shares.
+Anonymous requests (login, public pages, scrapers) are charged to the
+client IP. Each bucket refills at its per-minute limit and holds one
+minute's worth of tokens, which is also the largest burst it allows.
+``RATE_LIMIT_ROUTE_COSTS`` makes expensive routes take more than one token.
+
+With ``RATE_LIMIT_BACKEND = "valkey"`` buckets live in Valkey and a single
+Lua script checks and charges all of a request's buckets atomically, on the
+Valkey clock, in one round trip, so limits hold across workers and nodes.
+Without Valkey, or for ``VALKEY_RETRY_SECONDS`` after a Valkey error, the
+same algorithm runs on per-process buckets.
+
+A request is charged all or nothing: if any bucket is short, none is
+charged and the response is 429 with ``Retry-After`` set to when the
+emptiest bucket will have enough tokens.
+"""
+
+import asyncio
+import json
+import logging
+import math
+from functools import lru_cache
+from time import monotonic
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from starlette.requests import cookie_parser
+
+from opendms.core.config import settings
+from opendms.core.security import decode_token
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "opendms:ratelimit:"
+
+# Seconds to stay on per-process buckets after a Valkey error
+VALKEY_RETRY_SECONDS = 5.0
+
+# KEYS: bucket keys. ARGV: cost, then capacity and refill rate (tokens per
+# second) for each key. Returns {1} when charged, or {0, wait, key index}.
+TOKEN_BUCKET_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+local wait, short = 0, 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local level = tonumber(state[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+    level = math.min(capacity, level + elapsed * rate)
+    levels[i] = level
+    local need = math.min(cost, capacity)
+    if level < need and (need - level) / rate > wait then
+        wait, short = (need - level) / rate, i
+    end
+end
+if short > 0 then
+    return {0, tostring(wait), short}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call("HSET", key, "tokens", levels[i] - math.min(cost, capacity), "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(capacity / rate * 1000))
+end
+return {1}
+"""
+
+# (key, capacity, tokens per second)
+Bucket = Tuple[str, float, float]
+
+
+@lru_cache(maxsize=4096)
+def _token_identity(token: str) -> Tuple[Optional[str], Optional[int]]:
+    """User and dealership of a bearer token; tokens repeat across requests."""
+    claims = decode_token(token)
+    if claims is None or claims.get("type") == "refresh":
+        return None, None
+    return claims.get("sub"), claims.get("dealership_id")
+
+
+def _bearer_token(scope: Dict[str, Any]) -> Optional[str]:
+    """Access token from the Authorization header or the login cookie."""
+    cookie = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+        elif name == b"cookie":
+            cookie = value.decode("latin-1")
+    if cookie is not None:
+        value = cookie_parser(cookie).get("access_token", "").strip('"')
+        if value.startswith("Bearer "):
+            return value[7:]
+    return None
+
+
+def _route_costs() -> Tuple[Dict[str, int], List[Tuple[str, int]]]:
+    """Exact and prefix (trailing ``*``) entries of ``RATE_LIMIT_ROUTE_COSTS``."""
+    exact: Dict[str, int] = {}
+    prefixes: List[Tuple[str, int]] = []
+    for route, cost in settings.RATE_LIMIT_ROUTE_COSTS.items():
+        if route.endswith("*"):
+            prefixes.append((route[:-1], cost))
+        else:
+            exact[route] = cost
+    # Longest prefix wins
+    prefixes.sort(key=lambda entry: len(entry[0]), reverse=True)
+    return exact, prefixes
+
+
+class RateLimiter:
+    """Token buckets in Valkey, with per-process buckets as a fallback."""
+
+    def __init__(self) -> None:
+        self._client: Optional[aioredis.Redis] = None
+        self._script: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._valkey_down_until = 0.0
+        # key -> [tokens, monotonic time]; insertion order approximates LRU
+        self._local: Dict[str, List[float]] = {}
+
+    @property
+    def use_valkey(self) -> bool:
+        return settings.RATE_LIMIT_BACKEND == "valkey" and bool(settings.VALKEY_URL)
+
+    def buckets(self, scope: Dict[str, Any]) -> List[Bucket]:
+        """Buckets a request is charged to."""
+        user_id = dealership_id = None
+        token = _bearer_token(scope)
+        if token is not None:
+            user_id, dealership_id = _token_identity(token)
+
+        if user_id is None:
+            client = scope.get("client")
+            ip = client[0] if client else "unknown"
+            limit = settings.RATE_LIMIT_PER_IP
+            return [(f"{KEY_PREFIX}ip:{ip}", limit, limit / 60)]
+
+        limit = settings.RATE_LIMIT_PER_USER
+        buckets = [(f"{KEY_PREFIX}user:{user_id}", limit, limit / 60)]
+        if dealership_id is not None:
+            limit = settings.RATE_LIMIT_DEALERSHIP_QUOTAS.get(
+                dealership_id, settings.RATE_LIMIT_PER_DEALERSHIP
+            )
+            buckets.append(
+                (f"{KEY_PREFIX}dealership:{dealership_id}", limit, limit / 60)
+            )
+        return buckets
+
+    async def acquire(
+        self, buckets: List[Bucket], cost: int
+    ) -> Tuple[bool, float, Optional[str]]:
+        """
+        Charge ``cost`` tokens to every bucket, or to none of them.
+
+        Args:
+            buckets: Buckets from ``buckets()``
+            cost: Tokens the request takes
+
+        Returns:
+            Tuple[bool, float, Optional[str]]: Whether the request may proceed,
+            seconds until it could, and the key of the bucket that was short
+        """
+        if self.use_valkey and monotonic() >= self._valkey_down_until:
+            try:
+                return await self._acquire_valkey(buckets, cost)
+            except (redis.RedisError, OSError) as exc:
+                logger.warning("Rate limiting on Valkey failed, using local: %s", exc)
+                self._valkey_down_until = monotonic() + VALKEY_RETRY_SECONDS
+        return self._acquire_local(buckets, cost)
+
+    async def _acquire_valkey(
+        self, buckets: List[Bucket], cost: int
+    ) -> Tuple[bool, float, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Connections belong to the loop that opened them
+            self._client = aioredis.from_url(
+                str(settings.VALKEY_URL),
+                socket_timeout=settings.RATE_LIMIT_TIMEOUT,
+                socket_connect_timeout=settings.RATE_LIMIT_TIMEOUT,
+            )
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+            self._loop = loop
+        args: List[Any] = [cost]
+        for _, capacity, rate in buckets:
+            args.extend((capacity, rate))
+        result = await self._script(keys=[key for key, _, _ in buckets], args=args)
+        if result[0] == 1:
+            return True, 0.0, None
+        return False, float(result[1]), buckets[int(result[2]) - 1][0]
+
+    def _acquire_local(
+        self, buckets: List[Bucket], cost: int
+    ) -> Tuple[bool, float, Optional[str]]:
+        now = monotonic()
+        levels = []
+        wait, short = 0.0, None
+        for key, capacity, rate in buckets:
+            state = self._local.get(key)
+            if state is None:
+                level = capacity
+            else:
+                level = min(capacity, state[0] + (now - state[1]) * rate)
+            levels.append(level)
+            need = min(cost, capacity)
+            if level < need and (need - level) / rate > wait:
+                wait, short = (need - level) / rate, key
+        if short is not None:
+            return False, wait, short
+
+        for (key, capacity, _), level in zip(buckets, levels, strict=True):
+            self._local.pop(key, None)
+            self._local[key] = [level - min(cost, capacity), now]
+        while len(self._local) > settings.RATE_LIMIT_LOCAL_MAX_KEYS:
+            # Least recently charged; a dropped bucket starts full again
+            del self._local[next(iter(self._local))]
+        return True, 0.0, None
+
+    async def close(self) -> None:
+        """Release the Valkey connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._script = None
+            self._loop = None
+
+
+limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """Rejects requests over their buckets with 429 and ``Retry-After``."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self.exempt = tuple(settings.RATE_LIMIT_EXEMPT_PATHS)
+        self.costs, self.cost_prefixes = _route_costs()
+
+    def cost(self, method: str, path: str) -> int:
+        """Tokens a request takes (``RATE_LIMIT_ROUTE_COSTS``, default 1)."""
+        route = f"{method} {path}"
+        cost = self.costs.get(route)
+        if cost is not None:
+            return cost
+        for prefix, cost in self.cost_prefixes:
+            if route.startswith(prefix):
+                return cost
+        return 1
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMIT_ENABLED
+            or scope["path"].startswith(self.exempt)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        cost = self.cost(scope["method"], scope["path"])
+        if cost <= 0:
+            await self.app(scope, receive, send)
+            return
+        allowed, wait, key = await limiter.acquire(limiter.buckets(scope), cost)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        scope_name = key[len(KEY_PREFIX) :].partition(":")[0]
+        logger.info("Rate limited %s %s (%s)", scope["method"], scope["path"], key)
+        body = json.dumps({"detail": "Too many requests", "limit": scope_name}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -3,7 +3,7 @@ Security utilities for authentication and authorization.
 """
 
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Dict, Optional, Union
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
@@ -22,7 +22,9 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
 def create_access_token(
-    subject: Union[str, Any], expires_delta: Optional[timedelta] = None
+    subject: Union[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    dealership_id: Optional[int] = None,
 ) -> str:
     """
     Create JWT access token.
@@ -30,6 +32,7 @@ def create_access_token(
     Args:
         subject: Token subject (usually user ID)
         expires_delta: Token expiration time
+        dealership_id: User's dealership, used to key per-dealership limits
 
     Returns:
         str: JWT token
@@ -42,6 +45,8 @@ def create_access_token(
         )
 
     to_encode = {"exp": expire, "sub": str(subject)}
+    if dealership_id is not None:
+        to_encode["dealership_id"] = dealership_id
     encoded_jwt = jwt.encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
     )
@@ -73,6 +78,22 @@ def create_refresh_token(
     return encoded_jwt
 
 
+def decode_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify JWT token and return its claims.
+
+    Args:
+        token: JWT token to verify
+
+    Returns:
+        Optional[Dict[str, Any]]: Token claims if valid, None otherwise
+    """
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+
+
 def verify_token(token: str) -> Optional[str]:
     """
     Verify JWT token and return subject.
@@ -83,16 +104,10 @@ def verify_token(token: str) -> Optional[str]:
     Returns:
         Optional[str]: Token subject if valid, None otherwise
     """
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        subject = payload.get("sub")
-        if subject is None:
-            return None
-        return str(subject)
-    except JWTError:
+    payload = decode_token(token)
+    if payload is None or payload.get("sub") is None:
         return None
+    return str(payload["sub"])
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -159,8 +174,10 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     Raises:
         HTTPException: If token invalid or user not found
     """
+    from opendms.core.log import bind_log_context
     from opendms.crud.user import get_user
     from opendms.models.user import User
+    from opendms.services.audit import set_audit_user
 
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -185,6 +202,8 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     if user is None:
         raise credentials_exception
 
+    set_audit_user(db, user.id)
+    bind_log_context(user_id=user.id, dealership_id=user.dealership_id)
     return user
 
 
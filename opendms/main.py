@@ -6,38 +6,82 @@ This module contains the FastAPI application and all route registrations.
 
 import logging
 from contextlib import asynccontextmanager
-from typing import Any, Dict
 
 import uvicorn
+from anyio import to_thread
 from fastapi import Depends, FastAPI, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from opendms.api.v1.api import api_router
+from opendms.core.admission import AdmissionMiddleware
+from opendms.core.admission import controller as admission
+from opendms.core.assets import AssetStaticFiles, asset_url, asset_version, manifest
+from opendms.core.compression import (
+    STATIC_DIR,
+    CompressionMiddleware,
+    ensure_precompressed_static,
+)
 from opendms.core.config import settings
-from opendms.core.database import Base, engine, get_db
+from opendms.core.database import SessionLocal, engine, get_db, init_db
+from opendms.core.events import hub as event_hub
+from opendms.core.log import RequestLogMiddleware, configure_logging
+from opendms.core.media import ensure_media_dirs
+from opendms.core.ratelimit import RateLimitMiddleware, limiter
 from opendms.core.security import get_current_user
 from opendms.models import user
+from opendms.services import audit, caller_id, vehicle_images
 
 # Configure logging
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL), format=settings.LOG_FORMAT
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
+_prepared = False
+
+
+def prepare() -> None:
+    """
+    Startup work shared by every worker: the schema, media directories and
+    precompressed static files.
+
+    ``opendms serve`` runs this once in the supervisor before forking, so
+    workers inherit the result instead of racing each other; servers that
+    do not fork run it from the lifespan.
+    """
+    global _prepared
+    if _prepared:
+        return
+    init_db()
+    ensure_media_dirs()
+    ensure_precompressed_static()
+    if settings.CALLER_ID_WARM_ON_STARTUP:
+        with SessionLocal() as db:
+            caller_id.warm(db)
+    _prepared = True
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
-    print("Starting OpenDMS application...")
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    logger.info("Starting OpenDMS application")
+    # Threads for sync endpoints and dependencies, per process
+    threads = to_thread.current_default_thread_limiter()
+    threads.total_tokens = settings.SERVER_THREADPOOL_SIZE
+    prepare()
+    await event_hub.start()
+    await admission.start()
     yield
-    print("Shutting down OpenDMS application...")
+    await admission.stop()
+    await event_hub.stop()
+    await limiter.close()
+    vehicle_images.shutdown_pool()
+    audit.writer.stop()
+    logger.info("Shutting down OpenDMS application")
 
 
 # Create FastAPI application
@@ -52,15 +96,34 @@ app = FastAPI(
 )
 
 # Mount static files
-app.mount("/static", StaticFiles(directory="opendms/static"), name="static")
+app.mount("/static", AssetStaticFiles(directory=STATIC_DIR), name="static")
+app.mount(
+    settings.MEDIA_URL,
+    StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False),
+    name="media",
+)
 
 # Setup Jinja2 templates
 templates = Jinja2Templates(directory="opendms/templates")
+templates.env.globals["asset_url"] = asset_url
+
+# Response compression (gzip, br, zstd); innermost, so logged latency includes it
+app.add_middleware(CompressionMiddleware)
+
+# Token buckets per user, dealership or IP; inside logging so 429s are logged
+app.add_middleware(RateLimitMiddleware)
+
+# Load shedding by priority while saturated; before rate limiting, so shed
+# requests take no tokens
+app.add_middleware(AdmissionMiddleware)
 
-# CORS middleware
+# CORS middleware; outside rate limiting and shedding, so preflights are
+# answered without being charged or shed and 429/503 responses carry the
+# CORS headers the browser needs to read them
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[str(origin) for origin in settings.BACKEND_CORS_ORIGINS],
+    # Origins are compared without the trailing slash URL validation adds
+    allow_origins=[str(origin).rstrip("/") for origin in settings.BACKEND_CORS_ORIGINS],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -72,6 +135,9 @@ app.add_middleware(
     allowed_hosts=["*"] if settings.DEBUG else ["localhost", "127.0.0.1"],
 )
 
+# Request ids and access logging; outermost so latency covers everything
+app.add_middleware(RequestLogMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
@@ -85,21 +151,28 @@ async def root(request: Request):
 
 # Dashboard route
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(
-    request: Request, current_user: user.User = Depends(get_current_user)
+def dashboard(
+    request: Request,
+    current_user: user.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
     """Dashboard endpoint."""
+    from opendms.services.reporting import month_to_date_units
+
     # Get dashboard stats
     stats = {
         "inventory_count": 0,  # TODO: Get from database
         "customer_count": 0,  # TODO: Get from database
-        "monthly_sales": 0,  # TODO: Get from database
+        "monthly_sales": month_to_date_units(
+            db, dealership_id=current_user.dealership_id
+        ),
         "active_service": 0,  # TODO: Get from database
     }
 
     return templates.TemplateResponse(
+        request,
         "dashboard.html",
-        {"request": request, "current_user": current_user, "stats": stats},
+        {"current_user": current_user, "stats": stats},
     )
 
 
@@ -115,9 +188,9 @@ async def inventory_page(
     pagination = None
 
     return templates.TemplateResponse(
+        request,
         "inventory.html",
         {
-            "request": request,
             "current_user": current_user,
             "vehicles": vehicles,
             "makes": makes,
@@ -132,7 +205,7 @@ async def new_inventory(
 ):
     """New inventory endpoint."""
     return templates.TemplateResponse(
-        "inventory_form.html", {"request": request, "current_user": current_user}
+        request, "inventory_form.html", {"current_user": current_user}
     )
 
 
@@ -147,8 +220,9 @@ async def edit_inventory(
     vehicle = None
 
     return templates.TemplateResponse(
+        request,
         "inventory_form.html",
-        {"request": request, "current_user": current_user, "vehicle": vehicle},
+        {"current_user": current_user, "vehicle": vehicle},
     )
 
 
@@ -163,8 +237,9 @@ async def view_inventory(
     vehicle = None
 
     return templates.TemplateResponse(
+        request,
         "inventory_view.html",
-        {"request": request, "current_user": current_user, "vehicle": vehicle},
+        {"current_user": current_user, "vehicle": vehicle},
     )
 
 
@@ -179,9 +254,9 @@ async def customers_page(
     pagination = None
 
     return templates.TemplateResponse(
+        request,
         "customers.html",
         {
-            "request": request,
             "current_user": current_user,
             "customers": customers,
             "pagination": pagination,
@@ -195,7 +270,7 @@ async def new_customer(
 ):
     """New customer endpoint."""
     return templates.TemplateResponse(
-        "customer_form.html", {"request": request, "current_user": current_user}
+        request, "customer_form.html", {"current_user": current_user}
     )
 
 
@@ -210,9 +285,9 @@ async def sales_page(
     pagination = None
 
     return templates.TemplateResponse(
+        request,
         "sales.html",
         {
-            "request": request,
             "current_user": current_user,
             "sales": sales,
             "pagination": pagination,
@@ -226,7 +301,7 @@ async def new_sale(
 ):
     """New sale endpoint."""
     return templates.TemplateResponse(
-        "sale_form.html", {"request": request, "current_user": current_user}
+        request, "sale_form.html", {"current_user": current_user}
     )
 
 
@@ -241,9 +316,9 @@ async def service_page(
     pagination = None
 
     return templates.TemplateResponse(
+        request,
         "service.html",
         {
-            "request": request,
             "current_user": current_user,
             "service_tickets": service_tickets,
             "pagination": pagination,
@@ -257,7 +332,7 @@ async def new_service(
 ):
     """New service endpoint."""
     return templates.TemplateResponse(
-        "service_form.html", {"request": request, "current_user": current_user}
+        request, "service_form.html", {"current_user": current_user}
     )
 
 
@@ -265,7 +340,7 @@ async def new_service(
 @app.get("/auth/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Login page endpoint."""
-    return templates.TemplateResponse("auth/login.html", {"request": request})
+    return templates.TemplateResponse(request, "auth/login.html")
 
 
 @app.post("/auth/login", response_class=HTMLResponse)
@@ -284,22 +359,26 @@ async def login_form(
     user = authenticate_user(db, email=email, password=password)
     if not user:
         return templates.TemplateResponse(
+            request,
             "auth/login.html",
-            {"request": request, "error": "Invalid email or password"},
+            {"error": "Invalid email or password"},
             status_code=401,
         )
 
     if not getattr(user, "is_active", True):
         return templates.TemplateResponse(
+            request,
             "auth/login.html",
-            {"request": request, "error": "Account is inactive"},
+            {"error": "Account is inactive"},
             status_code=401,
         )
 
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=user.id, expires_delta=access_token_expires
+        subject=user.id,
+        expires_delta=access_token_expires,
+        dealership_id=user.dealership_id,
     )
 
     # Redirect to dashboard with token
@@ -317,20 +396,54 @@ async def login_form(
 @app.get("/auth/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     """Register page endpoint."""
-    return templates.TemplateResponse("auth/register.html", {"request": request})
+    return templates.TemplateResponse(request, "auth/register.html")
 
 
 @app.get("/auth/forgot-password", response_class=HTMLResponse)
 async def forgot_password_page(request: Request):
     """Forgot password page endpoint."""
-    return templates.TemplateResponse("auth/forgot_password.html", {"request": request})
+    return templates.TemplateResponse(request, "auth/forgot_password.html")
+
+
+# Service worker
+@app.get("/sw.js")
+async def service_worker(request: Request):
+    """Service worker, served from the root so its scope is the whole site."""
+    return templates.TemplateResponse(
+        request,
+        "sw.js",
+        {
+            "asset_version": asset_version(),
+            "static_urls": manifest.urls(),
+        },
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+# Health checks (not rate limited or shed)
+@app.get("/health")
+async def health():
+    """Liveness: the worker is serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 503 while this worker sheds default-priority traffic."""
+    status = admission.status()
+    threads = to_thread.current_default_thread_limiter().statistics()
+    status["threads_busy"] = threads.borrowed_tokens
+    status["threads_waiting"] = threads.tasks_waiting
+    status["pool"] = engine.pool.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 # Offline page
 @app.get("/offline.html", response_class=HTMLResponse)
 async def offline_page(request: Request):
     """Offline page endpoint."""
-    return templates.TemplateResponse("offline.html", {"request": request})
+    return templates.TemplateResponse(request, "offline.html")
 
 
 if __name__ == "__main__":
@@ -2,10 +2,12 @@
 Database models package.
 """
 
+from opendms.models.audit import AuditLog
 from opendms.models.customer import Customer, CustomerNote
 from opendms.models.dealership import Dealership
 from opendms.models.inventory import Vehicle, VehicleImage
-from opendms.models.sale import Sale, SaleItem
+from opendms.models.numbering import NumberSequence
+from opendms.models.sale import Sale, SaleDocument, SaleItem
 from opendms.models.service import ServiceAppointment, ServiceWorkOrder
 from opendms.models.user import User
 
@@ -18,6 +20,9 @@ __all__ = [
     "CustomerNote",
     "Sale",
     "SaleItem",
+    "SaleDocument",
     "ServiceAppointment",
     "ServiceWorkOrder",
+    "AuditLog",
+    "NumberSequence",
 ]
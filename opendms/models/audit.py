@@ -0,0 +1,37 @@
+"""
+Audit log model.
+"""
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from opendms.core.database import Base
+
+
+class AuditLog(Base):
+    """One committed change to one row (see opendms.services.audit)."""
+
+    __tablename__ = "audit_log"
+    # Queries filter by entity or user and read newest first
+    __table_args__ = (
+        Index("ix_audit_log_occurred_at", "occurred_at", "id"),
+        Index("ix_audit_log_entity", "entity", "entity_id", "occurred_at", "id"),
+        Index("ix_audit_log_user_id", "user_id", "occurred_at", "id"),
+    )
+
+    # Integer on SQLite, which only auto-increments INTEGER PRIMARY KEY
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    occurred_at = Column(DateTime, nullable=False)
+    # No FK: history outlives deleted users
+    user_id = Column(Integer, nullable=True)
+
+    # Table name and primary key of the changed row
+    entity = Column(String(64), nullable=False)
+    entity_id = Column(String(64), nullable=False)
+    action = Column(String(10), nullable=False)  # created, updated, deleted
+
+    # {column: [before, after]}
+    changes = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<AuditLog(id={self.id}, entity='{self.entity}', entity_id='{self.entity_id}', action='{self.action}')>"
@@ -5,7 +5,17 @@ Customer models for CRM functionality.
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.orm import relationship
 
 from opendms.core.database import Base
@@ -24,6 +34,9 @@ class Customer(Base):
     last_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=True, index=True)
     phone = Column(String(20), nullable=True)
+    # Canonical forms for caller-ID lookup (see opendms.services.caller_id)
+    phone_e164 = Column(String(16), nullable=True)
+    email_normalized = Column(String(255), nullable=True)
     date_of_birth = Column(DateTime, nullable=True)
 
     # Address
@@ -68,6 +81,22 @@ class Customer(Base):
         )
 
 
+# Duplicate checks look customers up by dealership and case-folded last name
+Index(
+    "ix_customers_dealership_id_last_name",
+    Customer.dealership_id,
+    func.lower(Customer.last_name),
+)
+Index(
+    "ix_customers_dealership_id_phone_e164", Customer.dealership_id, Customer.phone_e164
+)
+Index(
+    "ix_customers_dealership_id_email_normalized",
+    Customer.dealership_id,
+    Customer.email_normalized,
+)
+
+
 class CustomerNote(Base):
     """Customer note model for tracking interactions."""
 
@@ -7,6 +7,7 @@ from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (
+    JSON,
     Boolean,
     Column,
     DateTime,
@@ -17,6 +18,7 @@ from sqlalchemy import (
     String,
     Text,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from opendms.core.database import Base
@@ -70,7 +72,11 @@ class Vehicle(Base):
     location = Column(String(100), nullable=True)  # Lot location
 
     # Additional Information
-    features = Column(Text, nullable=True)  # JSON string of features
+    # JSON array of feature names (see opendms.services.vehicle_features)
+    features = Column(
+        JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"),
+        nullable=True,
+    )
     description = Column(Text, nullable=True)
     notes = Column(Text, nullable=True)
 
@@ -0,0 +1,20 @@
+"""
+Document number sequence model.
+"""
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+
+from opendms.core.database import Base
+
+
+class NumberSequence(Base):
+    """Last number issued per dealership and kind (see opendms.services.numbering)."""
+
+    __tablename__ = "number_sequences"
+
+    dealership_id = Column(Integer, ForeignKey("dealerships.id"), primary_key=True)
+    kind = Column(String(20), primary_key=True)  # sale, appointment, work_order
+    last_value = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<NumberSequence(dealership_id={self.dealership_id}, kind='{self.kind}', last_value={self.last_value})>"
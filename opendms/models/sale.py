@@ -7,19 +7,24 @@ from datetime import datetime
 from typing import Optional
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     Enum,
     Float,
     ForeignKey,
+    Identity,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 
 from opendms.core.database import Base
+from opendms.core.partitioning import partitioned_by
 
 
 class SaleStatus(str, enum.Enum):
@@ -36,9 +41,17 @@ class Sale(Base):
     """Sale model for sales management."""
 
     __tablename__ = "sales"
+    # Range-partitioned by month on sale_date on PostgreSQL, where the primary
+    # key becomes (id, sale_date) (see opendms.core.partitioning). Unique
+    # constraints would need sale_date too, so sale_number is only indexed;
+    # numbers come from opendms.services.numbering.
+    __table_args__ = (
+        Index("ix_sales_dealership_id_sale_date", "dealership_id", "sale_date"),
+        partitioned_by("sale_date"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    sale_number = Column(String(50), unique=True, index=True, nullable=False)
+    id = Column(Integer, Identity(), primary_key=True)
+    sale_number = Column(String(50), index=True, nullable=False)
     dealership_id = Column(Integer, ForeignKey("dealerships.id"), nullable=False)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
     sales_person_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -63,7 +76,9 @@ class Sale(Base):
 
     # Additional Information
     notes = Column(Text, nullable=True)
-    documents = Column(Text, nullable=True)  # JSON string of document URLs
+    # Legacy JSON string of document URLs; the sale_document_migration job
+    # moves them to sale_documents
+    legacy_documents = Column("documents", Text, nullable=True)
 
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -77,7 +92,17 @@ class Sale(Base):
     sales_person = relationship("User")
     vehicle = relationship("Vehicle", back_populates="sales")
     items = relationship(
-        "SaleItem", back_populates="sale", cascade="all, delete-orphan"
+        "SaleItem",
+        back_populates="sale",
+        cascade="all, delete-orphan",
+        primaryjoin="Sale.id == foreign(SaleItem.sale_id)",
+    )
+    documents = relationship(
+        "SaleDocument",
+        back_populates="sale",
+        cascade="all, delete-orphan",
+        order_by="SaleDocument.id",
+        primaryjoin="Sale.id == foreign(SaleDocument.sale_id)",
     )
 
     def __repr__(self) -> str:
@@ -90,7 +115,8 @@ class SaleItem(Base):
     __tablename__ = "sale_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
+    # No database-level FK: sales is partitioned and sales.id alone is not unique
+    sale_id = Column(Integer, nullable=False, index=True)
 
     # Item Information
     name = Column(String(255), nullable=False)
@@ -106,7 +132,50 @@ class SaleItem(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     # Relationships
-    sale = relationship("Sale", back_populates="items")
+    sale = relationship(
+        "Sale",
+        back_populates="items",
+        primaryjoin="foreign(SaleItem.sale_id) == Sale.id",
+    )
 
     def __repr__(self) -> str:
         return f"<SaleItem(id={self.id}, name='{self.name}', quantity={self.quantity})>"
+
+
+class SaleDocument(Base):
+    """Document in a deal jacket: contract, license, insurance card, stip."""
+
+    __tablename__ = "sale_documents"
+    __table_args__ = (
+        # The same file is attached to a deal once
+        UniqueConstraint("sale_id", "sha256", name="uq_sale_documents_sale_id_sha256"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No database-level FK: sales is partitioned and sales.id alone is not unique
+    sale_id = Column(Integer, nullable=False, index=True)
+
+    # Document Information
+    document_type = Column(String(50), nullable=True)  # contract, license, stip, etc.
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    size = Column(BigInteger, nullable=True)
+
+    # Storage: uploaded files are content-addressed under DOCUMENT_DIR;
+    # documents migrated from the legacy JSON list only have a URL
+    sha256 = Column(String(64), nullable=True, index=True)
+    storage_path = Column(String(500), nullable=True)
+    url = Column(String(500), nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Relationships
+    sale = relationship(
+        "Sale",
+        back_populates="documents",
+        primaryjoin="foreign(SaleDocument.sale_id) == Sale.id",
+    )
+
+    def __repr__(self) -> str:
+        return f"<SaleDocument(id={self.id}, sale_id={self.sale_id}, filename='{self.filename}')>"
@@ -13,6 +13,8 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Identity,
+    Index,
     Integer,
     String,
     Text,
@@ -20,6 +22,7 @@ from sqlalchemy import (
 from sqlalchemy.orm import relationship
 
 from opendms.core.database import Base
+from opendms.core.partitioning import partitioned_by
 
 
 class AppointmentStatus(str, enum.Enum):
@@ -46,9 +49,19 @@ class ServiceAppointment(Base):
     """Service appointment model."""
 
     __tablename__ = "service_appointments"
+    # Range-partitioned by month on appointment_date on PostgreSQL (see
+    # opendms.core.partitioning); numbers come from opendms.services.numbering
+    __table_args__ = (
+        Index(
+            "ix_service_appointments_dealership_id_appointment_date",
+            "dealership_id",
+            "appointment_date",
+        ),
+        partitioned_by("appointment_date"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    appointment_number = Column(String(50), unique=True, index=True, nullable=False)
+    id = Column(Integer, Identity(), primary_key=True)
+    appointment_number = Column(String(50), index=True, nullable=False)
     dealership_id = Column(Integer, ForeignKey("dealerships.id"), nullable=False)
     customer_id = Column(Integer, ForeignKey("customers.id"), nullable=False)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
@@ -84,7 +97,10 @@ class ServiceAppointment(Base):
     vehicle = relationship("Vehicle", back_populates="service_appointments")
     service_advisor = relationship("User")
     work_orders = relationship(
-        "ServiceWorkOrder", back_populates="appointment", cascade="all, delete-orphan"
+        "ServiceWorkOrder",
+        back_populates="appointment",
+        cascade="all, delete-orphan",
+        primaryjoin="ServiceAppointment.id == foreign(ServiceWorkOrder.appointment_id)",
     )
 
     def __repr__(self) -> str:
@@ -95,12 +111,16 @@ class ServiceWorkOrder(Base):
     """Service work order model."""
 
     __tablename__ = "service_work_orders"
+    # Range-partitioned by month on created_at on PostgreSQL (see
+    # opendms.core.partitioning)
+    __table_args__ = (partitioned_by("created_at"),)
 
-    id = Column(Integer, primary_key=True, index=True)
-    work_order_number = Column(String(50), unique=True, index=True, nullable=False)
-    appointment_id = Column(
-        Integer, ForeignKey("service_appointments.id"), nullable=False
-    )
+    id = Column(Integer, Identity(), primary_key=True)
+
+    work_order_number = Column(String(50), index=True, nullable=False)
+    # No database-level FK: service_appointments is partitioned and its id
+    # alone is not unique
+    appointment_id = Column(Integer, nullable=False, index=True)
     technician_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     # Work Order Information
@@ -130,7 +150,11 @@ class ServiceWorkOrder(Base):
     completed_at = Column(DateTime, nullable=True)
 
     # Relationships
-    appointment = relationship("ServiceAppointment", back_populates="work_orders")
+    appointment = relationship(
+        "ServiceAppointment",
+        back_populates="work_orders",
+        primaryjoin="foreign(ServiceWorkOrder.appointment_id) == ServiceAppointment.id",
+    )
     technician = relationship("User")
 
     def __repr__(self) -> str:
@@ -51,6 +51,7 @@ class User(Base):
     is_verified = Column(Boolean, default=False, nullable=False)
     phone = Column(String(20), nullable=True)
     avatar_url = Column(String(500), nullable=True)
+    skills = Column(Text, nullable=True)  # JSON list of service types
 
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
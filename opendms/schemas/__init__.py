@@ -2,19 +2,65 @@
 Pydantic schemas package.
 """
 
+from opendms.schemas.audit import AuditEntry, AuditWriterStatus
 from opendms.schemas.auth import Token, TokenRefresh, UserCreate, UserLogin
-from opendms.schemas.customer import CustomerCreate, CustomerResponse, CustomerUpdate
+from opendms.schemas.customer import (
+    CallerLookupResponse,
+    CustomerCreate,
+    CustomerMergeRequest,
+    CustomerMergeResponse,
+    CustomerOverview,
+    CustomerResponse,
+    CustomerUpdate,
+    DuplicateReport,
+    NoteSearchResponse,
+)
 from opendms.schemas.dealership import (
     DealershipCreate,
     DealershipResponse,
     DealershipUpdate,
 )
-from opendms.schemas.inventory import VehicleCreate, VehicleResponse, VehicleUpdate
-from opendms.schemas.sale import SaleCreate, SaleResponse, SaleUpdate
+from opendms.schemas.inventory import (
+    ImageUploadResponse,
+    InventoryAnalyticsResponse,
+    VehicleCreate,
+    VehicleImageResponse,
+    VehicleResponse,
+    VehicleUpdate,
+    VinBatchResponse,
+    VinDecodeRequest,
+    VinDecodeResponse,
+)
+from opendms.schemas.job import (
+    JobCreate,
+    JobMetrics,
+    JobStatus,
+    JobSubmitted,
+    JobTypeInfo,
+)
+from opendms.schemas.report import (
+    SalesReportResponse,
+    SalesReportRow,
+    SalesTrendPoint,
+    SalesTrendResponse,
+)
+from opendms.schemas.sale import (
+    DocumentUploadStatus,
+    PaymentGridRequest,
+    PaymentGridResponse,
+    SaleCreate,
+    SaleDocumentResponse,
+    SaleResponse,
+    SaleUpdate,
+)
 from opendms.schemas.service import (
+    AvailableSlot,
+    AvailableSlotsResponse,
+    DispatchPlanResponse,
     ServiceAppointmentCreate,
     ServiceAppointmentResponse,
     ServiceAppointmentUpdate,
+    WorkOrderAssign,
 )
 from opendms.schemas.user import UserCreate, UserResponse, UserUpdate
 
@@ -31,13 +77,44 @@ __all__ = [
     "VehicleResponse",
     "VehicleCreate",
     "VehicleUpdate",
+    "InventoryAnalyticsResponse",
+    "VehicleImageResponse",
+    "ImageUploadResponse",
+    "VinDecodeResponse",
+    "VinDecodeRequest",
+    "VinBatchResponse",
     "CustomerResponse",
     "CustomerCreate",
     "CustomerUpdate",
+    "CustomerMergeRequest",
+    "CustomerMergeResponse",
+    "DuplicateReport",
+    "CallerLookupResponse",
+    "NoteSearchResponse",
+    "CustomerOverview",
     "SaleResponse",
     "SaleCreate",
     "SaleUpdate",
+    "PaymentGridRequest",
+    "PaymentGridResponse",
+    "SaleDocumentResponse",
+    "DocumentUploadStatus",
     "ServiceAppointmentResponse",
     "ServiceAppointmentCreate",
     "ServiceAppointmentUpdate",
+    "AvailableSlot",
+    "AvailableSlotsResponse",
+    "DispatchPlanResponse",
+    "WorkOrderAssign",
+    "SalesReportRow",
+    "SalesReportResponse",
+    "SalesTrendPoint",
+    "SalesTrendResponse",
+    "JobCreate",
+    "JobSubmitted",
+    "JobStatus",
+    "JobTypeInfo",
+    "JobMetrics",
+    "AuditEntry",
+    "AuditWriterStatus",
 ]
@@ -0,0 +1,34 @@
+"""
+Audit log schemas for API responses.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class AuditEntry(BaseModel):
+    """Schema for one recorded change."""
+
+    id: int
+    occurred_at: datetime
+    user_id: Optional[int] = None
+    entity: str
+    entity_id: str
+    action: str  # created, updated or deleted
+    changes: Optional[Dict[str, List[Any]]] = None  # column -> [before, after]
+
+    class Config:
+        from_attributes = True
+
+
+class AuditWriterStatus(BaseModel):
+    """Schema for the audit writer's backlog in this process."""
+
+    enabled: bool
+    queued: int
+    written: int
+    spilled: int
+    failed_batches: int
+    spill_files: int
@@ -3,7 +3,7 @@ Customer schemas for API requests and responses.
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, EmailStr
 
@@ -29,7 +29,7 @@ class CustomerBase(BaseModel):
 class CustomerCreate(CustomerBase):
     """Schema for creating a customer."""
 
-    pass
+    dealership_id: int
 
 
 class CustomerUpdate(BaseModel):
@@ -62,3 +62,181 @@ class CustomerResponse(CustomerBase):
 
     class Config:
         from_attributes = True
+
+
+class CustomerMatchResponse(BaseModel):
+    """An existing customer that resembles another."""
+
+    customer_id: int
+    score: float
+    reasons: List[str]
+
+
+class DuplicatePairResponse(BaseModel):
+    """Two customers that probably describe the same person."""
+
+    customer_id: int
+    duplicate_id: int
+    score: float
+    reasons: List[str]
+
+
+class DuplicateReport(BaseModel):
+    """Schema for a dealership duplicate scan."""
+
+    dealership_id: int
+    customers_scanned: int
+    pairs: List[DuplicatePairResponse]
+    clusters: List[List[int]]
+
+
+class CustomerMergeRequest(BaseModel):
+    """Schema for merging duplicates into a customer."""
+
+    duplicate_ids: List[int]
+
+
+class CustomerMergeResponse(BaseModel):
+    """Schema for the result of a merge."""
+
+    customer: CustomerResponse
+    merged_ids: List[int]
+    sales: int
+    service_appointments: int
+    notes: int
+
+
+class CallerSaleSummary(BaseModel):
+    """A caller's most recent sale and the vehicle sold."""
+
+    sale_id: int
+    sale_number: str
+    sale_date: datetime
+    status: str
+    vehicle_id: int
+    vin: Optional[str] = None
+    year: Optional[int] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+
+
+class CallerMatch(BaseModel):
+    """A customer matching a caller-ID lookup."""
+
+    customer_id: int
+    first_name: str
+    last_name: str
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    preferred_contact_method: Optional[str] = None
+    is_active: bool
+    latest_sale: Optional[CallerSaleSummary] = None
+
+
+class CallerLookupResponse(BaseModel):
+    """Schema for a caller-ID lookup."""
+
+    dealership_id: int
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    matches: List[CallerMatch]
+
+
+class NoteSearchHit(BaseModel):
+    """A customer note matching a search."""
+
+    note_id: int
+    customer_id: int
+    customer_name: str
+    title: Optional[str] = None
+    note_type: Optional[str] = None
+    created_at: datetime
+    rank: float
+    highlight: str
+
+
+class NoteSearchResponse(BaseModel):
+    """Schema for a customer note search."""
+
+    dealership_id: int
+    query: str
+    hits: List[NoteSearchHit]
+
+
+class OverviewVehicle(BaseModel):
+    """Vehicle summary inside a customer overview."""
+
+    id: int
+    vin: str
+    year: int
+    make: str
+    model: str
+    trim: Optional[str] = None
+    color: Optional[str] = None
+
+
+class OverviewSale(BaseModel):
+    """A sale inside a customer overview."""
+
+    id: int
+    sale_number: str
+    sale_date: datetime
+    status: str
+    total_amount: float
+    vehicle: Optional[OverviewVehicle] = None
+
+
+class OverviewWorkOrder(BaseModel):
+    """A work order inside a customer overview."""
+
+    id: int
+    work_order_number: str
+    status: str
+    work_description: Optional[str] = None
+    actual_hours: Optional[float] = None
+    total_cost: Optional[float] = None
+    completed_at: Optional[datetime] = None
+
+
+class OverviewAppointment(BaseModel):
+    """A service visit inside a customer overview."""
+
+    id: int
+    appointment_number: str
+    appointment_date: datetime
+    status: str
+    service_type: Optional[str] = None
+    vehicle: Optional[OverviewVehicle] = None
+    work_orders: List[OverviewWorkOrder]
+
+
+class OverviewNote(BaseModel):
+    """A recent note inside a customer overview."""
+
+    id: int
+    title: Optional[str] = None
+    note_type: Optional[str] = None
+    content: str
+    created_at: datetime
+
+
+class CustomerTotals(BaseModel):
+    """Lifetime figures for a customer; cancelled sales are excluded."""
+
+    purchases: int
+    purchase_total: float
+    first_purchase: Optional[datetime] = None
+    last_purchase: Optional[datetime] = None
+    service_visits: int
+    service_total: float
+    last_service: Optional[datetime] = None
+
+
+class CustomerOverview(BaseModel):
+    """Schema for a customer 360 overview."""
+
+    customer: CustomerResponse
+    sales: List[OverviewSale]
+    service_history: List[OverviewAppointment]
+    recent_notes: List[OverviewNote]
+    totals: CustomerTotals
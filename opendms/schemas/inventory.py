@@ -4,7 +4,7 @@ Inventory schemas for API requests and responses.
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
@@ -29,14 +29,18 @@ class VehicleBase(BaseModel):
     condition: Optional[str] = None
     status: str = "available"
     description: Optional[str] = None
-    features: Optional[str] = None
+    # List of names; a JSON string, {name: bool} or comma-separated string
+    # is also accepted and normalized on save
+    features: Optional[Union[List[str], Dict[str, Any], str]] = None
     images: Optional[str] = None
 
 
 class VehicleCreate(VehicleBase):
-    """Schema for creating a vehicle."""
+    """Schema for creating a vehicle (year, make and model default from the VIN)."""
 
-    pass
+    year: Optional[int] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
 
 
 class VehicleUpdate(BaseModel):
@@ -59,7 +63,9 @@ class VehicleUpdate(BaseModel):
     condition: Optional[str] = None
     status: Optional[str] = None
     description: Optional[str] = None
-    features: Optional[str] = None
+    # List of names; a JSON string, {name: bool} or comma-separated string
+    # is also accepted and normalized on save
+    features: Optional[Union[List[str], Dict[str, Any], str]] = None
     images: Optional[str] = None
 
 
@@ -69,8 +75,122 @@ class VehicleResponse(VehicleBase):
     id: int
     dealership_id: int
     is_active: bool
+    features: Optional[List[str]] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class AgingBucket(BaseModel):
+    """Units and cost for one days-in-stock bucket."""
+
+    label: str
+    min_days: int
+    max_days: Optional[int] = None
+    units: int
+    total_cost: float
+
+
+class StaleUnit(BaseModel):
+    """An on-hand vehicle past the stale threshold."""
+
+    id: int
+    stock_number: str
+    vin: str
+    year: int
+    make: str
+    model: str
+    status: str
+    days_in_stock: int
+    cost_price: Optional[float] = None
+    sale_price: Optional[float] = None
+    spread: Optional[float] = None
+    holding_cost: float
+
+
+class InventoryAnalyticsResponse(BaseModel):
+    """Schema for inventory aging and turn analytics."""
+
+    dealership_id: int
+    units_in_stock: int
+    units_sold: int
+    average_age_days: Optional[float] = None
+    average_days_to_sale: Optional[float] = None
+    turn_rate: Optional[float] = None
+    total_cost: float
+    average_spread: Optional[float] = None
+    total_holding_cost: float
+    aging_buckets: List[AgingBucket]
+    stale_units_count: int
+    stale_units: List[StaleUnit]
+
+
+class VehicleImageResponse(BaseModel):
+    """Schema for a vehicle photo with its renditions."""
+
+    id: int
+    vehicle_id: int
+    image_url: str
+    image_type: Optional[str] = None
+    is_primary: bool
+    sort_order: int
+    created_at: datetime
+    renditions: Dict[str, str] = {}
+
+    class Config:
+        from_attributes = True
+
+
+class UploadRejection(BaseModel):
+    """A file that was not accepted, and why."""
+
+    filename: str
+    reason: str
+
+
+class ImageUploadResponse(BaseModel):
+    """Schema for the result of a photo upload."""
+
+    images: List[VehicleImageResponse]
+    duplicates: List[str]
+    rejected: List[UploadRejection]
+
+
+class VinDecodeResponse(BaseModel):
+    """Schema for a decoded VIN."""
+
+    vin: str
+    valid: bool
+    errors: List[str] = []
+    check_digit_valid: Optional[bool] = None
+    wmi: Optional[str] = None
+    vds: Optional[str] = None
+    vis: Optional[str] = None
+    region: Optional[str] = None
+    country: Optional[str] = None
+    year: Optional[int] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    body_style: Optional[str] = None
+    fuel_type: Optional[str] = None
+    plant_code: Optional[str] = None
+    serial_number: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class VinDecodeRequest(BaseModel):
+    """Schema for decoding a batch of VINs."""
+
+    vins: List[str]
+
+
+class VinBatchResponse(BaseModel):
+    """Schema for batch VIN decoding results, in request order."""
+
+    results: List[VinDecodeResponse]
+    decoded: int
+    invalid: int
@@ -0,0 +1,60 @@
+"""
+Background job schemas for API requests and responses.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    """Schema for submitting a background job."""
+
+    job_type: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class JobSubmitted(BaseModel):
+    """Schema returned when a job is accepted."""
+
+    job_id: str
+    job_type: str
+    queue: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatus(BaseModel):
+    """Schema for a job's current state."""
+
+    job_id: str
+    status: str  # PENDING, STARTED, RETRY, SUCCESS, FAILURE or REVOKED
+    ready: bool
+    job_type: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    runtime_seconds: Optional[float] = None
+    wait_seconds: Optional[float] = None
+    completed_at: Optional[datetime] = None
+
+
+class JobTypeInfo(BaseModel):
+    """Schema describing a registered job type."""
+
+    name: str
+    queue: str
+    description: str
+
+
+class JobMetrics(BaseModel):
+    """Timing metrics for one job type across workers."""
+
+    job_type: str
+    count: int
+    failures: int
+    average_runtime_seconds: float
+    max_runtime_seconds: float
+    average_wait_seconds: float
+    max_wait_seconds: float
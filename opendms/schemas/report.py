@@ -0,0 +1,50 @@
+"""
+Report schemas for API responses.
+"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SalesReportRow(BaseModel):
+    """Aggregated sales metrics for one group."""
+
+    dealership_id: Optional[int] = None
+    sales_person_id: Optional[int] = None
+    month: Optional[str] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    units: int
+    revenue: float
+    total_amount: float
+    trade_in_value: float
+    gross_profit: float
+    average_price: float
+    average_gross: Optional[float] = None
+    gross_margin: Optional[float] = None
+
+
+class SalesReportResponse(BaseModel):
+    """Schema for a grouped sales report."""
+
+    group_by: List[str]
+    rows: List[SalesReportRow]
+    totals: Optional[SalesReportRow] = None
+
+
+class SalesTrendPoint(BaseModel):
+    """Monthly sales totals with month-over-month change."""
+
+    month: str
+    units: int
+    revenue: float
+    gross_profit: float
+    units_change_pct: Optional[float] = None
+    gross_change_pct: Optional[float] = None
+
+
+class SalesTrendResponse(BaseModel):
+    """Schema for a monthly sales trend report."""
+
+    points: List[SalesTrendPoint]
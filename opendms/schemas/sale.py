@@ -4,9 +4,11 @@ Sale schemas for API requests and responses.
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
+
+from opendms.schemas.inventory import UploadRejection
 
 
 class SaleBase(BaseModel):
@@ -56,7 +58,22 @@ class SaleUpdate(BaseModel):
 class SaleResponse(SaleBase):
     """Schema for sale response."""
 
+    # Read from the model's column names
+    salesperson_id: int = Field(
+        validation_alias=AliasChoices("sales_person_id", "salesperson_id")
+    )
+    sale_price: Decimal = Field(
+        validation_alias=AliasChoices("vehicle_price", "sale_price")
+    )
+    financing_amount: Optional[Decimal] = Field(
+        default=None,
+        validation_alias=AliasChoices("finance_amount", "financing_amount"),
+    )
+    loan_term: Optional[int] = Field(
+        default=None, validation_alias=AliasChoices("term_months", "loan_term")
+    )
     id: int
+    sale_number: str
     dealership_id: int
     sale_date: datetime
     status: str
@@ -65,3 +82,81 @@ class SaleResponse(SaleBase):
 
     class Config:
         from_attributes = True
+
+
+class PaymentGridRequest(BaseModel):
+    """Schema for a deal-desk payment grid request."""
+
+    vehicle_price: Decimal = Field(gt=0)
+    trade_in_value: Decimal = Decimal(0)
+    taxes_and_fees: Decimal = Decimal(0)
+    vehicle_value: Optional[Decimal] = None
+    down_payments: List[Decimal] = Field(min_length=1, max_length=24)
+    terms: List[int] = Field(min_length=1, max_length=24)
+    rates: List[Decimal] = Field(min_length=1, max_length=24)
+
+
+class PaymentGridResponse(BaseModel):
+    """
+    Schema for a deal-desk payment grid response.
+
+    Grid values are indexed ``[down_payment][term][rate]``.
+    """
+
+    down_payments: List[float]
+    terms: List[int]
+    rates: List[float]
+    amount_financed: List[float]
+    monthly_payment: List[List[List[float]]]
+    total_interest: List[List[List[float]]]
+    ltv: List[List[List[float]]]
+
+
+class SaleDocumentResponse(BaseModel):
+    """Schema for a deal jacket document."""
+
+    id: int
+    sale_id: int
+    document_type: Optional[str] = None
+    filename: str
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    url: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentUploadResponse(BaseModel):
+    """Schema for the result of a multipart document upload."""
+
+    documents: List[SaleDocumentResponse]
+    duplicates: List[str]
+    rejected: List[UploadRejection]
+
+
+class DocumentUploadStart(BaseModel):
+    """Schema for starting a chunked document upload."""
+
+    filename: str = Field(min_length=1, max_length=255)
+    size: int = Field(gt=0)
+    document_type: Optional[str] = Field(None, max_length=50)
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
+
+
+class DocumentUploadStatus(BaseModel):
+    """
+    Schema for the state of a chunked document upload.
+
+    ``document`` is set once the upload is complete, or immediately when
+    the file was already stored.
+    """
+
+    upload_id: Optional[str] = None
+    offset: int
+    size: int
+    chunk_size: int
+    complete: bool
+    document: Optional[SaleDocumentResponse] = None
@@ -4,9 +4,11 @@ Service schemas for API requests and responses.
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from opendms.core.config import settings
 
 
 class ServiceAppointmentBase(BaseModel):
@@ -19,7 +21,10 @@ class ServiceAppointmentBase(BaseModel):
     service_type: str
     description: Optional[str] = None
     estimated_cost: Optional[Decimal] = None
-    estimated_duration: Optional[int] = None
+    # Bounded so conflict checks only need to look back this far
+    estimated_duration: Optional[int] = Field(
+        default=None, gt=0, le=settings.SERVICE_MAX_APPOINTMENT_MINUTES
+    )
     priority: str = "normal"
     status: str = "scheduled"
     notes: Optional[str] = None
@@ -41,7 +46,9 @@ class ServiceAppointmentUpdate(BaseModel):
     service_type: Optional[str] = None
     description: Optional[str] = None
     estimated_cost: Optional[Decimal] = None
-    estimated_duration: Optional[int] = None
+    estimated_duration: Optional[int] = Field(
+        default=None, gt=0, le=settings.SERVICE_MAX_APPOINTMENT_MINUTES
+    )
     priority: Optional[str] = None
     status: Optional[str] = None
     notes: Optional[str] = None
@@ -52,6 +59,7 @@ class ServiceAppointmentResponse(ServiceAppointmentBase):
 
     id: int
     dealership_id: int
+    estimated_duration: Optional[int] = None
     actual_cost: Optional[Decimal] = None
     actual_duration: Optional[int] = None
     completed_at: Optional[datetime] = None
@@ -60,3 +68,48 @@ class ServiceAppointmentResponse(ServiceAppointmentBase):
 
     class Config:
         from_attributes = True
+
+
+class AvailableSlot(BaseModel):
+    """An open appointment slot for one advisor."""
+
+    start: datetime
+    end: datetime
+    service_advisor_id: int
+
+
+class AvailableSlotsResponse(BaseModel):
+    """Schema for open appointment slots."""
+
+    dealership_id: int
+    duration: int
+    slots: List[AvailableSlot]
+
+
+class DispatchAssignment(BaseModel):
+    """A work order placed in a technician's queue."""
+
+    work_order_id: int
+    work_order_number: str
+    technician_id: int
+    estimated_hours: float
+    start_offset_hours: float
+    pinned: bool
+    in_progress: bool
+
+
+class DispatchPlanResponse(BaseModel):
+    """Schema for a technician dispatch plan."""
+
+    dealership_id: int
+    version: int
+    mode: str
+    assignments: List[DispatchAssignment]
+    technician_hours: Dict[int, float]
+    unassignable: List[int]
+
+
+class WorkOrderAssign(BaseModel):
+    """Schema for manually assigning a work order."""
+
+    technician_id: Optional[int] = None
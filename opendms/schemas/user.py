@@ -19,6 +19,7 @@ class UserBase(BaseModel):
     role: Optional[UserRole] = None
     phone: Optional[str] = None
     dealership_id: Optional[int] = None
+    skills: Optional[str] = None
 
 
 class UserCreate(UserBase):
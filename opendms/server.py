@@ -0,0 +1,322 @@
+"""
+Production HTTP server (``opendms serve``).
+
+A prefork supervisor around uvicorn. The parent imports the application
+once, runs the startup DDL and cache warming (``opendms.main.prepare``),
+binds the listening socket and forks the workers. Workers share the
+parent's imported modules, templates and reference data copy-on-write:
+``gc.freeze()`` before forking keeps the collector from touching, and so
+copying, those pages. Every worker accepts from the same socket. A worker
+that exits (crash, or ``max_requests`` recycling) is replaced.
+
+uvicorn picks uvloop and httptools when they are installed (both come with
+``uvicorn[standard]``) and falls back to asyncio and h11.
+
+SIGTERM or SIGINT stops the workers gracefully: they stop accepting and
+finish in-flight requests for up to ``SERVER_GRACEFUL_TIMEOUT`` seconds
+before they are killed.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import signal
+import socket
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+
+from opendms.core import log
+from opendms.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# A worker exiting sooner than this after starting is treated as a crash
+# loop, and replacing it is delayed by the same amount
+MIN_WORKER_LIFETIME = 1.0
+
+
+def default_workers() -> int:
+    """One worker per CPU available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        return os.cpu_count() or 1
+
+
+class Supervisor:
+    """Forks, watches and replaces uvicorn worker processes."""
+
+    def __init__(
+        self,
+        config: uvicorn.Config,
+        workers: int,
+        graceful_timeout: float,
+    ) -> None:
+        self.config = config
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, float] = {}  # pid -> start time
+        self.socket: Optional[socket.socket] = None
+        self.stopping = False
+        self.stop_deadline = 0.0
+
+    def run(self) -> None:
+        self.socket = self.config.bind_socket()
+        # Objects created so far (the whole app) stay out of GC passes, so
+        # workers do not copy the pages holding them
+        gc.collect()
+        gc.freeze()
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_stop)
+
+        logger.info(
+            "Serving on %s:%d with %d workers",
+            self.config.host,
+            self.config.port,
+            self.workers,
+        )
+        for _ in range(self.workers):
+            self._spawn()
+        while self.children:
+            self._reap()
+            if self.stopping:
+                if time.monotonic() > self.stop_deadline:
+                    self._signal_all(signal.SIGKILL)
+            else:
+                while len(self.children) < self.workers and not self.stopping:
+                    self._spawn()
+            time.sleep(0.2)
+        self.socket.close()
+        logger.info("Server stopped")
+
+    def _spawn(self) -> None:
+        # Forking while the log listener thread runs could copy a held lock
+        log.stop_logging()
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        log.configure_logging()
+        self.children[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def _run_worker(self) -> None:
+        """Worker process body; never returns."""
+        status = 0
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            log.configure_logging()
+            from opendms.core.database import engine
+
+            # Connections are per process; leave the parent's to the parent
+            engine.dispose(close=False)
+            uvicorn.Server(self.config).run(sockets=[self.socket])
+        except BaseException:
+            logger.exception("Worker %d failed", os.getpid())
+            status = 1
+        finally:
+            log.stop_logging()
+            os._exit(status)
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                logger.info("Worker %d stopped", pid)
+            elif time.monotonic() - started < MIN_WORKER_LIFETIME:
+                logger.error("Worker %d exited on startup (%d)", pid, code)
+                time.sleep(MIN_WORKER_LIFETIME)
+            else:
+                logger.info("Worker %d exited (%d), replacing it", pid, code)
+
+    def _signal_all(self, signum: int) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _handle_stop(self, signum: int, frame: Any) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        self.stop_deadline = time.monotonic() + self.graceful_timeout
+        self._signal_all(signal.SIGTERM)
+
+
+def serve(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: Optional[int] = None,
+    backlog: Optional[int] = None,
+    keep_alive: Optional[int] = None,
+    graceful_timeout: Optional[int] = None,
+    max_requests: Optional[int] = None,
+    max_requests_jitter: Optional[int] = None,
+) -> None:
+    """
+    Run the app on a prefork pool of uvicorn workers.
+
+    Arguments default to the ``SERVER_*`` settings; ``workers`` defaults to
+    the number of CPUs.
+    """
+    # Preload: the import and one-off startup work happen once, here,
+    # before forking
+    from opendms.core.database import engine
+    from opendms.main import app, prepare
+
+    prepare()
+    # Workers open their own connections
+    engine.dispose()
+
+    config = uvicorn.Config(
+        app,
+        host=host or settings.SERVER_HOST,
+        port=port or settings.SERVER_PORT,
+        backlog=backlog or settings.SERVER_BACKLOG,
+        timeout_keep_alive=(
+            settings.SERVER_KEEP_ALIVE if keep_alive is None else keep_alive
+        ),
+        timeout_graceful_shutdown=(
+            settings.SERVER_GRACEFUL_TIMEOUT
+            if graceful_timeout is None
+            else graceful_timeout
+        ),
+        limit_max_requests=(
+            settings.SERVER_MAX_REQUESTS if max_requests is None else max_requests
+        )
+        or None,
+        limit_max_requests_jitter=(
+            settings.SERVER_MAX_REQUESTS_JITTER
+            if max_requests_jitter is None
+            else max_requests_jitter
+        ),
+        proxy_headers=True,
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        # Logging is configured by opendms.core.log; RequestLogMiddleware
+        # writes the access log
+        log_config=None,
+        access_log=False,
+    )
+    # Kill workers that are still running a little after uvicorn's own
+    # graceful timeout has passed
+    supervisor = Supervisor(
+        config,
+        workers or settings.SERVER_WORKERS or default_workers(),
+        config.timeout_graceful_shutdown + 5,
+    )
+    supervisor.run()
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, request: bytes
+) -> int:
+    """Send one keep-alive request and read the response; returns the status."""
+    writer.write(request)
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    chunked = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and b"chunked" in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def load_test(
+    host: str,
+    port: int,
+    paths: List[str],
+    concurrency: int,
+    duration: float,
+    keep_alive: bool = True,
+) -> Dict[str, Any]:
+    """
+    Drive a running server with ``concurrency`` clients for ``duration`` s.
+
+    Clients are minimal HTTP/1.1 connections, so the load generator costs
+    far less CPU per request than the server; run it on another machine
+    for absolute numbers.
+
+    Returns:
+        Dict[str, Any]: Requests per second, latency percentiles in ms and
+        error count
+    """
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    connection = b"keep-alive" if keep_alive else b"close"
+    requests = [
+        b"GET %s HTTP/1.1\r\nHost: %s\r\nAccept-Encoding: gzip\r\n"
+        b"Connection: %s\r\n\r\n" % (path.encode(), host.encode(), connection)
+        for path in paths
+    ]
+
+    async def client(index: int) -> None:
+        nonlocal errors
+        reader = writer = None
+        sent = index
+        while time.perf_counter() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, port)
+                started = time.perf_counter()
+                status = await _request(reader, writer, requests[sent % len(requests)])
+                latencies.append(time.perf_counter() - started)
+                sent += 1
+                if status >= 400:
+                    errors += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                if writer is not None:
+                    writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"requests": 0, "rps": 0.0, "errors": errors}
+    cuts = (
+        statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    )
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": cuts[49] * 1000,
+        "p99_ms": cuts[98] * 1000,
+        "errors": errors,
+    }
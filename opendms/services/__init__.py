@@ -0,0 +1,6 @@
+"""
+Domain services package.
+
+Business logic that spans several models (reporting, scheduling, analytics)
+lives here so that endpoints stay thin.
+"""
@@ -0,0 +1,552 @@
+"""
+Audit log of committed changes.
+
+Session hooks record, for every row inserted, updated or deleted through the
+ORM, the columns that changed with their before and after values. Records
+are collected during flushes and handed over only when the transaction
+commits, so rolled-back work is never logged. Bulk ``UPDATE`` and ``DELETE``
+statements bypass the flush; for those the affected rows are read before
+(and, for updates, after) the statement runs and diffed the same way.
+Statements executed with a list of parameter sets and ones without a
+``WHERE`` clause are not audited.
+
+Handing over is a ``put`` on a bounded in-process queue; a background
+thread drains it and writes rows with one multi-row INSERT per
+``AUDIT_BATCH_SIZE`` records or ``AUDIT_FLUSH_SECONDS``, whichever comes
+first, on its own connection. Requests therefore pay for building the diff,
+not for an extra write. If the database falls behind and the queue fills,
+committing threads wait up to ``AUDIT_ENQUEUE_TIMEOUT`` for space and then
+spill their records to JSON-lines files under ``AUDIT_SPILL_DIR``; batches
+that fail to insert are spilled the same way. Spilled records are replayed
+after the next successful write, in this or any other process.
+
+The acting user is taken from ``session.info`` (``set_audit_user``), which
+``get_current_user`` fills for authenticated requests.
+"""
+
+import atexit
+import enum
+import fcntl
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, event, insert, inspect, select, tuple_
+from sqlalchemy.engine import CursorResult, Result
+from sqlalchemy.orm import Mapper, ORMExecuteState, Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.core.database import Base, engine
+from opendms.models.audit import AuditLog
+
+logger = logging.getLogger(__name__)
+
+USER_KEY = "audit_user_id"
+
+# Never copied into the log
+REDACTED_COLUMNS = frozenset({"hashed_password"})
+REDACTED = "[redacted]"
+
+# Seconds between replay attempts while spilled records remain
+REPLAY_INTERVAL = 30.0
+
+_STOP = object()
+
+
+def set_audit_user(session: Session, user_id: Optional[int]) -> None:
+    """Attribute changes committed by ``session`` to a user."""
+    session.info[USER_KEY] = user_id
+
+
+def _keep_previous(target: Any, value: Any, oldvalue: Any, initiator: Any) -> None:
+    pass
+
+
+def _track_previous_values(mapper: Mapper) -> None:
+    """
+    Make column assignments load the value they replace.
+
+    Without this, setting an attribute that was expired by an earlier commit
+    does not load the old value, and the diff would have no "before".
+    """
+    for attr in mapper.column_attrs:
+        attribute = mapper.class_manager[attr.key]
+        if not event.contains(attribute, "set", _keep_previous):
+            event.listen(attribute, "set", _keep_previous, active_history=True)
+
+
+for _mapper in Base.registry.mappers:
+    _track_previous_values(_mapper)
+
+
+@event.listens_for(Mapper, "mapper_configured")
+def _on_mapper_configured(mapper: Mapper, class_: Any) -> None:
+    _track_previous_values(mapper)
+
+
+def _jsonable(value: Any) -> Any:
+    """Convert a column value to something JSON can hold."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (list, dict)):
+        return json.loads(json.dumps(value, default=str))
+    return str(value)
+
+
+def _value(key: str, value: Any) -> Any:
+    return REDACTED if key in REDACTED_COLUMNS else _jsonable(value)
+
+
+def _record(obj: Any, action: str, now: datetime, user_id: Any) -> Optional[Dict]:
+    """Build the audit record for one flushed object, or None if unchanged."""
+    state = inspect(obj)
+    mapper = state.mapper
+    changes: Dict[str, List[Any]] = {}
+    for attr in mapper.column_attrs:
+        key = attr.key
+        if action == "updated":
+            # Attribute history is still in place during after_flush
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            before = history.deleted[0] if history.deleted else None
+            after = history.added[0] if history.added else None
+            if before == after:
+                continue
+            changes[key] = [_value(key, before), _value(key, after)]
+        else:
+            # Read loaded values only; never emit SQL inside a flush
+            value = state.dict.get(key)
+            if value is None:
+                continue
+            value = _value(key, value)
+            changes[key] = [None, value] if action == "created" else [value, None]
+    if action == "updated" and not changes:
+        return None
+    identity = mapper.primary_key_from_instance(obj)
+    return {
+        "occurred_at": now,
+        "user_id": user_id,
+        "entity": mapper.persist_selectable.name,
+        "entity_id": ",".join(str(part) for part in identity)[:64],
+        "action": action,
+        "changes": changes,
+    }
+
+
+def _collect_changes(session: Session, pending: List[Dict[str, Any]]) -> None:
+    """Record the changes written in this flush."""
+    if not settings.ENABLE_AUDIT_LOGGING:
+        return
+    now = datetime.utcnow()
+    user_id = session.info.get(USER_KEY)
+    for action, objects in (
+        ("created", session.new),
+        ("updated", session.dirty),
+        ("deleted", session.deleted),
+    ):
+        for obj in objects:
+            if isinstance(obj, AuditLog):
+                continue
+            if action == "updated" and not session.is_modified(
+                obj, include_collections=False
+            ):
+                continue
+            record = _record(obj, action, now, user_id)
+            if record is not None:
+                pending.append(record)
+
+
+def _bulk_rows(
+    session: Session, mapper: Mapper, condition: Any
+) -> Dict[tuple, Dict[str, Any]]:
+    """Column values of the rows matching ``condition``, keyed by identity."""
+    columns = [attr.columns[0].label(attr.key) for attr in mapper.column_attrs]
+    keys = [column.key for column in mapper.primary_key]
+    rows = session.execute(select(*columns).where(condition)).mappings()
+    return {tuple(row[key] for key in keys): dict(row) for row in rows}
+
+
+def _bulk_record(
+    entity: str,
+    identity: tuple,
+    action: str,
+    changes: Dict[str, List[Any]],
+    now: datetime,
+    user_id: Any,
+) -> Dict[str, Any]:
+    return {
+        "occurred_at": now,
+        "user_id": user_id,
+        "entity": entity,
+        "entity_id": ",".join(str(part) for part in identity)[:64],
+        "action": action,
+        "changes": changes,
+    }
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _audit_bulk_statement(orm_execute_state: ORMExecuteState) -> Optional[Result]:
+    """Record the rows changed by an ORM bulk ``UPDATE`` or ``DELETE``."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    condition = orm_execute_state.statement.whereclause
+    if (
+        not settings.ENABLE_AUDIT_LOGGING
+        or mapper is None
+        or mapper.class_ is AuditLog
+        or condition is None
+        or orm_execute_state.is_executemany
+    ):
+        return None
+
+    session = orm_execute_state.session
+    before = _bulk_rows(session, mapper, condition)
+    result = orm_execute_state.invoke_statement()
+    if not before:
+        return result
+    if not isinstance(result, CursorResult):
+        # RETURNING rows: read them before issuing another query
+        result = result.freeze()()
+
+    entity = mapper.persist_selectable.name
+    now = datetime.utcnow()
+    user_id = session.info.get(USER_KEY)
+    pending = invalidation.pending(session, "audit")
+    if orm_execute_state.is_delete:
+        for identity, values in before.items():
+            changes = {
+                key: [_value(key, value), None]
+                for key, value in values.items()
+                if value is not None
+            }
+            pending.append(
+                _bulk_record(entity, identity, "deleted", changes, now, user_id)
+            )
+        return result
+
+    primary_key = tuple_(*mapper.primary_key)
+    after = _bulk_rows(session, mapper, primary_key.in_(list(before)))
+    for identity, values in after.items():
+        old = before[identity]
+        changes = {
+            key: [_value(key, old[key]), _value(key, value)]
+            for key, value in values.items()
+            if old[key] != value
+        }
+        if changes:
+            pending.append(
+                _bulk_record(entity, identity, "updated", changes, now, user_id)
+            )
+    return result
+
+
+def _submit_changes(pending: List[Dict[str, Any]]) -> None:
+    """Queue the committed transaction's records for writing."""
+    writer.submit(pending)
+
+
+def _encode(record: Dict[str, Any]) -> str:
+    return json.dumps({**record, "occurred_at": record["occurred_at"].isoformat()})
+
+
+def _decode(line: str) -> Dict[str, Any]:
+    record = json.loads(line)
+    record["occurred_at"] = datetime.fromisoformat(record["occurred_at"])
+    return record
+
+
+class AuditWriter:
+    """Bounded queue of committed records and the thread that writes them."""
+
+    def __init__(self) -> None:
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._next_replay = 0.0
+        self.written = 0
+        self.spilled = 0
+        self.failed_batches = 0
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            # A forked worker inherits the object but not the thread
+            if self._pid != os.getpid() or self._thread is None:
+                self._queue = queue.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-writer", daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Hand over one transaction's records.
+
+        Waits up to ``AUDIT_ENQUEUE_TIMEOUT`` when the queue is full, then
+        spills the records to disk instead.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put(records, timeout=settings.AUDIT_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            self._spill(records)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything submitted so far is written or spilled."""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write what is queued and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None or self._pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depth and counters for monitoring."""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "failed_batches": self.failed_batches,
+            "spill_files": len(self._spill_files()),
+        }
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - time.monotonic(), 0.0) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, list):
+                if not batch:
+                    deadline = time.monotonic() + settings.AUDIT_FLUSH_SECONDS
+                batch.extend(item)
+                if len(batch) < settings.AUDIT_BATCH_SIZE:
+                    continue
+            # Batch full, flush interval elapsed, flush() or stop()
+            if batch:
+                self._write(batch)
+                batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    @staticmethod
+    def _insert(records: List[Dict[str, Any]]) -> None:
+        """Insert records in one transaction, one multi-row INSERT per batch."""
+        with engine.begin() as conn:
+            for start in range(0, len(records), settings.AUDIT_BATCH_SIZE):
+                conn.execute(
+                    insert(AuditLog), records[start : start + settings.AUDIT_BATCH_SIZE]
+                )
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        try:
+            self._insert(records)
+        except Exception:
+            logger.exception("Audit write failed; spilling %d records", len(records))
+            self.failed_batches += 1
+            self._spill(records)
+            self._next_replay = time.monotonic() + REPLAY_INTERVAL
+            return
+        self.written += len(records)
+        if time.monotonic() >= self._next_replay:
+            self._replay()
+
+    def _spill_dir(self) -> str:
+        return os.path.abspath(settings.AUDIT_SPILL_DIR)
+
+    def _spill_files(self) -> List[str]:
+        try:
+            names = os.listdir(self._spill_dir())
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith(".jsonl"))
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        """Append records to this process's spill file."""
+        self._append(records)
+        self.spilled += len(records)
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        """Write records to this process's spill file, never to a claimed one."""
+        directory = self._spill_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"audit-{os.getpid()}.jsonl")
+        data = "".join(_encode(record) + "\n" for record in records)
+        with self._spill_lock:
+            while True:
+                with open(path, "a") as handle:
+                    # A replaying process renames the file and then takes
+                    # this lock, so it never reads a half-written line
+                    fcntl.flock(handle, fcntl.LOCK_EX)
+                    # If it was renamed before we got the lock, the replayer
+                    # may already have read and removed it: start a new file
+                    try:
+                        current = os.stat(path).st_ino
+                    except FileNotFoundError:
+                        continue
+                    if current != os.fstat(handle.fileno()).st_ino:
+                        continue
+                    handle.write(data)
+                    break
+
+    def _replay(self) -> None:
+        """Insert spilled records, one file at a time."""
+        self._next_replay = time.monotonic() + REPLAY_INTERVAL
+        directory = self._spill_dir()
+        for name in self._spill_files():
+            path = os.path.join(directory, name)
+            claimed = f"{path}.{os.getpid()}.replay"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # Claimed by another process
+            with open(claimed) as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                records = [_decode(line) for line in handle if line.strip()]
+            try:
+                self._insert(records)
+            except Exception:
+                logger.exception("Audit replay of %s failed", name)
+                # Back into this process's spill file, never over a file
+                # spilled since the claim
+                self._append(records)
+                os.unlink(claimed)
+                return
+            os.unlink(claimed)
+            self.written += len(records)
+            logger.info("Replayed %d spilled audit records from %s", len(records), name)
+
+
+writer = AuditWriter()
+atexit.register(writer.stop)
+invalidation.subscribe("audit", _collect_changes, _submit_changes, factory=list)
+
+
+def query_audit(
+    db: Session,
+    entity: Optional[str] = None,
+    entity_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = 100,
+) -> List[AuditLog]:
+    """
+    Audit entries, newest first (records replayed after an outage sort by
+    when they happened, not when they were written).
+
+    Args:
+        db: Database session
+        entity: Table name, e.g. ``vehicles``
+        entity_id: Primary key of one row (requires ``entity``)
+        user_id: Acting user
+        start: Earliest ``occurred_at`` (inclusive)
+        end: Latest ``occurred_at`` (exclusive)
+        before_id: Continue after the last entry of the previous page
+        limit: Page size
+
+    Returns:
+        List[AuditLog]: Matching entries
+    """
+    stmt = select(AuditLog)
+    if entity is not None:
+        stmt = stmt.where(AuditLog.entity == entity)
+        if entity_id is not None:
+            stmt = stmt.where(AuditLog.entity_id == entity_id)
+    if user_id is not None:
+        stmt = stmt.where(AuditLog.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(AuditLog.occurred_at >= start)
+    if end is not None:
+        stmt = stmt.where(AuditLog.occurred_at < end)
+    if before_id is not None:
+        cursor = (
+            select(AuditLog.occurred_at)
+            .where(AuditLog.id == before_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(
+            tuple_(AuditLog.occurred_at, AuditLog.id) < tuple_(cursor, before_id)
+        )
+    return db.scalars(
+        stmt.order_by(AuditLog.occurred_at.desc(), AuditLog.id.desc()).limit(limit)
+    ).all()
+
+
+def prune_audit_log(db: Session, batch_size: int = 5000) -> int:
+    """
+    Delete entries older than ``AUDIT_RETENTION_DAYS``, committing per batch.
+
+    Each batch is itself logged as one ``audit_log`` entry with the id range
+    and count removed.
+
+    Returns:
+        int: Entries deleted
+    """
+    if settings.AUDIT_RETENTION_DAYS is None:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=settings.AUDIT_RETENTION_DAYS)
+    deleted = 0
+    while True:
+        ids = db.scalars(
+            select(AuditLog.id)
+            .where(AuditLog.occurred_at < cutoff)
+            .order_by(AuditLog.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return deleted
+        db.execute(delete(AuditLog).where(AuditLog.id.in_(ids)))
+        if settings.ENABLE_AUDIT_LOGGING:
+            # One entry per batch rather than one per pruned entry
+            invalidation.pending(db, "audit").append(
+                _bulk_record(
+                    AuditLog.__tablename__,
+                    (f"{ids[0]}-{ids[-1]}",),
+                    "deleted",
+                    {"entries": [len(ids), None], "before": [cutoff.isoformat(), None]},
+                    datetime.utcnow(),
+                    db.info.get(USER_KEY),
+                )
+            )
+        db.commit()
+        deleted += len(ids)
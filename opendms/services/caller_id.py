@@ -0,0 +1,406 @@
+"""
+Caller-ID lookup by phone number or email.
+
+Customers carry ``phone_e164`` and ``email_normalized`` columns, filled from
+the raw values on every insert and update, so a ringing phone can be matched
+with one indexed equality lookup regardless of how the number was typed.
+
+For the softphone the database is only the fallback. Each process keeps an
+in-memory hash index per dealership mapping normalized phones and emails to
+ready-made caller summaries (the customer plus their latest sale and
+vehicle). A dealership's index is built on its first lookup, or ahead of
+time by ``warm``, which ``opendms serve`` runs once before forking so the
+workers share the result. From then on indexes are patched rather than
+rebuilt: a committed write to a customer or one of their sales flags that
+customer, and the next lookup for the dealership reloads only the flagged
+summaries before answering. Indexes are also reloaded after
+``CALLER_ID_CACHE_SECONDS`` to pick up writes made by other processes, and a
+miss falls through to the indexed columns so a customer created elsewhere is
+found immediately.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.customer import Customer
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import Sale
+from opendms.services.normalization import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+_customer_columns = (
+    Customer.id,
+    Customer.first_name,
+    Customer.last_name,
+    Customer.email,
+    Customer.phone,
+    Customer.preferred_contact_method,
+    Customer.is_active,
+)
+
+
+@dataclass
+class CallerIndex:
+    """Caller summaries for one dealership, keyed by normalized contact."""
+
+    by_phone: Dict[str, Set[int]] = field(default_factory=dict)
+    by_email: Dict[str, Set[int]] = field(default_factory=dict)
+    callers: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def add(self, caller: Dict[str, Any]) -> None:
+        self.remove(caller["customer_id"])
+        self.callers[caller["customer_id"]] = caller
+        for key, index in (
+            (caller["phone_e164"], self.by_phone),
+            (caller["email_normalized"], self.by_email),
+        ):
+            if key:
+                index.setdefault(key, set()).add(caller["customer_id"])
+
+    def remove(self, customer_id: int) -> None:
+        caller = self.callers.pop(customer_id, None)
+        if caller is None:
+            return
+        for key, index in (
+            (caller["phone_e164"], self.by_phone),
+            (caller["email_normalized"], self.by_email),
+        ):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(customer_id)
+                if not ids:
+                    del index[key]
+
+
+_indexes: Dict[int, CallerIndex] = {}
+_dirty: Dict[int, Set[int]] = {}
+_lock = threading.Lock()
+
+
+def _latest_sales(dealership_id: int, customer_ids: Optional[Set[int]] = None) -> Any:
+    """Select each customer's most recent sale with its vehicle."""
+    ranked = select(
+        Sale.customer_id,
+        Sale.id.label("sale_id"),
+        Sale.sale_number,
+        Sale.sale_date,
+        Sale.status,
+        Sale.vehicle_id,
+        func.row_number()
+        .over(
+            partition_by=Sale.customer_id,
+            order_by=(Sale.sale_date.desc(), Sale.id.desc()),
+        )
+        .label("rank"),
+    ).where(Sale.dealership_id == dealership_id)
+    if customer_ids is not None:
+        ranked = ranked.where(Sale.customer_id.in_(customer_ids))
+    ranked = ranked.subquery()
+    return (
+        select(
+            ranked.c.customer_id,
+            ranked.c.sale_id,
+            ranked.c.sale_number,
+            ranked.c.sale_date,
+            ranked.c.status,
+            ranked.c.vehicle_id,
+            Vehicle.vin,
+            Vehicle.year,
+            Vehicle.make,
+            Vehicle.model,
+        )
+        .join(Vehicle, Vehicle.id == ranked.c.vehicle_id)
+        .where(ranked.c.rank == 1)
+    )
+
+
+def _load_callers(
+    db: Session, dealership_id: int, customer_ids: Optional[Set[int]] = None
+) -> List[Dict[str, Any]]:
+    """Build caller summaries for a dealership, or for some of its customers."""
+    stmt = select(*_customer_columns).where(Customer.dealership_id == dealership_id)
+    if customer_ids is not None:
+        stmt = stmt.where(Customer.id.in_(customer_ids))
+
+    latest = {}
+    for row in db.execute(_latest_sales(dealership_id, customer_ids)):
+        latest[row.customer_id] = {
+            "sale_id": row.sale_id,
+            "sale_number": row.sale_number,
+            "sale_date": row.sale_date,
+            "status": row.status,
+            "vehicle_id": row.vehicle_id,
+            "vin": row.vin,
+            "year": row.year,
+            "make": row.make,
+            "model": row.model,
+        }
+
+    return [
+        {
+            "customer_id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "email": row.email,
+            "phone": row.phone,
+            # Derived from the raw values so rows written before the
+            # normalized columns existed are still found
+            "phone_e164": normalize_phone(row.phone),
+            "email_normalized": normalize_email(row.email),
+            "preferred_contact_method": row.preferred_contact_method,
+            "is_active": row.is_active,
+            "latest_sale": latest.get(row.id),
+        }
+        for row in db.execute(stmt.execution_options(yield_per=5000))
+    ]
+
+
+def get_index(db: Session, dealership_id: int) -> CallerIndex:
+    """
+    Return the caller index for a dealership, refreshing as needed.
+
+    A missing or expired index is loaded in full; otherwise only customers
+    marked dirty since the last lookup are re-queried.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to load
+
+    Returns:
+        CallerIndex: Current caller summaries
+    """
+    with _lock:
+        index = _indexes.get(dealership_id)
+        dirty = _dirty.pop(dealership_id, set())
+
+    expired = (
+        index is not None
+        and time.monotonic() - index.loaded_at > settings.CALLER_ID_CACHE_SECONDS
+    )
+    if index is None or expired:
+        index = CallerIndex()
+        for caller in _load_callers(db, dealership_id):
+            index.add(caller)
+        with _lock:
+            _indexes[dealership_id] = index
+    elif dirty:
+        fresh = _load_callers(db, dealership_id, dirty)
+        with _lock:
+            for customer_id in dirty:
+                index.remove(customer_id)
+            for caller in fresh:
+                index.add(caller)
+    return index
+
+
+def lookup(
+    db: Session,
+    dealership_id: int,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Find the customers behind a phone number or email address.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership receiving the call
+        phone: Phone number in any common format
+        email: Email address
+
+    Returns:
+        List[Dict[str, Any]]: Caller summaries, active customers first and
+        then most recent buyers first
+
+    Raises:
+        ValueError: If neither value can be normalized
+    """
+    phone_key = normalize_phone(phone)
+    email_key = normalize_email(email)
+    if phone_key is None and email_key is None:
+        raise ValueError("A valid phone number or email address is required")
+
+    index = get_index(db, dealership_id)
+    with _lock:
+        ids = set()
+        if phone_key:
+            ids |= index.by_phone.get(phone_key, set())
+        if email_key:
+            ids |= index.by_email.get(email_key, set())
+        callers = [index.callers[customer_id] for customer_id in ids]
+
+    if not callers:
+        callers = _lookup_columns(db, dealership_id, index, phone_key, email_key)
+
+    callers.sort(
+        key=lambda caller: (
+            (caller["latest_sale"] or {}).get("sale_date") or datetime.min
+        ),
+        reverse=True,
+    )
+    callers.sort(key=lambda caller: not caller["is_active"])
+    return callers
+
+
+def _lookup_columns(
+    db: Session,
+    dealership_id: int,
+    index: CallerIndex,
+    phone_key: Optional[str],
+    email_key: Optional[str],
+) -> List[Dict[str, Any]]:
+    """Check the indexed columns for customers the local index has not seen."""
+    conditions = []
+    if phone_key:
+        conditions.append(Customer.phone_e164 == phone_key)
+    if email_key:
+        conditions.append(Customer.email_normalized == email_key)
+    ids = set(
+        db.scalars(
+            select(Customer.id).where(
+                Customer.dealership_id == dealership_id,
+                or_(*conditions),
+            )
+        )
+    )
+    if not ids:
+        return []
+    callers = _load_callers(db, dealership_id, ids)
+    with _lock:
+        for caller in callers:
+            index.add(caller)
+    return callers
+
+
+def warm(db: Session, dealership_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Load caller indexes ahead of the first call.
+
+    Args:
+        db: Database session
+        dealership_ids: Dealerships to load, defaults to every dealership
+            with customers
+
+    Returns:
+        int: Number of customers indexed
+    """
+    started = time.perf_counter()
+    if dealership_ids is None:
+        dealership_ids = db.scalars(select(Customer.dealership_id).distinct()).all()
+    total = 0
+    for dealership_id in dealership_ids:
+        invalidate(dealership_id)
+        total += len(get_index(db, dealership_id).callers)
+    logger.info(
+        "Caller ID indexes warmed: %d customers in %.2fs",
+        total,
+        time.perf_counter() - started,
+    )
+    return total
+
+
+def invalidate(dealership_id: Optional[int] = None) -> None:
+    """Drop cached indexes for one dealership, or all of them."""
+    with _lock:
+        if dealership_id is None:
+            _indexes.clear()
+            _dirty.clear()
+        else:
+            _indexes.pop(dealership_id, None)
+            _dirty.pop(dealership_id, None)
+
+
+def mark_changed(
+    session: Session, dealership_id: int, customer_ids: Iterable[int]
+) -> None:
+    """
+    Record customers changed by bulk statements the flush hooks cannot see.
+
+    They are marked dirty when the session commits.
+    """
+    pending = invalidation.pending(session, "caller_id")
+    pending.update((dealership_id, customer_id) for customer_id in customer_ids)
+
+
+def backfill_contact_keys(db: Session, batch_size: int = 1000) -> int:
+    """
+    Fill ``phone_e164`` and ``email_normalized`` on rows written before
+    they existed, committing per batch.
+
+    Args:
+        db: Database session
+        batch_size: Rows updated per commit
+
+    Returns:
+        int: Number of customers checked
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        customers = db.scalars(
+            select(Customer)
+            .where(
+                Customer.id > last_id,
+                ((Customer.phone.is_not(None)) & (Customer.phone_e164.is_(None)))
+                | (
+                    (Customer.email.is_not(None))
+                    & (Customer.email_normalized.is_(None))
+                ),
+            )
+            .order_by(Customer.id)
+            .limit(batch_size)
+        ).all()
+        if not customers:
+            return updated
+        for customer in customers:
+            _normalize_contact(customer)
+        last_id = customers[-1].id
+        updated += len(customers)
+        db.commit()
+
+
+def _normalize_contact(customer: Customer) -> None:
+    phone = normalize_phone(customer.phone)
+    email = normalize_email(customer.email)
+    if customer.phone_e164 != phone:
+        customer.phone_e164 = phone
+    if customer.email_normalized != email:
+        customer.email_normalized = email
+
+
+@event.listens_for(Customer, "before_insert")
+@event.listens_for(Customer, "before_update")
+def _fill_contact_keys(mapper: Any, connection: Any, customer: Customer) -> None:
+    """Keep the normalized lookup columns in step with the raw values."""
+    _normalize_contact(customer)
+
+
+def _collect_changed_customers(session: Session, pending: Set[Tuple[int, int]]) -> None:
+    """Record customers whose caller summary changed in this flush."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Customer):
+            pending.add((obj.dealership_id, obj.id))
+        elif isinstance(obj, Sale):
+            pending.add((obj.dealership_id, obj.customer_id))
+
+
+def _mark_dirty(pending: Set[Tuple[int, int]]) -> None:
+    """Mark committed customer changes dirty for the next lookup."""
+    with _lock:
+        for dealership_id, customer_id in pending:
+            if dealership_id in _indexes:
+                _dirty.setdefault(dealership_id, set()).add(customer_id)
+
+
+invalidation.subscribe("caller_id", _collect_changed_customers, _mark_dirty)
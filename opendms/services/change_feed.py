@@ -0,0 +1,91 @@
+"""
+Change events for vehicles, sales, service appointments and customers.
+
+Inserted, updated and deleted rows are collected during flushes (see
+``opendms.core.invalidation``) and published per dealership through
+``opendms.core.events`` once the transaction commits, so clients never hear
+about rolled-back work.
+"""
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.core.events import hub
+from opendms.models.customer import Customer
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import Sale
+from opendms.models.service import ServiceAppointment
+
+# Entity names used in event payloads and as SSE event names
+TRACKED_ENTITIES = {
+    Vehicle: "vehicle",
+    Sale: "sale",
+    ServiceAppointment: "service_appointment",
+    Customer: "customer",
+}
+
+
+def mark_changed(
+    session: Session,
+    dealership_id: int,
+    entity: str,
+    entity_ids: Iterable[int],
+    action: str,
+) -> None:
+    """
+    Record rows written by bulk statements the flush hooks cannot see.
+
+    They are published when the session commits.
+    """
+    if not settings.ENABLE_REAL_TIME_UPDATES:
+        return
+    pending = invalidation.pending(session, "change_feed")
+    for entity_id in entity_ids:
+        _add(pending, (dealership_id, entity, entity_id), action)
+
+
+def _add(
+    pending: Dict[Tuple[int, str, int], str], key: Tuple[int, str, int], action: str
+) -> None:
+    # Keep "created" if the row is also updated later in the transaction
+    if pending.get(key) != "created" or action == "deleted":
+        pending[key] = action
+
+
+def _collect_changes(
+    session: Session, pending: Dict[Tuple[int, str, int], str]
+) -> None:
+    """Record tracked rows written in this flush."""
+    if not settings.ENABLE_REAL_TIME_UPDATES:
+        return
+    for action, objects in (
+        ("created", session.new),
+        ("updated", session.dirty),
+        ("deleted", session.deleted),
+    ):
+        for obj in objects:
+            entity = TRACKED_ENTITIES.get(type(obj))
+            if entity is None or obj.dealership_id is None:
+                continue
+            if action == "updated" and not session.is_modified(
+                obj, include_collections=False
+            ):
+                continue
+            _add(pending, (obj.dealership_id, entity, obj.id), action)
+
+
+def _publish_changes(pending: Dict[Tuple[int, str, int], str]) -> None:
+    """Publish committed changes, one message per dealership."""
+    by_dealership: Dict[int, List[Dict[str, Any]]] = {}
+    for (dealership_id, entity, entity_id), action in pending.items():
+        by_dealership.setdefault(dealership_id, []).append(
+            {"entity": entity, "id": entity_id, "action": action}
+        )
+    for dealership_id, changes in by_dealership.items():
+        hub.publish(dealership_id, changes)
+
+
+invalidation.subscribe("change_feed", _collect_changes, _publish_changes, factory=dict)
@@ -0,0 +1,439 @@
+"""
+Customer 360 overview.
+
+An overview gathers a customer's profile, sales with the vehicles sold,
+service appointments with their work orders, recent notes and lifetime
+totals. Walking the ORM relationships for that fires a query per sale,
+appointment and vehicle, so overviews are assembled from batch loaders
+instead: each loader collects the keys needed at one stage, fetches them all
+with a single ``IN`` query and memoizes the rows for the rest of the
+request. Assembly runs in three stages (customers; their sales, appointments
+and notes; the vehicles and work orders those reference), so one overview or
+a page of a hundred costs the same six queries however much history there
+is.
+
+Assembled overviews are cached per customer. Committed writes to the
+customer, their sales, appointments, work orders or notes, or to a vehicle
+they bought or had serviced, evict the affected overviews.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.customer import Customer, CustomerNote
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import Sale, SaleStatus
+from opendms.models.service import ServiceAppointment, ServiceWorkOrder
+from opendms.schemas.customer import CustomerResponse
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# Sales that never happened are listed but left out of lifetime totals
+EXCLUDED_SALE_STATUSES = (SaleStatus.CANCELLED,)
+
+
+class BatchLoader(Generic[K, V]):
+    """
+    Fetch values for many keys with one call and remember them.
+
+    Args:
+        batch_fn: Takes a list of unseen keys and returns values by key;
+            keys it leaves out resolve to ``default``
+        default: Value for keys with nothing to load
+    """
+
+    def __init__(
+        self, batch_fn: Callable[[List[K]], Dict[K, V]], default: Any = None
+    ) -> None:
+        self._batch_fn = batch_fn
+        self._default = default
+        self._values: Dict[K, V] = {}
+
+    def load_many(self, keys: Iterable[K]) -> Dict[K, V]:
+        """Return values for ``keys``, loading unseen ones in one batch."""
+        keys = list(dict.fromkeys(keys))
+        missing = [key for key in keys if key not in self._values]
+        if missing:
+            loaded = self._batch_fn(missing)
+            for key in missing:
+                self._values[key] = loaded.get(key, self._default)
+        return {key: self._values[key] for key in keys}
+
+
+def _group(rows: Iterable[Any], key: str) -> Dict[Any, List[Dict[str, Any]]]:
+    grouped: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        values = dict(row._mapping)
+        grouped.setdefault(values[key], []).append(values)
+    return grouped
+
+
+@dataclass
+class OverviewLoaders:
+    """Per-request loaders; all share one session."""
+
+    db: Session
+    customers: BatchLoader = field(init=False)
+    sales: BatchLoader = field(init=False)
+    appointments: BatchLoader = field(init=False)
+    notes: BatchLoader = field(init=False)
+    work_orders: BatchLoader = field(init=False)
+    vehicles: BatchLoader = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.customers = BatchLoader(self._load_customers)
+        self.sales = BatchLoader(self._load_sales, default=[])
+        self.appointments = BatchLoader(self._load_appointments, default=[])
+        self.notes = BatchLoader(self._load_notes, default=[])
+        self.work_orders = BatchLoader(self._load_work_orders, default=[])
+        self.vehicles = BatchLoader(self._load_vehicles)
+
+    def _load_customers(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        customers = self.db.scalars(select(Customer).where(Customer.id.in_(ids)))
+        return {
+            customer.id: CustomerResponse.model_validate(customer).model_dump()
+            for customer in customers
+        }
+
+    def _load_sales(self, customer_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        stmt = (
+            select(
+                Sale.id,
+                Sale.customer_id,
+                Sale.sale_number,
+                Sale.sale_date,
+                Sale.status,
+                Sale.vehicle_id,
+                Sale.total_amount,
+            )
+            .where(Sale.customer_id.in_(customer_ids))
+            .order_by(Sale.sale_date.desc(), Sale.id.desc())
+        )
+        return _group(self.db.execute(stmt), "customer_id")
+
+    def _load_appointments(
+        self, customer_ids: List[int]
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        stmt = (
+            select(
+                ServiceAppointment.id,
+                ServiceAppointment.customer_id,
+                ServiceAppointment.appointment_number,
+                ServiceAppointment.appointment_date,
+                ServiceAppointment.status,
+                ServiceAppointment.service_type,
+                ServiceAppointment.vehicle_id,
+            )
+            .where(ServiceAppointment.customer_id.in_(customer_ids))
+            .order_by(
+                ServiceAppointment.appointment_date.desc(),
+                ServiceAppointment.id.desc(),
+            )
+        )
+        return _group(self.db.execute(stmt), "customer_id")
+
+    def _load_notes(self, customer_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        ranked = (
+            select(
+                CustomerNote.id,
+                CustomerNote.customer_id,
+                CustomerNote.title,
+                CustomerNote.note_type,
+                CustomerNote.content,
+                CustomerNote.created_at,
+                func.row_number()
+                .over(
+                    partition_by=CustomerNote.customer_id,
+                    order_by=(CustomerNote.created_at.desc(), CustomerNote.id.desc()),
+                )
+                .label("rank"),
+            )
+            .where(CustomerNote.customer_id.in_(customer_ids))
+            .subquery()
+        )
+        stmt = (
+            select(*(column for column in ranked.c if column.name != "rank"))
+            .where(ranked.c.rank <= settings.CUSTOMER_OVERVIEW_RECENT_NOTES)
+            .order_by(ranked.c.customer_id, ranked.c.rank)
+        )
+        return _group(self.db.execute(stmt), "customer_id")
+
+    def _load_work_orders(
+        self, appointment_ids: List[int]
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        stmt = (
+            select(
+                ServiceWorkOrder.id,
+                ServiceWorkOrder.appointment_id,
+                ServiceWorkOrder.work_order_number,
+                ServiceWorkOrder.status,
+                ServiceWorkOrder.work_description,
+                ServiceWorkOrder.actual_hours,
+                ServiceWorkOrder.total_cost,
+                ServiceWorkOrder.completed_at,
+            )
+            .where(ServiceWorkOrder.appointment_id.in_(appointment_ids))
+            .order_by(ServiceWorkOrder.created_at, ServiceWorkOrder.id)
+        )
+        return _group(self.db.execute(stmt), "appointment_id")
+
+    def _load_vehicles(self, vehicle_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        stmt = select(
+            Vehicle.id,
+            Vehicle.vin,
+            Vehicle.year,
+            Vehicle.make,
+            Vehicle.model,
+            Vehicle.trim,
+            Vehicle.color,
+        ).where(Vehicle.id.in_(vehicle_ids))
+        return {row.id: dict(row._mapping) for row in self.db.execute(stmt)}
+
+
+def _totals(
+    sales: List[Dict[str, Any]], appointments: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Lifetime figures from a customer's full history."""
+    purchases = [sale for sale in sales if sale["status"] not in EXCLUDED_SALE_STATUSES]
+    service_spend = sum(
+        order["total_cost"] or 0.0
+        for appointment in appointments
+        for order in appointment["work_orders"]
+    )
+    return {
+        "purchases": len(purchases),
+        "purchase_total": sum(sale["total_amount"] or 0.0 for sale in purchases),
+        "first_purchase": min((s["sale_date"] for s in purchases), default=None),
+        "last_purchase": max((s["sale_date"] for s in purchases), default=None),
+        "service_visits": len(appointments),
+        "service_total": service_spend,
+        "last_service": max(
+            (a["appointment_date"] for a in appointments), default=None
+        ),
+    }
+
+
+def assemble(db: Session, customer_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Build overviews for several customers with a fixed number of queries.
+
+    Args:
+        db: Database session
+        customer_ids: Customers to assemble; unknown ids are left out
+
+    Returns:
+        Dict[int, Dict[str, Any]]: Overviews by customer id
+    """
+    loaders = OverviewLoaders(db)
+    profiles = {
+        customer_id: profile
+        for customer_id, profile in loaders.customers.load_many(customer_ids).items()
+        if profile is not None
+    }
+    ids = list(profiles)
+    if not ids:
+        return {}
+
+    sales = loaders.sales.load_many(ids)
+    appointments = loaders.appointments.load_many(ids)
+    notes = loaders.notes.load_many(ids)
+
+    all_sales = [sale for rows in sales.values() for sale in rows]
+    all_appointments = [row for rows in appointments.values() for row in rows]
+    vehicles = loaders.vehicles.load_many(
+        row["vehicle_id"] for row in (*all_sales, *all_appointments)
+    )
+    work_orders = loaders.work_orders.load_many(row["id"] for row in all_appointments)
+
+    overviews = {}
+    for customer_id in ids:
+        customer_sales = [
+            {**sale, "vehicle": vehicles[sale["vehicle_id"]]}
+            for sale in sales[customer_id]
+        ]
+        customer_appointments = [
+            {
+                **appointment,
+                "vehicle": vehicles[appointment["vehicle_id"]],
+                "work_orders": work_orders[appointment["id"]],
+            }
+            for appointment in appointments[customer_id]
+        ]
+        overviews[customer_id] = {
+            "customer": profiles[customer_id],
+            "sales": customer_sales,
+            "service_history": customer_appointments,
+            "recent_notes": notes[customer_id],
+            "totals": _totals(customer_sales, customer_appointments),
+        }
+    return overviews
+
+
+@dataclass
+class _Entry:
+    overview: Dict[str, Any]
+    vehicle_ids: Set[int]
+    appointment_ids: Set[int]
+    loaded_at: float
+
+
+_cache: "OrderedDict[int, _Entry]" = OrderedDict()
+_by_vehicle: Dict[int, Set[int]] = {}
+_by_appointment: Dict[int, int] = {}
+_lock = threading.Lock()
+
+
+def _store(customer_id: int, overview: Dict[str, Any]) -> None:
+    """Cache an overview and index what it depends on (lock held)."""
+    _evict(customer_id)
+    entry = _Entry(
+        overview=overview,
+        vehicle_ids={row["vehicle_id"] for row in overview["sales"]}
+        | {row["vehicle_id"] for row in overview["service_history"]},
+        appointment_ids={row["id"] for row in overview["service_history"]},
+        loaded_at=time.monotonic(),
+    )
+    _cache[customer_id] = entry
+    for vehicle_id in entry.vehicle_ids:
+        _by_vehicle.setdefault(vehicle_id, set()).add(customer_id)
+    for appointment_id in entry.appointment_ids:
+        _by_appointment[appointment_id] = customer_id
+    while len(_cache) > settings.CUSTOMER_OVERVIEW_CACHE_SIZE:
+        _evict(next(iter(_cache)))
+
+
+def _evict(customer_id: int) -> None:
+    """Drop one cached overview and its reverse index entries (lock held)."""
+    entry = _cache.pop(customer_id, None)
+    if entry is None:
+        return
+    for vehicle_id in entry.vehicle_ids:
+        customers = _by_vehicle.get(vehicle_id)
+        if customers is not None:
+            customers.discard(customer_id)
+            if not customers:
+                del _by_vehicle[vehicle_id]
+    for appointment_id in entry.appointment_ids:
+        _by_appointment.pop(appointment_id, None)
+
+
+def get_overviews(
+    db: Session, customer_ids: Sequence[int]
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Return overviews for customers, assembling only those not cached.
+
+    Args:
+        db: Database session
+        customer_ids: Customers to return
+
+    Returns:
+        Dict[int, Dict[str, Any]]: Overviews by customer id, in request order;
+        unknown customers are left out
+    """
+    now = time.monotonic()
+    found: Dict[int, Dict[str, Any]] = {}
+    with _lock:
+        for customer_id in customer_ids:
+            entry = _cache.get(customer_id)
+            if (
+                entry is not None
+                and now - entry.loaded_at <= settings.CUSTOMER_OVERVIEW_CACHE_SECONDS
+            ):
+                _cache.move_to_end(customer_id)
+                found[customer_id] = entry.overview
+
+    missing = [customer_id for customer_id in customer_ids if customer_id not in found]
+    if missing:
+        assembled = assemble(db, missing)
+        with _lock:
+            for customer_id, overview in assembled.items():
+                _store(customer_id, overview)
+        found.update(assembled)
+    return {
+        customer_id: found[customer_id]
+        for customer_id in customer_ids
+        if customer_id in found
+    }
+
+
+def invalidate(customer_ids: Optional[Iterable[int]] = None) -> None:
+    """Drop cached overviews for some customers, or all of them."""
+    with _lock:
+        if customer_ids is None:
+            _cache.clear()
+            _by_vehicle.clear()
+            _by_appointment.clear()
+            return
+        for customer_id in customer_ids:
+            _evict(customer_id)
+
+
+def mark_changed(session: Session, customer_ids: Iterable[int]) -> None:
+    """
+    Record customers changed by bulk statements the flush hooks cannot see.
+
+    Their overviews are evicted when the session commits.
+    """
+    pending = invalidation.pending(session, "customer_overview")
+    pending.update(("customer", customer_id) for customer_id in customer_ids)
+
+
+def _collect_changes(session: Session, pending: Set[Tuple[str, int]]) -> None:
+    """Record rows written in this flush that overviews are built from."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Customer):
+            pending.add(("customer", obj.id))
+        elif isinstance(obj, (Sale, ServiceAppointment, CustomerNote)):
+            pending.add(("customer", obj.customer_id))
+            # Rows moved to another customer leave the previous one stale too
+            for previous in inspect(obj).attrs.customer_id.history.deleted:
+                pending.add(("customer", previous))
+            if isinstance(obj, ServiceAppointment):
+                pending.add(("appointment", obj.id))
+        elif isinstance(obj, ServiceWorkOrder):
+            pending.add(("appointment", obj.appointment_id))
+        elif isinstance(obj, Vehicle):
+            pending.add(("vehicle", obj.id))
+
+
+def _evict_changed(pending: Set[Tuple[str, int]]) -> None:
+    """Evict overviews that depend on committed changes."""
+    with _lock:
+        if not _cache:
+            return
+        for kind, key in pending:
+            if kind == "customer":
+                _evict(key)
+            elif kind == "appointment":
+                customer_id = _by_appointment.get(key)
+                if customer_id is not None:
+                    _evict(customer_id)
+            else:
+                for customer_id in list(_by_vehicle.get(key, ())):
+                    _evict(customer_id)
+
+
+invalidation.subscribe("customer_overview", _collect_changes, _evict_changed)
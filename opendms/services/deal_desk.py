@@ -0,0 +1,105 @@
+"""
+Deal structuring calculations.
+
+Payments are computed for a whole down payment x term x rate grid in one
+NumPy broadcast. The amortization factors only depend on the rate and term
+axes, which rarely change while a desk manager edits a deal, so they are
+memoized per (rates, terms) pair.
+"""
+
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@lru_cache(maxsize=256)
+def amortization_factors(
+    rates: Tuple[float, ...], terms: Tuple[int, ...]
+) -> np.ndarray:
+    """
+    Build the payment-per-dollar table for every term and APR.
+
+    Args:
+        rates: Annual percentage rates, e.g. ``(4.9, 6.9)``
+        terms: Loan terms in months
+
+    Returns:
+        np.ndarray: Read-only array of shape ``(len(terms), len(rates))``
+    """
+    monthly = np.asarray(rates, dtype=np.float64)[np.newaxis, :] / 1200.0
+    months = np.asarray(terms, dtype=np.float64)[:, np.newaxis]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = monthly / -np.expm1(-months * np.log1p(monthly))
+    # Zero-rate loans are a straight division of the principal
+    factors = np.where(monthly == 0.0, 1.0 / months, factors)
+    factors.setflags(write=False)
+    return factors
+
+
+def monthly_payment(principal: float, annual_rate: float, term_months: int) -> float:
+    """
+    Compute the amortized monthly payment for a single loan.
+
+    Args:
+        principal: Amount financed
+        annual_rate: APR as a percentage
+        term_months: Loan term in months
+
+    Returns:
+        float: Monthly payment rounded to cents
+    """
+    if principal <= 0:
+        return 0.0
+    factor = amortization_factors((float(annual_rate),), (int(term_months),))[0, 0]
+    return round(float(principal * factor), 2)
+
+
+def payment_grid(
+    vehicle_price: float,
+    down_payments: Sequence[float],
+    terms: Sequence[int],
+    rates: Sequence[float],
+    trade_in_value: float = 0.0,
+    taxes_and_fees: float = 0.0,
+    vehicle_value: Optional[float] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Compute payments, total interest and LTV for every deal structure.
+
+    Args:
+        vehicle_price: Selling price of the vehicle
+        down_payments: Cash down options
+        terms: Loan terms in months
+        rates: APR options as percentages
+        trade_in_value: Trade-in allowance applied to every structure
+        taxes_and_fees: Amount added to the financed balance
+        vehicle_value: Collateral value for LTV, defaults to ``vehicle_price``
+
+    Returns:
+        Dict[str, np.ndarray]: ``amount_financed`` with shape ``(D,)`` and
+        ``monthly_payment``, ``total_interest``, ``ltv`` with shape
+        ``(D, T, R)``
+    """
+    down = np.asarray(down_payments, dtype=np.float64)
+    financed = np.clip(
+        vehicle_price + taxes_and_fees - trade_in_value - down, 0.0, None
+    )
+    factors = amortization_factors(
+        tuple(float(rate) for rate in rates), tuple(int(term) for term in terms)
+    )
+    months = np.asarray(terms, dtype=np.float64)[np.newaxis, :, np.newaxis]
+
+    payments = np.round(financed[:, np.newaxis, np.newaxis] * factors, 2)
+    total_interest = payments * months - financed[:, np.newaxis, np.newaxis]
+    collateral = vehicle_value if vehicle_value else vehicle_price
+    ltv = np.broadcast_to(
+        (financed / collateral)[:, np.newaxis, np.newaxis], payments.shape
+    )
+
+    return {
+        "amount_financed": financed,
+        "monthly_payment": payments,
+        "total_interest": np.round(np.maximum(total_interest, 0.0), 2),
+        "ltv": np.round(ltv, 4),
+    }
@@ -0,0 +1,502 @@
+"""
+Customer duplicate detection and merge.
+
+Comparing every customer with every other is quadratic, so records are first
+grouped by blocking keys: matching email mailbox, E.164 phone, street address,
+and phonetic last name with first initial and ZIP. Only records sharing a
+block are scored against each other, which keeps the work close to linear in
+the number of customers. Oversized blocks (a shared office number, a family
+email) are skipped rather than exploding into all-pairs.
+
+Scores are a weighted blend of email, phone, name (Jaro-Winkler) and address
+agreement. Shared contact details with a clearly different first or last
+name usually mean a household rather than a duplicate, so those pairs are
+capped below the match threshold.
+"""
+
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from opendms.core.config import settings
+from opendms.models.customer import Customer, CustomerNote
+from opendms.models.sale import Sale
+from opendms.models.service import ServiceAppointment
+from opendms.services import caller_id, change_feed, customer_overview
+from opendms.services.normalization import (
+    email_match_key,
+    normalize_address,
+    normalize_email,
+    normalize_name,
+    normalize_phone,
+    normalize_zip,
+    soundex,
+)
+
+# Fields copied onto the surviving customer when it has no value of its own
+MERGE_FILL_FIELDS = (
+    "email",
+    "phone",
+    "date_of_birth",
+    "address_line_1",
+    "address_line_2",
+    "city",
+    "state",
+    "zip_code",
+    "customer_type",
+    "source",
+    "preferred_contact_method",
+)
+
+# Score cap for pairs whose names disagree
+HOUSEHOLD_CAP = 0.6
+
+_record_columns = (
+    Customer.id,
+    Customer.first_name,
+    Customer.last_name,
+    Customer.email,
+    Customer.phone,
+    Customer.address_line_1,
+    Customer.zip_code,
+    Customer.created_at,
+)
+
+
+@dataclass
+class CustomerRecord:
+    """Normalized matching fields for one customer."""
+
+    id: Optional[int]
+    first: str
+    last: str
+    email: Optional[str]
+    phone: Optional[str]
+    address: Optional[str]
+    zip5: Optional[str]
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_values(
+        cls,
+        id: Optional[int],
+        first_name: Optional[str],
+        last_name: Optional[str],
+        email: Optional[str],
+        phone: Optional[str],
+        address_line_1: Optional[str],
+        zip_code: Optional[str],
+        created_at: Optional[datetime] = None,
+    ) -> "CustomerRecord":
+        return cls(
+            id=id,
+            first=normalize_name(first_name),
+            last=normalize_name(last_name),
+            email=email_match_key(normalize_email(email)),
+            phone=normalize_phone(phone),
+            address=normalize_address(address_line_1, zip_code),
+            zip5=normalize_zip(zip_code),
+            created_at=created_at,
+        )
+
+
+@dataclass
+class DuplicatePair:
+    """Two customers that probably describe the same person."""
+
+    customer_id: int  # the older record, kept on merge
+    duplicate_id: int
+    score: float
+    reasons: List[str]
+
+
+@dataclass
+class CustomerMatch:
+    """An existing customer resembling an incoming one."""
+
+    customer_id: int
+    score: float
+    reasons: List[str]
+
+
+def blocking_keys(record: CustomerRecord) -> List[Tuple[str, ...]]:
+    """Keys under which a record is compared with others."""
+    keys: List[Tuple[str, ...]] = []
+    if record.email:
+        keys.append(("email", record.email))
+    if record.phone:
+        keys.append(("phone", record.phone))
+    if record.address:
+        keys.append(("address", record.address))
+    if record.last and record.zip5:
+        keys.append(("name_zip", soundex(record.last), record.first[:1], record.zip5))
+    return keys
+
+
+def jaro_winkler(a: str, b: str) -> float:
+    """Jaro-Winkler similarity of two strings in ``[0, 1]``."""
+    if a == b:
+        return 1.0 if a else 0.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(i + window + 1, len(b))):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    a_chars = [c for c, m in zip(a, a_matched, strict=True) if m]
+    b_chars = [c for c, m in zip(b, b_matched, strict=True) if m]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars, strict=True)) / 2
+    jaro = (
+        matches / len(a) + matches / len(b) + (matches - transpositions) / matches
+    ) / 3
+
+    prefix = 0
+    for x, y in zip(a[:4], b[:4], strict=False):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def score_pair(a: CustomerRecord, b: CustomerRecord) -> Tuple[float, List[str]]:
+    """
+    Score how likely two records are the same customer.
+
+    Args:
+        a: First record
+        b: Second record
+
+    Returns:
+        Tuple[float, List[str]]: Score in ``[0, 1]`` and the fields that agreed
+    """
+    weighted = 0.0
+    total_weight = 0.0
+    reasons: List[str] = []
+    exact_contact = False
+
+    for field, weight in (("email", 0.35), ("phone", 0.35)):
+        left, right = getattr(a, field), getattr(b, field)
+        if left and right:
+            total_weight += weight
+            if left == right:
+                weighted += weight
+                reasons.append(field)
+                exact_contact = True
+
+    first_sim = jaro_winkler(a.first, b.first)
+    last_sim = jaro_winkler(a.last, b.last)
+    total_weight += 0.2
+    weighted += 0.2 * (0.4 * first_sim + 0.6 * last_sim)
+    if first_sim >= 0.9 and last_sim >= 0.9:
+        reasons.append("name")
+
+    if a.address and b.address:
+        total_weight += 0.1
+        if a.address == b.address:
+            weighted += 0.1
+            reasons.append("address")
+            exact_contact = True
+        elif a.zip5 == b.zip5:
+            weighted += 0.1 * SequenceMatcher(None, a.address, b.address).ratio()
+
+    score = weighted / total_weight
+    if not exact_contact:
+        # Name alone is not enough to call two people the same
+        score *= 0.8
+    if (a.first and b.first and first_sim < 0.85) or last_sim < 0.8:
+        score = min(score, HOUSEHOLD_CAP)
+    return round(score, 4), reasons
+
+
+def _ordered(a: CustomerRecord, b: CustomerRecord) -> Tuple[int, int]:
+    """Return (keep, duplicate) ids, keeping the older record."""
+    if (a.created_at, a.id) <= (b.created_at, b.id):
+        return a.id, b.id
+    return b.id, a.id
+
+
+def find_duplicates(
+    records: Sequence[CustomerRecord],
+    min_score: Optional[float] = None,
+    max_block_size: Optional[int] = None,
+) -> List[DuplicatePair]:
+    """
+    Find likely duplicate pairs among a set of customers.
+
+    Args:
+        records: Normalized customers, typically one dealership
+        min_score: Lowest score reported, defaults to ``DEDUP_MIN_SCORE``
+        max_block_size: Blocks larger than this are skipped, defaults to
+            ``DEDUP_MAX_BLOCK_SIZE``
+
+    Returns:
+        List[DuplicatePair]: Pairs ordered by descending score
+    """
+    min_score = settings.DEDUP_MIN_SCORE if min_score is None else min_score
+    max_block_size = max_block_size or settings.DEDUP_MAX_BLOCK_SIZE
+
+    blocks: Dict[Tuple[str, ...], List[int]] = defaultdict(list)
+    for index, record in enumerate(records):
+        for key in blocking_keys(record):
+            blocks[key].append(index)
+
+    candidates = set()
+    for members in blocks.values():
+        if 2 <= len(members) <= max_block_size:
+            candidates.update(combinations(members, 2))
+
+    pairs = []
+    for i, j in candidates:
+        score, reasons = score_pair(records[i], records[j])
+        if score >= min_score:
+            keep, duplicate = _ordered(records[i], records[j])
+            pairs.append(DuplicatePair(keep, duplicate, score, reasons))
+    pairs.sort(key=lambda pair: (-pair.score, pair.customer_id, pair.duplicate_id))
+    return pairs
+
+
+def group_duplicates(pairs: Iterable[DuplicatePair]) -> List[List[int]]:
+    """
+    Group pairs into clusters of customers that should become one.
+
+    Returns:
+        List[List[int]]: Customer ids per cluster, surviving record first
+    """
+    parent: Dict[int, int] = {}
+
+    def find(node: int) -> int:
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    keepers = set()
+    for pair in pairs:
+        keepers.add(pair.customer_id)
+        left, right = find(pair.customer_id), find(pair.duplicate_id)
+        if left != right:
+            parent[max(left, right)] = min(left, right)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for node in parent:
+        clusters[find(node)].append(node)
+    return [
+        sorted(members, key=lambda cid: (cid not in keepers, cid))
+        for members in clusters.values()
+    ]
+
+
+def load_records(db: Session, dealership_id: int) -> List[CustomerRecord]:
+    """Stream a dealership's active customers into normalized records."""
+    stmt = (
+        select(*_record_columns)
+        .where(Customer.dealership_id == dealership_id, Customer.is_active.is_(True))
+        .execution_options(yield_per=5000)
+    )
+    return [CustomerRecord.from_values(*row) for row in db.execute(stmt)]
+
+
+def _like_literal(value: str) -> str:
+    """Escape LIKE wildcards in ``value`` (use with ``escape="\\"``)."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def find_matches(
+    db: Session,
+    dealership_id: int,
+    candidate: CustomerRecord,
+    raw_last_name: Optional[str] = None,
+    min_score: Optional[float] = None,
+    exclude_id: Optional[int] = None,
+) -> List[CustomerMatch]:
+    """
+    Find existing customers matching one new or edited customer.
+
+    Only rows that could share a blocking key are fetched, so this is cheap
+    enough to run inline on create.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to search
+        candidate: Normalized incoming customer
+        raw_last_name: Last name as entered, for the indexed name lookup
+        min_score: Lowest score reported, defaults to ``DEDUP_MIN_SCORE``
+        exclude_id: Customer to ignore (the one being edited)
+
+    Returns:
+        List[CustomerMatch]: Matches ordered by descending score
+    """
+    conditions = []
+    if candidate.email:
+        # Catches case and plus-tag variants; the batch scan also folds dots
+        local, _, domain = candidate.email.partition("@")
+        conditions.append(func.lower(Customer.email) == candidate.email)
+        conditions.append(
+            func.lower(Customer.email).like(
+                f"{_like_literal(local)}+%@{_like_literal(domain)}", escape="\\"
+            )
+        )
+    if candidate.phone:
+        conditions.append(Customer.phone_e164 == candidate.phone)
+        # Rows not yet backfilled only have the free-form phone
+        conditions.append(
+            Customer.phone_e164.is_(None)
+            & Customer.phone.like(
+                f"%{_like_literal(candidate.phone[-4:])}", escape="\\"
+            )
+        )
+    if raw_last_name:
+        conditions.append(
+            func.lower(Customer.last_name) == raw_last_name.strip().lower()
+        )
+    if not conditions:
+        return []
+
+    stmt = (
+        select(*_record_columns)
+        .where(
+            Customer.dealership_id == dealership_id,
+            Customer.is_active.is_(True),
+            or_(*conditions),
+        )
+        .limit(settings.DEDUP_MAX_BLOCK_SIZE * 10)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(Customer.id != exclude_id)
+
+    min_score = settings.DEDUP_MIN_SCORE if min_score is None else min_score
+    matches = []
+    for row in db.execute(stmt):
+        existing = CustomerRecord.from_values(*row)
+        if not set(blocking_keys(existing)) & set(blocking_keys(candidate)):
+            continue
+        score, reasons = score_pair(candidate, existing)
+        if score >= min_score:
+            matches.append(CustomerMatch(existing.id, score, reasons))
+    matches.sort(key=lambda pair: -pair.score)
+    return matches
+
+
+def merge_customers(
+    db: Session, primary: Customer, duplicate_ids: Sequence[int]
+) -> Dict[str, Any]:
+    """
+    Fold duplicate customers into ``primary``.
+
+    Sales, service appointments and notes are re-pointed with one
+    ``UPDATE`` per table, empty fields on the primary are filled from the
+    most recently updated duplicate, and the duplicates are deleted. The
+    caller commits.
+
+    Args:
+        db: Database session
+        primary: Customer that survives
+        duplicate_ids: Customers merged into it
+
+    Returns:
+        Dict[str, Any]: Merged ids and rows moved per table
+
+    Raises:
+        ValueError: If a duplicate is missing, is the primary, or belongs to
+            another dealership
+    """
+    ids = sorted(set(duplicate_ids))
+    if primary.id in ids:
+        raise ValueError("A customer cannot be merged into itself")
+    duplicates = (
+        db.query(Customer)
+        .filter(Customer.id.in_(ids))
+        .order_by(Customer.updated_at.desc())
+        .all()
+    )
+    missing = set(ids) - {dup.id for dup in duplicates}
+    if missing:
+        raise ValueError(f"Customers not found: {sorted(missing)}")
+    if any(dup.dealership_id != primary.dealership_id for dup in duplicates):
+        raise ValueError("Customers belong to different dealerships")
+
+    for field in MERGE_FILL_FIELDS:
+        if getattr(primary, field) in (None, ""):
+            for dup in duplicates:
+                value = getattr(dup, field)
+                if value not in (None, ""):
+                    setattr(primary, field, value)
+                    break
+    primary.is_verified = primary.is_verified or any(d.is_verified for d in duplicates)
+
+    # Keep the ORM from cascading on the rows it still holds
+    for dup in duplicates:
+        db.expunge(dup)
+
+    moved = {}
+    for name, model, entity in (
+        ("sales", Sale, "sale"),
+        ("service_appointments", ServiceAppointment, "service_appointment"),
+        ("notes", CustomerNote, None),
+    ):
+        moved_ids = db.scalars(
+            update(model)
+            .where(model.customer_id.in_(ids))
+            .values(customer_id=primary.id)
+            .returning(model.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        moved[name] = len(moved_ids)
+        if entity is not None:
+            change_feed.mark_changed(
+                db, primary.dealership_id, entity, moved_ids, "updated"
+            )
+    db.execute(
+        delete(Customer)
+        .where(Customer.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    # Bulk statements bypass the flush hooks, so report the changes directly
+    change_feed.mark_changed(db, primary.dealership_id, "customer", ids, "deleted")
+    caller_id.mark_changed(db, primary.dealership_id, [primary.id, *ids])
+    customer_overview.mark_changed(db, [primary.id, *ids])
+    return {"merged_ids": ids, **moved}
+
+
+def scan_dealership(
+    db: Session,
+    dealership_id: int,
+    min_score: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Run a full duplicate scan over one dealership.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to scan
+        min_score: Lowest score reported, defaults to ``DEDUP_MIN_SCORE``
+        limit: Maximum pairs returned; clusters always cover every pair
+
+    Returns:
+        Dict[str, Any]: Customers scanned, scored pairs and merge clusters
+    """
+    records = load_records(db, dealership_id)
+    pairs = find_duplicates(records, min_score=min_score)
+    return {
+        "dealership_id": dealership_id,
+        "customers_scanned": len(records),
+        "pairs": [asdict(pair) for pair in pairs[:limit]],
+        "clusters": group_duplicates(pairs),
+    }
@@ -0,0 +1,499 @@
+"""
+Technician dispatch for service work orders.
+
+Open work orders are spread across a dealership's technicians so that the
+busiest technician finishes as early as possible. The default solver is a
+longest-job-first greedy over a min-heap of technician loads; small batches
+can be solved exactly with a branch-and-bound search. Plans are cached per
+dealership and versioned: a work order change only removes and re-inserts
+that order, so the service board can poll without triggering a full solve.
+
+Each worker process caches its own plans and only hears about its own
+commits, so a change made through another worker shows up there once the
+plan is rebuilt, after at most ``DISPATCH_PLAN_CACHE_SECONDS``. Versions
+count rebuilds within one process and are not comparable across processes.
+"""
+
+import heapq
+import json
+import threading
+from dataclasses import dataclass, field, replace
+from time import monotonic
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.service import (
+    ServiceAppointment,
+    ServiceWorkOrder,
+    WorkOrderStatus,
+)
+from opendms.models.user import User, UserRole
+
+# Work orders that still need a technician's time
+ACTIVE_STATUSES = (WorkOrderStatus.PENDING, WorkOrderStatus.IN_PROGRESS)
+
+
+@dataclass
+class Job:
+    """A work order as seen by the solver."""
+
+    id: int
+    work_order_number: str
+    hours: float
+    skill: Optional[str]
+    technician_id: Optional[int]  # current assignment, None if unassigned
+    in_progress: bool
+
+
+@dataclass
+class Technician:
+    """A technician and the work types they can take."""
+
+    id: int
+    skills: Optional[FrozenSet[str]]  # None means any work type
+
+    def can_do(self, job: Job) -> bool:
+        """Check whether this technician can take ``job``."""
+        return self.skills is None or job.skill is None or job.skill in self.skills
+
+
+@dataclass
+class DispatchPlan:
+    """Cached dispatch state for one dealership."""
+
+    technicians: Dict[int, Technician]
+    jobs: Dict[int, Job]
+    base_load: Dict[int, float]  # hours already assigned or in progress
+    suggested: Dict[int, int]  # unassigned work order id -> technician id
+    version: int = 0
+    loaded_at: float = field(default_factory=monotonic)
+
+    def loads(self) -> Dict[int, float]:
+        """Total planned hours per technician including suggestions."""
+        loads = dict(self.base_load)
+        for job_id, technician_id in self.suggested.items():
+            loads[technician_id] += self.jobs[job_id].hours
+        return loads
+
+
+_plans: Dict[int, DispatchPlan] = {}
+_dirty: Dict[int, Set[int]] = {}
+_lock = threading.Lock()
+
+
+def _parse_skills(raw: Optional[str]) -> Optional[FrozenSet[str]]:
+    """Parse ``User.skills`` (a JSON list of work types)."""
+    if not raw:
+        return None
+    try:
+        return frozenset(str(skill).lower() for skill in json.loads(raw))
+    except (TypeError, ValueError):
+        return None
+
+
+def _job_hours(estimated: Optional[float], actual: Optional[float]) -> float:
+    """Remaining hours for a work order, applying the default estimate."""
+    hours = estimated or settings.DISPATCH_DEFAULT_JOB_HOURS
+    return max(hours - (actual or 0.0), 0.0)
+
+
+def _job_query(dealership_id: int, job_ids: Optional[Set[int]] = None) -> Any:
+    """Select active work orders for a dealership."""
+    stmt = (
+        select(
+            ServiceWorkOrder.id,
+            ServiceWorkOrder.work_order_number,
+            ServiceWorkOrder.estimated_hours,
+            ServiceWorkOrder.actual_hours,
+            ServiceWorkOrder.technician_id,
+            ServiceWorkOrder.status,
+            ServiceAppointment.service_type,
+        )
+        .join(
+            ServiceAppointment,
+            ServiceAppointment.id == ServiceWorkOrder.appointment_id,
+        )
+        .where(ServiceAppointment.dealership_id == dealership_id)
+        .where(ServiceWorkOrder.status.in_(ACTIVE_STATUSES))
+    )
+    if job_ids is not None:
+        stmt = stmt.where(ServiceWorkOrder.id.in_(job_ids))
+    return stmt
+
+
+def _load_jobs(db: Session, stmt: Any) -> List[Job]:
+    """Run a work order query and convert rows to jobs."""
+    return [
+        Job(
+            id=row.id,
+            work_order_number=row.work_order_number,
+            hours=_job_hours(row.estimated_hours, row.actual_hours),
+            skill=row.service_type.lower() if row.service_type else None,
+            technician_id=row.technician_id,
+            in_progress=row.status == WorkOrderStatus.IN_PROGRESS,
+        )
+        for row in db.execute(stmt)
+    ]
+
+
+def solve_greedy(
+    jobs: List[Job],
+    technicians: Dict[int, Technician],
+    base_load: Dict[int, float],
+) -> Dict[int, int]:
+    """
+    Assign jobs longest-first to the least-loaded capable technician.
+
+    Args:
+        jobs: Unassigned jobs
+        technicians: Available technicians
+        base_load: Hours each technician already has
+
+    Returns:
+        Dict[int, int]: Job id -> technician id; jobs nobody can take are
+        left out
+    """
+    heap = [(base_load.get(tech_id, 0.0), tech_id) for tech_id in technicians]
+    heapq.heapify(heap)
+    assignment: Dict[int, int] = {}
+
+    for job in sorted(jobs, key=lambda j: (-j.hours, j.id)):
+        skipped = []
+        while heap:
+            load, tech_id = heapq.heappop(heap)
+            if technicians[tech_id].can_do(job):
+                assignment[job.id] = tech_id
+                heapq.heappush(heap, (load + job.hours, tech_id))
+                break
+            skipped.append((load, tech_id))
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+    return assignment
+
+
+def solve_optimal(
+    jobs: List[Job],
+    technicians: Dict[int, Technician],
+    base_load: Dict[int, float],
+) -> Dict[int, int]:
+    """
+    Find the assignment minimizing the largest technician load.
+
+    Exhaustive branch-and-bound seeded with the greedy solution; only meant
+    for batches up to ``DISPATCH_OPTIMAL_MAX_JOBS``.
+
+    Args:
+        jobs: Unassigned jobs
+        technicians: Available technicians
+        base_load: Hours each technician already has
+
+    Returns:
+        Dict[int, int]: Job id -> technician id
+    """
+    ordered = sorted(jobs, key=lambda j: (-j.hours, j.id))
+    tech_ids = sorted(technicians)
+    loads = {tech_id: base_load.get(tech_id, 0.0) for tech_id in tech_ids}
+
+    best = solve_greedy(ordered, technicians, base_load)
+    best_loads = dict(loads)
+    for job in ordered:
+        if job.id in best:
+            best_loads[best[job.id]] += job.hours
+    best_makespan = max(best_loads.values(), default=0.0)
+    current: Dict[int, int] = {}
+
+    def search(index: int, makespan: float) -> None:
+        nonlocal best, best_makespan
+        if makespan >= best_makespan:
+            return
+        if index == len(ordered):
+            best, best_makespan = dict(current), makespan
+            return
+        job = ordered[index]
+        capable = [t for t in tech_ids if technicians[t].can_do(job)]
+        if not capable:
+            search(index + 1, makespan)
+            return
+        seen = set()
+        for tech_id in capable:
+            # Technicians with identical load and skills are interchangeable
+            key = (loads[tech_id], technicians[tech_id].skills)
+            if key in seen:
+                continue
+            seen.add(key)
+            loads[tech_id] += job.hours
+            current[job.id] = tech_id
+            search(index + 1, max(makespan, loads[tech_id]))
+            loads[tech_id] -= job.hours
+            del current[job.id]
+
+    search(0, max(loads.values(), default=0.0))
+    return best
+
+
+def build_plan(db: Session, dealership_id: int) -> DispatchPlan:
+    """
+    Load technicians and work orders and solve from scratch.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to plan
+
+    Returns:
+        DispatchPlan: Fresh plan
+    """
+    technicians = {
+        row.id: Technician(id=row.id, skills=_parse_skills(row.skills))
+        for row in db.execute(
+            select(User.id, User.skills)
+            .where(User.dealership_id == dealership_id)
+            .where(User.is_active.is_(True))
+            .where(User.role == UserRole.SERVICE_TECHNICIAN)
+        )
+    }
+    plan = DispatchPlan(
+        technicians=technicians,
+        jobs={},
+        base_load=dict.fromkeys(technicians, 0.0),
+        suggested={},
+    )
+    unassigned = _add_jobs(plan, _load_jobs(db, _job_query(dealership_id)))
+    plan.suggested = solve_greedy(unassigned, plan.technicians, plan.base_load)
+    return plan
+
+
+def _add_jobs(plan: DispatchPlan, jobs: List[Job]) -> List[Job]:
+    """Add jobs to a plan, returning those that still need a technician."""
+    unassigned = []
+    for job in jobs:
+        plan.jobs[job.id] = job
+        if job.technician_id in plan.technicians:
+            plan.base_load[job.technician_id] += job.hours
+        elif not job.in_progress:
+            unassigned.append(job)
+    return unassigned
+
+
+def _remove_job(plan: DispatchPlan, job_id: int) -> None:
+    """Take a job out of a plan, releasing its hours."""
+    job = plan.jobs.pop(job_id, None)
+    if job is None:
+        return
+    if job.technician_id in plan.technicians:
+        plan.base_load[job.technician_id] -= job.hours
+    plan.suggested.pop(job_id, None)
+
+
+def get_plan(db: Session, dealership_id: int) -> DispatchPlan:
+    """
+    Return the current plan, re-solving only what changed.
+
+    Work orders marked dirty since the last call are removed from the plan,
+    re-read, and greedily inserted against the remaining loads. A missing or
+    expired plan is rebuilt from scratch. Cached plans are never modified:
+    the update is made on a copy that replaces the cached plan only if no
+    other request replaced it first, so readers need no lock.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to plan
+
+    Returns:
+        DispatchPlan: Current plan
+    """
+    with _lock:
+        cached = _plans.get(dealership_id)
+        dirty = _dirty.pop(dealership_id, set())
+
+    try:
+        if (
+            cached is None
+            or monotonic() - cached.loaded_at > settings.DISPATCH_PLAN_CACHE_SECONDS
+        ):
+            plan = build_plan(db, dealership_id)
+            plan.version = cached.version + 1 if cached else 0
+        elif dirty:
+            plan = replace(
+                cached,
+                jobs=dict(cached.jobs),
+                base_load=dict(cached.base_load),
+                suggested=dict(cached.suggested),
+                version=cached.version + 1,
+            )
+            for job_id in dirty:
+                _remove_job(plan, job_id)
+            fresh = _load_jobs(db, _job_query(dealership_id, job_ids=dirty))
+            unassigned = _add_jobs(plan, fresh)
+            plan.suggested.update(
+                solve_greedy(unassigned, plan.technicians, plan.loads())
+            )
+        else:
+            return cached
+    except Exception:
+        _restore_dirty(dealership_id, dirty)
+        raise
+
+    with _lock:
+        current = _plans.get(dealership_id)
+        if current is cached:
+            _plans[dealership_id] = plan
+            return plan
+    # Replaced or invalidated meanwhile; the cached plan still lacks our changes
+    _restore_dirty(dealership_id, dirty)
+    return plan
+
+
+def _restore_dirty(dealership_id: int, dirty: Set[int]) -> None:
+    """Mark work orders dirty again after a failed or discarded update."""
+    if not dirty:
+        return
+    with _lock:
+        if dealership_id in _plans:
+            _dirty.setdefault(dealership_id, set()).update(dirty)
+
+
+def optimal_suggestions(plan: DispatchPlan) -> Dict[int, int]:
+    """
+    Re-solve a plan's unassigned jobs exactly when the batch is small.
+
+    Args:
+        plan: Current plan
+
+    Returns:
+        Dict[int, int]: Job id -> technician id (greedy for large batches)
+    """
+    unassigned = [plan.jobs[job_id] for job_id in plan.suggested]
+    if len(unassigned) > settings.DISPATCH_OPTIMAL_MAX_JOBS:
+        return dict(plan.suggested)
+    return solve_optimal(unassigned, plan.technicians, plan.base_load)
+
+
+def apply_suggestions(db: Session, suggestions: Dict[int, int]) -> int:
+    """
+    Persist suggested technicians onto still-unassigned work orders.
+
+    Args:
+        db: Database session
+        suggestions: Work order id -> technician id
+
+    Returns:
+        int: Number of work orders assigned
+    """
+    by_technician: Dict[int, List[int]] = {}
+    for job_id, tech_id in suggestions.items():
+        by_technician.setdefault(tech_id, []).append(job_id)
+
+    assigned = 0
+    for tech_id, job_ids in by_technician.items():
+        result = db.execute(
+            update(ServiceWorkOrder)
+            .where(ServiceWorkOrder.id.in_(job_ids))
+            .where(ServiceWorkOrder.technician_id.is_(None))
+            .values(technician_id=tech_id)
+            .execution_options(synchronize_session=False)
+        )
+        assigned += result.rowcount
+    invalidation.pending(db, "dispatch").update(
+        (None, job_id) for job_id in suggestions
+    )
+    db.commit()
+    return assigned
+
+
+def schedule_plan(
+    plan: DispatchPlan, suggestions: Dict[int, int]
+) -> Tuple[List[Dict[str, Any]], Dict[int, float]]:
+    """
+    Lay out each technician's queue with start offsets.
+
+    Args:
+        plan: Current plan
+        suggestions: Suggested assignments to show for unassigned jobs
+
+    Returns:
+        Tuple: Assignment dicts and total hours per technician
+    """
+    queues: Dict[int, List[Tuple[int, Job, bool]]] = {
+        tech_id: [] for tech_id in plan.technicians
+    }
+    for job in plan.jobs.values():
+        if job.technician_id in plan.technicians:
+            # In-progress work first, then pinned assignments
+            queues[job.technician_id].append((0 if job.in_progress else 1, job, True))
+        elif job.id in suggestions:
+            queues[suggestions[job.id]].append((2, job, False))
+
+    assignments = []
+    loads = {}
+    for tech_id, queue in queues.items():
+        offset = 0.0
+        for _, job, pinned in sorted(queue, key=lambda item: (item[0], item[1].id)):
+            assignments.append(
+                {
+                    "work_order_id": job.id,
+                    "work_order_number": job.work_order_number,
+                    "technician_id": tech_id,
+                    "estimated_hours": job.hours,
+                    "start_offset_hours": offset,
+                    "pinned": pinned,
+                    "in_progress": job.in_progress,
+                }
+            )
+            offset += job.hours
+        loads[tech_id] = offset
+    return assignments, loads
+
+
+def _mark_dirty(pending: Set[Tuple[Optional[int], int]]) -> None:
+    """Flag work orders dirty in every cached plan that may hold them."""
+    with _lock:
+        for dealership_id, job_id in pending:
+            targets = [dealership_id] if dealership_id is not None else list(_plans)
+            for target in targets:
+                if target in _plans:
+                    _dirty.setdefault(target, set()).add(job_id)
+
+
+def invalidate(dealership_id: Optional[int] = None) -> None:
+    """Drop cached plans for one dealership, or all of them."""
+    with _lock:
+        if dealership_id is None:
+            _plans.clear()
+            _dirty.clear()
+        else:
+            _plans.pop(dealership_id, None)
+            _dirty.pop(dealership_id, None)
+
+
+def _collect_order_changes(
+    session: Session, pending: Set[Tuple[Optional[int], int]]
+) -> None:
+    """Record work orders written in this flush."""
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, ServiceWorkOrder):
+            # The dealership lives on the appointment; avoid a lazy load here
+            # and let every cached plan re-check the order instead
+            pending.add((None, obj.id))
+
+
+def _collect_technician_changes(session: Session, pending: Set[int]) -> None:
+    """Record dealerships whose technicians changed in this flush."""
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, User) and obj.role == UserRole.SERVICE_TECHNICIAN:
+            pending.add(obj.dealership_id)
+
+
+def _invalidate_dealerships(pending: Set[int]) -> None:
+    """Drop plans whose technician roster changed."""
+    for dealership_id in pending:
+        invalidate(dealership_id)
+
+
+invalidation.subscribe("dispatch", _collect_order_changes, _mark_dirty)
+invalidation.subscribe(
+    "dispatch_technicians", _collect_technician_changes, _invalidate_dealerships
+)
@@ -0,0 +1,338 @@
+"""
+Resized image delivery.
+
+Any stored image can be requested at one of the ``IMAGE_SIZES``, cropped or
+transcoded at one of the ``IMAGE_QUALITIES``. The first
+request for a rendition decodes the original and encodes the result in the
+shared image process pool; the file is then kept under
+``<UPLOAD_DIR>/cache`` and later requests are served straight from disk.
+Concurrent requests for a rendition that is still being made wait on the
+same resize instead of starting their own.
+
+Rendition files are named after the original's content hash and the
+rendition parameters, so they never change once written and can be cached
+by browsers and proxies indefinitely. The cache directory is bounded by
+``IMAGE_CACHE_MAX_BYTES``; when it grows past that, the least recently
+served files are removed.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from opendms.core.config import settings
+from opendms.core.media import media_root
+from opendms.services.vehicle_images import get_pool
+
+logger = logging.getLogger(__name__)
+
+# Format name -> (Pillow format, MIME type)
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+
+FITS = ("contain", "cover")
+
+# Eviction trims the cache to this fraction of the limit so it does not run
+# again on the next write
+EVICT_TO = 0.9
+
+# Access times are refreshed at most this often per file
+TOUCH_SECONDS = 3600
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+_inflight: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+_cache_bytes: Optional[int] = None
+_evicting = False
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    """Size, crop and encoding of a rendition."""
+
+    width: Optional[int]
+    height: Optional[int]
+    fit: str
+    format: str
+    quality: int
+
+    @property
+    def name(self) -> str:
+        """File name of the rendition, unique per parameter set."""
+        return (
+            f"{self.width or 0}x{self.height or 0}-{self.fit}-q{self.quality}"
+            f".{self.format}"
+        )
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format][1]
+
+
+def parse_spec(
+    width: Optional[int],
+    height: Optional[int],
+    fit: str = "contain",
+    format: str = "jpeg",
+    quality: int = 80,
+) -> RenditionSpec:
+    """
+    Validate rendition parameters.
+
+    Args:
+        width: Maximum width, or width of the crop; one of ``IMAGE_SIZES``
+        height: Maximum height, or height of the crop; one of ``IMAGE_SIZES``
+        fit: ``contain`` scales within the box, ``cover`` crops to its
+            aspect ratio and scales down to fill it
+        format: ``webp`` or ``jpeg``
+        quality: Encoder quality, one of ``IMAGE_QUALITIES``
+
+    Returns:
+        RenditionSpec: The validated parameters
+
+    Raises:
+        ValueError: If a parameter is not one of the allowed values
+    """
+    for label, value in (("width", width), ("height", height)):
+        if value is not None and value not in settings.IMAGE_SIZES:
+            raise ValueError(
+                f"{label} must be one of: {_choices(settings.IMAGE_SIZES)}"
+            )
+    if fit not in FITS:
+        raise ValueError(f"fit must be one of: {', '.join(FITS)}")
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if quality not in settings.IMAGE_QUALITIES:
+        raise ValueError(
+            f"quality must be one of: {_choices(settings.IMAGE_QUALITIES)}"
+        )
+    if fit == "cover" and not (width and height):
+        # Cropping needs a box; with one side it is the same as contain
+        fit = "contain"
+    return RenditionSpec(width, height, fit, format, quality)
+
+
+def _choices(values: List[int]) -> str:
+    return ", ".join(str(value) for value in sorted(values))
+
+
+def validate_digest(digest: str) -> None:
+    """Raise ValueError unless ``digest`` is a SHA-256 hex digest."""
+    if not _DIGEST.match(digest):
+        raise ValueError("Not an image digest")
+
+
+def cache_root() -> str:
+    """Directory holding cached renditions."""
+    return os.path.join(media_root(), "cache")
+
+
+def cache_path(digest: str, spec: RenditionSpec) -> str:
+    """Path of a cached rendition."""
+    return os.path.join(cache_root(), digest[:2], digest, spec.name)
+
+
+def find_original(digest: str) -> Optional[str]:
+    """Path of the stored image with this content hash, if any."""
+    directory = os.path.join(media_root(), "images", digest[:2], digest)
+    try:
+        entries = os.listdir(directory)
+    except FileNotFoundError:
+        return None
+    for entry in entries:
+        if entry.startswith("original."):
+            return os.path.join(directory, entry)
+    return None
+
+
+def render(
+    original: str,
+    target: str,
+    width: Optional[int],
+    height: Optional[int],
+    fit: str,
+    format: str,
+    quality: int,
+) -> int:
+    """
+    Write one rendition of an image.
+
+    Runs in a worker process; the arguments are plain values so they pickle
+    cheaply. Images are never enlarged.
+
+    Returns:
+        int: Size of the written file in bytes
+    """
+    with Image.open(original) as source:
+        longest = max(width or 0, height or 0)
+        if longest:
+            # A square box stays large enough whatever the EXIF rotation
+            source.draft("RGB", (longest, longest))
+        image = ImageOps.exif_transpose(source)
+
+    pillow_format = FORMATS[format][0]
+    if pillow_format == "WEBP" and image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+    else:
+        image = image.convert("RGB")
+
+    if fit == "cover":
+        # Crop to the box's aspect ratio; if the image is smaller than the
+        # box, the crop keeps the image's own resolution
+        scale = min(1.0, image.width / width, image.height / height)
+        box = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+    elif longest:
+        image.thumbnail(
+            (width or image.width, height or image.height), Image.Resampling.LANCZOS
+        )
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    options = {"quality": quality}
+    if pillow_format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    image.save(temp_path, pillow_format, **options)
+    os.replace(temp_path, target)
+    return os.path.getsize(target)
+
+
+def _touch(path: str) -> bool:
+    """Record a cache hit; return False if the file is not cached."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    now = time.time()
+    if now - stat.st_atime > TOUCH_SECONDS:
+        # Eviction goes by access time; set it explicitly because the
+        # filesystem may be mounted noatime
+        os.utime(path, (now, stat.st_mtime))
+    return True
+
+
+async def get_rendition(digest: str, spec: RenditionSpec) -> Optional[str]:
+    """
+    Return the path of a rendition, making it first if needed.
+
+    Args:
+        digest: SHA-256 of the stored original
+        spec: Rendition parameters
+
+    Returns:
+        Optional[str]: Path of the rendition, or None if there is no such
+        image
+
+    Raises:
+        ValueError: If ``digest`` is not a SHA-256 hex digest
+    """
+    validate_digest(digest)
+    path = cache_path(digest, spec)
+    if _touch(path):
+        return path
+
+    future = _inflight.get(path)
+    if future is None:
+        future = asyncio.ensure_future(_make_rendition(digest, spec, path))
+        _inflight[path] = future
+        future.add_done_callback(lambda _, key=path: _inflight.pop(key, None))
+    # One waiter disconnecting must not cancel the resize for the others
+    return await asyncio.shield(future)
+
+
+async def _make_rendition(digest: str, spec: RenditionSpec, path: str) -> Optional[str]:
+    original = await run_in_threadpool(find_original, digest)
+    if original is None:
+        return None
+    started = time.perf_counter()
+    size = await asyncio.get_running_loop().run_in_executor(
+        get_pool(),
+        render,
+        original,
+        path,
+        spec.width,
+        spec.height,
+        spec.fit,
+        spec.format,
+        spec.quality,
+    )
+    logger.debug(
+        "Rendered %s/%s in %.3fs", digest, spec.name, time.perf_counter() - started
+    )
+    await _account(size)
+    return path
+
+
+async def _account(size: int) -> None:
+    """Add a new rendition to the cache size and evict if over the limit."""
+    global _cache_bytes, _evicting
+    with _lock:
+        if _cache_bytes is not None:
+            _cache_bytes += size
+            if _cache_bytes <= settings.IMAGE_CACHE_MAX_BYTES:
+                return
+        if _evicting:
+            return
+        _evicting = True
+    try:
+        await run_in_threadpool(evict)
+    finally:
+        with _lock:
+            _evicting = False
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """
+    Remove least recently served renditions until the cache fits.
+
+    Also (re)counts the cache size, which is otherwise only tracked in
+    memory.
+
+    Args:
+        max_bytes: Limit to enforce, defaults to ``IMAGE_CACHE_MAX_BYTES``
+
+    Returns:
+        int: Number of files removed
+    """
+    global _cache_bytes
+    limit = settings.IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    files: List[Tuple[float, int, str]] = []
+    total = 0
+    for directory, _, names in os.walk(cache_root()):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_atime, stat.st_size, path))
+            total += stat.st_size
+
+    removed = 0
+    if total > limit:
+        target = limit * EVICT_TO
+        files.sort()
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        logger.info("Image cache evicted %d files, %d bytes remain", removed, total)
+
+    with _lock:
+        _cache_bytes = total
+    return removed
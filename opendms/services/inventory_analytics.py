@@ -0,0 +1,334 @@
+"""
+Inventory aging and turn analytics.
+
+Vehicle facts (stock date, sale date, cost, asking price) for a dealership are
+pulled with one set-based query into NumPy columns and cached per dealership.
+Ages are derived at read time, so the cached extract never goes stale by the
+clock. Writes that change a vehicle's status or record a sale only mark that
+vehicle dirty, and the next read re-queries just the dirty rows and patches
+the cached columns in place of a full reload.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.inventory import Vehicle, VehicleStatus
+from opendms.models.sale import Sale, SaleStatus
+
+# Upper bounds (inclusive, in days) of the aging buckets; the last is open
+AGING_BUCKETS = (30, 60, 90, 120)
+
+# Statuses counted as on-hand inventory
+IN_STOCK_STATUSES = (
+    VehicleStatus.AVAILABLE,
+    VehicleStatus.RESERVED,
+    VehicleStatus.IN_TRANSIT,
+    VehicleStatus.SERVICE,
+)
+
+
+@dataclass
+class InventorySnapshot:
+    """Cached per-vehicle columns for one dealership."""
+
+    vehicle_id: np.ndarray
+    stocked_at: np.ndarray  # datetime64[s]
+    sold_at: np.ndarray  # datetime64[s], NaT while unsold
+    in_stock: np.ndarray  # bool
+    cost_price: np.ndarray  # float64, NaN when unknown
+    sale_price: np.ndarray  # float64, NaN when unknown
+    details: Dict[int, Dict[str, Any]]  # display fields by vehicle id
+    loaded_at: float
+
+
+_cache: Dict[int, InventorySnapshot] = {}
+_dirty: Dict[int, Set[int]] = {}
+_lock = threading.Lock()
+
+
+def _vehicle_query(
+    dealership_id: int, since: datetime, vehicle_ids: Optional[Set[int]] = None
+) -> Any:
+    """Select on-hand vehicles plus vehicles sold since ``since``."""
+    sales = (
+        select(Sale.vehicle_id, func.min(Sale.sale_date).label("sold_at"))
+        .where(Sale.dealership_id == dealership_id)
+        .where(Sale.sale_date >= since)
+        .where(Sale.status != SaleStatus.CANCELLED)
+    )
+    if vehicle_ids is not None:
+        sales = sales.where(Sale.vehicle_id.in_(vehicle_ids))
+    first_sale = sales.group_by(Sale.vehicle_id).subquery()
+
+    stmt = (
+        select(
+            Vehicle.id,
+            Vehicle.stock_number,
+            Vehicle.vin,
+            Vehicle.year,
+            Vehicle.make,
+            Vehicle.model,
+            Vehicle.status,
+            Vehicle.created_at,
+            Vehicle.cost_price,
+            Vehicle.sale_price,
+            first_sale.c.sold_at,
+        )
+        .outerjoin(first_sale, first_sale.c.vehicle_id == Vehicle.id)
+        .where(Vehicle.dealership_id == dealership_id)
+        .where(
+            or_(
+                Vehicle.status.in_(IN_STOCK_STATUSES),
+                first_sale.c.sold_at.isnot(None),
+            )
+        )
+    )
+    if vehicle_ids is not None:
+        stmt = stmt.where(Vehicle.id.in_(vehicle_ids))
+    return stmt
+
+
+def _build_snapshot(rows: List[Any]) -> InventorySnapshot:
+    """Convert query rows into a snapshot."""
+    columns = list(zip(*rows, strict=True)) if rows else [()] * 11
+    statuses = columns[6]
+    return InventorySnapshot(
+        vehicle_id=np.array(columns[0], dtype=np.int64),
+        stocked_at=np.array(columns[7], dtype="datetime64[s]"),
+        sold_at=np.array(columns[10], dtype="datetime64[s]"),
+        in_stock=np.array(
+            [status in IN_STOCK_STATUSES for status in statuses], dtype=bool
+        ),
+        cost_price=np.array(columns[8], dtype=np.float64),
+        sale_price=np.array(columns[9], dtype=np.float64),
+        details={
+            row[0]: {
+                "id": row[0],
+                "stock_number": row[1],
+                "vin": row[2],
+                "year": row[3],
+                "make": row[4],
+                "model": row[5],
+                "status": row[6].value,
+            }
+            for row in rows
+        },
+        loaded_at=time.monotonic(),
+    )
+
+
+def _merge(
+    snapshot: InventorySnapshot, refreshed_ids: Set[int], fresh: InventorySnapshot
+) -> InventorySnapshot:
+    """Replace the rows for ``refreshed_ids`` with ``fresh`` rows."""
+    keep = ~np.isin(snapshot.vehicle_id, np.fromiter(refreshed_ids, dtype=np.int64))
+    details = {
+        vehicle_id: detail
+        for vehicle_id, detail in snapshot.details.items()
+        if vehicle_id not in refreshed_ids
+    }
+    details.update(fresh.details)
+    return InventorySnapshot(
+        vehicle_id=np.concatenate((snapshot.vehicle_id[keep], fresh.vehicle_id)),
+        stocked_at=np.concatenate((snapshot.stocked_at[keep], fresh.stocked_at)),
+        sold_at=np.concatenate((snapshot.sold_at[keep], fresh.sold_at)),
+        in_stock=np.concatenate((snapshot.in_stock[keep], fresh.in_stock)),
+        cost_price=np.concatenate((snapshot.cost_price[keep], fresh.cost_price)),
+        sale_price=np.concatenate((snapshot.sale_price[keep], fresh.sale_price)),
+        details=details,
+        loaded_at=snapshot.loaded_at,
+    )
+
+
+def get_snapshot(db: Session, dealership_id: int) -> InventorySnapshot:
+    """
+    Return the cached snapshot for a dealership, refreshing as needed.
+
+    A missing or expired snapshot is loaded in full; otherwise only vehicles
+    marked dirty since the last read are re-queried.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to load
+
+    Returns:
+        InventorySnapshot: Current inventory columns
+    """
+    since = datetime.utcnow() - timedelta(days=settings.INVENTORY_TURN_LOOKBACK_DAYS)
+
+    with _lock:
+        snapshot = _cache.get(dealership_id)
+        dirty = _dirty.pop(dealership_id, set())
+
+    expired = (
+        snapshot is not None
+        and time.monotonic() - snapshot.loaded_at
+        > settings.INVENTORY_ANALYTICS_CACHE_SECONDS
+    )
+    if snapshot is None or expired:
+        rows = db.execute(_vehicle_query(dealership_id, since)).all()
+        snapshot = _build_snapshot(rows)
+    elif dirty:
+        stmt = _vehicle_query(dealership_id, since, vehicle_ids=dirty)
+        fresh = _build_snapshot(db.execute(stmt).all())
+        snapshot = _merge(snapshot, dirty, fresh)
+
+    with _lock:
+        _cache[dealership_id] = snapshot
+    return snapshot
+
+
+def invalidate(dealership_id: Optional[int] = None) -> None:
+    """Drop cached snapshots for one dealership, or all of them."""
+    with _lock:
+        if dealership_id is None:
+            _cache.clear()
+            _dirty.clear()
+        else:
+            _cache.pop(dealership_id, None)
+            _dirty.pop(dealership_id, None)
+
+
+def compute_analytics(
+    snapshot: InventorySnapshot,
+    now: Optional[datetime] = None,
+    stale_days: Optional[int] = None,
+    stale_limit: int = 50,
+) -> Dict[str, Any]:
+    """
+    Compute aging buckets, turn and spread metrics from a snapshot.
+
+    Args:
+        snapshot: Inventory columns for one dealership
+        now: Reference time, defaults to the current UTC time
+        stale_days: Age after which an on-hand unit is stale
+        stale_limit: Maximum stale units to return, oldest first
+
+    Returns:
+        Dict[str, Any]: Metrics matching ``InventoryAnalyticsResponse``
+    """
+    now64 = np.datetime64(now or datetime.utcnow(), "s")
+    stale_days = stale_days if stale_days is not None else settings.INVENTORY_STALE_DAYS
+    seconds_per_day = 86400.0
+
+    in_stock = snapshot.in_stock
+    sold = ~np.isnat(snapshot.sold_at) & ~in_stock
+
+    age_days = (now64 - snapshot.stocked_at).astype(np.float64) / seconds_per_day
+    days_to_sale = (snapshot.sold_at - snapshot.stocked_at).astype(
+        np.float64
+    ) / seconds_per_day
+
+    stock_age = age_days[in_stock]
+    stock_cost = snapshot.cost_price[in_stock]
+    bucket_index = np.searchsorted(np.array(AGING_BUCKETS), stock_age, side="left")
+    n_buckets = len(AGING_BUCKETS) + 1
+    bucket_units = np.bincount(bucket_index, minlength=n_buckets)
+    bucket_cost = np.bincount(
+        bucket_index, weights=np.nan_to_num(stock_cost), minlength=n_buckets
+    )
+
+    lower_bounds = (0,) + tuple(bound + 1 for bound in AGING_BUCKETS)
+    upper_bounds = AGING_BUCKETS + (None,)
+    buckets = [
+        {
+            "label": f"{low}-{high}" if high is not None else f"{low}+",
+            "min_days": low,
+            "max_days": high,
+            "units": int(bucket_units[i]),
+            "total_cost": float(bucket_cost[i]),
+        }
+        for i, (low, high) in enumerate(zip(lower_bounds, upper_bounds, strict=True))
+    ]
+
+    daily_rate = settings.INVENTORY_FLOORPLAN_RATE / 100.0 / 365.0
+    holding_cost = np.nan_to_num(snapshot.cost_price) * daily_rate * age_days
+    spread = snapshot.sale_price - snapshot.cost_price
+
+    units_in_stock = int(in_stock.sum())
+    units_sold = int(sold.sum())
+    lookback_years = settings.INVENTORY_TURN_LOOKBACK_DAYS / 365.0
+    turn_rate = units_sold / lookback_years / units_in_stock if units_in_stock else None
+
+    stale_mask = in_stock & (age_days > stale_days)
+    stale_positions = np.flatnonzero(stale_mask)
+    stale_positions = stale_positions[np.argsort(-age_days[stale_positions])]
+    stale_units = [
+        {
+            **snapshot.details[int(snapshot.vehicle_id[i])],
+            "days_in_stock": int(age_days[i]),
+            "cost_price": _optional(snapshot.cost_price[i]),
+            "sale_price": _optional(snapshot.sale_price[i]),
+            "spread": _optional(spread[i]),
+            "holding_cost": round(float(holding_cost[i]), 2),
+        }
+        for i in stale_positions[:stale_limit]
+    ]
+
+    return {
+        "units_in_stock": units_in_stock,
+        "units_sold": units_sold,
+        "average_age_days": _mean(stock_age),
+        "average_days_to_sale": _mean(days_to_sale[sold]),
+        "turn_rate": turn_rate,
+        "total_cost": float(np.nansum(stock_cost)),
+        "average_spread": _mean(spread[in_stock]),
+        "total_holding_cost": round(float(holding_cost[in_stock].sum()), 2),
+        "aging_buckets": buckets,
+        "stale_units_count": int(stale_mask.sum()),
+        "stale_units": stale_units,
+    }
+
+
+def _optional(value: float) -> Optional[float]:
+    """Convert NaN to None for JSON output."""
+    return None if np.isnan(value) else float(value)
+
+
+def _mean(values: np.ndarray) -> Optional[float]:
+    """NaN-aware mean returning None for empty input."""
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if values.size else None
+
+
+def _collect_changed_vehicles(session: Session, pending: Set[Tuple[int, int]]) -> None:
+    """Record vehicles whose analytics inputs changed in this flush."""
+    for obj in session.new:
+        if isinstance(obj, Vehicle):
+            pending.add((obj.dealership_id, obj.id))
+        elif isinstance(obj, Sale):
+            pending.add((obj.dealership_id, obj.vehicle_id))
+    for obj in session.dirty:
+        if isinstance(obj, Vehicle):
+            state = inspect(obj)
+            if any(
+                state.attrs[name].history.has_changes()
+                for name in ("status", "cost_price", "sale_price", "created_at")
+            ):
+                pending.add((obj.dealership_id, obj.id))
+        elif isinstance(obj, Sale) and inspect(obj).attrs.status.history.has_changes():
+            pending.add((obj.dealership_id, obj.vehicle_id))
+    for obj in session.deleted:
+        if isinstance(obj, (Vehicle, Sale)):
+            vehicle_id = obj.id if isinstance(obj, Vehicle) else obj.vehicle_id
+            pending.add((obj.dealership_id, vehicle_id))
+
+
+def _mark_dirty(pending: Set[Tuple[int, int]]) -> None:
+    """Mark committed vehicle changes dirty for the next analytics read."""
+    with _lock:
+        for dealership_id, vehicle_id in pending:
+            if dealership_id in _cache:
+                _dirty.setdefault(dealership_id, set()).add(vehicle_id)
+
+
+invalidation.subscribe("inventory_analytics", _collect_changed_vehicles, _mark_dirty)
@@ -0,0 +1,243 @@
+"""
+Background job catalogue.
+
+Work that is too slow for the request path is registered here as a job type:
+a handler taking a database session plus JSON parameters, and the Celery
+queue it runs on. ``opendms.worker`` executes jobs and the ``/jobs`` API
+submits and tracks them, so adding a job type needs no new task or route.
+"""
+
+import inspect
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from opendms.core.partitioning import maintain_partitions
+from opendms.schemas.customer import DuplicateReport
+from opendms.schemas.inventory import InventoryAnalyticsResponse
+from opendms.schemas.report import (
+    SalesReportResponse,
+    SalesReportRow,
+    SalesTrendPoint,
+    SalesTrendResponse,
+)
+from opendms.services.audit import prune_audit_log
+from opendms.services.caller_id import backfill_contact_keys
+from opendms.services.dedup import scan_dealership
+from opendms.services.inventory_analytics import compute_analytics, get_snapshot
+from opendms.services.reminders import send_due_reminders
+from opendms.services.reporting import (
+    GROUP_BY_FIELDS,
+    load_sales_cube,
+    monthly_trend,
+    summarize,
+)
+from opendms.services.sale_documents import migrate_legacy_documents, purge_uploads
+
+# Queues; workers choose which to consume with ``-Q``
+QUEUE_DEFAULT = "default"
+QUEUE_REPORTS = "reports"
+QUEUE_EMAILS = "emails"
+QUEUE_INTEGRATIONS = "integrations"
+
+QUEUES = (QUEUE_DEFAULT, QUEUE_REPORTS, QUEUE_EMAILS, QUEUE_INTEGRATIONS)
+
+
+@dataclass(frozen=True)
+class JobType:
+    """A kind of background job and where it runs."""
+
+    name: str
+    queue: str
+    handler: Callable[..., Any]
+    description: str
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO 8601 job parameter."""
+    return datetime.fromisoformat(value) if value else None
+
+
+def sales_report(
+    db: Session,
+    group_by: Optional[List[str]] = None,
+    dealership_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the ``/reports/sales`` response."""
+    group_by = group_by or ["month"]
+    unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown group_by field(s): {', '.join(unknown)}")
+
+    cube = load_sales_cube(
+        db,
+        dealership_id=dealership_id,
+        start_date=_parse_datetime(start_date),
+        end_date=_parse_datetime(end_date),
+    )
+    totals = summarize(cube, [])
+    return SalesReportResponse(
+        group_by=group_by,
+        rows=[SalesReportRow(**row) for row in summarize(cube, group_by)],
+        totals=SalesReportRow(**totals[0]) if totals else None,
+    ).model_dump(mode="json")
+
+
+def sales_trend(
+    db: Session,
+    dealership_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the ``/reports/sales/trend`` response."""
+    cube = load_sales_cube(
+        db,
+        dealership_id=dealership_id,
+        start_date=_parse_datetime(start_date),
+        end_date=_parse_datetime(end_date),
+    )
+    return SalesTrendResponse(
+        points=[SalesTrendPoint(**point) for point in monthly_trend(cube)]
+    ).model_dump(mode="json")
+
+
+def inventory_analytics(
+    db: Session,
+    dealership_id: int,
+    stale_days: Optional[int] = None,
+    stale_limit: int = 50,
+) -> Dict[str, Any]:
+    """Build the ``/inventory/analytics`` response."""
+    snapshot = get_snapshot(db, dealership_id)
+    return InventoryAnalyticsResponse(
+        dealership_id=dealership_id,
+        **compute_analytics(snapshot, stale_days=stale_days, stale_limit=stale_limit),
+    ).model_dump(mode="json")
+
+
+def customer_duplicates(
+    db: Session,
+    dealership_id: int,
+    min_score: Optional[float] = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Scan a dealership's customers for likely duplicates."""
+    return DuplicateReport(
+        **scan_dealership(db, dealership_id, min_score=min_score, limit=limit)
+    ).model_dump(mode="json")
+
+
+def customer_contact_backfill(db: Session, batch_size: int = 1000) -> Dict[str, Any]:
+    """Fill normalized phone and email on customers that predate them."""
+    return {"customers_checked": backfill_contact_keys(db, batch_size=batch_size)}
+
+
+def sale_document_migration(db: Session, batch_size: int = 500) -> Dict[str, Any]:
+    """Move legacy JSON document URLs on sales into sale_documents."""
+    return migrate_legacy_documents(db, batch_size=batch_size)
+
+
+def document_upload_cleanup(db: Session) -> Dict[str, Any]:
+    """Remove abandoned chunked document uploads."""
+    return {"uploads_removed": purge_uploads()}
+
+
+def service_reminders(db: Session) -> Dict[str, Any]:
+    """Send due service reminders now instead of waiting for beat."""
+    return send_due_reminders(db).as_dict()
+
+
+def audit_log_retention(db: Session) -> Dict[str, Any]:
+    """Delete audit entries older than AUDIT_RETENTION_DAYS."""
+    return {"entries_deleted": prune_audit_log(db)}
+
+
+def partition_maintenance(db: Session) -> Dict[str, Any]:
+    """Create upcoming partitions and archive expired ones."""
+    maintain_partitions(db.get_bind())
+    return {"status": "ok"}
+
+
+JOB_TYPES: Dict[str, JobType] = {
+    job.name: job
+    for job in (
+        JobType(
+            "sales_report",
+            QUEUE_REPORTS,
+            sales_report,
+            "Sales and gross profit grouped by the requested fields",
+        ),
+        JobType(
+            "sales_trend",
+            QUEUE_REPORTS,
+            sales_trend,
+            "Monthly sales totals with month-over-month change",
+        ),
+        JobType(
+            "inventory_analytics",
+            QUEUE_REPORTS,
+            inventory_analytics,
+            "Inventory aging, turn and stale units for a dealership",
+        ),
+        JobType(
+            "customer_duplicates",
+            QUEUE_REPORTS,
+            customer_duplicates,
+            "Likely duplicate customers in a dealership, grouped for merging",
+        ),
+        JobType(
+            "customer_contact_backfill",
+            QUEUE_DEFAULT,
+            customer_contact_backfill,
+            "Normalize customer phones and emails for caller-ID lookup",
+        ),
+        JobType(
+            "sale_document_migration",
+            QUEUE_DEFAULT,
+            sale_document_migration,
+            "Move legacy sale document URLs into the document store",
+        ),
+        JobType(
+            "document_upload_cleanup",
+            QUEUE_DEFAULT,
+            document_upload_cleanup,
+            "Remove chunked document uploads abandoned past their expiry",
+        ),
+        JobType(
+            "service_reminders",
+            QUEUE_EMAILS,
+            service_reminders,
+            "Send reminders for upcoming service appointments",
+        ),
+        JobType(
+            "audit_log_retention",
+            QUEUE_DEFAULT,
+            audit_log_retention,
+            "Delete audit log entries past the retention period",
+        ),
+        JobType(
+            "partition_maintenance",
+            QUEUE_DEFAULT,
+            partition_maintenance,
+            "Create and archive monthly table partitions",
+        ),
+    )
+}
+
+
+def validate_params(job_type: JobType, params: Dict[str, Any]) -> None:
+    """
+    Check job parameters against the handler signature before queueing.
+
+    Args:
+        job_type: Registered job type
+        params: Keyword arguments for the handler
+
+    Raises:
+        TypeError: If parameters are missing or unexpected
+    """
+    inspect.signature(job_type.handler).bind(None, **params)
@@ -0,0 +1,192 @@
+"""
+Contact detail normalization.
+
+Customers arrive from walk-ins, web leads and DMS imports with phones, emails,
+names and addresses in whatever shape the source used. These helpers reduce
+them to canonical forms for matching and lookup. They are deliberately
+conservative: a value that cannot be normalized confidently becomes ``None``
+rather than a guess.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+DEFAULT_COUNTRY_CODE = "1"
+
+# Placeholders staff type to get past required fields
+PLACEHOLDER_EMAIL_LOCALS = {"none", "noemail", "no", "na", "n/a", "test", "unknown"}
+
+# Mailbox providers that ignore dots in the local part
+DOTLESS_EMAIL_DOMAINS = {"gmail.com", "googlemail.com"}
+
+NICKNAMES = {
+    "alex": "alexander",
+    "andy": "andrew",
+    "bill": "william",
+    "billy": "william",
+    "bob": "robert",
+    "bobby": "robert",
+    "chris": "christopher",
+    "dan": "daniel",
+    "danny": "daniel",
+    "dave": "david",
+    "jim": "james",
+    "jimmy": "james",
+    "joe": "joseph",
+    "jon": "john",
+    "johnny": "john",
+    "kate": "katherine",
+    "katie": "katherine",
+    "kathy": "katherine",
+    "liz": "elizabeth",
+    "beth": "elizabeth",
+    "matt": "matthew",
+    "mike": "michael",
+    "nick": "nicholas",
+    "pat": "patricia",
+    "rob": "robert",
+    "sam": "samuel",
+    "steve": "steven",
+    "stephen": "steven",
+    "sue": "susan",
+    "tom": "thomas",
+    "tommy": "thomas",
+    "tony": "anthony",
+}
+
+ADDRESS_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "boulevard": "blvd",
+    "highway": "hwy",
+    "parkway": "pkwy",
+    "circle": "cir",
+    "terrace": "ter",
+    "suite": "ste",
+    "apartment": "apt",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+_non_digits = re.compile(r"\D+")
+_non_letters = re.compile(r"[^a-z]+")
+_non_alnum = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """
+    Convert a phone number to E.164.
+
+    Bare 10-digit numbers are assumed to be North American. Extensions
+    (``x123``, ``ext. 123``) are dropped.
+
+    Args:
+        value: Phone number in any common format
+
+    Returns:
+        Optional[str]: ``+<country><number>``, or None if not a plausible number
+    """
+    if not value:
+        return None
+    value = re.split(r"(?i)\s*(?:x|ext\.?|extension)\s*\d+\s*$", value.strip())[0]
+    international = value.startswith("+") or value.startswith("00")
+    digits = _non_digits.sub("", value)
+    if value.startswith("00"):
+        digits = digits[2:]
+
+    if not international:
+        if len(digits) == 10:
+            digits = DEFAULT_COUNTRY_CODE + digits
+        elif not (len(digits) == 11 and digits.startswith(DEFAULT_COUNTRY_CODE)):
+            return None
+    if not 8 <= len(digits) <= 15:
+        return None
+    # Runs of one digit (000-000-0000) are placeholders
+    if len(set(digits[-7:])) == 1:
+        return None
+    return f"+{digits}"
+
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    """Lowercase and trim an email, dropping obvious placeholders."""
+    if not value:
+        return None
+    email = value.strip().lower()
+    local, _, domain = email.partition("@")
+    if not local or "." not in domain or local in PLACEHOLDER_EMAIL_LOCALS:
+        return None
+    return email
+
+
+def email_match_key(email: Optional[str]) -> Optional[str]:
+    """
+    Reduce a normalized email to the mailbox it delivers to.
+
+    Plus-addressing tags are removed, as are dots for providers that ignore
+    them, so ``J.Smith+cars@gmail.com`` and ``jsmith@gmail.com`` match.
+    """
+    if not email:
+        return None
+    local, _, domain = email.partition("@")
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Fold accents and case and keep letters only; map common nicknames."""
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKD", value)
+    letters = _non_letters.sub("", folded.encode("ascii", "ignore").decode().lower())
+    return NICKNAMES.get(letters, letters)
+
+
+def normalize_address(line: Optional[str], zip_code: Optional[str]) -> Optional[str]:
+    """Canonical ``<street words>|<zip5>`` key for an address line."""
+    if not line:
+        return None
+    words = _non_alnum.sub(" ", line.lower()).split()
+    street = " ".join(ADDRESS_ABBREVIATIONS.get(word, word) for word in words)
+    return f"{street}|{normalize_zip(zip_code) or ''}"
+
+
+def normalize_zip(value: Optional[str]) -> Optional[str]:
+    """First five digits of a US ZIP code."""
+    digits = _non_digits.sub("", value or "")
+    return digits[:5] if len(digits) >= 5 else None
+
+
+def soundex(name: str) -> str:
+    """American Soundex code of an already-normalized name."""
+    if not name:
+        return ""
+    codes = {
+        **dict.fromkeys("bfpv", "1"),
+        **dict.fromkeys("cgjkqsxz", "2"),
+        **dict.fromkeys("dt", "3"),
+        "l": "4",
+        **dict.fromkeys("mn", "5"),
+        "r": "6",
+    }
+    result = name[0].upper()
+    previous = codes.get(name[0], "")
+    for char in name[1:]:
+        code = codes.get(char, "")
+        if code and code != previous:
+            result += code
+            if len(result) == 4:
+                break
+        if char not in "hw":
+            previous = code
+    return result.ljust(4, "0")
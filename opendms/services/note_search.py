@@ -0,0 +1,484 @@
+"""
+Full-text search over customer notes.
+
+Queries are a list of words, ``"quoted phrases"`` and ``prefix*`` terms,
+all of which must match. On PostgreSQL they run against a GIN index over
+``to_tsvector(title || content)``; PostgreSQL maintains the index itself as
+notes are inserted and updated, and results are ranked with ``ts_rank_cd``.
+
+Other databases (SQLite in development) use an in-process inverted index per
+dealership with positional postings, built on the first search. A committed
+note write queues that note, and the next search drops its old postings and
+tokenizes the new text before querying, so the index never needs a full
+rebuild. Results are ranked with BM25.
+
+Highlighting is done here for both backends so snippets look the same and
+note text is always HTML-escaped around the ``<mark>`` tags.
+"""
+
+import bisect
+import heapq
+import html
+import math
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.customer import Customer, CustomerNote
+
+SEARCH_INDEX_NAME = "ix_customer_notes_search"
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Characters of context either side of the first match in a snippet
+SNIPPET_CONTEXT = 80
+
+_token = re.compile(r"[a-z0-9]+")
+_query_part = re.compile(r'"([^"]*)"|(\S+)')
+_suffixes = ("ing", "ed", "es", "s")
+
+
+@dataclass
+class QueryTerm:
+    """One required part of a search query."""
+
+    kind: str  # "word", "prefix" or "phrase"
+    words: List[str]
+
+
+@lru_cache(maxsize=65536)
+def _stem(word: str) -> str:
+    """Strip common English suffixes so ``calls`` matches ``call``."""
+    for suffix in _suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """Lowercase alphanumeric words of a text, stemmed."""
+    return [_stem(word) for word in _token.findall((value or "").lower())]
+
+
+def parse_query(query: str) -> List[QueryTerm]:
+    """
+    Split a search string into words, phrases and prefixes.
+
+    Args:
+        query: e.g. ``"third row" callback tues*``
+
+    Returns:
+        List[QueryTerm]: Terms that must all match
+
+    Raises:
+        ValueError: If the query has nothing searchable
+    """
+    terms = []
+    for phrase, word in _query_part.findall(query.lower()):
+        if phrase:
+            words = _token.findall(phrase)
+            if len(words) > 1:
+                terms.append(QueryTerm("phrase", words))
+                continue
+            word = words[0] if words else ""
+        if word.endswith("*"):
+            words = _token.findall(word)
+            if words:
+                terms.append(QueryTerm("prefix", [words[-1]]))
+                terms.extend(QueryTerm("word", [w]) for w in words[:-1])
+            continue
+        terms.extend(QueryTerm("word", [w]) for w in _token.findall(word))
+    if not terms:
+        raise ValueError("Search query has no searchable words")
+    return terms
+
+
+def highlight(content: str, terms: List[QueryTerm]) -> str:
+    """
+    Build an HTML snippet of ``content`` with matching words in ``<mark>``.
+
+    Args:
+        content: Note text
+        terms: Parsed query
+
+    Returns:
+        str: Escaped snippet around the first match
+    """
+    stems = {
+        _stem(word) for term in terms if term.kind != "prefix" for word in term.words
+    }
+    # As in the index, a prefix also matches through its stem
+    prefixes = tuple(
+        prefix
+        for term in terms
+        if term.kind == "prefix"
+        for prefix in {term.words[0], _stem(term.words[0])}
+    )
+
+    spans = [
+        match.span()
+        for match in _token.finditer(content.lower())
+        if _stem(match.group()) in stems
+        or (
+            prefixes
+            and (
+                match.group().startswith(prefixes)
+                or _stem(match.group()).startswith(prefixes)
+            )
+        )
+    ]
+    start = max(0, spans[0][0] - SNIPPET_CONTEXT) if spans else 0
+    end = min(len(content), (spans[0][1] if spans else 0) + SNIPPET_CONTEXT * 2)
+
+    parts = ["…" if start else ""]
+    position = start
+    for span_start, span_end in spans:
+        if span_start < start or span_end > end:
+            continue
+        parts.append(html.escape(content[position:span_start]))
+        parts.append(f"<mark>{html.escape(content[span_start:span_end])}</mark>")
+        position = span_end
+    parts.append(html.escape(content[position:end]))
+    parts.append("…" if end < len(content) else "")
+    return "".join(parts)
+
+
+def _language() -> str:
+    language = settings.NOTE_SEARCH_LANGUAGE
+    if not language.isalpha():
+        raise ValueError(f"Invalid text search configuration: {language!r}")
+    return language
+
+
+def _document_sql(qualify: bool = True) -> str:
+    """Text search document; must match the index expression exactly."""
+    prefix = "customer_notes." if qualify else ""
+    return (
+        f"to_tsvector('{_language()}', "
+        f"coalesce({prefix}title, '') || ' ' || {prefix}content)"
+    )
+
+
+def ensure_search_index(bind: Engine) -> None:
+    """Create the PostgreSQL GIN index on notes if it is missing."""
+    if bind.dialect.name != "postgresql":
+        return
+    with bind.begin() as conn:
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX_NAME} "
+                f"ON customer_notes USING gin ({_document_sql(qualify=False)})"
+            )
+        )
+
+
+def _tsquery(terms: List[QueryTerm]) -> Any:
+    """Combine query terms into one PostgreSQL ``tsquery``."""
+    language = _language()
+    parts = []
+    for term in terms:
+        if term.kind == "phrase":
+            parts.append(func.phraseto_tsquery(language, " ".join(term.words)))
+        elif term.kind == "prefix":
+            # Words are [a-z0-9] only, so no tsquery syntax can leak in
+            parts.append(func.to_tsquery(language, f"{term.words[0]}:*"))
+        else:
+            parts.append(func.plainto_tsquery(language, term.words[0]))
+    query = parts[0]
+    for part in parts[1:]:
+        query = query.op("&&")(part)
+    return query
+
+
+_hit_columns = (
+    CustomerNote.id,
+    CustomerNote.customer_id,
+    Customer.first_name,
+    Customer.last_name,
+    CustomerNote.title,
+    CustomerNote.note_type,
+    CustomerNote.content,
+    CustomerNote.created_at,
+)
+
+
+def _search_postgres(
+    db: Session, dealership_id: int, terms: List[QueryTerm], limit: int
+) -> List[Tuple[Any, float]]:
+    document = literal_column(_document_sql())
+    query = _tsquery(terms)
+    rank = func.ts_rank_cd(document, query)
+    stmt = (
+        select(*_hit_columns, rank.label("rank"))
+        .join(Customer, Customer.id == CustomerNote.customer_id)
+        .where(Customer.dealership_id == dealership_id, document.op("@@")(query))
+        .order_by(rank.desc(), CustomerNote.created_at.desc())
+        .limit(limit)
+    )
+    return [(row, float(row.rank)) for row in db.execute(stmt)]
+
+
+@dataclass
+class NoteIndex:
+    """Positional inverted index over one dealership's notes."""
+
+    postings: Dict[str, Dict[int, Tuple[int, ...]]] = field(
+        default_factory=lambda: defaultdict(dict)
+    )
+    lengths: Dict[int, int] = field(default_factory=dict)
+    terms: Dict[int, Set[str]] = field(default_factory=dict)
+    vocabulary: List[str] = field(default_factory=list)  # sorted, for prefixes
+    total_length: int = 0
+
+    def add(self, note_id: int, title: Optional[str], content: str) -> None:
+        self.remove(note_id)
+        tokens = tokenize(title) + tokenize(content)
+        positions: Dict[str, List[int]] = defaultdict(list)
+        for position, token in enumerate(tokens):
+            positions[token].append(position)
+        for token, token_positions in positions.items():
+            if token not in self.postings:
+                bisect.insort(self.vocabulary, token)
+            # Tuples of ints drop out of GC tracking; lists would be rescanned
+            # on every collection and make building large indexes quadratic
+            self.postings[token][note_id] = tuple(token_positions)
+        self.lengths[note_id] = len(tokens)
+        self.terms[note_id] = set(positions)
+        self.total_length += len(tokens)
+
+    def remove(self, note_id: int) -> None:
+        for token in self.terms.pop(note_id, ()):
+            notes = self.postings[token]
+            notes.pop(note_id, None)
+            if not notes:
+                del self.postings[token]
+                index = bisect.bisect_left(self.vocabulary, token)
+                del self.vocabulary[index]
+        self.total_length -= self.lengths.pop(note_id, 0)
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Indexed tokens starting with ``prefix`` or its stem.
+
+        Indexed tokens are stemmed, so ``wants*`` has to look up ``want``;
+        PostgreSQL stems ``to_tsquery`` prefixes the same way.
+        """
+        tokens: Dict[str, None] = {}
+        for start_with in dict.fromkeys((prefix, _stem(prefix))):
+            start = bisect.bisect_left(self.vocabulary, start_with)
+            end = bisect.bisect_left(self.vocabulary, start_with + "\uffff")
+            tokens.update(dict.fromkeys(self.vocabulary[start:end]))
+        return list(tokens)
+
+    def _matches(self, term: QueryTerm) -> Dict[int, Tuple[int, ...]]:
+        """Note id -> positions where one query term matches."""
+        if term.kind == "word":
+            return self.postings.get(_stem(term.words[0]), {})
+        if term.kind == "prefix":
+            tokens = self._expand_prefix(term.words[0])
+            if len(tokens) == 1:
+                return self.postings[tokens[0]]
+            merged: Dict[int, Tuple[int, ...]] = {}
+            for token in tokens:
+                for note_id, positions in self.postings[token].items():
+                    merged[note_id] = merged.get(note_id, ()) + positions
+            return merged
+
+        postings = [self.postings.get(_stem(word)) for word in term.words]
+        if not all(postings):
+            return {}
+        phrases = {}
+        for note_id in min(postings, key=len):
+            if not all(note_id in notes for notes in postings):
+                continue
+            following = [set(notes[note_id]) for notes in postings[1:]]
+            starts = tuple(
+                start
+                for start in postings[0][note_id]
+                if all(
+                    start + offset in positions
+                    for offset, positions in enumerate(following, 1)
+                )
+            )
+            if starts:
+                phrases[note_id] = starts
+        return phrases
+
+    def search(self, terms: List[QueryTerm], limit: int) -> List[Tuple[int, float]]:
+        """Note ids and BM25 scores for notes matching every term."""
+        matches = [self._matches(term) for term in terms]
+        if not matches or not all(matches):
+            return []
+        matches.sort(key=len)
+        candidates = [
+            note_id
+            for note_id in matches[0]
+            if all(note_id in match for match in matches[1:])
+        ]
+        total = len(self.lengths)
+        average = (self.total_length / total if total else 0.0) or 1.0
+        weights = [
+            (match, math.log(1 + (total - len(match) + 0.5) / (len(match) + 0.5)))
+            for match in matches
+        ]
+        lengths = self.lengths
+
+        def score(note_id: int) -> float:
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[note_id] / average)
+            total_score = 0.0
+            for match, idf in weights:
+                frequency = len(match[note_id])
+                total_score += (
+                    idf * frequency * (BM25_K1 + 1) / (frequency + length_norm)
+                )
+            return total_score
+
+        scored = ((score(note_id), note_id) for note_id in candidates)
+        return [(note_id, value) for value, note_id in heapq.nlargest(limit, scored)]
+
+
+_indexes: Dict[int, NoteIndex] = {}
+_dirty: Set[int] = set()
+_lock = threading.Lock()
+
+
+def _load_notes(db: Session, dealership_id: Optional[int], note_ids: Set[int]) -> Any:
+    stmt = select(
+        CustomerNote.id,
+        Customer.dealership_id,
+        CustomerNote.title,
+        CustomerNote.content,
+    ).join(Customer, Customer.id == CustomerNote.customer_id)
+    if dealership_id is not None:
+        stmt = stmt.where(Customer.dealership_id == dealership_id)
+    if note_ids:
+        stmt = stmt.where(CustomerNote.id.in_(note_ids))
+    return db.execute(stmt.execution_options(yield_per=5000))
+
+
+def get_index(db: Session, dealership_id: int) -> NoteIndex:
+    """
+    Return the in-process note index for a dealership, refreshing as needed.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to load
+
+    Returns:
+        NoteIndex: Current index
+    """
+    with _lock:
+        index = _indexes.get(dealership_id)
+        dirty = set(_dirty)
+        _dirty.clear()
+
+    if index is None:
+        index = NoteIndex()
+        for row in _load_notes(db, dealership_id, set()):
+            index.add(row.id, row.title, row.content)
+        with _lock:
+            _indexes[dealership_id] = index
+    if dirty:
+        rows = _load_notes(db, None, dirty).all()
+        with _lock:
+            # A note belongs to one dealership; drop it everywhere first
+            for loaded in _indexes.values():
+                for note_id in dirty:
+                    loaded.remove(note_id)
+            for row in rows:
+                loaded = _indexes.get(row.dealership_id)
+                if loaded is not None:
+                    loaded.add(row.id, row.title, row.content)
+    return index
+
+
+def _search_memory(
+    db: Session, dealership_id: int, terms: List[QueryTerm], limit: int
+) -> List[Tuple[Any, float]]:
+    index = get_index(db, dealership_id)
+    with _lock:
+        ranked = index.search(terms, limit)
+    if not ranked:
+        return []
+    rows = {
+        row.id: row
+        for row in db.execute(
+            select(*_hit_columns)
+            .join(Customer, Customer.id == CustomerNote.customer_id)
+            .where(CustomerNote.id.in_([note_id for note_id, _ in ranked]))
+        )
+    }
+    return [(rows[note_id], score) for note_id, score in ranked if note_id in rows]
+
+
+def search_notes(
+    db: Session, dealership_id: int, query: str, limit: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Search a dealership's customer notes.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership whose customers' notes are searched
+        query: Words, ``"quoted phrases"`` and ``prefix*`` terms
+        limit: Maximum hits returned
+
+    Returns:
+        List[Dict[str, Any]]: Hits ordered by descending rank
+
+    Raises:
+        ValueError: If the query has nothing searchable
+    """
+    terms = parse_query(query)
+    if db.get_bind().dialect.name == "postgresql":
+        results = _search_postgres(db, dealership_id, terms, limit)
+    else:
+        results = _search_memory(db, dealership_id, terms, limit)
+
+    return [
+        {
+            "note_id": row.id,
+            "customer_id": row.customer_id,
+            "customer_name": f"{row.first_name} {row.last_name}",
+            "title": row.title,
+            "note_type": row.note_type,
+            "created_at": row.created_at,
+            "rank": round(rank, 6),
+            "highlight": highlight(row.content, terms),
+        }
+        for row, rank in results
+    ]
+
+
+def invalidate() -> None:
+    """Drop every in-process note index."""
+    with _lock:
+        _indexes.clear()
+        _dirty.clear()
+
+
+def _collect_changed_notes(session: Session, pending: Set[int]) -> None:
+    """Record notes written in this flush."""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, CustomerNote):
+            pending.add(obj.id)
+
+
+def _mark_dirty(pending: Set[int]) -> None:
+    """Mark committed note changes for re-indexing on the next search."""
+    with _lock:
+        if _indexes:
+            _dirty.update(pending)
+
+
+invalidation.subscribe("note_search", _collect_changed_notes, _mark_dirty)
@@ -0,0 +1,56 @@
+"""
+Sale, appointment and work order numbers.
+
+The partitioned tables cannot enforce unique numbers: PostgreSQL only
+allows unique constraints that include the partition key. Numbers are
+therefore issued from a counter row per dealership and kind
+(``number_sequences``). The counter is incremented in the caller's
+transaction and the row stays locked until it commits, so concurrent
+creates get distinct numbers, and a rolled-back create gives its number
+back.
+"""
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from opendms.models.numbering import NumberSequence
+
+PREFIXES = {"sale": "S", "appointment": "A", "work_order": "RO"}
+
+
+def next_number(db: Session, dealership_id: int, kind: str) -> str:
+    """
+    Issue the next number for a dealership.
+
+    Args:
+        db: Database session; the number is issued in its transaction
+        dealership_id: Dealership the record belongs to
+        kind: "sale", "appointment" or "work_order"
+
+    Returns:
+        str: Number such as ``S12-000045``, unique across dealerships
+    """
+    prefix = PREFIXES[kind]
+    bump = (
+        update(NumberSequence)
+        .where(
+            NumberSequence.dealership_id == dealership_id,
+            NumberSequence.kind == kind,
+        )
+        .values(last_value=NumberSequence.last_value + 1)
+        .returning(NumberSequence.last_value)
+        .execution_options(synchronize_session=False)
+    )
+    value = db.execute(bump).scalar()
+    if value is None:
+        try:
+            with db.begin_nested():
+                db.add(
+                    NumberSequence(dealership_id=dealership_id, kind=kind, last_value=1)
+                )
+            value = 1
+        except IntegrityError:
+            # Another transaction created the counter first
+            value = db.execute(bump).scalar()
+    return f"{prefix}{dealership_id}-{value:06d}"
@@ -0,0 +1,278 @@
+"""
+Service appointment reminders.
+
+Due appointments are claimed in keyset-ordered chunks with
+``FOR UPDATE SKIP LOCKED``, so any number of workers can run the job at the
+same time: each chunk is locked by exactly one of them until its transaction
+commits. A chunk is rendered from a single joined query with pre-compiled
+templates, sent over pooled transports, and closed out with one set-based
+``UPDATE`` of ``reminder_sent``. Delivery is at-least-once: a worker that
+dies after sending but before committing leaves its chunk to be resent.
+"""
+
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+from opendms.core.config import settings
+from opendms.core.messaging import (
+    EMAIL,
+    SMS,
+    Message,
+    Transport,
+    close_transports,
+    open_transports,
+)
+from opendms.models.customer import Customer
+from opendms.models.dealership import Dealership
+from opendms.models.inventory import Vehicle
+from opendms.models.service import AppointmentStatus, ServiceAppointment
+from opendms.services.normalization import normalize_phone
+from opendms.services.scheduling import local_now
+
+logger = logging.getLogger(__name__)
+
+_templates = Environment(
+    loader=FileSystemLoader(
+        Path(__file__).resolve().parent.parent / "templates" / "reminders"
+    ),
+    undefined=StrictUndefined,
+    keep_trailing_newline=False,
+    autoescape=False,
+)
+EMAIL_TEMPLATE = _templates.get_template("service_email.txt")
+SMS_TEMPLATE = _templates.get_template("service_sms.txt")
+
+# Contact preferences that favour a text message over email
+SMS_PREFERENCES = ("text", "sms", "phone")
+
+
+@dataclass
+class ReminderRunStats:
+    """Counters and timings for one reminder run."""
+
+    chunks: int = 0
+    selected: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0  # customers with no reachable channel
+    elapsed_seconds: float = 0.0
+    max_lag_seconds: float = 0.0  # latest send past the reminder becoming due
+    total_lag_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Messages sent per second."""
+        return self.sent / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def average_lag_seconds(self) -> float:
+        return self.total_lag_seconds / self.sent if self.sent else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["throughput"] = round(self.throughput, 2)
+        data["average_lag_seconds"] = round(self.average_lag_seconds, 3)
+        return data
+
+
+def _claim_chunk(
+    db: Session,
+    window_start: datetime,
+    window_end: datetime,
+    after: Optional[Tuple[datetime, int]],
+    limit: int,
+) -> List[Any]:
+    """Lock and load the next chunk of due appointments with their context."""
+    stmt = (
+        select(
+            ServiceAppointment.id,
+            ServiceAppointment.appointment_date,
+            ServiceAppointment.appointment_number,
+            ServiceAppointment.service_type,
+            Customer.first_name,
+            Customer.email,
+            Customer.phone,
+            Customer.phone_e164,
+            Customer.preferred_contact_method,
+            Dealership.name.label("dealership_name"),
+            Dealership.phone.label("dealership_phone"),
+            Vehicle.year,
+            Vehicle.make,
+            Vehicle.model,
+        )
+        .join(Customer, Customer.id == ServiceAppointment.customer_id)
+        .join(Dealership, Dealership.id == ServiceAppointment.dealership_id)
+        .join(Vehicle, Vehicle.id == ServiceAppointment.vehicle_id)
+        .where(
+            ServiceAppointment.reminder_sent.is_(False),
+            ServiceAppointment.status == AppointmentStatus.SCHEDULED,
+            ServiceAppointment.appointment_date >= window_start,
+            ServiceAppointment.appointment_date < window_end,
+        )
+        .order_by(ServiceAppointment.appointment_date, ServiceAppointment.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True, of=ServiceAppointment)
+    )
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(ServiceAppointment.appointment_date, ServiceAppointment.id)
+            > tuple_(*after)
+        )
+    return db.execute(stmt).all()
+
+
+def sms_number(row: Any) -> Optional[str]:
+    """The customer's phone in E.164, or None if it cannot be texted."""
+    return row.phone_e164 or normalize_phone(row.phone)
+
+
+def render(row: Any, transports: Dict[str, Transport]) -> Optional[Message]:
+    """
+    Render the reminder for one appointment on the customer's best channel.
+
+    Args:
+        row: Row from the chunk query
+        transports: Open transports keyed by channel
+
+    Returns:
+        Optional[Message]: The message, or None if no channel can reach them
+    """
+    context = {
+        "first_name": row.first_name,
+        "dealership_name": row.dealership_name,
+        "dealership_phone": row.dealership_phone,
+        "appointment_date": row.appointment_date,
+        "appointment_number": row.appointment_number,
+        "service_type": row.service_type,
+        "vehicle": f"{row.year} {row.make} {row.model}",
+    }
+    can_email = bool(row.email) and EMAIL in transports
+    phone = sms_number(row)
+    can_text = phone is not None and SMS in transports
+    prefers_text = (row.preferred_contact_method or "").lower() in SMS_PREFERENCES
+
+    if can_text and (prefers_text or not can_email):
+        return Message(SMS, phone, SMS_TEMPLATE.render(context).strip())
+    if can_email:
+        return Message(
+            EMAIL,
+            row.email,
+            EMAIL_TEMPLATE.render(context),
+            subject=f"Service appointment reminder - {row.dealership_name}",
+        )
+    return None
+
+
+def _mark_sent(db: Session, rows: List[Any]) -> None:
+    """Flip ``reminder_sent`` for a chunk with one statement."""
+    dates = [row.appointment_date for row in rows]
+    db.execute(
+        update(ServiceAppointment)
+        .where(
+            ServiceAppointment.id.in_([row.id for row in rows]),
+            # Lets the planner prune to the partitions the chunk spans
+            ServiceAppointment.appointment_date.between(min(dates), max(dates)),
+        )
+        .values(reminder_sent=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def send_due_reminders(
+    db: Session,
+    now: Optional[datetime] = None,
+    lead_hours: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> ReminderRunStats:
+    """
+    Send reminders for every scheduled appointment inside the lead window.
+
+    Each chunk is committed on its own, releasing its row locks. Appointments
+    whose message failed to send stay unflagged and are retried on the next
+    run; the keyset cursor keeps this run from revisiting them.
+
+    Args:
+        db: Database session; committed once per chunk
+        now: Reference time, defaults to the current time in
+            ``SERVICE_TIME_ZONE`` (appointment times are local)
+        lead_hours: How far ahead to remind, defaults to ``REMINDER_LEAD_HOURS``
+        chunk_size: Rows claimed per chunk, defaults to ``REMINDER_BATCH_SIZE``
+
+    Returns:
+        ReminderRunStats: Counts, throughput and lag for the run
+    """
+    now = now or local_now()
+    lead = timedelta(hours=lead_hours or settings.REMINDER_LEAD_HOURS)
+    limit = chunk_size or settings.REMINDER_BATCH_SIZE
+    window_end = now + lead
+
+    stats = ReminderRunStats()
+    started = perf_counter()
+    transports = open_transports()
+    cursor: Optional[Tuple[datetime, int]] = None
+    try:
+        while True:
+            rows = _claim_chunk(db, now, window_end, cursor, limit)
+            if not rows:
+                db.commit()
+                break
+            stats.chunks += 1
+            stats.selected += len(rows)
+            cursor = (rows[-1].appointment_date, rows[-1].id)
+
+            done = []
+            for row in rows:
+                message = render(row, transports)
+                if message is None:
+                    stats.skipped += 1
+                    # Nothing to retry if the customer left no contact details
+                    if not row.email and sms_number(row) is None:
+                        done.append(row)
+                    continue
+                try:
+                    transports[message.channel].send(message)
+                except Exception:
+                    stats.failed += 1
+                    logger.exception(
+                        "Reminder for appointment %s failed", row.appointment_number
+                    )
+                    continue
+                stats.sent += 1
+                due_at = row.appointment_date - lead
+                sent_at = now + timedelta(seconds=perf_counter() - started)
+                lag = max((sent_at - due_at).total_seconds(), 0.0)
+                stats.total_lag_seconds += lag
+                stats.max_lag_seconds = max(stats.max_lag_seconds, lag)
+                done.append(row)
+
+            if done:
+                _mark_sent(db, done)
+            db.commit()
+            if len(rows) < limit:
+                break
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        close_transports(transports)
+        stats.elapsed_seconds = perf_counter() - started
+
+    logger.info(
+        "Service reminders: %d sent, %d failed, %d skipped in %d chunks "
+        "(%.1f msg/s, max lag %.0fs)",
+        stats.sent,
+        stats.failed,
+        stats.skipped,
+        stats.chunks,
+        stats.throughput,
+        stats.max_lag_seconds,
+    )
+    return stats
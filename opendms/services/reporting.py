@@ -0,0 +1,317 @@
+"""
+Sales and gross-profit reporting.
+
+Each report issues a single query that pre-aggregates sales at the finest
+grain any report needs (dealership x salesperson x month x make x model) and
+loads the result as NumPy columns. All further rollups, averages and trends
+are vectorized group-bys over those columns, so the cost in Python is
+proportional to the number of distinct cells rather than the number of sales.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import Sale, SaleStatus
+
+# Sales that count towards reported volume and gross
+REPORTABLE_STATUSES = (
+    SaleStatus.APPROVED,
+    SaleStatus.COMPLETED,
+    SaleStatus.DELIVERED,
+)
+
+GROUP_BY_FIELDS = ("dealership", "salesperson", "month", "make", "model")
+
+
+@dataclass
+class SalesCube:
+    """Pre-aggregated sales cells held as parallel NumPy columns."""
+
+    dealership_id: np.ndarray
+    sales_person_id: np.ndarray
+    month: np.ndarray  # months since year 0 (year * 12 + month - 1)
+    make: np.ndarray  # object array of labels
+    model: np.ndarray  # object array of labels
+    units: np.ndarray
+    revenue: np.ndarray  # sum of vehicle_price
+    total_amount: np.ndarray
+    trade_in_value: np.ndarray
+    gross_profit: np.ndarray  # sum of vehicle_price - cost_price where known
+    costed_units: np.ndarray  # units with a known cost_price
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+
+def _month_expression(db: Session) -> Any:
+    """Return a SQL expression truncating ``sale_date`` to its month."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m", Sale.sale_date)
+    return func.to_char(func.date_trunc("month", Sale.sale_date), "YYYY-MM")
+
+
+def month_index(label: str) -> int:
+    """Convert a ``YYYY-MM`` label to months since year 0."""
+    year, month = label.split("-")
+    return int(year) * 12 + int(month) - 1
+
+
+def month_label(index: int) -> str:
+    """Convert months since year 0 back to a ``YYYY-MM`` label."""
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def load_sales_cube(
+    db: Session,
+    dealership_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> SalesCube:
+    """
+    Load the sales cube for the given filters with one query.
+
+    Args:
+        db: Database session
+        dealership_id: Restrict to a single dealership
+        start_date: Inclusive lower bound on ``sale_date``
+        end_date: Exclusive upper bound on ``sale_date``
+
+    Returns:
+        SalesCube: Aggregated cells as NumPy columns
+    """
+    month = _month_expression(db).label("month")
+    stmt = (
+        select(
+            Sale.dealership_id,
+            Sale.sales_person_id,
+            month,
+            Vehicle.make,
+            Vehicle.model,
+            func.count(Sale.id),
+            func.coalesce(func.sum(Sale.vehicle_price), 0.0),
+            func.coalesce(func.sum(Sale.total_amount), 0.0),
+            func.coalesce(func.sum(Sale.trade_in_value), 0.0),
+            # NULL cost_price yields NULL, which SUM skips
+            func.coalesce(func.sum(Sale.vehicle_price - Vehicle.cost_price), 0.0),
+            func.count(Vehicle.cost_price),
+        )
+        .join(Vehicle, Vehicle.id == Sale.vehicle_id)
+        .where(Sale.status.in_(REPORTABLE_STATUSES))
+        .group_by(
+            Sale.dealership_id, Sale.sales_person_id, month, Vehicle.make, Vehicle.model
+        )
+    )
+    if dealership_id is not None:
+        stmt = stmt.where(Sale.dealership_id == dealership_id)
+    if start_date is not None:
+        stmt = stmt.where(Sale.sale_date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(Sale.sale_date < end_date)
+
+    rows = db.execute(stmt).all()
+    columns = list(zip(*rows, strict=True)) if rows else [()] * 11
+
+    return SalesCube(
+        dealership_id=np.array(columns[0], dtype=np.int64),
+        sales_person_id=np.array(columns[1], dtype=np.int64),
+        month=np.array([month_index(label) for label in columns[2]], dtype=np.int64),
+        make=np.array(columns[3], dtype=object),
+        model=np.array(columns[4], dtype=object),
+        units=np.array(columns[5], dtype=np.int64),
+        revenue=np.array(columns[6], dtype=np.float64),
+        total_amount=np.array(columns[7], dtype=np.float64),
+        trade_in_value=np.array(columns[8], dtype=np.float64),
+        gross_profit=np.array(columns[9], dtype=np.float64),
+        costed_units=np.array(columns[10], dtype=np.int64),
+    )
+
+
+def _group_codes(cube: SalesCube, field: str) -> np.ndarray:
+    """Return integer codes for a group-by field, one per cube cell."""
+    if field == "dealership":
+        return cube.dealership_id
+    if field == "salesperson":
+        return cube.sales_person_id
+    if field == "month":
+        return cube.month
+    if field == "make":
+        return np.unique(cube.make, return_inverse=True)[1].astype(np.int64)
+    if field == "model":
+        labels = np.char.add(
+            np.char.add(cube.make.astype(str), "\x00"), cube.model.astype(str)
+        )
+        return np.unique(labels, return_inverse=True)[1].astype(np.int64)
+    raise ValueError(f"Unknown group-by field: {field}")
+
+
+def _metrics(
+    units: np.ndarray,
+    revenue: np.ndarray,
+    total_amount: np.ndarray,
+    trade_in_value: np.ndarray,
+    gross_profit: np.ndarray,
+    costed_units: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Derive averages and margins from summed columns."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_price = np.where(units > 0, revenue / units, 0.0)
+        average_gross = np.where(costed_units > 0, gross_profit / costed_units, np.nan)
+        gross_margin = np.where(revenue > 0, gross_profit / revenue, np.nan)
+    return {
+        "units": units,
+        "revenue": revenue,
+        "total_amount": total_amount,
+        "trade_in_value": trade_in_value,
+        "gross_profit": gross_profit,
+        "average_price": average_price,
+        "average_gross": average_gross,
+        "gross_margin": gross_margin,
+    }
+
+
+def _to_rows(
+    keys: Dict[str, List[Any]], metrics: Dict[str, np.ndarray]
+) -> List[Dict[str, Any]]:
+    """Zip key columns and metric arrays into JSON-friendly dicts."""
+    plain = {
+        name: [None if np.isnan(v) else v for v in values.tolist()]
+        if values.dtype.kind == "f"
+        else values.tolist()
+        for name, values in metrics.items()
+    }
+    count = len(metrics["units"])
+    return [
+        {
+            **{name: column[i] for name, column in keys.items()},
+            **{name: column[i] for name, column in plain.items()},
+        }
+        for i in range(count)
+    ]
+
+
+def summarize(cube: SalesCube, group_by: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Roll the cube up to ``group_by`` and compute per-group metrics.
+
+    Args:
+        cube: Loaded sales cube
+        group_by: Fields from ``GROUP_BY_FIELDS``; empty for a grand total
+
+    Returns:
+        List[Dict[str, Any]]: One dict per group, sorted by the group keys
+    """
+    if len(cube) == 0:
+        return []
+
+    if group_by:
+        codes = np.stack([_group_codes(cube, field) for field in group_by], axis=1)
+        uniques, first, inverse = np.unique(
+            codes, axis=0, return_index=True, return_inverse=True
+        )
+        inverse = inverse.reshape(-1)
+        n_groups = len(uniques)
+    else:
+        first = np.zeros(1, dtype=np.int64)
+        inverse = np.zeros(len(cube), dtype=np.int64)
+        n_groups = 1
+
+    def total(column: np.ndarray) -> np.ndarray:
+        return np.bincount(inverse, weights=column, minlength=n_groups)
+
+    metrics = _metrics(
+        units=total(cube.units).astype(np.int64),
+        revenue=total(cube.revenue),
+        total_amount=total(cube.total_amount),
+        trade_in_value=total(cube.trade_in_value),
+        gross_profit=total(cube.gross_profit),
+        costed_units=total(cube.costed_units),
+    )
+
+    # Group labels come from the first cell of each group
+    keys: Dict[str, List[Any]] = {}
+    for field in group_by:
+        if field == "dealership":
+            keys["dealership_id"] = cube.dealership_id[first].tolist()
+        elif field == "salesperson":
+            keys["sales_person_id"] = cube.sales_person_id[first].tolist()
+        elif field == "month":
+            keys["month"] = [month_label(m) for m in cube.month[first].tolist()]
+        elif field == "make":
+            keys["make"] = cube.make[first].tolist()
+        elif field == "model":
+            keys["make"] = cube.make[first].tolist()
+            keys["model"] = cube.model[first].tolist()
+
+    return _to_rows(keys, metrics)
+
+
+def monthly_trend(cube: SalesCube) -> List[Dict[str, Any]]:
+    """
+    Compute monthly totals with month-over-month changes.
+
+    Months without sales inside the observed range are filled with zeros so
+    that changes are always relative to the previous calendar month.
+
+    Args:
+        cube: Loaded sales cube
+
+    Returns:
+        List[Dict[str, Any]]: One dict per month in chronological order
+    """
+    if len(cube) == 0:
+        return []
+
+    first_month = int(cube.month.min())
+    offsets = cube.month - first_month
+    n_months = int(offsets.max()) + 1
+
+    units = np.bincount(offsets, weights=cube.units, minlength=n_months)
+    revenue = np.bincount(offsets, weights=cube.revenue, minlength=n_months)
+    gross = np.bincount(offsets, weights=cube.gross_profit, minlength=n_months)
+
+    def change(series: np.ndarray) -> np.ndarray:
+        previous = np.concatenate(([np.nan], series[:-1]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(previous > 0, (series - previous) / previous, np.nan)
+
+    units_change = change(units)
+    gross_change = change(gross)
+
+    return [
+        {
+            "month": month_label(first_month + i),
+            "units": int(units[i]),
+            "revenue": float(revenue[i]),
+            "gross_profit": float(gross[i]),
+            "units_change_pct": None
+            if np.isnan(units_change[i])
+            else float(units_change[i]),
+            "gross_change_pct": None
+            if np.isnan(gross_change[i])
+            else float(gross_change[i]),
+        }
+        for i in range(n_months)
+    ]
+
+
+def month_to_date_units(db: Session, dealership_id: Optional[int] = None) -> int:
+    """
+    Count reportable sales in the current calendar month.
+
+    Args:
+        db: Database session
+        dealership_id: Restrict to a single dealership
+
+    Returns:
+        int: Units sold since the first of the month
+    """
+    now = datetime.utcnow()
+    start = datetime(now.year, now.month, 1)
+    cube = load_sales_cube(db, dealership_id=dealership_id, start_date=start)
+    return int(cube.units.sum())
@@ -0,0 +1,417 @@
+"""
+Deal jacket document storage.
+
+Contracts, licenses, insurance cards and stips are stored as rows in
+``sale_documents`` with the files content-addressed under ``DOCUMENT_DIR``,
+which is outside the public media mount: documents are only served through
+the sale endpoints. A file already on the deal is never stored twice, and a
+file already stored for another deal is linked without being uploaded again
+when the client sends its digest up front.
+
+Files are moved into place only after the row referencing them has
+committed, and a file is removed only when the last row referencing it is
+deleted. On PostgreSQL both sides take a transaction advisory lock on the
+file's digest (``lock_file``), so a deal linking a stored file cannot race
+with its removal.
+
+Small files can be posted as multipart; large scans go through resumable
+chunked uploads (``opendms.core.media.ResumableUploads``).
+"""
+
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from opendms.core.config import settings
+from opendms.core.media import (
+    ReceivedFile,
+    ResumableUploads,
+    UploadNotFound,
+    UploadSession,
+    discard,
+    store,
+    stored_path,
+)
+from opendms.models.sale import Sale, SaleDocument
+
+logger = logging.getLogger(__name__)
+
+# First key of the advisory locks taken by ``lock_file``
+FILE_LOCK_KEY = 0x646F6373
+
+
+def document_root() -> str:
+    """Absolute path of the private document directory."""
+    return os.path.abspath(settings.DOCUMENT_DIR)
+
+
+def temp_dir() -> str:
+    """Directory for files being received, on the same filesystem as storage."""
+    path = os.path.join(document_root(), "tmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def uploads() -> ResumableUploads:
+    """Resumable upload sessions for documents."""
+    return ResumableUploads(os.path.join(document_root(), "uploads"))
+
+
+def document_path(document: SaleDocument) -> Optional[str]:
+    """Absolute path of a stored document, or None for external URLs."""
+    if document.storage_path is None:
+        return None
+    return os.path.join(document_root(), document.storage_path)
+
+
+def lock_file(db: Session, sha256: str) -> None:
+    """
+    Serialize changes to the rows referencing one stored file.
+
+    Takes a PostgreSQL advisory lock held until the transaction ends. Other
+    databases are used by a single process and need no lock.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    # Second key: the digest's first 32 bits as a signed int4
+    key = int(sha256[:8], 16) - 2**31
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, :key)"),
+        {"namespace": FILE_LOCK_KEY, "key": key},
+    )
+
+
+def store_file(received: ReceivedFile) -> str:
+    """Move a received file to its stored path, once its row has committed."""
+    return store(received, "files", root=document_root())
+
+
+def list_documents(db: Session, sale_id: int) -> List[SaleDocument]:
+    """A deal's documents in the order they were added."""
+    return db.scalars(
+        select(SaleDocument)
+        .where(SaleDocument.sale_id == sale_id)
+        .order_by(SaleDocument.id)
+    ).all()
+
+
+def _on_sale(db: Session, sale_id: int, sha256: str) -> Optional[SaleDocument]:
+    return db.scalars(
+        select(SaleDocument).where(
+            SaleDocument.sale_id == sale_id, SaleDocument.sha256 == sha256
+        )
+    ).first()
+
+
+def _insert(db: Session, document: SaleDocument) -> Tuple[SaleDocument, bool]:
+    """Insert a document unless a concurrent request attached the same file."""
+    try:
+        with db.begin_nested():
+            db.add(document)
+    except IntegrityError:
+        existing = _on_sale(db, document.sale_id, document.sha256)
+        if existing is None:
+            raise
+        return existing, False
+    return document, True
+
+
+def add_document(
+    db: Session,
+    sale_id: int,
+    received: ReceivedFile,
+    document_type: Optional[str] = None,
+) -> Tuple[SaleDocument, bool]:
+    """
+    Attach a received file to a deal.
+
+    The caller commits and then, for a new document, moves the file into
+    place with ``store_file``; a file the deal already has is left for the
+    caller to ``discard``.
+
+    Args:
+        db: Database session
+        sale_id: Deal receiving the document
+        received: File from ``receive_files`` or a finished upload
+        document_type: Optional label such as ``contract`` or ``stip``
+
+    Returns:
+        Tuple[SaleDocument, bool]: The document, and whether it is new
+        (False when the deal already had this file)
+    """
+    existing = _on_sale(db, sale_id, received.sha256)
+    if existing is not None:
+        return existing, False
+
+    lock_file(db, received.sha256)
+    path = stored_path(received, "files", root=document_root())
+    return _insert(
+        db,
+        SaleDocument(
+            sale_id=sale_id,
+            document_type=document_type,
+            filename=received.filename[:255],
+            content_type=received.content_type,
+            size=received.size,
+            sha256=received.sha256,
+            storage_path=os.path.relpath(path, document_root()),
+        ),
+    )
+
+
+def start_upload(
+    db: Session,
+    sale_id: int,
+    filename: str,
+    size: int,
+    document_type: Optional[str] = None,
+    sha256: Optional[str] = None,
+) -> Tuple[Optional[SaleDocument], Optional[UploadSession]]:
+    """
+    Begin a chunked upload, or skip it when the file is already stored.
+
+    With a digest, a file already on the deal is returned as is, and a file
+    stored for another deal is linked to this one without any data being
+    sent. The caller commits.
+
+    Args:
+        db: Database session
+        sale_id: Deal receiving the document
+        filename: Client file name
+        size: Total size in bytes
+        document_type: Optional label such as ``contract`` or ``stip``
+        sha256: Hex digest of the file, if the client computed it
+
+    Returns:
+        Tuple: The document when no upload is needed, otherwise the new
+        upload session
+
+    Raises:
+        UploadError: If the size is out of range
+    """
+    if sha256:
+        sha256 = sha256.lower()
+        existing = _on_sale(db, sale_id, sha256)
+        if existing is not None:
+            return existing, None
+        lock_file(db, sha256)
+        stored = db.scalars(
+            select(SaleDocument).where(
+                SaleDocument.sha256 == sha256, SaleDocument.storage_path.is_not(None)
+            )
+        ).first()
+        if stored is not None and os.path.exists(document_path(stored)):
+            document, _ = _insert(
+                db,
+                SaleDocument(
+                    sale_id=sale_id,
+                    document_type=document_type,
+                    filename=filename[:255],
+                    content_type=stored.content_type,
+                    size=stored.size,
+                    sha256=sha256,
+                    storage_path=stored.storage_path,
+                ),
+            )
+            return document, None
+
+    session = uploads().start(
+        filename,
+        size,
+        settings.DOCUMENT_MAX_FILE_SIZE,
+        sha256=sha256,
+        metadata={"sale_id": sale_id, "document_type": document_type},
+    )
+    return None, session
+
+
+def get_upload(sale_id: int, upload_id: str) -> UploadSession:
+    """
+    Load an upload session belonging to a deal.
+
+    Raises:
+        UploadNotFound: If there is no such session for this deal
+    """
+    session = uploads().get(upload_id)
+    if session.metadata.get("sale_id") != sale_id:
+        raise UploadNotFound("Upload not found")
+    return session
+
+
+def complete_upload(
+    db: Session, session: UploadSession
+) -> Tuple[SaleDocument, bool, ReceivedFile]:
+    """
+    Turn a fully received upload into a document.
+
+    The caller commits and then stores or discards the returned file, as
+    for ``add_document``.
+
+    Returns:
+        Tuple: The document, whether it is new, and the received file
+
+    Raises:
+        UploadError: If the file is of a disallowed type or does not match
+            its declared digest
+    """
+    received = uploads().finish(session.upload_id, settings.ALLOWED_FILE_TYPES)
+    try:
+        document, created = add_document(
+            db,
+            session.metadata["sale_id"],
+            received,
+            session.metadata.get("document_type"),
+        )
+    except Exception:
+        discard([received])
+        raise
+    return document, created, received
+
+
+def delete_document(db: Session, document: SaleDocument) -> None:
+    """Remove a document, and its file if no other deal uses it. Commits."""
+    delete_documents(db, [document])
+
+
+def delete_documents(
+    db: Session, documents: List[SaleDocument], also: Optional[List[Any]] = None
+) -> None:
+    """
+    Remove documents, and each file no other deal uses, in one commit.
+
+    The files' directories are renamed aside before the commit and removed
+    after it, so a failed commit leaves the files in place.
+
+    Args:
+        db: Database session
+        documents: Documents to delete
+        also: Further objects deleted in the same commit, such as the sale
+            the documents belong to
+    """
+    files = {
+        document.storage_path: document.sha256
+        for document in documents
+        if document.storage_path is not None
+    }
+    # Sorted, so two deletions sharing files cannot deadlock
+    for sha256 in sorted(set(files.values())):
+        lock_file(db, sha256)
+    for document in documents:
+        db.delete(document)
+    for instance in also or []:
+        db.delete(instance)
+    db.flush()
+
+    removed: List[Tuple[str, str, str]] = []  # directory, trash, digest
+    try:
+        for storage_path, sha256 in files.items():
+            still_used = db.scalar(
+                select(SaleDocument.id).where(SaleDocument.storage_path == storage_path)
+            )
+            if still_used is not None:
+                continue
+            directory = os.path.dirname(os.path.join(document_root(), storage_path))
+            trash = f"{directory}.{os.getpid()}.deleted"
+            try:
+                os.rename(directory, trash)
+            except FileNotFoundError:
+                continue
+            removed.append((directory, trash, sha256))
+        db.commit()
+    except Exception:
+        db.rollback()
+        for directory, trash, _ in removed:
+            os.rename(trash, directory)
+        raise
+    for _, trash, sha256 in removed:
+        shutil.rmtree(trash, ignore_errors=True)
+        logger.info("Removed unreferenced document file %s", sha256)
+
+
+def purge_uploads() -> int:
+    """Remove upload sessions idle for ``DOCUMENT_UPLOAD_EXPIRE_HOURS``."""
+    return uploads().purge(settings.DOCUMENT_UPLOAD_EXPIRE_HOURS * 3600)
+
+
+def _legacy_entries(value: str) -> List[Dict[str, Any]]:
+    """Parse a sale's legacy JSON document list into name/URL pairs."""
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        # Some rows hold a bare URL rather than a JSON list
+        parsed = [value]
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+
+    entries = []
+    for item in parsed:
+        if isinstance(item, dict):
+            url = item.get("url")
+            name = item.get("name") or item.get("filename")
+        else:
+            url, name = item, None
+        if not isinstance(url, str) or not url.strip():
+            continue
+        url = url.strip()
+        name = name or os.path.basename(urlparse(url).path) or url
+        entries.append({"url": url[:500], "filename": str(name)[:255]})
+    return entries
+
+
+def migrate_legacy_documents(db: Session, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Move document URLs from ``sales.documents`` JSON into ``sale_documents``,
+    committing per batch. Safe to run more than once.
+
+    Args:
+        db: Database session
+        batch_size: Sales migrated per commit
+
+    Returns:
+        Dict[str, int]: Sales migrated and documents created
+    """
+    migrated = created = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Sale.id, Sale.legacy_documents)
+            .where(Sale.id > last_id, Sale.legacy_documents.is_not(None))
+            .order_by(Sale.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return {"sales_migrated": migrated, "documents_created": created}
+
+        sale_ids = [row.id for row in rows]
+        known = set(
+            db.execute(
+                select(SaleDocument.sale_id, SaleDocument.url).where(
+                    SaleDocument.sale_id.in_(sale_ids),
+                    SaleDocument.url.is_not(None),
+                )
+            ).tuples()
+        )
+        documents = []
+        for row in rows:
+            for entry in _legacy_entries(row.legacy_documents):
+                if (row.id, entry["url"]) not in known:
+                    known.add((row.id, entry["url"]))
+                    documents.append(SaleDocument(sale_id=row.id, **entry))
+        db.add_all(documents)
+        db.execute(
+            update(Sale)
+            .where(Sale.id.in_(sale_ids))
+            .values(legacy_documents=None)
+            .execution_options(synchronize_session=False)
+        )
+        migrated += len(rows)
+        created += len(documents)
+        last_id = sale_ids[-1]
+        db.commit()
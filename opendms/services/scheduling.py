@@ -0,0 +1,430 @@
+"""
+Service appointment availability.
+
+Each dealership's upcoming appointments are loaded with one query into
+per-advisor calendars: sorted, merged busy intervals searched with
+``bisect``. Open slots are produced lazily per advisor and merged in time
+order, so "next N slots" only walks as far into the calendar as it must.
+Calendars are cached per dealership and patched from session events when
+appointments are booked, changed or cancelled. A patch replaces the cached
+schedule with an updated copy, so readers walk a calendar without locking.
+
+Appointment times and operating hours are the dealership's local wall time
+in ``SERVICE_TIME_ZONE``; "now" is taken in that zone too.
+"""
+
+import heapq
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from opendms.core import invalidation
+from opendms.core.config import settings
+from opendms.models.dealership import Dealership
+from opendms.models.service import AppointmentStatus, ServiceAppointment
+from opendms.models.user import User, UserRole
+
+# Appointments that occupy an advisor's time
+BLOCKING_STATUSES = (AppointmentStatus.SCHEDULED, AppointmentStatus.IN_PROGRESS)
+
+# Roles that take service appointments
+ADVISOR_ROLES = (UserRole.SERVICE_MANAGER, UserRole.CUSTOMER_SERVICE)
+
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+
+# Used when a dealership has no operating_hours configured
+DEFAULT_OPERATING_HOURS: Dict[int, Tuple[time, time]] = {
+    **{day: (time(8, 0), time(17, 0)) for day in range(5)},
+    5: (time(8, 0), time(12, 0)),
+}
+
+
+@dataclass
+class AdvisorCalendar:
+    """Sorted, non-overlapping busy intervals for one advisor."""
+
+    starts: List[datetime] = field(default_factory=list)
+    ends: List[datetime] = field(default_factory=list)
+
+    def add(self, start: datetime, end: datetime) -> None:
+        """Insert a busy interval, merging it with any it touches."""
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def with_interval(self, start: datetime, end: datetime) -> "AdvisorCalendar":
+        """Return a copy with a busy interval added."""
+        calendar = AdvisorCalendar(list(self.starts), list(self.ends))
+        calendar.add(start, end)
+        return calendar
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """Check that ``[start, end)`` overlaps no busy interval."""
+        i = bisect_right(self.ends, start)
+        return i == len(self.starts) or self.starts[i] >= end
+
+    def gaps(
+        self, window_start: datetime, window_end: datetime
+    ) -> Iterator[Tuple[datetime, datetime]]:
+        """Yield free ``(start, end)`` gaps inside a window, in order."""
+        cursor = window_start
+        i = bisect_right(self.ends, window_start)
+        while i < len(self.starts) and self.starts[i] < window_end:
+            if self.starts[i] > cursor:
+                yield cursor, self.starts[i]
+            cursor = max(cursor, self.ends[i])
+            i += 1
+        if cursor < window_end:
+            yield cursor, window_end
+
+
+@dataclass
+class DealershipSchedule:
+    """
+    Operating hours and advisor calendars for one dealership.
+
+    Not modified once cached; updates swap in a new schedule.
+    """
+
+    hours: Dict[int, Tuple[time, time]]
+    calendars: Dict[int, AdvisorCalendar]
+    loaded_at: float
+
+
+_schedules: Dict[int, DealershipSchedule] = {}
+_lock = threading.Lock()
+
+
+def parse_operating_hours(raw: Optional[str]) -> Dict[int, Tuple[time, time]]:
+    """
+    Parse ``Dealership.operating_hours`` into weekday -> (open, close).
+
+    Accepts a JSON object keyed by weekday name (full or three-letter) whose
+    values are ``{"open": "08:00", "close": "17:00"}``, ``"08:00-17:00"`` or
+    ``null`` for closed days.
+
+    Args:
+        raw: JSON string from the dealership record
+
+    Returns:
+        Dict[int, Tuple[time, time]]: Hours keyed by ``date.weekday()``
+    """
+    if not raw:
+        return dict(DEFAULT_OPERATING_HOURS)
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return dict(DEFAULT_OPERATING_HOURS)
+
+    hours = {}
+    for key, value in data.items():
+        matches = [
+            i for i, day in enumerate(WEEKDAYS) if day.startswith(key.lower()[:3])
+        ]
+        if not matches or not value:
+            continue
+        if isinstance(value, str):
+            opens, closes = value.split("-", 1)
+        else:
+            opens, closes = value.get("open"), value.get("close")
+        if opens and closes:
+            hours[matches[0]] = (
+                time.fromisoformat(opens.strip()),
+                time.fromisoformat(closes.strip()),
+            )
+    return hours
+
+
+def local_now() -> datetime:
+    """Current wall time in ``SERVICE_TIME_ZONE``, naive like stored times."""
+    return datetime.now(ZoneInfo(settings.SERVICE_TIME_ZONE)).replace(tzinfo=None)
+
+
+def _appointment_end(start: datetime, duration: Optional[int]) -> datetime:
+    """Return when an appointment ends, applying the default duration."""
+    minutes = duration or settings.SERVICE_DEFAULT_APPOINTMENT_MINUTES
+    return start + timedelta(minutes=minutes)
+
+
+def load_schedule(db: Session, dealership_id: int) -> DealershipSchedule:
+    """
+    Build a dealership's schedule from its upcoming appointments.
+
+    Args:
+        db: Database session
+        dealership_id: Dealership to load
+
+    Returns:
+        DealershipSchedule: Hours and per-advisor calendars
+    """
+    dealership = db.get(Dealership, dealership_id)
+    hours = parse_operating_hours(dealership.operating_hours if dealership else None)
+
+    calendars: Dict[int, AdvisorCalendar] = {}
+    advisor_ids = db.execute(
+        select(User.id)
+        .where(User.dealership_id == dealership_id)
+        .where(User.is_active.is_(True))
+        .where(User.role.in_(ADVISOR_ROLES))
+    ).scalars()
+    for advisor_id in advisor_ids:
+        calendars[advisor_id] = AdvisorCalendar()
+
+    now = local_now()
+    rows = db.execute(
+        select(
+            ServiceAppointment.service_advisor_id,
+            ServiceAppointment.appointment_date,
+            ServiceAppointment.estimated_duration,
+        )
+        .where(ServiceAppointment.dealership_id == dealership_id)
+        .where(ServiceAppointment.status.in_(BLOCKING_STATUSES))
+        .where(ServiceAppointment.appointment_date >= now - timedelta(days=1))
+        .where(
+            ServiceAppointment.appointment_date
+            < now + timedelta(days=settings.SERVICE_BOOKING_HORIZON_DAYS)
+        )
+        .order_by(ServiceAppointment.appointment_date)
+    )
+    for advisor_id, start, duration in rows:
+        calendar = calendars.setdefault(advisor_id, AdvisorCalendar())
+        calendar.add(start, _appointment_end(start, duration))
+
+    return DealershipSchedule(hours=hours, calendars=calendars, loaded_at=monotonic())
+
+
+def get_schedule(db: Session, dealership_id: int) -> DealershipSchedule:
+    """Return the cached schedule for a dealership, loading it if needed."""
+    with _lock:
+        schedule = _schedules.get(dealership_id)
+    if (
+        schedule is None
+        or monotonic() - schedule.loaded_at > settings.SERVICE_SCHEDULE_CACHE_SECONDS
+    ):
+        schedule = load_schedule(db, dealership_id)
+        with _lock:
+            _schedules[dealership_id] = schedule
+    return schedule
+
+
+def invalidate(dealership_id: Optional[int] = None) -> None:
+    """Drop cached schedules for one dealership, or all of them."""
+    with _lock:
+        if dealership_id is None:
+            _schedules.clear()
+        else:
+            _schedules.pop(dealership_id, None)
+
+
+def _round_up(value: datetime, minutes: int) -> datetime:
+    """Round a datetime up to the next multiple of ``minutes`` past midnight."""
+    midnight = datetime.combine(value.date(), time())
+    step = timedelta(minutes=minutes)
+    steps = -((midnight - value) // step)
+    return midnight + steps * step
+
+
+def _advisor_slots(
+    calendar: AdvisorCalendar,
+    advisor_id: int,
+    window_start: datetime,
+    window_end: datetime,
+    duration: timedelta,
+    increment: int,
+) -> Iterator[Tuple[datetime, int]]:
+    """Yield slot starts for one advisor within a single day's window."""
+    step = timedelta(minutes=increment)
+    for gap_start, gap_end in calendar.gaps(window_start, window_end):
+        slot = _round_up(gap_start, increment)
+        while slot + duration <= gap_end:
+            yield slot, advisor_id
+            slot += step
+
+
+def find_open_slots(
+    schedule: DealershipSchedule,
+    duration_minutes: int,
+    count: int,
+    after: Optional[datetime] = None,
+    advisor_ids: Optional[Sequence[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Find the earliest open slots of a given length.
+
+    Args:
+        schedule: Dealership schedule
+        duration_minutes: Required slot length
+        count: Number of slots to return
+        after: Earliest acceptable start (local time), defaults to now
+        advisor_ids: Restrict to these advisors
+
+    Returns:
+        List[Dict[str, Any]]: Slots with ``start``, ``end`` and
+        ``service_advisor_id``, earliest first
+    """
+    increment = settings.SERVICE_SLOT_INCREMENT_MINUTES
+    duration = timedelta(minutes=duration_minutes)
+    earliest = _round_up(after or local_now(), increment)
+    advisors = {
+        advisor_id: calendar
+        for advisor_id, calendar in schedule.calendars.items()
+        if advisor_ids is None or advisor_id in advisor_ids
+    }
+
+    slots: List[Dict[str, Any]] = []
+    day: date = earliest.date()
+    last_day = day + timedelta(days=settings.SERVICE_BOOKING_HORIZON_DAYS)
+    while day <= last_day and len(slots) < count:
+        if day.weekday() in schedule.hours:
+            opens, closes = schedule.hours[day.weekday()]
+            window_start = max(datetime.combine(day, opens), earliest)
+            window_end = datetime.combine(day, closes)
+            merged = heapq.merge(
+                *(
+                    _advisor_slots(
+                        calendar,
+                        advisor_id,
+                        window_start,
+                        window_end,
+                        duration,
+                        increment,
+                    )
+                    for advisor_id, calendar in advisors.items()
+                )
+            )
+            for start, advisor_id in merged:
+                slots.append(
+                    {
+                        "start": start,
+                        "end": start + duration,
+                        "service_advisor_id": advisor_id,
+                    }
+                )
+                if len(slots) == count:
+                    break
+        day += timedelta(days=1)
+    return slots
+
+
+def find_conflict(
+    db: Session,
+    advisor_id: int,
+    start: datetime,
+    duration_minutes: Optional[int],
+    exclude_id: Optional[int] = None,
+) -> Optional[ServiceAppointment]:
+    """
+    Lock the advisor and look for an overlapping booking.
+
+    The advisor's user row is locked ``FOR UPDATE`` so concurrent bookings
+    for the same advisor serialize until the caller commits; the overlap
+    check and the insert are therefore atomic.
+
+    Args:
+        db: Database session (transaction stays open)
+        advisor_id: Service advisor being booked
+        start: Proposed start
+        duration_minutes: Proposed length, default applied when missing
+        exclude_id: Appointment being rescheduled, ignored in the check
+
+    Returns:
+        Optional[ServiceAppointment]: The conflicting appointment, if any
+    """
+    db.execute(select(User.id).where(User.id == advisor_id).with_for_update())
+
+    end = _appointment_end(start, duration_minutes)
+    stmt = (
+        select(ServiceAppointment)
+        .where(ServiceAppointment.service_advisor_id == advisor_id)
+        .where(ServiceAppointment.status.in_(BLOCKING_STATUSES))
+        .where(
+            ServiceAppointment.appointment_date
+            >= start - timedelta(minutes=settings.SERVICE_MAX_APPOINTMENT_MINUTES)
+        )
+        .where(ServiceAppointment.appointment_date < end)
+    )
+    if exclude_id is not None:
+        stmt = stmt.where(ServiceAppointment.id != exclude_id)
+
+    for appointment in db.execute(stmt).scalars():
+        other_end = _appointment_end(
+            appointment.appointment_date, appointment.estimated_duration
+        )
+        if other_end > start:
+            return appointment
+    return None
+
+
+def _collect_stale_schedules(session: Session, pending: Set[int]) -> None:
+    """Record dealerships whose calendars a flushed change invalidates."""
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, ServiceAppointment):
+            pending.add(obj.dealership_id)
+        elif isinstance(obj, Dealership):
+            pending.add(obj.id)
+        elif isinstance(obj, User) and obj.dealership_id is not None:
+            pending.add(obj.dealership_id)
+
+
+def _drop_schedules(pending: Set[int]) -> None:
+    """Drop cached schedules invalidated by committed changes."""
+    with _lock:
+        for dealership_id in pending:
+            _schedules.pop(dealership_id, None)
+
+
+def _collect_bookings(session: Session, pending: List[Tuple[Any, ...]]) -> None:
+    """Record appointments booked in this flush."""
+    for obj in session.new:
+        if isinstance(obj, ServiceAppointment):
+            pending.append(
+                (
+                    obj.dealership_id,
+                    obj.service_advisor_id,
+                    obj.appointment_date,
+                    obj.estimated_duration,
+                    obj.status,
+                )
+            )
+
+
+def _apply_bookings(pending: List[Tuple[Any, ...]]) -> None:
+    """Patch cached calendars with committed bookings."""
+    with _lock:
+        for dealership_id, advisor_id, start, duration, status in pending:
+            schedule = _schedules.get(dealership_id)
+            if schedule is None or status not in (None, *BLOCKING_STATUSES):
+                continue
+            calendars = dict(schedule.calendars)
+            calendar = calendars.get(advisor_id, AdvisorCalendar())
+            calendars[advisor_id] = calendar.with_interval(
+                start, _appointment_end(start, duration)
+            )
+            _schedules[dealership_id] = replace(schedule, calendars=calendars)
+
+
+# Stale schedules are dropped before bookings are patched into the rest
+invalidation.subscribe("scheduling", _collect_stale_schedules, _drop_schedules)
+invalidation.subscribe(
+    "scheduling_bookings", _collect_bookings, _apply_bookings, factory=list
+)
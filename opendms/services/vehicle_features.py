@@ -0,0 +1,191 @@
+"""
+Vehicle feature lists.
+
+``vehicles.features`` holds a JSON array of feature names, normalized to
+lower case with whitespace collapsed so "Sunroof" and " sunroof " are the
+same feature. On PostgreSQL the column is JSONB with a GIN index
+(``jsonb_path_ops``), so "has all of these features" is a containment query
+answered from the index. SQLite (development) stores the same JSON as text
+and filters with ``json_each``.
+
+Databases created before the column was JSON hold free-form strings: JSON
+lists, JSON objects, or comma-separated names. ``ensure_features_column``
+rewrites those into arrays at startup and, on PostgreSQL, converts the
+column in place; it is a no-op once done.
+"""
+
+import json
+import logging
+from typing import Any, Iterable, List, Optional
+
+from sqlalchemy import and_, column, event, func, select, table, text, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from opendms.models.inventory import Vehicle
+
+logger = logging.getLogger(__name__)
+
+FEATURES_INDEX_NAME = "ix_vehicles_features"
+
+MIGRATION_BATCH_SIZE = 1000
+
+# Untyped view of the column so legacy text is read without JSON decoding
+_raw_vehicles = table("vehicles", column("id"), column("features"))
+
+
+def normalize_features(value: Any) -> Optional[List[str]]:
+    """
+    Convert any accepted form of a feature list to the stored form.
+
+    Accepts a list of names, a JSON string of a list or object, an object
+    of ``{name: enabled}``, or a comma-separated string.
+
+    Returns:
+        Optional[List[str]]: Distinct lower-case names in their first order,
+        or None for no features
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        stripped = value.strip()
+        if not stripped:
+            return None
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            value = stripped.split(",")
+    if isinstance(value, str):
+        value = [value]
+    elif isinstance(value, dict):
+        value = [name for name, enabled in value.items() if enabled]
+    elif not isinstance(value, (list, tuple, set)):
+        value = [value]
+
+    features: List[str] = []
+    for item in value:
+        if item is None or isinstance(item, (dict, list)):
+            continue
+        name = " ".join(str(item).split()).lower()
+        if name and name not in features:
+            features.append(name)
+    return features or None
+
+
+def parse_feature_filter(value: Optional[str]) -> List[str]:
+    """Split a ``features=`` query parameter (comma-separated) into names."""
+    return normalize_features((value or "").split(",")) or []
+
+
+def has_features(db: Session, features: Iterable[str]) -> Any:
+    """
+    SQL condition matching vehicles that have every one of ``features``.
+
+    Args:
+        db: Database session, used to pick the dialect
+        features: Normalized feature names
+
+    Returns:
+        Any: A WHERE clause
+    """
+    features = list(features)
+    if db.get_bind().dialect.name == "postgresql":
+        # @> is served by the GIN index
+        return type_coerce(Vehicle.features, JSONB).contains(features)
+    conditions = []
+    for feature in features:
+        elements = func.json_each(Vehicle.features).table_valued("value")
+        conditions.append(
+            select(1).select_from(elements).where(elements.c.value == feature).exists()
+        )
+    return and_(*conditions)
+
+
+@event.listens_for(Vehicle.features, "set", retval=True)
+def _normalize_on_set(
+    target: Vehicle, value: Any, oldvalue: Any, initiator: Any
+) -> Any:
+    """Store every assignment, API or import, in the normalized form."""
+    return normalize_features(value)
+
+
+def _rewrite_rows(conn: Connection, condition: Optional[Any] = None) -> int:
+    """Rewrite legacy feature strings as JSON arrays, in batches by id."""
+    rewritten = 0
+    last_id = 0
+    while True:
+        stmt = (
+            select(_raw_vehicles.c.id, _raw_vehicles.c.features)
+            .where(_raw_vehicles.c.id > last_id, _raw_vehicles.c.features.is_not(None))
+            .order_by(_raw_vehicles.c.id)
+            .limit(MIGRATION_BATCH_SIZE)
+        )
+        if condition is not None:
+            stmt = stmt.where(condition)
+        rows = conn.execute(stmt).all()
+        if not rows:
+            return rewritten
+        for row in rows:
+            features = normalize_features(row.features)
+            stored = None if features is None else json.dumps(features)
+            if stored != row.features:
+                conn.execute(
+                    _raw_vehicles.update()
+                    .where(_raw_vehicles.c.id == row.id)
+                    .values(features=stored)
+                )
+                rewritten += 1
+        last_id = rows[-1].id
+
+
+def ensure_features_column(bind: Engine) -> None:
+    """
+    Convert legacy feature strings and index the column.
+
+    On PostgreSQL a ``text`` column is rewritten and altered to ``jsonb``
+    (one table rewrite, in a single transaction), then the GIN index is
+    created if missing. On SQLite, rows that are not normalized arrays are
+    rewritten.
+    """
+    dialect = bind.dialect.name
+    with bind.begin() as conn:
+        if dialect == "postgresql":
+            column_type = conn.scalar(
+                text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_schema = current_schema() "
+                    "AND table_name = 'vehicles' AND column_name = 'features'"
+                )
+            )
+            if column_type not in (None, "jsonb"):
+                rewritten = _rewrite_rows(conn)
+                conn.execute(
+                    text(
+                        "ALTER TABLE vehicles ALTER COLUMN features "
+                        "TYPE jsonb USING features::jsonb"
+                    )
+                )
+                logger.info(
+                    "Converted vehicles.features to jsonb (%d rows rewritten)",
+                    rewritten,
+                )
+            conn.execute(
+                text(
+                    f"CREATE INDEX IF NOT EXISTS {FEATURES_INDEX_NAME} "
+                    "ON vehicles USING gin (features jsonb_path_ops)"
+                )
+            )
+        elif dialect == "sqlite":
+            rewritten = _rewrite_rows(
+                conn,
+                # json_type() raises on malformed JSON, so test validity first
+                text(
+                    "CASE WHEN json_valid(features) "
+                    "THEN json_type(features) != 'array' "
+                    "OR json_array_length(features) = 0 "
+                    "OR features != lower(features) ELSE 1 END"
+                ),
+            )
+            if rewritten:
+                logger.info("Rewrote %d legacy vehicle feature lists", rewritten)
@@ -0,0 +1,261 @@
+"""
+Vehicle photo storage and renditions.
+
+Uploaded photos are stored once per content hash (see ``opendms.core.media``)
+and attached to a vehicle with a single batched insert; files are moved into
+place only once that insert has committed. Each photo gets
+``RENDITIONS`` next to the original: JPEGs bounded to a maximum edge, for
+list thumbnails, detail pages and full-screen views.
+
+Resizing a 24-megapixel photo takes a good fraction of a second of CPU, so
+renditions are made in a process pool after the upload has been committed
+and answered. Until they exist, clients fall back to the original.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from PIL import Image, ImageOps
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from opendms.core.config import settings
+from opendms.core.media import (
+    ReceivedFile,
+    media_path,
+    media_url,
+    store,
+    stored_path,
+)
+from opendms.models.inventory import VehicleImage
+
+logger = logging.getLogger(__name__)
+
+# Rendition name -> longest edge in pixels, largest first
+RENDITIONS = {"web": 1600, "medium": 800, "thumbnail": 320}
+
+RENDITION_QUALITY = 82
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/gif")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def rendition_path(original: str, name: str) -> str:
+    """Path of a rendition stored beside its original."""
+    return os.path.join(os.path.dirname(original), f"{name}.jpg")
+
+
+def rendition_urls(image_url: str) -> Dict[str, str]:
+    """URLs of an image's renditions, whether or not they exist yet."""
+    base = image_url.rsplit("/", 1)[0]
+    return {name: f"{base}/{name}.jpg" for name in RENDITIONS}
+
+
+def generate_renditions(original: str) -> List[str]:
+    """
+    Write the missing renditions of one stored image.
+
+    Runs in a worker process. Each rendition is scaled from the next larger
+    one rather than from the original, and written atomically.
+
+    Args:
+        original: Absolute path of the stored original
+
+    Returns:
+        List[str]: Names of the renditions written
+    """
+    missing = {
+        name: size
+        for name, size in RENDITIONS.items()
+        if not os.path.exists(rendition_path(original, name))
+    }
+    if not missing:
+        return []
+
+    with Image.open(original) as source:
+        largest = max(missing.values())
+        # Lets the JPEG decoder skip most of the work for large reductions
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    written = []
+    for name, size in RENDITIONS.items():
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if name not in missing:
+            continue
+        path = rendition_path(original, name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        image.save(
+            temp_path,
+            "JPEG",
+            quality=RENDITION_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        os.replace(temp_path, path)
+        written.append(name)
+    return written
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Process pool shared by CPU-bound image work."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit the server's threads and sockets
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_RENDITION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _log_failure(original: str, future: Future) -> None:
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Renditions failed for %s: %s", original, exc)
+
+
+def schedule_renditions(originals: Sequence[str]) -> None:
+    """Queue rendition generation for stored originals without waiting."""
+    pool = get_pool()
+    for original in originals:
+        future = pool.submit(generate_renditions, original)
+        future.add_done_callback(lambda done, path=original: _log_failure(path, done))
+
+
+def shutdown_pool() -> None:
+    """Wait for queued renditions and stop the worker processes."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def attach_images(
+    db: Session,
+    vehicle_id: int,
+    files: Sequence[ReceivedFile],
+    image_type: Optional[str] = None,
+    primary: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Add uploaded photos to a vehicle.
+
+    New photos are appended after the vehicle's existing ones in upload
+    order. Photos the vehicle already has are skipped. If the vehicle has no
+    primary photo the first new one becomes primary; ``primary`` picks a
+    different one and replaces the current primary, and if it points at a
+    skipped photo the vehicle's existing copy becomes primary.
+
+    Nothing is written to the media directory here: the caller commits and
+    then moves the files into place with ``store_attached``, so a rollback
+    leaves no stored files behind.
+
+    Args:
+        db: Database session
+        vehicle_id: Vehicle receiving the photos
+        files: Files from ``receive_files``, in upload order
+        image_type: Optional label such as ``exterior`` or ``interior``
+        primary: Index into ``files`` of the photo to make primary
+
+    Returns:
+        Dict[str, Any]: ``images`` created, ``duplicates`` skipped (file
+        names), ``files`` to store after the commit and ``originals``
+        (their paths, needing renditions)
+    """
+    existing = db.execute(
+        select(
+            func.max(VehicleImage.sort_order),
+            func.count(VehicleImage.id).filter(VehicleImage.is_primary.is_(True)),
+        ).where(VehicleImage.vehicle_id == vehicle_id)
+    ).one()
+    next_order = 0 if existing[0] is None else existing[0] + 1
+    has_primary = bool(existing[1])
+    # URL -> id of an existing image, or an image added by this upload
+    known: Dict[str, Any] = dict(
+        db.execute(
+            select(VehicleImage.image_url, VehicleImage.id).where(
+                VehicleImage.vehicle_id == vehicle_id
+            )
+        ).all()
+    )
+
+    images, duplicates, to_store, originals = [], [], [], []
+    primary_image = None
+    for position, received in enumerate(files):
+        original = stored_path(received, "images")
+        url = media_url(original)
+        if url in known:
+            duplicates.append(received.filename)
+            if position == primary:
+                primary_image = known[url]
+            continue
+        to_store.append(received)
+        originals.append(original)
+        image = VehicleImage(
+            vehicle_id=vehicle_id,
+            image_url=url,
+            image_type=image_type,
+            is_primary=False,
+            sort_order=next_order,
+        )
+        known[url] = image
+        next_order += 1
+        images.append(image)
+        if position == primary or (
+            primary is None and not has_primary and primary_image is None
+        ):
+            primary_image = image
+
+    if primary_image is not None:
+        if has_primary:
+            db.execute(
+                update(VehicleImage)
+                .where(
+                    VehicleImage.vehicle_id == vehicle_id,
+                    VehicleImage.is_primary.is_(True),
+                )
+                .values(is_primary=False)
+            )
+        if isinstance(primary_image, VehicleImage):
+            primary_image.is_primary = True
+        else:
+            db.execute(
+                update(VehicleImage)
+                .where(VehicleImage.id == primary_image)
+                .values(is_primary=True)
+            )
+
+    # One INSERT for the batch
+    db.add_all(images)
+    db.flush()
+    return {
+        "images": images,
+        "duplicates": duplicates,
+        "files": to_store,
+        "originals": originals,
+    }
+
+
+def store_attached(files: Sequence[ReceivedFile]) -> None:
+    """Move the files of committed images to their stored paths."""
+    for received in files:
+        store(received, "images")
+
+
+def image_renditions(image: VehicleImage) -> Dict[str, str]:
+    """Rendition URLs of an attached image that have been generated."""
+    original = media_path(image.image_url)
+    return {
+        name: url
+        for name, url in rendition_urls(image.image_url).items()
+        if os.path.exists(rendition_path(original, name))
+    }
@@ -0,0 +1,361 @@
+"""
+Offline VIN decoding.
+
+A 17-character VIN (ISO 3779) carries the manufacturer (WMI, positions 1-3),
+a manufacturer-specific vehicle description (VDS, positions 4-8), a check
+digit (position 9) and the model year (position 10). Decoding uses the
+reference table in ``opendms/data/vin_reference.csv``: each row is a VIN
+prefix, either a bare WMI giving the make or a WMI plus leading VDS
+characters giving the model, optionally limited to a range of model years.
+The longest matching prefix wins. Extending coverage is a matter of adding
+rows.
+
+The table is parsed once at import, so a preforking server that imports the
+app before forking shares it between workers. Decoding is pure Python at
+roughly 15 microseconds per VIN, and results are memoized, so a 10,000-VIN
+import decodes in a fraction of a second.
+
+Vehicles inserted without ``year``, ``make`` or ``model`` have them filled
+from the VIN, which covers the create endpoint and any bulk import.
+"""
+
+import csv
+from dataclasses import asdict, dataclass
+from datetime import date
+from functools import lru_cache
+from operator import mul
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from opendms.core.config import settings
+from opendms.models.inventory import Vehicle
+
+REFERENCE_PATH = Path(__file__).resolve().parent.parent / "data" / "vin_reference.csv"
+
+VIN_LENGTH = 17
+
+# I, O and Q are never used, to avoid confusion with 1 and 0
+VIN_CHARACTERS = frozenset("ABCDEFGHJKLMNPRSTUVWXYZ0123456789")
+
+_TRANSLITERATION = {
+    **{str(digit): digit for digit in range(10)},
+    **dict(zip("ABCDEFGH", range(1, 9), strict=True)),
+    **dict(zip("JKLMN", range(1, 6), strict=True)),
+    "P": 7,
+    "R": 9,
+    **dict(zip("STUVWXYZ", range(2, 10), strict=True)),
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 codes in order; the cycle repeats every 30 years from 1980
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+_YEAR_OFFSETS = {code: offset for offset, code in enumerate(_YEAR_CODES)}
+
+# Ordering of the second character used by country code ranges
+_RANGE_ORDER = {
+    code: index for index, code in enumerate("ABCDEFGHJKLMNPRSTUVWXYZ1234567890")
+}
+
+REGIONS = {
+    **dict.fromkeys("12345", "North America"),
+    **dict.fromkeys("67", "Oceania"),
+    **dict.fromkeys("890", "South America"),
+    **dict.fromkeys("ABCDEFGH", "Africa"),
+    **dict.fromkeys("JKLMNPR", "Asia"),
+    **dict.fromkeys("STUVWXYZ", "Europe"),
+}
+
+# First character -> ((first second char, last second char, country), ...)
+COUNTRIES = {
+    "1": (("A", "0", "United States"),),
+    "2": (("A", "0", "Canada"),),
+    "3": (("A", "W", "Mexico"),),
+    "4": (("A", "0", "United States"),),
+    "5": (("A", "0", "United States"),),
+    "6": (("A", "W", "Australia"),),
+    "7": (("A", "E", "New Zealand"), ("F", "0", "United States")),
+    "9": (("A", "E", "Brazil"), ("F", "J", "Colombia")),
+    "J": (("A", "0", "Japan"),),
+    "K": (("L", "R", "South Korea"),),
+    "L": (("A", "0", "China"),),
+    "M": (("A", "E", "India"), ("F", "K", "Indonesia"), ("L", "R", "Thailand")),
+    "S": (("A", "M", "United Kingdom"), ("N", "T", "Germany"), ("U", "Z", "Poland")),
+    "T": (("J", "P", "Czech Republic"), ("R", "V", "Hungary")),
+    "V": (("F", "R", "France"), ("S", "W", "Spain")),
+    "W": (("A", "0", "Germany"),),
+    "Y": (("A", "E", "Belgium"), ("S", "W", "Sweden")),
+    "Z": (("A", "R", "Italy"),),
+}
+
+# Fields a decode can fill on a Vehicle
+VEHICLE_FIELDS = ("year", "make", "model", "body_style", "fuel_type")
+
+
+@dataclass(frozen=True)
+class _Pattern:
+    year_from: Optional[int]
+    year_to: Optional[int]
+    make: Optional[str]
+    model: Optional[str]
+    body_style: Optional[str]
+    fuel_type: Optional[str]
+
+    def covers(self, year: Optional[int]) -> bool:
+        """Whether the pattern applies to a model year (None if unknown)."""
+        if year is None:
+            return self.year_from is None and self.year_to is None
+        return (self.year_from is None or year >= self.year_from) and (
+            self.year_to is None or year <= self.year_to
+        )
+
+
+@dataclass(frozen=True)
+class DecodedVin:
+    """What a VIN says about a vehicle."""
+
+    vin: str
+    valid: bool
+    errors: Tuple[str, ...] = ()
+    check_digit_valid: Optional[bool] = None
+    wmi: Optional[str] = None
+    vds: Optional[str] = None
+    vis: Optional[str] = None
+    region: Optional[str] = None
+    country: Optional[str] = None
+    year: Optional[int] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    body_style: Optional[str] = None
+    fuel_type: Optional[str] = None
+    plant_code: Optional[str] = None
+    serial_number: Optional[str] = None
+
+    def vehicle_fields(self) -> Dict[str, Any]:
+        """Decoded values for ``Vehicle`` columns, omitting unknowns."""
+        return {
+            name: getattr(self, name)
+            for name in VEHICLE_FIELDS
+            if getattr(self, name) is not None
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["errors"] = list(self.errors)
+        return data
+
+
+def _parse_years(value: str) -> Tuple[Optional[int], Optional[int]]:
+    if not value:
+        return None, None
+    start, _, end = value.partition("-")
+    return int(start) if start else None, int(end) if end else None
+
+
+def load_reference(path: Path = REFERENCE_PATH) -> Dict[str, Tuple[_Pattern, ...]]:
+    """
+    Parse the reference table.
+
+    Returns:
+        Dict[str, Tuple]: VIN prefix -> patterns, most specific year range
+        first
+    """
+    patterns: Dict[str, List[_Pattern]] = {}
+    with open(path, newline="") as handle:
+        rows = csv.DictReader(line for line in handle if not line.startswith("#"))
+        for row in rows:
+            year_from, year_to = _parse_years(row["years"])
+            patterns.setdefault(row["pattern"].upper(), []).append(
+                _Pattern(
+                    year_from=year_from,
+                    year_to=year_to,
+                    make=row["make"] or None,
+                    model=row["model"] or None,
+                    body_style=row["body_style"] or None,
+                    fuel_type=row["fuel_type"] or None,
+                )
+            )
+    return {
+        prefix: tuple(
+            sorted(
+                entries,
+                key=lambda pattern: (
+                    pattern.year_from is None,
+                    pattern.year_to is None,
+                ),
+            )
+        )
+        for prefix, entries in patterns.items()
+    }
+
+
+_REFERENCE = load_reference()
+# Prefix lengths present in the table, longest first
+_PREFIX_LENGTHS = sorted({len(prefix) for prefix in _REFERENCE}, reverse=True)
+
+
+def check_digit(vin: str) -> str:
+    """
+    Compute the check digit (position 9) of a 17-character VIN.
+
+    Raises:
+        KeyError: If the VIN contains characters that cannot appear in one
+    """
+    total = sum(map(mul, map(_TRANSLITERATION.__getitem__, vin), _WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def model_year(vin: str, latest: Optional[int] = None) -> Optional[int]:
+    """
+    Decode the model year from position 10.
+
+    The code repeats every 30 years. For North American light vehicles a
+    letter in position 7 marks the 2010 cycle and a digit the 1980 one;
+    otherwise the most recent year not after ``latest`` is used.
+
+    Args:
+        vin: 17-character VIN
+        latest: Newest plausible model year, defaults to next year
+    """
+    offset = _YEAR_OFFSETS.get(vin[9])
+    if offset is None:
+        return None
+    latest = latest or date.today().year + 1
+    year = 1980 + offset
+    if vin[0] in "12345" and vin[6].isalpha():
+        year += 30
+    elif vin[0] not in "12345":
+        while year + 30 <= latest:
+            year += 30
+    return year if year <= latest else year - 30
+
+
+def _country(vin: str) -> Optional[str]:
+    second = _RANGE_ORDER.get(vin[1])
+    for start, end, country in COUNTRIES.get(vin[0], ()):
+        if second is not None and _RANGE_ORDER[start] <= second <= _RANGE_ORDER[end]:
+            return country
+    return None
+
+
+def _lookup(vin: str, year: Optional[int]) -> Dict[str, Optional[str]]:
+    """Merge matching reference patterns, longest prefix first."""
+    found: Dict[str, Optional[str]] = {}
+    for length in _PREFIX_LENGTHS:
+        for pattern in _REFERENCE.get(vin[:length], ()):
+            if pattern.covers(year):
+                for name in ("make", "model", "body_style", "fuel_type"):
+                    if found.get(name) is None:
+                        found[name] = getattr(pattern, name)
+                break
+    return found
+
+
+def normalize_vin(vin: Optional[str]) -> str:
+    """Upper-case a VIN and strip spaces and dashes."""
+    return "".join((vin or "").split()).replace("-", "").upper()
+
+
+def decode(vin: Optional[str]) -> DecodedVin:
+    """
+    Decode a VIN.
+
+    Never raises: problems are reported in ``errors`` and ``valid``. The
+    check digit is required to match for North American VINs, where it is
+    mandatory, and reported but not enforced elsewhere.
+
+    Args:
+        vin: VIN in any case, spaces and dashes allowed
+
+    Returns:
+        DecodedVin: Decoded fields; unknown parts are None
+    """
+    return _decode(normalize_vin(vin))
+
+
+@lru_cache(maxsize=settings.VIN_DECODE_CACHE_SIZE)
+def _decode(vin: str) -> DecodedVin:
+    if len(vin) != VIN_LENGTH:
+        return DecodedVin(vin=vin, valid=False, errors=("VIN must be 17 characters",))
+    if not VIN_CHARACTERS.issuperset(vin):
+        invalid = sorted(set(vin) - VIN_CHARACTERS)
+        return DecodedVin(
+            vin=vin,
+            valid=False,
+            errors=(f"VIN contains invalid characters: {', '.join(invalid)}",),
+        )
+
+    errors = []
+    check_ok = check_digit(vin) == vin[8]
+    region = REGIONS.get(vin[0])
+    if not check_ok and region == "North America":
+        errors.append("Check digit does not match")
+    year = model_year(vin)
+    if year is None:
+        errors.append(f"Unknown model year code: {vin[9]}")
+
+    return DecodedVin(
+        vin=vin,
+        valid=not errors,
+        errors=tuple(errors),
+        check_digit_valid=check_ok,
+        wmi=vin[:3],
+        vds=vin[3:8],
+        vis=vin[9:],
+        region=region,
+        country=_country(vin),
+        year=year,
+        plant_code=vin[10],
+        serial_number=vin[11:],
+        **_lookup(vin, year),
+    )
+
+
+def decode_many(vins: Iterable[Optional[str]]) -> List[DecodedVin]:
+    """
+    Decode a batch of VINs in order.
+
+    Repeated VINs are decoded once.
+    """
+    decoded: Dict[str, DecodedVin] = {}
+    results = []
+    for vin in vins:
+        key = normalize_vin(vin)
+        result = decoded.get(key)
+        if result is None:
+            result = decoded[key] = _decode(key)
+        results.append(result)
+    return results
+
+
+def fill_vehicle_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fill missing vehicle fields in ``data`` from its ``vin``.
+
+    Values already present are never overwritten, and nothing is filled
+    from a VIN that fails validation.
+
+    Returns:
+        Dict[str, Any]: ``data``, updated in place
+    """
+    decoded = decode(data.get("vin"))
+    if decoded.valid:
+        for name, value in decoded.vehicle_fields().items():
+            if data.get(name) is None:
+                data[name] = value
+    return data
+
+
+@event.listens_for(Vehicle, "before_insert")
+def _fill_from_vin(mapper: Any, connection: Any, vehicle: Vehicle) -> None:
+    """Complete vehicles created or imported without year, make or model."""
+    if all(getattr(vehicle, name) is not None for name in VEHICLE_FIELDS):
+        return
+    decoded = decode(vehicle.vin)
+    if not decoded.valid:
+        return
+    for name, value in decoded.vehicle_fields().items():
+        if getattr(vehicle, name) is None:
+            setattr(vehicle, name, value)
@@ -1,19 +1,17 @@
 // Service Worker for OpenDMS PWA
-const CACHE_NAME = "opendms-v1.0.0";
-const STATIC_CACHE = "opendms-static-v1.0.0";
+// Rendered by GET /sw.js: the static cache is named after the asset version,
+// so any change to a static file installs a new worker and a fresh precache.
+const STATIC_CACHE = "opendms-static-{{ asset_version }}";
 const DYNAMIC_CACHE = "opendms-dynamic-v1.0.0";
 
-// Files to cache immediately
+// Files to cache immediately; static files use fingerprinted URLs
 const STATIC_FILES = [
   "/",
-  "/static/css/app.css",
-  "/static/manifest.json",
-  "/static/icons/icon-192x192.png",
-  "/static/icons/icon-512x512.png",
+  "/offline.html",
   "https://unpkg.com/htmx.org@1.9.0",
   "https://unpkg.com/hyperscript.org@0.9.8",
   "https://cdn.tailwindcss.com",
-];
+].concat({{ static_urls | tojson }});
 
 // Install event - cache static files
 self.addEventListener("install", (event) => {
@@ -0,0 +1,209 @@
+"""
+Celery application and background job runner.
+
+Every job registered in ``opendms.services.jobs`` runs through the single
+``opendms.jobs.run`` task, published to the job type's queue (reports,
+emails, integrations or default) so each queue can get its own workers:
+
+    celery -A opendms.worker worker -Q reports --concurrency=2
+    celery -A opendms.worker worker -Q default,emails,integrations
+    celery -A opendms.worker beat
+
+Each worker process keeps per-job-type timing (queue wait and runtime), which
+``collect_metrics`` gathers from all workers with a broadcast. With
+``CELERY_TASK_ALWAYS_EAGER`` jobs run inline and results are kept in memory,
+so the API works in local runs and tests without a broker.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+from time import perf_counter, time
+from typing import Any, Dict, Optional
+
+from celery import Celery
+from celery.schedules import crontab
+from celery.worker.control import inspect_command
+from kombu import Queue
+
+from opendms.core.config import settings
+from opendms.core.database import SessionLocal
+from opendms.services import audit, change_feed  # noqa: F401  audits and publishes job writes
+from opendms.services.jobs import JOB_TYPES, QUEUE_DEFAULT, QUEUES
+
+logger = logging.getLogger(__name__)
+
+if settings.CELERY_TASK_ALWAYS_EAGER:
+    celery_app = Celery("opendms", broker="memory://", backend="cache+memory://")
+else:
+    celery_app = Celery(
+        "opendms",
+        broker=settings.CELERY_BROKER_URL,
+        backend=settings.CELERY_RESULT_BACKEND,
+    )
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    timezone="UTC",
+    enable_utc=True,
+    task_queues=[Queue(name) for name in QUEUES],
+    task_default_queue=QUEUE_DEFAULT,
+    task_track_started=True,
+    result_extended=True,
+    result_expires=timedelta(hours=settings.JOB_RESULT_TTL_HOURS),
+    # Long reports should not be prefetched behind each other
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_always_eager=settings.CELERY_TASK_ALWAYS_EAGER,
+    task_store_eager_result=True,
+    beat_schedule={
+        "send-service-reminders": {
+            "task": "opendms.jobs.run",
+            "schedule": float(settings.REMINDER_INTERVAL_SECONDS),
+            "args": ("service_reminders", {}),
+            "options": {"queue": JOB_TYPES["service_reminders"].queue},
+        },
+        "maintain-partitions": {
+            "task": "opendms.jobs.run",
+            "schedule": crontab(hour=2, minute=0),
+            "args": ("partition_maintenance", {}),
+            "options": {"queue": JOB_TYPES["partition_maintenance"].queue},
+        },
+        "prune-audit-log": {
+            "task": "opendms.jobs.run",
+            "schedule": crontab(hour=3, minute=0),
+            "args": ("audit_log_retention", {}),
+            "options": {"queue": JOB_TYPES["audit_log_retention"].queue},
+        },
+        "clean-document-uploads": {
+            "task": "opendms.jobs.run",
+            "schedule": crontab(minute=15),
+            "args": ("document_upload_cleanup", {}),
+            "options": {"queue": JOB_TYPES["document_upload_cleanup"].queue},
+        },
+    },
+)
+
+# Per-process timing, keyed by job type
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, float]] = {}
+
+
+def record_timing(
+    job_type: str, runtime: float, wait: Optional[float], failed: bool
+) -> None:
+    """Add one job execution to this process's timing metrics."""
+    with _metrics_lock:
+        entry = _metrics.setdefault(
+            job_type,
+            {
+                "count": 0,
+                "failures": 0,
+                "total_runtime_seconds": 0.0,
+                "max_runtime_seconds": 0.0,
+                "total_wait_seconds": 0.0,
+                "max_wait_seconds": 0.0,
+            },
+        )
+        entry["count"] += 1
+        entry["failures"] += int(failed)
+        entry["total_runtime_seconds"] += runtime
+        entry["max_runtime_seconds"] = max(entry["max_runtime_seconds"], runtime)
+        if wait is not None:
+            entry["total_wait_seconds"] += wait
+            entry["max_wait_seconds"] = max(entry["max_wait_seconds"], wait)
+
+
+def local_metrics() -> Dict[str, Dict[str, float]]:
+    """Return a copy of this process's timing metrics."""
+    with _metrics_lock:
+        return {name: dict(entry) for name, entry in _metrics.items()}
+
+
+@inspect_command()
+def job_metrics(state) -> Dict[str, Dict[str, float]]:
+    """Remote-control command returning a worker's timing metrics."""
+    return local_metrics()
+
+
+def collect_metrics(timeout: float = 1.0) -> Dict[str, Dict[str, float]]:
+    """
+    Merge timing metrics from every reachable worker.
+
+    Args:
+        timeout: Seconds to wait for worker replies
+
+    Returns:
+        Dict[str, Dict[str, float]]: Summed counts and totals, maxima of maxima
+    """
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        return local_metrics()
+
+    replies = celery_app.control.broadcast("job_metrics", reply=True, timeout=timeout)
+    merged: Dict[str, Dict[str, float]] = {}
+    for reply in replies:
+        for worker_metrics in reply.values():
+            for job_type, entry in worker_metrics.items():
+                target = merged.setdefault(job_type, dict.fromkeys(entry, 0))
+                for key, value in entry.items():
+                    if key.startswith("max_"):
+                        target[key] = max(target[key], value)
+                    else:
+                        target[key] += value
+    return merged
+
+
+@celery_app.task(bind=True, name="opendms.jobs.run")
+def run_job(
+    self,
+    job_type: str,
+    params: Dict[str, Any],
+    submitted_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Run a registered job and return its result with timing."""
+    job = JOB_TYPES[job_type]
+    wait = max(time() - submitted_at, 0.0) if submitted_at else None
+    started = perf_counter()
+    failed = True
+    db = SessionLocal()
+    try:
+        result = job.handler(db, **params)
+        failed = False
+    finally:
+        db.close()
+        runtime = perf_counter() - started
+        record_timing(job_type, runtime, wait, failed)
+        logger.info(
+            "Job %s (%s) %s in %.3fs after %.3fs in queue",
+            job_type,
+            self.request.id,
+            "failed" if failed else "finished",
+            runtime,
+            wait or 0.0,
+        )
+    return {
+        "job_type": job_type,
+        "result": result,
+        "runtime_seconds": round(runtime, 6),
+        "wait_seconds": None if wait is None else round(wait, 6),
+    }
+
+
+def submit_job(job_type: str, params: Dict[str, Any]) -> str:
+    """
+    Queue a registered job on its queue.
+
+    Args:
+        job_type: Name from ``JOB_TYPES``
+        params: Keyword arguments for the job handler
+
+    Returns:
+        str: Job id for status polling
+    """
+    job = JOB_TYPES[job_type]
+    async_result = run_job.apply_async(
+        args=(job_type, params), kwargs={"submitted_at": time()}, queue=job.queue
+    )
+    return async_result.id
@@ -0,0 +1,95 @@
+"""
+Shared test fixtures.
+
+Tests run against a throwaway SQLite database created per test. Tests that
+take the ``pg_engine`` fixture need ``OPENDMS_TEST_POSTGRES_URL`` pointing
+at a disposable PostgreSQL database (its ``public`` schema is dropped) and
+are skipped without it.
+"""
+
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="opendms-tests-")
+
+# Settings are read at import time, so configure them before importing opendms
+os.environ.update(
+    {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{_TMP}/test.db",
+        "UPLOAD_DIR": os.path.join(_TMP, "uploads"),
+        "DOCUMENT_DIR": os.path.join(_TMP, "documents"),
+        "AUDIT_SPILL_DIR": os.path.join(_TMP, "audit_spill"),
+    }
+)
+for name, value in {
+    "SECRET_KEY": "test-secret-key",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_USER": "opendms",
+    "POSTGRES_PASSWORD": "opendms",
+    "POSTGRES_DB": "opendms_test",
+    "REALTIME_BROKER": "local",
+    "RATE_LIMIT_BACKEND": "local",
+    "NOTIFICATION_BACKEND": "memory",
+    "CELERY_TASK_ALWAYS_EAGER": "true",
+    "LOG_JSON": "false",
+    "BACKEND_CORS_ORIGINS": '["http://dms.example"]',
+    # Every test client shares one IP bucket; rate limit tests enable it
+    "RATE_LIMIT_ENABLED": "false",
+}.items():
+    os.environ.setdefault(name, value)
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from opendms.core.config import settings  # noqa: E402
+from opendms.core.database import Base, SessionLocal, engine  # noqa: E402
+from opendms.services import audit  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session on a freshly created SQLite schema."""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        # Audit rows are written in the background; finish before dropping
+        audit.writer.flush()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db):
+    """API client whose requests use the test session (no lifespan)."""
+    from fastapi.testclient import TestClient
+
+    from opendms.core.database import get_db
+    from opendms.main import app
+
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app, base_url="http://localhost")
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def pg_engine(monkeypatch):
+    """Engine on an emptied PostgreSQL database (changes are not audited)."""
+    url = os.environ.get("OPENDMS_TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("OPENDMS_TEST_POSTGRES_URL is not set")
+    # The audit writer inserts through the SQLite engine, which has no
+    # tables while these tests run
+    monkeypatch.setattr(settings, "ENABLE_AUDIT_LOGGING", False)
+    pg = create_engine(url)
+    with pg.begin() as conn:
+        conn.execute(text("DROP SCHEMA IF EXISTS public CASCADE"))
+        conn.execute(text("DROP SCHEMA IF EXISTS archive CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    try:
+        yield pg
+    finally:
+        pg.dispose()
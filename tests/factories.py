@@ -0,0 +1,120 @@
+"""
+Model factories for tests.
+
+Each factory fills the required columns with unique values, applies the
+keyword overrides, and flushes so the row has an id.
+"""
+
+import itertools
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from opendms.models import (
+    Customer,
+    Dealership,
+    Sale,
+    ServiceAppointment,
+    ServiceWorkOrder,
+    User,
+    Vehicle,
+)
+
+_sequence = itertools.count(1)
+
+
+def _add(db: Session, instance: Any) -> Any:
+    db.add(instance)
+    db.flush()
+    return instance
+
+
+def dealership(db: Session, **overrides: Any) -> Dealership:
+    n = next(_sequence)
+    values = {
+        "name": f"Dealership {n}",
+        "dealer_number": f"D{n:05d}",
+        "address_line_1": f"{n} Main St",
+        "city": "Springfield",
+        "state": "IL",
+        "zip_code": "62701",
+    }
+    return _add(db, Dealership(**{**values, **overrides}))
+
+
+def user(db: Session, **overrides: Any) -> User:
+    n = next(_sequence)
+    values = {
+        "email": f"user{n}@example.com",
+        "hashed_password": "not-a-hash",
+        "first_name": "Pat",
+        "last_name": f"User{n}",
+    }
+    return _add(db, User(**{**values, **overrides}))
+
+
+def customer(db: Session, **overrides: Any) -> Customer:
+    if "dealership_id" not in overrides:
+        overrides["dealership_id"] = dealership(db).id
+    values = {"first_name": "Alex", "last_name": f"Customer{next(_sequence)}"}
+    return _add(db, Customer(**{**values, **overrides}))
+
+
+def vehicle(db: Session, **overrides: Any) -> Vehicle:
+    n = next(_sequence)
+    if "dealership_id" not in overrides:
+        overrides["dealership_id"] = dealership(db).id
+    values = {
+        "vin": f"1HGCM82633A{n:06d}",
+        "stock_number": f"S{n:05d}",
+        "year": 2022,
+        "make": "Honda",
+        "model": "Accord",
+    }
+    return _add(db, Vehicle(**{**values, **overrides}))
+
+
+def _people(db: Session, overrides: dict, person: str) -> None:
+    """Fill dealership, customer, vehicle and staff ids that were not given."""
+    if "dealership_id" not in overrides:
+        overrides["dealership_id"] = dealership(db).id
+    dealership_id = overrides["dealership_id"]
+    if "customer_id" not in overrides:
+        overrides["customer_id"] = customer(db, dealership_id=dealership_id).id
+    if "vehicle_id" not in overrides:
+        overrides["vehicle_id"] = vehicle(db, dealership_id=dealership_id).id
+    if person not in overrides:
+        overrides[person] = user(db, dealership_id=dealership_id).id
+
+
+def sale(db: Session, **overrides: Any) -> Sale:
+    _people(db, overrides, "sales_person_id")
+    values = {
+        "sale_number": f"S-{next(_sequence):06d}",
+        "sale_date": datetime(2026, 3, 15, 12, 0),
+        "vehicle_price": 30000.0,
+        "total_amount": 32000.0,
+    }
+    return _add(db, Sale(**{**values, **overrides}))
+
+
+def appointment(db: Session, **overrides: Any) -> ServiceAppointment:
+    _people(db, overrides, "service_advisor_id")
+    values = {
+        "appointment_number": f"A-{next(_sequence):06d}",
+        "appointment_date": datetime(2026, 3, 16, 9, 0),
+        "estimated_duration": 60,
+        "service_type": "maintenance",
+    }
+    return _add(db, ServiceAppointment(**{**values, **overrides}))
+
+
+def work_order(db: Session, **overrides: Any) -> ServiceWorkOrder:
+    if "appointment_id" not in overrides:
+        overrides["appointment_id"] = appointment(db).id
+    values = {
+        "work_order_number": f"RO-{next(_sequence):06d}",
+        "estimated_hours": 1.5,
+    }
+    return _add(db, ServiceWorkOrder(**{**values, **overrides}))
@@ -0,0 +1,110 @@
+import pytest
+
+from opendms.core import admission
+from opendms.core.admission import AdmissionMiddleware, controller
+from opendms.core.config import settings
+
+ORIGIN = "http://dms.example"
+
+
+@pytest.fixture
+def load(monkeypatch):
+    """Sets the worker's pressure through its database pool wait."""
+    monkeypatch.setattr(controller, "in_flight", 0)
+    monkeypatch.setattr(controller, "loop_lag", 0.0)
+    monkeypatch.setattr(controller, "pool_wait", 0.0)
+    monkeypatch.setattr(controller, "shed", {})
+
+    def set_pressure(pressure):
+        controller.pool_wait = pressure * settings.ADMISSION_POOL_WAIT_TARGET_MS / 1000
+
+    return set_pressure
+
+
+def test_pressure_is_the_worst_signal(load):
+    controller.in_flight = settings.ADMISSION_MAX_IN_FLIGHT // 2
+    assert controller.pressure() == pytest.approx(0.5)
+    controller.loop_lag = 3 * settings.ADMISSION_LOOP_LAG_TARGET_MS / 1000
+    assert controller.pressure() == pytest.approx(3.0)
+    load(1.5)
+    assert controller.pressure() == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize(
+    "pressure, shed",
+    [
+        (0.99, []),
+        (1.0, ["low"]),
+        (1.99, ["low"]),
+        (2.0, ["low", "normal"]),
+        (4.0, ["high", "low", "normal"]),
+    ],
+)
+def test_classes_are_shed_at_their_thresholds(load, pressure, shed):
+    load(pressure)
+    assert [p for p in ("high", "low", "normal") if not controller.admits(p)] == shed
+    assert controller.status()["shedding"] == shed
+    # Classes without a threshold are never shed
+    assert controller.admits("unlisted")
+
+
+def test_pool_wait_counts_checkouts_still_waiting(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission, "monotonic", lambda: now[0])
+    checkouts = admission.AdmissionController()
+    done = checkouts.checkout_started()
+    pending = checkouts.checkout_started()
+    now[0] += 0.05
+    checkouts.checkout_finished(done)
+    assert checkouts._sample_pool_wait() == pytest.approx(0.05)
+
+    now[0] += 0.3
+    assert checkouts._sample_pool_wait() == pytest.approx(0.35)
+    checkouts.checkout_finished(pending)
+    assert checkouts._sample_pool_wait() == pytest.approx(0.35)
+    assert checkouts._sample_pool_wait() == 0.0
+
+
+def test_routes_map_to_priority_classes():
+    middleware = AdmissionMiddleware(app=None)
+    assert middleware.priority("POST", "/api/v1/auth/login") == "high"
+    assert middleware.priority("PUT", "/api/v1/sales/3") == "high"
+    assert middleware.priority("GET", "/api/v1/reports/units") == "low"
+    # Entries without * only match the exact path
+    assert middleware.priority("GET", "/api/v1/inventory/") == "low"
+    assert middleware.priority("GET", "/api/v1/inventory/vin/X") == "normal"
+    assert middleware.priority("GET", "/api/v1/sales/3") == "normal"
+
+
+def test_shed_requests_get_503_with_retry_after(client, load):
+    load(1.5)
+    shed = client.get("/api/v1/inventory/", headers={"Origin": ORIGIN})
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == str(settings.ADMISSION_RETRY_AFTER)
+    assert shed.headers["access-control-allow-origin"] == ORIGIN
+    assert shed.json() == {
+        "detail": "Server is overloaded, retry later",
+        "priority": "low",
+    }
+    assert controller.shed == {"low": 1}
+
+    # Normal traffic still passes, and leaves nothing in flight
+    assert client.get("/api/v1/inventory/vin/X").status_code == 200
+    assert controller.in_flight == 0
+    assert client.get("/health").status_code == 200
+
+
+def test_ready_fails_while_the_default_class_is_shed(client, load):
+    load(1.5)
+    ready = client.get("/ready")
+    assert ready.status_code == 200
+    assert ready.json()["shedding"] == ["low"]
+
+    load(2.0)
+    ready = client.get("/ready")
+    assert ready.status_code == 503
+    assert ready.json()["ready"] is False
+    assert ready.json()["shedding"] == ["low", "normal"]
+    assert ready.json()["pool_wait_ms"] == pytest.approx(
+        2 * settings.ADMISSION_POOL_WAIT_TARGET_MS
+    )
@@ -0,0 +1,201 @@
+import fcntl
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+
+from opendms.core.config import settings
+from opendms.models.audit import AuditLog
+from opendms.models.inventory import Vehicle
+from opendms.services import audit
+from opendms.services.audit import AuditWriter, prune_audit_log, set_audit_user
+from tests import factories
+
+
+def _entries(db, entity, entity_id):
+    audit.writer.flush()
+    db.expire_all()
+    return [
+        (entry.action, entry.changes)
+        for entry in db.query(AuditLog)
+        .filter(AuditLog.entity == entity, AuditLog.entity_id == str(entity_id))
+        .order_by(AuditLog.id)
+    ]
+
+
+def test_committed_changes_are_diffed(db):
+    user = factories.user(db)
+    db.commit()
+    set_audit_user(db, user.id)
+    vehicle = factories.vehicle(db, color="Blue")
+    db.commit()
+
+    vehicle.color = "Red"
+    vehicle.mileage = 10
+    db.commit()
+    vehicle.color = "Green"
+    db.rollback()
+
+    entries = _entries(db, "vehicles", vehicle.id)
+    assert [action for action, _ in entries] == ["created", "updated"]
+    assert entries[0][1]["color"] == [None, "Blue"]
+    assert entries[1][1] == {"color": ["Blue", "Red"], "mileage": [None, 10]}
+    logged = db.query(AuditLog).filter(AuditLog.entity == "vehicles").first()
+    assert logged.user_id == user.id
+
+    created_user = _entries(db, "users", user.id)
+    assert created_user[0][1]["hashed_password"] == [None, "[redacted]"]
+
+
+def test_bulk_statements_are_audited(db):
+    red, blue = factories.vehicle(db, color="Red"), factories.vehicle(db, color="Blue")
+    db.commit()
+    red_id, blue_id, red_vin = red.id, blue.id, red.vin
+
+    db.execute(
+        update(Vehicle)
+        .where(Vehicle.id.in_([red_id, blue_id]))
+        .values(color="Black")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    db.execute(delete(Vehicle).where(Vehicle.id == blue_id))
+    db.rollback()
+    db.execute(delete(Vehicle).where(Vehicle.id == red_id))
+    db.commit()
+
+    red_entries = _entries(db, "vehicles", red_id)
+    assert [action for action, _ in red_entries] == ["created", "updated", "deleted"]
+    # The column's onupdate default is part of the statement's changes
+    assert set(red_entries[1][1]) == {"color", "updated_at"}
+    assert red_entries[1][1]["color"] == ["Red", "Black"]
+    assert red_entries[2][1]["vin"] == [red_vin, None]
+    assert [action for action, _ in _entries(db, "vehicles", blue_id)] == [
+        "created",
+        "updated",
+    ]
+
+
+def test_rows_a_bulk_update_leaves_unchanged_are_not_logged(db):
+    vehicle = factories.vehicle(db, color="Red")
+    db.commit()
+    vehicle_id = vehicle.id
+    db.execute(
+        update(Vehicle)
+        .where(Vehicle.id == vehicle_id)
+        .values(color="Red", updated_at=vehicle.updated_at)
+    )
+    db.commit()
+    assert [action for action, _ in _entries(db, "vehicles", vehicle_id)] == ["created"]
+
+
+def test_prune_logs_one_entry_per_batch(db, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_RETENTION_DAYS", 30)
+    old = datetime.utcnow() - timedelta(days=40)
+    db.add_all(
+        AuditLog(
+            occurred_at=old,
+            entity="vehicles",
+            entity_id=str(n),
+            action="created",
+            changes={},
+        )
+        for n in range(3)
+    )
+    db.commit()
+
+    assert prune_audit_log(db, batch_size=2) == 3
+    audit.writer.flush()
+    db.expire_all()
+    pruned = db.query(AuditLog).order_by(AuditLog.id).all()
+    assert [(entry.entity, entry.changes["entries"]) for entry in pruned] == [
+        ("audit_log", [2, None]),
+        ("audit_log", [1, None]),
+    ]
+
+
+@pytest.fixture
+def spill_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_SPILL_DIR", str(tmp_path))
+    return AuditWriter()
+
+
+def _records(*ids):
+    return [
+        {
+            "occurred_at": datetime(2026, 1, 1),
+            "user_id": None,
+            "entity": "vehicles",
+            "entity_id": str(entity_id),
+            "action": "updated",
+            "changes": {},
+        }
+        for entity_id in ids
+    ]
+
+
+def _spilled(tmp_path):
+    lines = []
+    for name in sorted(os.listdir(tmp_path)):
+        with open(tmp_path / name) as handle:
+            lines.extend((name, audit._decode(line)["entity_id"]) for line in handle)
+    return lines
+
+
+def test_failed_batch_is_spilled_and_replayed(spill_writer, tmp_path, monkeypatch):
+    inserted = []
+
+    def fail(records):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(AuditWriter, "_insert", staticmethod(fail))
+    spill_writer._write(_records(1, 2))
+    own = f"audit-{os.getpid()}.jsonl"
+    assert _spilled(tmp_path) == [(own, "1"), (own, "2")]
+    assert spill_writer.status()["spill_files"] == 1
+
+    monkeypatch.setattr(AuditWriter, "_insert", staticmethod(inserted.extend))
+    spill_writer._next_replay = 0.0
+    spill_writer._write(_records(3))
+    assert [record["entity_id"] for record in inserted] == ["3", "1", "2"]
+    assert os.listdir(tmp_path) == []
+    assert spill_writer.written == 3
+
+
+def test_failed_replay_appends_instead_of_renaming_over(
+    spill_writer, tmp_path, monkeypatch
+):
+    spill_writer._spill(_records(1))
+
+    def spill_meanwhile_then_fail(records):
+        # Another batch fails while the replay holds the claimed file
+        spill_writer._spill(_records(2))
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(AuditWriter, "_insert", staticmethod(spill_meanwhile_then_fail))
+    spill_writer._replay()
+
+    own = f"audit-{os.getpid()}.jsonl"
+    assert _spilled(tmp_path) == [(own, "2"), (own, "1")]
+
+
+def test_spill_never_appends_to_a_claimed_file(spill_writer, tmp_path, monkeypatch):
+    path = tmp_path / f"audit-{os.getpid()}.jsonl"
+    claimed = tmp_path / "claimed"
+    flock = fcntl.flock
+    calls = []
+
+    def claim_before_lock(handle, operation):
+        # A replayer renames the file between our open and our lock
+        if not calls:
+            os.rename(path, claimed)
+        calls.append(operation)
+        flock(handle, operation)
+
+    monkeypatch.setattr(fcntl, "flock", claim_before_lock)
+    spill_writer._spill(_records(1))
+
+    assert claimed.read_text() == ""
+    assert [audit._decode(line)["entity_id"] for line in open(path)] == ["1"]
+    assert len(calls) == 2
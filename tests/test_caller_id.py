@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+from opendms.services import caller_id
+from tests import factories
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    caller_id.invalidate()
+    yield
+    caller_id.invalidate()
+
+
+def test_contact_columns_are_normalized_on_write(db):
+    customer = factories.customer(db, phone="(217) 555-0142", email=" Pat@Example.COM")
+    assert customer.phone_e164 == "+12175550142"
+    assert customer.email_normalized == "pat@example.com"
+
+
+def test_any_phone_format_finds_the_caller_and_latest_sale(db):
+    customer = factories.customer(db, phone="217.555.0142")
+    factories.sale(
+        db,
+        dealership_id=customer.dealership_id,
+        customer_id=customer.id,
+        sale_date=datetime(2025, 3, 1),
+    )
+    latest = factories.sale(
+        db,
+        dealership_id=customer.dealership_id,
+        customer_id=customer.id,
+        sale_date=datetime(2026, 3, 1),
+    )
+    db.commit()
+
+    [caller] = caller_id.lookup(db, customer.dealership_id, phone="+1 217 555 0142")
+    assert caller["customer_id"] == customer.id
+    assert caller["latest_sale"]["sale_id"] == latest.id
+
+
+def test_committed_edits_refresh_only_that_customer(db):
+    customer = factories.customer(db, phone="2175550142")
+    db.commit()
+    assert caller_id.lookup(db, customer.dealership_id, phone="2175550142")
+
+    customer.phone = "2175550199"
+    db.commit()
+    assert caller_id._dirty[customer.dealership_id] == {customer.id}
+    assert caller_id.lookup(db, customer.dealership_id, phone="2175550142") == []
+    [caller] = caller_id.lookup(db, customer.dealership_id, phone="2175550199")
+    assert caller["phone"] == "2175550199"
+
+
+def test_rows_from_other_processes_are_found_through_the_columns(db):
+    customer = factories.customer(db)
+    db.commit()
+    caller_id.get_index(db, customer.dealership_id)
+
+    # Flushed but not committed, so never marked in this index
+    other = factories.customer(
+        db, dealership_id=customer.dealership_id, email="late@example.com"
+    )
+    db.flush()
+    [caller] = caller_id.lookup(db, customer.dealership_id, email="LATE@example.com")
+    assert caller["customer_id"] == other.id
+
+
+def test_unusable_contact_details_are_rejected(db):
+    with pytest.raises(ValueError):
+        caller_id.lookup(db, 1, phone="12", email="not-an-email")
+
+
+def test_indexes_are_built_per_dealership_on_first_lookup(db):
+    first = factories.customer(db, phone="2175550142")
+    second = factories.customer(db, phone="2175550142")
+    db.commit()
+
+    caller_id.lookup(db, first.dealership_id, phone="2175550142")
+    assert set(caller_id._indexes) == {first.dealership_id}
+
+    assert caller_id.warm(db) == 2
+    assert set(caller_id._indexes) == {first.dealership_id, second.dealership_id}
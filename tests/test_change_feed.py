@@ -0,0 +1,114 @@
+import pytest
+
+from opendms.api.v1.endpoints import event
+from opendms.core import events
+from opendms.core.config import settings
+from opendms.core.events import EventHub
+from opendms.models.inventory import VehicleStatus
+from opendms.services import change_feed
+from tests import factories
+
+
+@pytest.fixture
+def published(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        change_feed.hub,
+        "publish",
+        lambda dealership_id, changes: calls.append((dealership_id, changes)),
+    )
+    return calls
+
+
+def test_changes_are_published_per_dealership_on_commit(db, published):
+    vehicle = factories.vehicle(db)
+    other = factories.customer(db)
+    db.flush()
+    assert published == []
+
+    vehicle.status = VehicleStatus.SOLD
+    db.commit()
+
+    by_dealership = dict(published)
+    assert by_dealership[vehicle.dealership_id] == [
+        {"entity": "vehicle", "id": vehicle.id, "action": "created"}
+    ]
+    assert by_dealership[other.dealership_id] == [
+        {"entity": "customer", "id": other.id, "action": "created"}
+    ]
+
+
+def test_rolled_back_changes_are_not_published(db, published):
+    vehicle = factories.vehicle(db)
+    db.commit()
+    published.clear()
+
+    vehicle.status = VehicleStatus.SOLD
+    db.flush()
+    db.rollback()
+    db.commit()
+
+    assert published == []
+
+
+def test_delete_wins_over_earlier_changes(db, published):
+    vehicle = factories.vehicle(db)
+    db.commit()
+    published.clear()
+
+    vehicle.status = VehicleStatus.SOLD
+    db.flush()
+    db.delete(vehicle)
+    db.commit()
+
+    assert published[0][1] == [
+        {"entity": "vehicle", "id": vehicle.id, "action": "deleted"}
+    ]
+
+
+async def test_window_coalesces_to_one_event_per_entity(monkeypatch):
+    monkeypatch.setattr(events.settings, "REALTIME_COALESCE_SECONDS", 0.01)
+    hub = EventHub()
+    await hub.start()
+    subscription = hub.subscribe(3)
+    try:
+        hub.publish(3, [{"entity": "sale", "id": 1, "action": "created"}])
+        hub.publish(3, [{"entity": "sale", "id": 1, "action": "updated"}])
+        hub.publish(3, [{"entity": "sale", "id": 2, "action": "updated"}])
+        hub.publish(4, [{"entity": "sale", "id": 9, "action": "created"}])
+
+        batch = await subscription.get(timeout=1.0)
+        assert sorted(batch, key=lambda change: change["id"]) == [
+            {"entity": "sale", "id": 1, "action": "created"},
+            {"entity": "sale", "id": 2, "action": "updated"},
+        ]
+        assert await subscription.get(timeout=0.05) is None
+    finally:
+        hub.unsubscribe(subscription)
+        await hub.stop()
+    assert hub.stats()["connections"] == 0
+
+
+async def test_stalled_subscriber_keeps_only_the_newest_batches(monkeypatch):
+    monkeypatch.setattr(events.settings, "REALTIME_MAX_PENDING_BATCHES", 2)
+    hub = EventHub()
+    subscription = hub.subscribe(1)
+    for number in range(3):
+        subscription.push([{"entity": "sale", "id": number, "action": "updated"}])
+    assert [(await subscription.get(0.01))[0]["id"] for _ in range(2)] == [1, 2]
+
+
+async def test_stream_subscribes_only_while_it_runs(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_REAL_TIME_UPDATES", True)
+    hub = EventHub()
+    monkeypatch.setattr(event, "hub", hub)
+
+    # A response that never starts streaming leaves nothing behind
+    await event.stream_events(7)
+    assert hub.stats()["connections"] == 0
+
+    body = (await event.stream_events(7)).body_iterator
+    assert await body.__anext__() == "retry: 5000\n\n"
+    assert hub.stats()["connections"] == 1
+    await body.aclose()
+    assert hub.stats()["connections"] == 0
@@ -0,0 +1,130 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from opendms.core import compression
+from opendms.core.compression import (
+    CompressionMiddleware,
+    accepted_encodings,
+    etag_matches,
+)
+from opendms.core.config import settings
+
+BODY = b'{"vehicles": []}' * 200
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("", []),
+        ("gzip", ["gzip"]),
+        ("gzip, br, zstd", ["zstd", "br", "gzip"]),
+        ("gzip;q=1.0, br;q=0.5", ["gzip", "br"]),
+        ("GZIP, br;q=0", ["gzip"]),
+        ("*;q=0.1, gzip", ["gzip", "zstd", "br"]),
+        ("identity, deflate", []),
+        ("br;q=oops, gzip", ["gzip"]),
+    ],
+)
+def test_accept_encoding_negotiation(monkeypatch, header, expected):
+    monkeypatch.setattr(
+        compression, "installed_encodings", lambda: ["gzip", "br", "zstd"]
+    )
+    assert accepted_encodings(header) == expected
+
+
+def test_uninstalled_encodings_are_never_chosen(monkeypatch):
+    monkeypatch.setattr(compression, "installed_encodings", lambda: ["gzip"])
+    assert accepted_encodings("zstd, br") == []
+    monkeypatch.setattr(settings, "COMPRESSION_ENCODINGS", ["br"])
+    assert accepted_encodings("gzip") == []
+
+
+@pytest.mark.parametrize(
+    "header, matches",
+    [
+        (None, False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"old", W/"abc"', True),
+        ("*", True),
+        ('"abcd"', False),
+        ("abc", False),
+    ],
+)
+def test_etag_matching_is_weak(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+    assert etag_matches(header, 'W/"abc"') is matches
+
+
+def _app():
+    def full(request):
+        return Response(BODY, media_type="application/json", headers={"ETag": '"v1"'})
+
+    def partial(request):
+        return Response(
+            BODY[:2000],
+            status_code=206,
+            media_type="application/json",
+            headers={"Content-Range": f"bytes 0-1999/{len(BODY)}"},
+        )
+
+    def ranged(request):
+        # A range that happens to cover the whole body is still a range
+        return Response(
+            BODY,
+            media_type="application/json",
+            headers={"Content-Range": f"bytes 0-{len(BODY) - 1}/{len(BODY)}"},
+        )
+
+    def stream(request):
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    app = Starlette(
+        routes=[
+            Route("/full", full),
+            Route("/partial", partial),
+            Route("/ranged", ranged),
+            Route("/stream", stream),
+        ]
+    )
+    return TestClient(CompressionMiddleware(app))
+
+
+def test_bodies_are_compressed_for_clients_that_accept_it():
+    client = _app()
+    response = client.get("/full", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.content == BODY
+
+    plain = client.get("/full", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == '"v1"'
+    assert "Accept-Encoding" in plain.headers["vary"]
+
+
+def test_streams_are_compressed_chunk_by_chunk():
+    response = _app().get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == BODY * 3
+
+
+@pytest.mark.parametrize("path", ["/partial", "/ranged"])
+def test_partial_responses_are_not_compressed(path):
+    response = _app().get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-range"].startswith("bytes 0-")
+    with pytest.raises(gzip.BadGzipFile):
+        gzip.decompress(response.content)
@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import event
+
+from opendms.core.database import engine
+from opendms.models.inventory import Vehicle
+from opendms.models.sale import SaleStatus
+from opendms.services import customer_overview
+from opendms.services.customer_overview import assemble, get_overviews
+from tests import factories
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    customer_overview.invalidate()
+    yield
+    customer_overview.invalidate()
+
+
+@pytest.fixture
+def statements():
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield seen
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def history(db, customer, sales=1, visits=1):
+    """Sales and serviced visits, each with its own vehicle."""
+    ids = {"dealership_id": customer.dealership_id, "customer_id": customer.id}
+    made = [factories.sale(db, **ids) for _ in range(sales)]
+    orders = [
+        factories.work_order(
+            db, appointment_id=factories.appointment(db, **ids).id, total_cost=120.0
+        )
+        for _ in range(visits)
+    ]
+    return made, orders
+
+
+def test_query_count_does_not_grow_with_history(db, statements):
+    small = factories.customer(db)
+    large = factories.customer(db)
+    history(db, small)
+    history(db, large, sales=4, visits=5)
+    ids = [small.id, large.id]
+    db.commit()
+
+    statements.clear()
+    assemble(db, ids[:1])
+    one = len(statements)
+    statements.clear()
+    overviews = assemble(db, ids)
+
+    assert one == len(statements) == 6
+    assert len(overviews[ids[1]]["sales"]) == 4
+    assert overviews[ids[1]]["service_history"][0]["work_orders"]
+
+
+def test_totals_leave_out_cancelled_sales(db):
+    customer = factories.customer(db)
+    (kept, cancelled), _ = history(db, customer, sales=2, visits=2)
+    cancelled.status = SaleStatus.CANCELLED
+    db.commit()
+
+    totals = assemble(db, [customer.id])[customer.id]["totals"]
+    assert totals["purchases"] == 1
+    assert totals["purchase_total"] == kept.total_amount
+    assert totals["service_visits"] == 2
+    assert totals["service_total"] == 240.0
+
+
+def test_unknown_customers_are_left_out_in_request_order(db):
+    first, second = factories.customer(db), factories.customer(db)
+    db.commit()
+    assert list(get_overviews(db, [second.id, 9999, first.id])) == [
+        second.id,
+        first.id,
+    ]
+
+
+def test_work_order_commit_evicts_its_customer(db, statements):
+    customer = factories.customer(db)
+    _, (order,) = history(db, customer)
+    db.commit()
+    get_overviews(db, [customer.id])
+
+    statements.clear()
+    get_overviews(db, [customer.id])
+    assert statements == []
+
+    order.total_cost = 300.0
+    db.commit()
+    overview = get_overviews(db, [customer.id])[customer.id]
+    assert overview["totals"]["service_total"] == 300.0
+
+
+def test_vehicle_commit_evicts_every_owner(db):
+    customer = factories.customer(db)
+    (sale,), _ = history(db, customer, visits=0)
+    db.commit()
+    get_overviews(db, [customer.id])
+
+    vehicle = db.get(Vehicle, sale.vehicle_id)
+    vehicle.color = "Teal"
+    db.commit()
+    overview = get_overviews(db, [customer.id])[customer.id]
+    assert overview["sales"][0]["vehicle"]["color"] == "Teal"
+
+
+def test_cache_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(customer_overview.settings, "CUSTOMER_OVERVIEW_CACHE_SIZE", 2)
+    customers = [factories.customer(db) for _ in range(3)]
+    db.commit()
+    get_overviews(db, [customer.id for customer in customers])
+    assert list(customer_overview._cache) == [c.id for c in customers[1:]]
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from opendms.models import Sale
+from opendms.services.deal_desk import (
+    amortization_factors,
+    monthly_payment,
+    payment_grid,
+)
+from tests import factories
+
+
+def test_monthly_payment_matches_the_amortization_formula():
+    assert monthly_payment(20000, 6.0, 60) == 386.66
+    assert monthly_payment(12000, 0.0, 60) == 200.0
+    assert monthly_payment(0, 6.0, 60) == 0.0
+
+
+def test_factors_are_memoized_and_read_only():
+    factors = amortization_factors((4.9, 0.0), (36, 72))
+    assert factors is amortization_factors((4.9, 0.0), (36, 72))
+    assert factors.shape == (2, 2)
+    with pytest.raises(ValueError):
+        factors[0, 0] = 1.0
+
+
+def test_grid_covers_every_structure():
+    grid = payment_grid(
+        vehicle_price=30000,
+        down_payments=[0, 5000, 40000],
+        terms=[36, 60],
+        rates=[0.0, 6.0],
+        trade_in_value=2000,
+        taxes_and_fees=1000,
+    )
+
+    assert grid["amount_financed"].tolist() == [29000.0, 24000.0, 0.0]
+    assert grid["monthly_payment"].shape == (3, 2, 2)
+    assert grid["monthly_payment"][1, 1, 1] == monthly_payment(24000, 6.0, 60)
+    assert grid["monthly_payment"][0, 0, 0] == pytest.approx(29000 / 36, abs=0.01)
+    # Zero-rate loans only pick up rounding to the cent
+    assert np.all(grid["total_interest"][:, :, 0] < 1.0)
+    assert grid["total_interest"][0, 1, 1] > 0
+    assert np.all(grid["monthly_payment"][2] == 0.0)
+    assert grid["ltv"][0, 0, 0] == pytest.approx(29000 / 30000, abs=1e-4)
+
+
+def test_payment_grid_endpoint_rejects_bad_terms(client):
+    body = {"vehicle_price": 30000, "down_payments": [0], "terms": [0], "rates": [5]}
+    assert client.post("/api/v1/sales/payment-grid", json=body).status_code == 400
+
+    body["terms"] = [60]
+    response = client.post("/api/v1/sales/payment-grid", json=body)
+    assert response.status_code == 200
+    assert response.json()["monthly_payment"] == [[[monthly_payment(30000, 5, 60)]]]
+
+
+def test_create_sale_maps_fields_and_computes_the_payment(client, db):
+    car = factories.vehicle(db)
+    buyer = factories.customer(db, dealership_id=car.dealership_id)
+    seller = factories.user(db, dealership_id=car.dealership_id)
+    db.commit()
+
+    response = client.post(
+        "/api/v1/sales/",
+        json={
+            "vehicle_id": car.id,
+            "customer_id": buyer.id,
+            "salesperson_id": seller.id,
+            "sale_price": "25000",
+            "down_payment": "3000",
+            "trade_in_value": "2000",
+            "interest_rate": "6",
+            "loan_term": 60,
+            "sale_type": "retail",
+        },
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["sale_number"] == f"S{car.dealership_id}-000001"
+    assert body["salesperson_id"] == seller.id
+    assert float(body["financing_amount"]) == 20000.0
+    assert float(body["monthly_payment"]) == monthly_payment(20000, 6.0, 60)
+    sale = db.get(Sale, body["id"])
+    assert sale.dealership_id == car.dealership_id
+    assert sale.vehicle_price == sale.total_amount == 25000.0
+    assert sale.term_months == 60
+
+
+def test_create_sale_for_unknown_vehicle_is_404(client):
+    response = client.post(
+        "/api/v1/sales/",
+        json={
+            "vehicle_id": 999,
+            "customer_id": 1,
+            "salesperson_id": 1,
+            "sale_price": 1,
+        },
+    )
+    assert response.status_code == 404
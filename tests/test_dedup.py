@@ -0,0 +1,165 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from opendms.models.customer import Customer, CustomerNote
+from opendms.services import change_feed
+from opendms.services.dedup import (
+    HOUSEHOLD_CAP,
+    CustomerRecord,
+    _like_literal,
+    find_duplicates,
+    find_matches,
+    group_duplicates,
+    jaro_winkler,
+    merge_customers,
+    score_pair,
+)
+from tests import factories
+
+
+def record(id, first, last, email=None, phone=None, address=None, zip_code=None):
+    return CustomerRecord.from_values(
+        id, first, last, email, phone, address, zip_code, datetime(2026, 1, id)
+    )
+
+
+def test_jaro_winkler_known_values():
+    assert jaro_winkler("martha", "marhta") == pytest.approx(0.9611, abs=1e-4)
+    assert jaro_winkler("dwayne", "duane") == pytest.approx(0.84, abs=1e-4)
+    assert jaro_winkler("", "") == 0.0
+    assert jaro_winkler("abc", "xyz") == 0.0
+
+
+def test_shared_email_with_matching_name_scores_high():
+    score, reasons = score_pair(
+        record(1, "Jon", "Smith", email="J.Smith+cars@gmail.com"),
+        record(2, "John", "Smith", email="jsmith@gmail.com"),
+    )
+    assert score > 0.9
+    assert "email" in reasons
+
+
+def test_household_members_are_capped_below_a_match():
+    score, reasons = score_pair(
+        record(1, "Maria", "Lopez", phone="217-555-0142", address="1 Elm St"),
+        record(2, "Carlos", "Lopez", phone="(217) 555-0142", address="1 Elm St"),
+    )
+    assert score == HOUSEHOLD_CAP
+    assert reasons[:1] == ["phone"]
+
+
+def test_name_alone_is_discounted():
+    score, _ = score_pair(record(1, "Ann", "Lee"), record(2, "Ann", "Lee"))
+    assert score == 0.8
+
+
+def test_only_records_sharing_a_block_are_paired():
+    records = [
+        record(1, "Jon", "Smith", email="jsmith@example.com"),
+        record(2, "Jon", "Smith", email="JSMITH@example.com"),
+        record(3, "Jon", "Smith"),  # no blocking key in common
+    ]
+    pairs = find_duplicates(records, min_score=0.5)
+    assert [(p.customer_id, p.duplicate_id) for p in pairs] == [(1, 2)]
+
+
+def test_oversized_blocks_are_skipped():
+    records = [record(n, "Ann", f"Lee{n}", phone="2175550100") for n in range(1, 5)]
+    assert find_duplicates(records, min_score=0.0, max_block_size=3) == []
+
+
+def test_pairs_are_grouped_into_clusters_keeping_the_older_record():
+    records = [
+        record(3, "Jon", "Smith", email="jon@example.com", phone="2175550100"),
+        record(1, "Jon", "Smith", phone="2175550100"),
+        record(2, "Jon", "Smith", email="jon@example.com"),
+    ]
+    clusters = group_duplicates(find_duplicates(records, min_score=0.5))
+    assert clusters == [[1, 2, 3]]
+
+
+def test_like_wildcards_in_contact_details_are_literal(db):
+    dealer = factories.dealership(db)
+    for email in ("aXb+x@example.com", "a_b+cars@example.com", "a%b+1@example.com"):
+        factories.customer(db, dealership_id=dealer.id, email=email)
+    db.commit()
+
+    pattern = f"{_like_literal('a_b')}+%@example.com"
+    rows = db.scalars(
+        select(Customer.email).where(Customer.email.like(pattern, escape="\\"))
+    ).all()
+    assert rows == ["a_b+cars@example.com"]
+    assert _like_literal("50%_off\\") == "50\\%\\_off\\\\"
+
+
+def test_matches_are_found_through_plus_tags(db):
+    dealer = factories.dealership(db)
+    tagged = factories.customer(
+        db, dealership_id=dealer.id, first_name="Bo", email="a_b+cars@example.com"
+    )
+    db.commit()
+
+    candidate = record(1, "Bo", "Stranger", email="a_b@example.com")
+    matches = find_matches(db, dealer.id, candidate, min_score=0.0)
+    assert [match.customer_id for match in matches] == [tagged.id]
+
+
+@pytest.fixture
+def published(monkeypatch):
+    calls = {}
+    monkeypatch.setattr(
+        change_feed.hub,
+        "publish",
+        lambda dealership_id, changes: calls.setdefault(dealership_id, []).extend(
+            changes
+        ),
+    )
+    return calls
+
+
+def test_merge_moves_history_and_publishes_the_bulk_changes(db, published):
+    primary = factories.customer(db, email=None)
+    duplicate = factories.customer(
+        db, dealership_id=primary.dealership_id, email="dup@example.com"
+    )
+    sale = factories.sale(
+        db, dealership_id=primary.dealership_id, customer_id=duplicate.id
+    )
+    db.add(
+        CustomerNote(
+            customer_id=duplicate.id,
+            user_id=sale.sales_person_id,
+            content="Prefers email",
+        )
+    )
+    db.commit()
+    published.clear()
+
+    result = merge_customers(db, primary, [duplicate.id])
+    db.commit()
+
+    assert result == {
+        "merged_ids": [duplicate.id],
+        "sales": 1,
+        "service_appointments": 0,
+        "notes": 1,
+    }
+    assert db.get(Customer, duplicate.id) is None
+    db.refresh(sale)
+    assert sale.customer_id == primary.id
+    assert primary.email == "dup@example.com"
+    changes = published[primary.dealership_id]
+    assert {"entity": "sale", "id": sale.id, "action": "updated"} in changes
+    assert {"entity": "customer", "id": duplicate.id, "action": "deleted"} in changes
+    assert {"entity": "customer", "id": primary.id, "action": "updated"} in changes
+
+
+def test_merge_refuses_other_dealerships(db):
+    primary = factories.customer(db)
+    stranger = factories.customer(db)
+    with pytest.raises(ValueError):
+        merge_customers(db, primary, [stranger.id])
+    with pytest.raises(ValueError):
+        merge_customers(db, primary, [primary.id])
@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from opendms.models.user import UserRole
+from opendms.services import dispatch
+from opendms.services.dispatch import (
+    Job,
+    Technician,
+    get_plan,
+    solve_greedy,
+    solve_optimal,
+)
+from tests import factories
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    dispatch.invalidate()
+    yield
+    dispatch.invalidate()
+
+
+def job(job_id, hours, skill=None):
+    return Job(
+        id=job_id,
+        work_order_number=f"RO-{job_id}",
+        hours=hours,
+        skill=skill,
+        technician_id=None,
+        in_progress=False,
+    )
+
+
+def makespan(jobs, assignment, base_load):
+    loads = dict(base_load)
+    for item in jobs:
+        loads[assignment[item.id]] += item.hours
+    return max(loads.values())
+
+
+def test_greedy_balances_and_respects_skills():
+    technicians = {
+        1: Technician(id=1, skills=frozenset({"diagnostic"})),
+        2: Technician(id=2, skills=None),
+    }
+    jobs = [job(10, 4.0, "diagnostic"), job(11, 3.0, "tires"), job(12, 1.0, "tires")]
+
+    assignment = solve_greedy(jobs, technicians, {1: 0.0, 2: 2.0})
+
+    assert assignment == {10: 1, 11: 2, 12: 2}
+
+
+def test_jobs_nobody_can_do_are_left_out():
+    technicians = {1: Technician(id=1, skills=frozenset({"diagnostic"}))}
+    assert solve_greedy([job(10, 1.0, "tires")], technicians, {1: 0.0}) == {}
+
+
+def test_optimal_beats_longest_first_greedy():
+    technicians = {1: Technician(id=1, skills=None), 2: Technician(id=2, skills=None)}
+    jobs = [job(i, hours) for i, hours in enumerate([3, 3, 2, 2, 2])]
+    base_load = {1: 0.0, 2: 0.0}
+
+    greedy = solve_greedy(jobs, technicians, base_load)
+    optimal = solve_optimal(jobs, technicians, base_load)
+
+    assert makespan(jobs, greedy, base_load) == 7
+    assert makespan(jobs, optimal, base_load) == 6
+
+
+@pytest.fixture
+def shop(db):
+    """Dealership with two technicians and one unassigned work order."""
+    dealership_id = factories.dealership(db).id
+    technicians = [
+        factories.user(
+            db,
+            dealership_id=dealership_id,
+            role=UserRole.SERVICE_TECHNICIAN,
+            skills=json.dumps(["maintenance"]),
+        ).id
+        for _ in range(2)
+    ]
+    booking = factories.appointment(db, dealership_id=dealership_id)
+    order = factories.work_order(db, appointment_id=booking.id, estimated_hours=2.0)
+    db.commit()
+    return {"dealership_id": dealership_id, "technicians": technicians, "order": order}
+
+
+def test_work_order_change_updates_a_copy_of_the_plan(db, shop):
+    first = get_plan(db, shop["dealership_id"])
+    assert first.version == 0
+    assert set(first.suggested) == {shop["order"].id}
+
+    shop["order"].estimated_hours = 5.0
+    db.commit()
+    second = get_plan(db, shop["dealership_id"])
+
+    assert second.version == 1
+    assert second.jobs[shop["order"].id].hours == 5.0
+    # The plan other requests may still be reading is untouched
+    assert first.jobs[shop["order"].id].hours == 2.0
+    assert get_plan(db, shop["dealership_id"]) is second
+
+
+def test_failed_refresh_keeps_the_changes_dirty(db, shop, monkeypatch):
+    first = get_plan(db, shop["dealership_id"])
+    shop["order"].estimated_hours = 5.0
+    db.commit()
+
+    def broken(db, stmt):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(dispatch, "_load_jobs", broken)
+    with pytest.raises(RuntimeError):
+        get_plan(db, shop["dealership_id"])
+    monkeypatch.undo()
+
+    assert dispatch._plans[shop["dealership_id"]] is first
+    assert get_plan(db, shop["dealership_id"]).jobs[shop["order"].id].hours == 5.0
+
+
+def test_etag_follows_the_plan_not_the_process_version(client, shop):
+    url = f"/api/v1/service/dispatch?dealership_id={shop['dealership_id']}"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    # The tag compression hands out is weak
+    weak = {"If-None-Match": f"W/{etag}"}
+    assert client.get(url, headers=weak).status_code == 304
+
+    # A rebuild in another process would restart the version count
+    dispatch.invalidate()
+    rebuilt = client.get(url)
+    assert rebuilt.json()["version"] == first.json()["version"]
+    assert rebuilt.headers["ETag"] == etag
+
+    other = client.get(url + "&mode=optimal")
+    assert other.headers["ETag"] != etag
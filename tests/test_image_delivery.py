@@ -0,0 +1,80 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from opendms.core.media import media_root
+from opendms.services import image_delivery
+from opendms.services.image_delivery import parse_spec, render
+
+
+@pytest.fixture
+def original(monkeypatch):
+    """A stored 600x400 PNG; renditions are made on a local thread."""
+    monkeypatch.setattr(image_delivery, "get_pool", lambda: None)
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 400), "orange").save(buffer, "PNG")
+    digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+    directory = os.path.join(media_root(), "images", digest[:2], digest)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "original.png"), "wb") as handle:
+        handle.write(buffer.getvalue())
+    return digest
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"width": 333}, {"height": 5000}, {"quality": 81}, {"fit": "stretch"}],
+)
+def test_parameters_outside_the_presets_are_rejected(params):
+    with pytest.raises(ValueError):
+        parse_spec(**{"width": 320, "height": None, **params})
+
+
+def test_cover_with_one_side_falls_back_to_contain():
+    assert parse_spec(320, None, fit="cover").fit == "contain"
+    assert parse_spec(320, 160, fit="cover", quality=60).name == (
+        "320x160-cover-q60.jpeg"
+    )
+
+
+def test_cover_crops_to_the_box_without_enlarging(tmp_path, original):
+    source = image_delivery.find_original(original)
+    target = str(tmp_path / "cover.jpeg")
+
+    render(source, target, 320, 320, "cover", "jpeg", 80)
+    with Image.open(target) as image:
+        assert image.size == (320, 320)
+
+    render(source, target, 1600, 800, "cover", "jpeg", 80)
+    with Image.open(target) as image:
+        assert image.size == (600, 300)
+
+    render(source, target, 2400, None, "contain", "jpeg", 80)
+    with Image.open(target) as image:
+        assert image.size == (600, 400)
+
+
+def test_rendition_is_served_and_cached(client, original):
+    url = f"/api/v1/images/{original}?width=320&format=webp"
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    with Image.open(io.BytesIO(response.content)) as image:
+        assert image.size == (320, 213)
+
+    cached = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get(f"/api/v1/images/{original}?width=321").status_code == 400
+
+
+def test_not_modified_requires_the_image_to_exist(client):
+    digest = "0" * 64
+    etag = f'"{digest}-320x0-contain-q80.jpeg"'
+    response = client.get(
+        f"/api/v1/images/{digest}?width=320&format=jpeg",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 404
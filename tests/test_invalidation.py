@@ -0,0 +1,51 @@
+import pytest
+
+from opendms.core import invalidation
+from tests import factories
+
+
+@pytest.fixture
+def applied():
+    calls = []
+
+    def collect(session, pending):
+        pending.update(obj.id for obj in session.new)
+
+    invalidation.subscribe("test", collect, calls.append)
+    yield calls
+    del invalidation._subscribers["test"]
+
+
+def test_changes_reach_subscribers_only_on_commit(db, applied):
+    factories.dealership(db)
+    db.rollback()
+    assert applied == []
+
+    second = factories.dealership(db)
+    invalidation.pending(db, "test").add(-1)  # e.g. a bulk UPDATE
+    db.commit()
+    assert applied == [{second.id, -1}]
+
+
+def test_failing_subscriber_does_not_block_the_others(db, applied, caplog):
+    def broken(pending):
+        raise RuntimeError("boom")
+
+    invalidation.subscribe("broken", lambda session, pending: pending.add(1), broken)
+    try:
+        factories.dealership(db)
+        db.commit()
+    finally:
+        del invalidation._subscribers["broken"]
+    assert len(applied) == 1
+    assert "Applying committed changes to broken failed" in caplog.text
+
+
+def test_empty_containers_are_not_applied(db, applied):
+    dealership = factories.dealership(db)
+    db.commit()
+    applied.clear()
+
+    dealership.name = "Renamed"
+    db.commit()
+    assert applied == []
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from opendms.models.inventory import VehicleStatus
+from opendms.services import inventory_analytics
+from opendms.services.inventory_analytics import (
+    InventorySnapshot,
+    compute_analytics,
+    get_snapshot,
+)
+from tests import factories
+
+NOW = datetime(2026, 6, 1)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    inventory_analytics.invalidate()
+    yield
+    inventory_analytics.invalidate()
+
+
+def snapshot(*vehicles):
+    """Snapshot from (days in stock, days until sold or None, cost) tuples."""
+    stocked = [NOW - timedelta(days=age) for age, _, _ in vehicles]
+    sold = [
+        None if to_sale is None else stocked_at + timedelta(days=to_sale)
+        for stocked_at, (_, to_sale, _) in zip(stocked, vehicles, strict=True)
+    ]
+    ids = list(range(1, len(vehicles) + 1))
+    return InventorySnapshot(
+        vehicle_id=np.array(ids, dtype=np.int64),
+        stocked_at=np.array(stocked, dtype="datetime64[s]"),
+        sold_at=np.array(sold, dtype="datetime64[s]"),
+        in_stock=np.array([to_sale is None for _, to_sale, _ in vehicles], dtype=bool),
+        cost_price=np.array([cost for _, _, cost in vehicles], dtype=np.float64),
+        sale_price=np.array([cost + 2000 for _, _, cost in vehicles], dtype=np.float64),
+        details={i: {"id": i} for i in ids},
+        loaded_at=0.0,
+    )
+
+
+def test_aging_buckets_and_stale_units():
+    result = compute_analytics(
+        snapshot(
+            (10, None, 20000.0),
+            (30, None, 20000.0),
+            (31, None, 10000.0),
+            (150, None, 30000.0),
+            (100, None, 25000.0),
+            (40, 20, 15000.0),
+        ),
+        now=NOW,
+        stale_days=90,
+    )
+
+    assert [bucket["units"] for bucket in result["aging_buckets"]] == [2, 1, 0, 1, 1]
+    assert result["aging_buckets"][0]["total_cost"] == 40000.0
+    assert result["aging_buckets"][-1]["label"] == "121+"
+    assert result["units_in_stock"] == 5
+    assert result["units_sold"] == 1
+    assert result["average_days_to_sale"] == pytest.approx(20.0)
+    assert result["average_spread"] == pytest.approx(2000.0)
+    # Oldest first
+    assert [unit["days_in_stock"] for unit in result["stale_units"]] == [150, 100]
+    assert result["stale_units_count"] == 2
+
+
+def test_turn_rate_and_unknown_costs():
+    result = compute_analytics(
+        snapshot((5, None, float("nan")), (60, 30, 10000.0), (90, 10, 10000.0)),
+        now=NOW,
+    )
+    # Two sold over the one-year lookback against one unit on hand
+    assert result["turn_rate"] == pytest.approx(2.0)
+    assert result["total_cost"] == 0.0
+    assert result["average_spread"] is None
+
+    empty = compute_analytics(snapshot(), now=NOW)
+    assert empty["turn_rate"] is None
+    assert empty["average_age_days"] is None
+
+
+def test_committed_sale_patches_only_that_vehicle(db):
+    dealership_id = factories.dealership(db).id
+    kept = factories.vehicle(db, dealership_id=dealership_id)
+    sold = factories.vehicle(db, dealership_id=dealership_id)
+    db.commit()
+    first = get_snapshot(db, dealership_id)
+    assert first.in_stock.tolist() == [True, True]
+
+    sold.status = VehicleStatus.SOLD
+    factories.sale(
+        db,
+        dealership_id=dealership_id,
+        vehicle_id=sold.id,
+        sale_date=datetime.utcnow(),
+    )
+    db.commit()
+
+    second = get_snapshot(db, dealership_id)
+    assert second.loaded_at == first.loaded_at  # patched, not reloaded
+    in_stock = dict(
+        zip(second.vehicle_id.tolist(), second.in_stock.tolist(), strict=True)
+    )
+    assert in_stock == {kept.id: True, sold.id: False}
+    assert not np.isnat(second.sold_at[second.vehicle_id == sold.id][0])
+
+
+def test_rolled_back_change_leaves_the_cache_alone(db):
+    car = factories.vehicle(db)
+    db.commit()
+    first = get_snapshot(db, car.dealership_id)
+
+    car.status = VehicleStatus.SOLD
+    db.flush()
+    db.rollback()
+
+    assert get_snapshot(db, car.dealership_id) is first
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from opendms.models.sale import SaleStatus
+from opendms.services.jobs import JOB_TYPES, validate_params
+from opendms.worker import local_metrics, record_timing
+from tests import factories
+
+
+def test_params_are_checked_against_the_handler():
+    job = JOB_TYPES["sales_report"]
+    validate_params(job, {"group_by": ["month"]})
+    with pytest.raises(TypeError):
+        validate_params(job, {"colour": "red"})
+
+
+def test_timings_accumulate_per_job_type():
+    before = local_metrics().get("test_job", {}).get("count", 0)
+    record_timing("test_job", runtime=2.0, wait=0.5, failed=False)
+    record_timing("test_job", runtime=1.0, wait=None, failed=True)
+
+    entry = local_metrics()["test_job"]
+    assert entry["count"] == before + 2
+    assert entry["failures"] >= 1
+    assert entry["max_runtime_seconds"] >= 2.0
+    assert entry["max_wait_seconds"] >= 0.5
+
+
+def test_submitted_job_runs_and_reports_its_result(client, db):
+    factories.sale(db, sale_date=datetime(2026, 1, 5), status=SaleStatus.DELIVERED)
+    db.commit()
+
+    response = client.post(
+        "/api/v1/jobs/", json={"job_type": "sales_trend", "params": {}}
+    )
+
+    assert response.status_code == 202
+    assert response.json()["queue"] == JOB_TYPES["sales_trend"].queue
+    job = client.get(response.headers["Location"]).json()
+    assert job["status"] == "SUCCESS"
+    assert job["job_type"] == "sales_trend"
+    assert job["result"]["points"][0]["units"] == 1
+
+
+def test_unknown_job_and_bad_params_are_400(client):
+    assert client.post("/api/v1/jobs/", json={"job_type": "nope"}).status_code == 400
+    response = client.post(
+        "/api/v1/jobs/", json={"job_type": "sales_trend", "params": {"x": 1}}
+    )
+    assert response.status_code == 400
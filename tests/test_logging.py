@@ -0,0 +1,138 @@
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+from opendms.core import log
+from opendms.core.config import settings
+from opendms.core.log import JsonFormatter, QueueingHandler, _sampled
+
+
+@pytest.fixture
+def records():
+    """Records the access logger puts on a fresh queue."""
+    log_queue = queue.Queue()
+    handler = QueueingHandler(log_queue)
+    logger = logging.getLogger("opendms.access")
+    previous = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        yield log_queue
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(previous)
+
+
+def _drain(log_queue):
+    items = []
+    while not log_queue.empty():
+        items.append(log_queue.get_nowait())
+    return items
+
+
+def test_access_record_carries_request_context(client, records):
+    response = client.get(
+        "/api/v1/inventory/vin/1HGCM82633A004352",
+        params={"dealership_id": 7},
+        headers={"X-Request-ID": "abc-123"},
+    )
+
+    assert response.headers["x-request-id"] == "abc-123"
+    [record] = _drain(records)
+    assert record.getMessage() == "GET /api/v1/inventory/vin/1HGCM82633A004352 200"
+    assert record.request_id == "abc-123"
+    assert record.route == "/api/v1/inventory/vin/{vin}"
+    assert record.dealership_id == "7"
+    assert record.status == 200
+    assert record.levelno == logging.INFO
+
+
+def test_invalid_request_id_is_replaced(client, records):
+    response = client.get("/health", headers={"X-Request-ID": "bad id\n"})
+    request_id = response.headers["x-request-id"]
+    assert request_id != "bad id\n"
+    assert len(request_id) == 32
+    assert _drain(records)[0].request_id == request_id
+
+
+def test_slow_requests_log_at_warning(client, records, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SLOW_REQUEST_MS", -1)
+    client.get("/health")
+    assert _drain(records)[0].levelno == logging.WARNING
+
+
+def test_full_queue_drops_and_later_reports():
+    log_queue = queue.Queue(maxsize=2)
+    handler = QueueingHandler(log_queue)
+    logger = logging.getLogger("opendms.tests.dropping")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for n in range(4):
+            logger.warning("record %d", n)
+        assert handler.dropped == 2
+        assert [record.msg for record in _drain(log_queue)] == ["record 0", "record 1"]
+
+        logger.warning("record 4")
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+    # The drop count is reported once there is room again
+    assert [record.getMessage() for record in _drain(log_queue)] == [
+        "record 4",
+        "Dropped 2 log records: queue full",
+    ]
+    assert handler.dropped == 0
+
+
+def test_sampling_is_per_request_and_spares_warnings(monkeypatch):
+    monkeypatch.setattr(
+        settings, "LOG_SAMPLE_RATES", {"opendms.noisy": 0.5, "opendms.off": 0}
+    )
+    decisions = {_sampled("opendms.noisy.child", f"req-{n}") for n in range(50)}
+    assert decisions == {True, False}
+    assert len({_sampled("opendms.noisy", "same") for _ in range(10)}) == 1
+    assert _sampled("opendms.off", "req") is False
+    assert _sampled("opendms.other", "req") is True
+
+    log_queue = queue.Queue()
+    handler = QueueingHandler(log_queue)
+    handler.emit(logging.makeLogRecord({"name": "opendms.off", "levelno": 20}))
+    handler.emit(logging.makeLogRecord({"name": "opendms.off", "levelno": 30}))
+    assert [record.levelno for record in _drain(log_queue)] == [30]
+
+
+def test_json_formatter_includes_context_extra_and_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord(
+            "opendms.test", logging.ERROR, __file__, 1, "failed %d", (3,), None
+        )
+        record.exc_info = sys.exc_info()
+    record.request_id = "abc"
+    record.latency_ms = 12.5
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "failed 3"
+    assert entry["level"] == "ERROR"
+    assert entry["request_id"] == "abc"
+    assert entry["latency_ms"] == 12.5
+    assert "ValueError: boom" in entry["exception"]
+    assert "user_id" not in entry
+
+
+def test_bound_context_reaches_records():
+    token = log._context.set({"request_id": "r1", "scope": {"path": "/x"}})
+    try:
+        log.bind_log_context(user_id=5, dealership_id=2)
+        record = QueueingHandler(queue.Queue()).prepare(
+            logging.makeLogRecord({"msg": "hello %s", "args": ("there",)})
+        )
+    finally:
+        log._context.reset(token)
+    assert (record.msg, record.args) == ("hello there", None)
+    assert (record.request_id, record.user_id, record.dealership_id) == ("r1", 5, 2)
+    assert record.route is None
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from opendms.core.database import Base
+from opendms.models.customer import CustomerNote
+from opendms.services import note_search
+from opendms.services.note_search import QueryTerm, highlight, parse_query
+from tests import factories
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    note_search.invalidate()
+    yield
+    note_search.invalidate()
+
+
+def test_queries_split_into_words_phrases_and_prefixes():
+    assert parse_query('"Third row" callback tues*') == [
+        QueryTerm("phrase", ["third", "row"]),
+        QueryTerm("word", ["callback"]),
+        QueryTerm("prefix", ["tues"]),
+    ]
+    with pytest.raises(ValueError):
+        parse_query('"" *')
+
+
+def test_highlight_escapes_the_note_text():
+    snippet = highlight("Wants <b>leather</b> seats", parse_query("leather"))
+    assert snippet == "Wants &lt;b&gt;<mark>leather</mark>&lt;/b&gt; seats"
+
+
+def add_notes(db, *texts):
+    customer = factories.customer(db)
+    author = factories.user(db, dealership_id=customer.dealership_id)
+    notes = [
+        CustomerNote(customer_id=customer.id, user_id=author.id, content=text)
+        for text in texts
+    ]
+    db.add_all(notes)
+    db.commit()
+    return customer.dealership_id, notes
+
+
+def hits(db, dealership_id, query):
+    return [
+        hit["note_id"] for hit in note_search.search_notes(db, dealership_id, query)
+    ]
+
+
+def test_memory_index_matches_stems_phrases_and_prefixes(db):
+    dealership_id, (row, calls, other) = add_notes(
+        db,
+        "Needs a third row for the kids",
+        "Called twice, call back Tuesday",
+        "Row of cones in the third bay",
+    )
+    assert hits(db, dealership_id, '"third row"') == [row.id]
+    assert hits(db, dealership_id, "calls") == [calls.id]
+    assert hits(db, dealership_id, "tue*") == [calls.id]
+    assert set(hits(db, dealership_id, "third row")) == {row.id, other.id}
+
+
+def test_inflected_prefixes_match_stemmed_words(db):
+    dealership_id, (note, other) = add_notes(
+        db, "Wants a truck, running errands", "Wanted it in blue"
+    )
+    assert set(hits(db, dealership_id, "wants*")) == {note.id, other.id}
+    assert hits(db, dealership_id, "running*") == [note.id]
+    assert hits(db, dealership_id, "want*") != []
+
+    terms = parse_query("running*")
+    assert "<mark>running</mark>" in highlight(note.content, terms)
+
+
+def test_committed_edits_are_reindexed(db):
+    dealership_id, (note,) = add_notes(db, "Prefers email")
+    assert hits(db, dealership_id, "email") == [note.id]
+
+    note.content = "Prefers text messages"
+    db.commit()
+    assert hits(db, dealership_id, "email") == []
+    assert hits(db, dealership_id, "text") == [note.id]
+
+
+def test_bad_query_is_a_400(client, db):
+    dealership_id, _ = add_notes(db, "Anything")
+    response = client.get(
+        "/api/v1/customers/notes/search",
+        params={"dealership_id": dealership_id, "q": '""'},
+    )
+    assert response.status_code == 400
+
+
+def test_postgresql_uses_the_text_search_index(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    note_search.ensure_search_index(pg_engine)
+    with Session(pg_engine) as db:
+        dealership_id, (row, _, errands) = add_notes(
+            db,
+            "Needs a third row for the kids",
+            "Row of cones in the third bay",
+            "Wants a truck, running errands",
+        )
+        assert hits(db, dealership_id, '"third row"') == [row.id]
+        # Same answer as the in-memory index
+        assert hits(db, dealership_id, "running*") == [errands.id]
+        assert hits(db, dealership_id, "wants*") == [errands.id]
+    assert not note_search._indexes
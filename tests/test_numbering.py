@@ -0,0 +1,23 @@
+from opendms.services.numbering import next_number
+from tests import factories
+
+
+def test_numbers_count_up_per_dealership_and_kind(db):
+    first = factories.dealership(db)
+    second = factories.dealership(db)
+
+    assert next_number(db, first.id, "sale") == f"S{first.id}-000001"
+    assert next_number(db, first.id, "sale") == f"S{first.id}-000002"
+    assert next_number(db, first.id, "appointment") == f"A{first.id}-000001"
+    assert next_number(db, second.id, "sale") == f"S{second.id}-000001"
+
+
+def test_rolled_back_number_is_issued_again(db):
+    dealership_id = factories.dealership(db).id
+    db.commit()
+    assert next_number(db, dealership_id, "work_order").endswith("-000001")
+    db.commit()
+
+    assert next_number(db, dealership_id, "work_order").endswith("-000002")
+    db.rollback()
+    assert next_number(db, dealership_id, "work_order").endswith("-000002")
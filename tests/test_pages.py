@@ -0,0 +1,35 @@
+import json
+import re
+
+from opendms.core.security import create_access_token
+from tests import factories
+
+
+def _precached(client):
+    script = client.get("/sw.js")
+    assert script.status_code == 200
+    assert script.headers["content-type"].startswith("application/javascript")
+    [(listed, static)] = re.findall(
+        r"const STATIC_FILES = \[(.*?)\]\.concat\((.*?)\);", script.text, re.S
+    )
+    return re.findall(r'"(/[^"]*)"', listed) + json.loads(static)
+
+
+def test_every_precached_url_loads(client):
+    urls = _precached(client)
+    assert {"/", "/offline.html"} <= set(urls)
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200, url
+
+    # "/" lands on the login page
+    assert "Login - OpenDMS" in client.get("/").text
+
+
+def test_dashboard_renders_for_a_signed_in_user(client, db):
+    user = factories.user(db)
+    db.commit()
+    client.cookies["access_token"] = f"Bearer {create_access_token(user.id)}"
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    assert "Dashboard - OpenDMS" in response.text
@@ -0,0 +1,175 @@
+from datetime import date, datetime
+
+from sqlalchemy import Column, MetaData, Table, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from opendms.core.database import Base, engine
+from opendms.core.partitioning import (
+    PARTITIONED_TABLES,
+    add_months,
+    convert_partitioned_tables,
+    maintain_partitions,
+    parse_partition_month,
+    partition_name,
+)
+from opendms.models import Sale, ServiceAppointment, ServiceWorkOrder
+from tests import factories
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_partition_names_round_trip():
+    name = partition_name("sales", date(2026, 4, 1))
+    assert name == "sales_p2026_04"
+    assert parse_partition_month("sales", name) == date(2026, 4, 1)
+    assert parse_partition_month("sales", "sales_default") is None
+    assert parse_partition_month("sales", "service_appointments_p2026_04") is None
+
+
+def test_primary_key_includes_partition_key_on_postgresql_only():
+    for table, key in [
+        (Sale.__table__, "sale_date"),
+        (ServiceAppointment.__table__, "appointment_date"),
+        (ServiceWorkOrder.__table__, "created_at"),
+    ]:
+        pg_ddl = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+        assert f"PRIMARY KEY (id, {key})" in pg_ddl
+        assert f"PARTITION BY RANGE ({key})" in pg_ddl
+        sqlite_ddl = str(CreateTable(table).compile(dialect=sqlite.dialect()))
+        assert "PRIMARY KEY (id)" in sqlite_ddl
+
+
+def test_sqlite_inserts_get_autoincremented_ids(db):
+    first = factories.sale(db)
+    second = factories.sale(db, dealership_id=first.dealership_id)
+    order = factories.work_order(db)
+    db.commit()
+    assert first.id and second.id == first.id + 1
+    assert order.id and order.appointment_id
+
+
+def test_rows_are_routed_to_their_month_partition(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    maintain_partitions(pg_engine, today=date(2026, 3, 10))
+    with Session(pg_engine) as db:
+        factories.sale(db, sale_date=datetime(2026, 4, 30, 23, 59))
+        factories.sale(db, sale_date=datetime(2026, 3, 1))
+        factories.sale(db, sale_date=datetime(2030, 1, 1))
+        db.commit()
+        placed = db.execute(
+            text("SELECT tableoid::regclass::text, sale_date FROM sales ORDER BY 2")
+        ).all()
+    assert [partition for partition, _ in placed] == [
+        "sales_p2026_03",
+        "sales_p2026_04",
+        "sales_default",
+    ]
+
+
+def _count(db, table):
+    return db.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+
+
+def test_default_partition_rows_move_into_new_month_partition(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    maintain_partitions(pg_engine, today=date(2026, 3, 10))
+    with Session(pg_engine) as db:
+        # Booked past the pre-created horizon, and a backdated sale
+        factories.appointment(db, appointment_date=datetime(2026, 9, 2))
+        factories.sale(db, sale_date=datetime(2025, 11, 20))
+        db.commit()
+        assert _count(db, "service_appointments_default") == 1
+
+    # A later run reaches September and also picks up the stranded sale
+    maintain_partitions(pg_engine, today=date(2026, 6, 1))
+    with Session(pg_engine) as db:
+        assert _count(db, "service_appointments_default") == 0
+        assert _count(db, "service_appointments_p2026_09") == 1
+        assert _count(db, "sales_default") == 0
+        assert _count(db, "sales_p2025_11") == 1
+        # New rows for the month route to the attached partition
+        factories.appointment(db, appointment_date=datetime(2026, 9, 3))
+        db.commit()
+        assert _count(db, "service_appointments_p2026_09") == 2
+
+
+def _legacy_table(metadata, name, primary_key):
+    """Copy of a partitioned table as an earlier release created it."""
+    source = Base.metadata.tables[name]
+    return Table(
+        name,
+        metadata,
+        *(
+            Column(
+                column.name,
+                column.type,
+                nullable=column.nullable,
+                primary_key=column.name in primary_key,
+                unique=column.name.endswith("_number"),
+            )
+            for column in source.columns
+        ),
+    )
+
+
+def test_sqlite_composite_key_table_is_rebuilt(db):
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE sales"))
+        legacy = MetaData()
+        _legacy_table(legacy, "sales", {"id", "sale_date"}).create(conn)
+    old = factories.sale(db, id=7)
+    db.commit()
+
+    assert convert_partitioned_tables(engine) == ["sales"]
+    assert inspect(engine).get_pk_constraint("sales")["constrained_columns"] == ["id"]
+    assert "ix_sales_sale_number" in {
+        index["name"] for index in inspect(engine).get_indexes("sales")
+    }
+    db.expire_all()
+    assert db.get(Sale, 7).sale_number == old.sale_number
+    assert factories.sale(db, dealership_id=old.dealership_id).id == 8
+    assert convert_partitioned_tables(engine) == []
+
+
+def test_plain_postgresql_table_is_converted(pg_engine):
+    Base.metadata.create_all(
+        bind=pg_engine,
+        tables=[
+            table for name, table in Base.metadata.tables.items() if name != "sales"
+        ],
+    )
+    legacy = MetaData()
+    _legacy_table(legacy, "sales", {"id"}).create(pg_engine)
+    with Session(pg_engine) as db:
+        dealership_id = factories.sale(
+            db, sale_date=datetime(2025, 11, 3)
+        ).dealership_id
+        factories.sale(db, dealership_id=dealership_id, sale_date=datetime(2026, 2, 9))
+        db.commit()
+
+    assert convert_partitioned_tables(pg_engine) == ["sales"]
+    assert convert_partitioned_tables(pg_engine) == []
+    with Session(pg_engine) as db:
+        relkind = db.execute(
+            text("SELECT relkind FROM pg_class WHERE relname = 'sales'")
+        ).scalar()
+        assert relkind == "p"
+        assert _count(db, "sales_p2025_11") == 1
+        assert _count(db, "sales_p2026_02") == 1
+        assert (
+            db.execute(text("SELECT to_regclass('sales_unpartitioned')")).scalar()
+            is None
+        )
+        # Ids continue after the copied rows
+        later = factories.sale(db, dealership_id=dealership_id)
+        db.commit()
+        assert later.id == 3
+    maintain_partitions(pg_engine, today=date(2026, 3, 1))
+    with pg_engine.connect() as conn:
+        for name in PARTITIONED_TABLES:
+            assert conn.execute(text(f"SELECT to_regclass('{name}_default')")).scalar()
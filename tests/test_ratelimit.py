@@ -0,0 +1,112 @@
+import pytest
+
+from opendms.core import ratelimit
+from opendms.core.config import settings
+from opendms.core.ratelimit import KEY_PREFIX, RateLimiter
+from opendms.core.security import create_access_token
+
+ORIGIN = "http://dms.example"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """A fresh process-local limiter used by the middleware."""
+    fresh = RateLimiter()
+    monkeypatch.setattr(ratelimit, "limiter", fresh)
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "local")
+    return fresh
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    bucket = [("k", 3, 1.0)]  # 3 tokens, one per second
+    limiter = RateLimiter()
+    assert [limiter._acquire_local(bucket, 1)[0] for _ in range(4)] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    allowed, wait, key = limiter._acquire_local(bucket, 2)
+    assert (allowed, wait, key) == (False, 2.0, "k")
+
+    clock[0] += 2
+    assert limiter._acquire_local(bucket, 2)[0] is True
+    # Never more than capacity, however long the bucket sits idle
+    clock[0] += 3600
+    assert limiter._acquire_local(bucket, 1)[0] is True
+    assert limiter._local["k"][0] == 2
+
+
+def test_requests_are_charged_to_all_buckets_or_none(clock):
+    limiter = RateLimiter()
+    user, dealership = ("user", 10, 1.0), ("dealership", 2, 1.0)
+    assert limiter._acquire_local([user, dealership], 2)[0] is True
+
+    allowed, wait, key = limiter._acquire_local([user, dealership], 1)
+    assert (allowed, wait, key) == (False, 1.0, "dealership")
+    assert limiter._local["user"][0] == 8
+
+    # A cost above capacity takes the whole bucket instead of never passing
+    assert limiter._acquire_local([("small", 1, 1.0)], 5)[0] is True
+
+
+def test_local_buckets_are_bounded(clock, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_LOCAL_MAX_KEYS", 2)
+    limiter = RateLimiter()
+    for key in ("a", "b", "a", "c"):
+        limiter._acquire_local([(key, 5, 1.0)], 1)
+    assert list(limiter._local) == ["a", "c"]
+
+
+def test_buckets_follow_the_token(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_DEALERSHIP_QUOTAS", {4: 120})
+    limiter = RateLimiter()
+    token = create_access_token(9, dealership_id=4)
+    scope = {
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+        "client": ("10.0.0.1", 5000),
+    }
+    assert limiter.buckets(scope) == [
+        (f"{KEY_PREFIX}user:9", settings.RATE_LIMIT_PER_USER, 10.0),
+        (f"{KEY_PREFIX}dealership:4", 120, 2.0),
+    ]
+    scope["headers"] = [(b"cookie", f'access_token="Bearer {token}"'.encode())]
+    assert limiter.buckets(scope)[0][0] == f"{KEY_PREFIX}user:9"
+
+    scope["headers"] = []
+    [(key, limit, _)] = limiter.buckets(scope)
+    assert (key, limit) == (f"{KEY_PREFIX}ip:10.0.0.1", settings.RATE_LIMIT_PER_IP)
+
+
+def test_limited_response_carries_cors_headers(client, limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_IP", 1)
+    headers = {"Origin": ORIGIN}
+    assert client.get("/api/v1/inventory/vin/X", headers=headers).status_code == 200
+
+    limited = client.get("/api/v1/inventory/vin/X", headers=headers)
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "60"
+    assert limited.headers["access-control-allow-origin"] == ORIGIN
+    assert limited.json()["limit"] == "ip"
+
+
+def test_preflights_and_images_are_not_charged(client, limiter, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_PER_IP", 1)
+    for _ in range(3):
+        preflight = client.options(
+            "/api/v1/inventory/vin/X",
+            headers={"Origin": ORIGIN, "Access-Control-Request-Method": "GET"},
+        )
+        assert preflight.status_code == 200
+        assert preflight.headers["access-control-allow-origin"] == ORIGIN
+        assert client.get(f"/api/v1/images/{'0' * 64}").status_code == 404
+    assert limiter._local == {}
+    assert client.get("/api/v1/inventory/vin/X").status_code == 200
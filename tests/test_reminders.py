@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from opendms.core import messaging
+from opendms.core.messaging import EMAIL, SMS, MemoryTransport, Transport
+from opendms.models import ServiceAppointment
+from opendms.services.reminders import send_due_reminders
+from tests import factories
+
+NOW = datetime(2026, 3, 16, 8, 0)
+
+
+@pytest.fixture
+def outbox():
+    messaging.OUTBOX.clear()
+    yield messaging.OUTBOX
+    messaging.OUTBOX.clear()
+
+
+def booking(db, hours_ahead=4, **customer):
+    person = factories.customer(db, **customer)
+    return factories.appointment(
+        db,
+        dealership_id=person.dealership_id,
+        customer_id=person.id,
+        appointment_date=NOW + timedelta(hours=hours_ahead),
+    )
+
+
+def test_transport_requires_send():
+    class Silent(Transport):
+        pass
+
+    with pytest.raises(TypeError):
+        Silent()
+    assert MemoryTransport(SMS).channel == SMS
+
+
+def test_texts_go_to_the_e164_number(db, outbox):
+    booking(db, phone="(217) 555-0142", preferred_contact_method="text")
+    booking(db, phone="217.555.0199", email="pat@example.com")
+    db.commit()
+
+    stats = send_due_reminders(db, now=NOW, lead_hours=24)
+
+    assert stats.sent == 2
+    by_channel = {message.channel: message.recipient for message in outbox}
+    assert by_channel == {SMS: "+12175550142", EMAIL: "pat@example.com"}
+
+
+def test_each_appointment_is_reminded_once(db, outbox):
+    due = booking(db, email="due@example.com")
+    later = booking(db, hours_ahead=48, email="later@example.com")
+    unreachable = booking(db, phone="12")
+    db.commit()
+
+    first = send_due_reminders(db, now=NOW, lead_hours=24)
+    second = send_due_reminders(db, now=NOW, lead_hours=24)
+
+    assert (first.sent, first.skipped) == (1, 1)
+    assert second.selected == 0
+    assert [message.recipient for message in outbox] == ["due@example.com"]
+    db.expire_all()
+    flags = {
+        appointment.id: appointment.reminder_sent
+        for appointment in db.query(ServiceAppointment)
+    }
+    # An unusable phone and no email: nothing to retry
+    assert flags == {due.id: True, later.id: False, unreachable.id: True}
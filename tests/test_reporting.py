@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import pytest
+
+from opendms.models.sale import SaleStatus
+from opendms.services.reporting import (
+    load_sales_cube,
+    month_index,
+    month_label,
+    monthly_trend,
+    summarize,
+)
+from tests import factories
+
+
+@pytest.fixture
+def store(db):
+    """One dealership with two salespeople, a costed and an uncosted car."""
+    dealership_id = factories.dealership(db).id
+    alice = factories.user(db, dealership_id=dealership_id).id
+    bob = factories.user(db, dealership_id=dealership_id).id
+    costed = {"dealership_id": dealership_id, "make": "Honda", "cost_price": 25000.0}
+
+    def sell(person, month, price, status=SaleStatus.COMPLETED, **vehicle):
+        car = factories.vehicle(db, **{**costed, **vehicle})
+        factories.sale(
+            db,
+            dealership_id=dealership_id,
+            vehicle_id=car.id,
+            sales_person_id=person,
+            sale_date=month,
+            vehicle_price=price,
+            status=status,
+        )
+
+    sell(alice, datetime(2026, 1, 10), 30000.0)
+    sell(alice, datetime(2026, 3, 2), 32000.0, model="Civic")
+    sell(bob, datetime(2026, 3, 20), 20000.0, make="Ford", cost_price=None)
+    sell(bob, datetime(2026, 3, 21), 99999.0, status=SaleStatus.PENDING)
+    sell(bob, datetime(2026, 3, 22), 99999.0, status=SaleStatus.CANCELLED)
+    db.commit()
+    return {"dealership_id": dealership_id, "alice": alice, "bob": bob}
+
+
+def test_month_labels_round_trip():
+    assert month_index("2026-01") == 2026 * 12
+    assert month_label(month_index("2025-12")) == "2025-12"
+
+
+def test_cube_only_counts_reportable_sales(db, store):
+    cube = load_sales_cube(db, dealership_id=store["dealership_id"])
+    assert int(cube.units.sum()) == 3
+    assert cube.revenue.sum() == pytest.approx(82000.0)
+
+
+def test_summary_by_salesperson(db, store):
+    cube = load_sales_cube(db)
+    rows = {row["sales_person_id"]: row for row in summarize(cube, ["salesperson"])}
+
+    alice = rows[store["alice"]]
+    assert alice["units"] == 2
+    assert alice["gross_profit"] == pytest.approx(12000.0)
+    assert alice["average_gross"] == pytest.approx(6000.0)
+    assert alice["gross_margin"] == pytest.approx(12000.0 / 62000.0)
+
+    # No cost on file: revenue counts, gross is unknown rather than zero
+    bob = rows[store["bob"]]
+    assert bob["units"] == 1
+    assert bob["average_price"] == pytest.approx(20000.0)
+    assert bob["average_gross"] is None
+
+
+def test_summary_by_model_and_grand_total(db, store):
+    cube = load_sales_cube(db)
+    models = [(row["make"], row["model"]) for row in summarize(cube, ["model"])]
+    assert sorted(models) == [
+        ("Ford", "Accord"),
+        ("Honda", "Accord"),
+        ("Honda", "Civic"),
+    ]
+
+    [total] = summarize(cube, [])
+    assert total["units"] == 3
+    assert summarize(load_sales_cube(db, dealership_id=-1), ["make"]) == []
+
+
+def test_unknown_group_by_field_is_rejected(db, store):
+    with pytest.raises(ValueError):
+        summarize(load_sales_cube(db), ["color"])
+
+
+def test_monthly_trend_fills_gaps(db, store):
+    trend = monthly_trend(load_sales_cube(db))
+
+    assert [row["month"] for row in trend] == ["2026-01", "2026-02", "2026-03"]
+    assert [row["units"] for row in trend] == [1, 0, 2]
+    assert trend[0]["units_change_pct"] is None
+    assert trend[1]["units_change_pct"] == pytest.approx(-1.0)
+    # Nothing to compare against after an empty month
+    assert trend[2]["units_change_pct"] is None
+
+
+def test_date_window_is_half_open(db, store):
+    cube = load_sales_cube(
+        db, start_date=datetime(2026, 3, 1), end_date=datetime(2026, 3, 20)
+    )
+    assert int(cube.units.sum()) == 1
@@ -0,0 +1,169 @@
+import hashlib
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from opendms.core.database import Base
+from opendms.models.sale import SaleDocument
+from opendms.services import sale_documents
+from tests import factories
+
+PDF = b"%PDF-1.4\n1 0 obj\n<< /Type /Catalog >>\nendobj\ntrailer\n<< >>\n%%EOF\n"
+DIGEST = hashlib.sha256(PDF).hexdigest()
+
+
+def _stored_dir():
+    return os.path.join(sale_documents.document_root(), "files", DIGEST[:2], DIGEST)
+
+
+def _sale_id(db):
+    sale_id = factories.sale(db).id
+    db.commit()
+    return sale_id
+
+
+def _post(client, sale_id, *names):
+    return client.post(
+        f"/api/v1/sales/{sale_id}/documents",
+        files=[("files", (name, PDF, "application/pdf")) for name in names],
+    )
+
+
+def _cleanup(db):
+    for document in db.query(SaleDocument).all():
+        sale_documents.delete_document(db, document)
+
+
+def test_upload_stores_once_and_reports_duplicates(client, db):
+    sale_id = _sale_id(db)
+
+    response = _post(client, sale_id, "contract.pdf", "copy.pdf")
+
+    assert response.status_code == 201
+    body = response.json()
+    assert [document["filename"] for document in body["documents"]] == ["contract.pdf"]
+    assert body["duplicates"] == ["copy.pdf"]
+    assert os.listdir(_stored_dir()) == ["original.pdf"]
+    assert os.listdir(sale_documents.temp_dir()) == []
+    _cleanup(db)
+
+
+def test_failed_commit_leaves_no_stored_file(client, db, monkeypatch):
+    sale_id = _sale_id(db)
+
+    def fail():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        _post(client, sale_id, "contract.pdf")
+
+    monkeypatch.undo()
+    assert not os.path.exists(_stored_dir())
+    assert os.listdir(sale_documents.temp_dir()) == []
+
+
+def test_linked_file_is_removed_with_its_last_document(client, db):
+    first, second = _sale_id(db), _sale_id(db)
+    _post(client, first, "contract.pdf")
+
+    linked = client.post(
+        f"/api/v1/sales/{second}/documents/uploads",
+        json={"filename": "scan.pdf", "size": len(PDF), "sha256": DIGEST},
+    )
+    assert linked.status_code == 200
+    assert linked.json()["document"]["filename"] == "scan.pdf"
+
+    documents = db.query(SaleDocument).order_by(SaleDocument.id).all()
+    assert [document.sale_id for document in documents] == [first, second]
+    deleted = client.delete(f"/api/v1/sales/{first}/documents/{documents[0].id}")
+    assert deleted.status_code == 200
+    assert os.path.exists(_stored_dir())
+    client.delete(f"/api/v1/sales/{second}/documents/{documents[1].id}")
+    assert not os.path.exists(_stored_dir())
+    assert not [
+        name for name in os.listdir(os.path.dirname(_stored_dir())) if DIGEST in name
+    ]
+
+
+def test_deleting_a_sale_removes_files_no_other_deal_uses(client, db):
+    first, second = _sale_id(db), _sale_id(db)
+    _post(client, first, "license.pdf")
+    _post(client, second, "insurance.pdf")
+
+    assert client.delete(f"/api/v1/sales/{first}").status_code == 200
+    assert os.path.exists(_stored_dir())
+    assert client.delete(f"/api/v1/sales/{second}").status_code == 200
+    assert not os.path.exists(_stored_dir())
+    assert db.query(SaleDocument).count() == 0
+
+
+def test_failed_delete_keeps_the_file(db, monkeypatch):
+    sale_id = _sale_id(db)
+    document, _ = sale_documents.start_upload(db, sale_id, "scan.pdf", len(PDF))
+    assert document is None
+
+    path = os.path.join(_stored_dir(), "original.pdf")
+    os.makedirs(_stored_dir(), exist_ok=True)
+    with open(path, "wb") as handle:
+        handle.write(PDF)
+    document = SaleDocument(
+        sale_id=sale_id,
+        filename="scan.pdf",
+        sha256=DIGEST,
+        storage_path=os.path.relpath(path, sale_documents.document_root()),
+    )
+    db.add(document)
+    db.commit()
+
+    def fail():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        sale_documents.delete_document(db, document)
+    monkeypatch.undo()
+
+    assert os.path.exists(path)
+    db.expire_all()
+    assert db.query(SaleDocument).count() == 1
+    _cleanup(db)
+    assert not os.path.exists(path)
+
+
+def test_chunked_upload_is_stored_when_complete(client, db):
+    sale_id = _sale_id(db)
+    started = client.post(
+        f"/api/v1/sales/{sale_id}/documents/uploads",
+        json={"filename": "license.pdf", "size": len(PDF)},
+    )
+    assert started.status_code == 201
+    upload_url = (
+        f"/api/v1/sales/{sale_id}/documents/uploads/{started.json()['upload_id']}"
+    )
+
+    partial = client.put(upload_url, content=PDF[:10], headers={"Upload-Offset": "0"})
+    assert partial.json()["offset"] == 10
+    assert not os.path.exists(_stored_dir())
+    done = client.put(upload_url, content=PDF[10:], headers={"Upload-Offset": "10"})
+
+    assert done.json()["document"]["sha256"] == DIGEST
+    assert os.path.exists(os.path.join(_stored_dir(), "original.pdf"))
+    _cleanup(db)
+
+
+def test_file_lock_is_held_until_commit(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    probe = text("SELECT pg_try_advisory_xact_lock(:namespace, :key)")
+    params = {
+        "namespace": sale_documents.FILE_LOCK_KEY,
+        "key": int(DIGEST[:8], 16) - 2**31,
+    }
+    with Session(pg_engine) as holder, Session(pg_engine) as other:
+        sale_documents.lock_file(holder, DIGEST)
+        assert other.execute(probe, params).scalar() is False
+        other.rollback()
+        holder.commit()
+        assert other.execute(probe, params).scalar() is True
@@ -0,0 +1,173 @@
+import json
+from datetime import datetime, time
+
+import pytest
+from pydantic import ValidationError
+
+from opendms.core.config import settings
+from opendms.models.service import AppointmentStatus
+from opendms.models.user import UserRole
+from opendms.schemas.service import ServiceAppointmentCreate
+from opendms.services import scheduling
+from opendms.services.scheduling import (
+    AdvisorCalendar,
+    find_conflict,
+    find_open_slots,
+    get_schedule,
+    local_now,
+    parse_operating_hours,
+)
+from tests import factories
+
+MONDAY = datetime(2026, 3, 16)
+
+
+def at(hour, minute=0, day=MONDAY):
+    return day.replace(hour=hour, minute=minute)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    scheduling.invalidate()
+    yield
+    scheduling.invalidate()
+
+
+def test_calendar_merges_touching_intervals():
+    calendar = AdvisorCalendar()
+    calendar.add(at(9), at(10))
+    calendar.add(at(11), at(12))
+    calendar.add(at(10), at(11))
+    assert list(zip(calendar.starts, calendar.ends, strict=True)) == [(at(9), at(12))]
+
+    assert not calendar.is_free(at(11, 30), at(12, 30))
+    assert calendar.is_free(at(12), at(13))
+    assert list(calendar.gaps(at(8), at(14))) == [(at(8), at(9)), (at(12), at(14))]
+
+
+def test_with_interval_leaves_the_original_alone():
+    calendar = AdvisorCalendar()
+    calendar.add(at(9), at(10))
+    copy = calendar.with_interval(at(13), at(14))
+    assert calendar.starts == [at(9)]
+    assert copy.starts == [at(9), at(13)]
+
+
+def test_operating_hours_formats():
+    hours = parse_operating_hours(
+        json.dumps(
+            {
+                "Mon": "07:30-18:00",
+                "tuesday": {"open": "09:00", "close": "17:00"},
+                "sun": None,
+            }
+        )
+    )
+    assert hours == {0: (time(7, 30), time(18, 0)), 1: (time(9, 0), time(17, 0))}
+    assert parse_operating_hours("not json") == parse_operating_hours(None)
+
+
+def test_open_slots_skip_bookings_and_closed_days():
+    calendar = AdvisorCalendar()
+    calendar.add(at(8), at(9, 30))
+    schedule = scheduling.DealershipSchedule(
+        hours={0: (time(8), time(10, 30)), 2: (time(8), time(9))},
+        calendars={7: calendar},
+        loaded_at=0.0,
+    )
+
+    slots = find_open_slots(schedule, duration_minutes=45, count=3, after=at(7))
+
+    assert [slot["start"] for slot in slots] == [
+        at(9, 30),
+        at(9, 45),
+        datetime(2026, 3, 18, 8, 0),  # Tuesday is closed
+    ]
+    assert slots[0]["end"] == at(10, 15)
+    assert {slot["service_advisor_id"] for slot in slots} == {7}
+
+
+def test_conflict_check_finds_overlaps(db):
+    booked = factories.appointment(db, appointment_date=at(10), estimated_duration=90)
+    advisor_id = booked.service_advisor_id
+
+    assert find_conflict(db, advisor_id, at(11), 30).id == booked.id
+    assert find_conflict(db, advisor_id, at(9), 60) is None
+    assert find_conflict(db, advisor_id, at(11, 30), 30) is None
+    assert find_conflict(db, advisor_id, at(11), 30, exclude_id=booked.id) is None
+
+
+def test_reopening_an_appointment_checks_for_conflicts(client, db):
+    cancelled = factories.appointment(
+        db, appointment_date=at(10), status=AppointmentStatus.CANCELLED
+    )
+    factories.appointment(
+        db,
+        appointment_date=at(10, 30),
+        service_advisor_id=cancelled.service_advisor_id,
+        dealership_id=cancelled.dealership_id,
+    )
+    db.commit()
+    url = f"/api/v1/service/{cancelled.id}"
+
+    # Still cancelled: moving it around blocks nothing
+    assert client.put(url, json={"estimated_duration": 90}).status_code == 200
+    reopened = client.put(url, json={"status": "scheduled"})
+    assert reopened.status_code == 409
+    assert client.put(url, json={"status": "reopened"}).status_code == 400
+
+    moved = client.put(
+        url, json={"status": "scheduled", "appointment_date": at(14).isoformat()}
+    )
+    assert moved.status_code == 200
+    assert moved.json()["status"] == "scheduled"
+
+
+def test_duration_is_capped_for_the_conflict_lookback():
+    fields = {
+        "customer_id": 1,
+        "vehicle_id": 1,
+        "service_advisor_id": 1,
+        "appointment_date": at(9),
+        "service_type": "maintenance",
+    }
+    ServiceAppointmentCreate(
+        **fields, estimated_duration=settings.SERVICE_MAX_APPOINTMENT_MINUTES
+    )
+    with pytest.raises(ValidationError):
+        ServiceAppointmentCreate(
+            **fields, estimated_duration=settings.SERVICE_MAX_APPOINTMENT_MINUTES + 1
+        )
+    with pytest.raises(ValidationError):
+        ServiceAppointmentCreate(**fields, estimated_duration=0)
+
+
+def test_committed_booking_swaps_in_a_new_schedule(db, monkeypatch):
+    monkeypatch.setattr(scheduling, "local_now", lambda: at(7))
+    dealership_id = factories.dealership(db).id
+    advisor = factories.user(
+        db, dealership_id=dealership_id, role=UserRole.SERVICE_MANAGER
+    )
+    db.commit()
+    before = get_schedule(db, dealership_id)
+    assert before.calendars[advisor.id].starts == []
+
+    factories.appointment(
+        db,
+        dealership_id=dealership_id,
+        service_advisor_id=advisor.id,
+        appointment_date=at(9),
+    )
+    db.commit()
+
+    after = get_schedule(db, dealership_id)
+    assert after is not before
+    assert before.calendars[advisor.id].starts == []
+    assert after.calendars[advisor.id].starts == [at(9)]
+
+
+def test_now_is_taken_in_the_service_time_zone(monkeypatch):
+    monkeypatch.setattr(settings, "SERVICE_TIME_ZONE", "Pacific/Kiritimati")  # UTC+14
+    assert (local_now() - datetime.utcnow()).total_seconds() == pytest.approx(
+        14 * 3600, abs=5
+    )
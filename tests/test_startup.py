@@ -0,0 +1,29 @@
+import pytest
+
+from opendms import main
+
+
+@pytest.fixture
+def startup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "_prepared", False)
+    monkeypatch.setattr(main, "init_db", lambda: calls.append("schema"))
+    monkeypatch.setattr(main, "ensure_media_dirs", lambda: calls.append("media"))
+    monkeypatch.setattr(
+        main, "ensure_precompressed_static", lambda: calls.append("static")
+    )
+    monkeypatch.setattr(main.caller_id, "warm", lambda db: calls.append("warm"))
+    return calls
+
+
+def test_shared_startup_work_runs_once_per_process_tree(startup):
+    main.prepare()
+    # A forked worker inherits the flag and its lifespan skips the work
+    main.prepare()
+    assert startup == ["schema", "media", "static", "warm"]
+
+
+def test_warming_can_be_left_to_the_first_lookup(startup, monkeypatch):
+    monkeypatch.setattr(main.settings, "CALLER_ID_WARM_ON_STARTUP", False)
+    main.prepare()
+    assert "warm" not in startup
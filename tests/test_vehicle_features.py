@@ -0,0 +1,140 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from opendms.core.database import Base, engine
+from opendms.models.inventory import Vehicle
+from opendms.services.vehicle_features import (
+    FEATURES_INDEX_NAME,
+    ensure_features_column,
+    has_features,
+    normalize_features,
+    parse_feature_filter,
+)
+from tests import factories
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, None),
+        ("  ", None),
+        ('["Sunroof", " heated  SEATS ", "sunroof"]', ["sunroof", "heated seats"]),
+        ('{"Sunroof": true, "Tow Package": false}', ["sunroof"]),
+        ("Sunroof, Navigation,,", ["sunroof", "navigation"]),
+        ('"Bluetooth"', ["bluetooth"]),
+        (["AWD", None, {"nested": 1}, 4], ["awd", "4"]),
+        ([], None),
+    ],
+)
+def test_normalize_features(value, expected):
+    assert normalize_features(value) == expected
+
+
+def test_assignments_are_normalized(db):
+    vehicle = factories.vehicle(db, features="Sunroof, Leather")
+    assert vehicle.features == ["sunroof", "leather"]
+    vehicle.features = {"Navigation": True}
+    db.commit()
+    db.expire_all()
+    assert db.get(Vehicle, vehicle.id).features == ["navigation"]
+
+
+def _matching(db, features):
+    return {
+        vehicle.stock_number
+        for vehicle in db.query(Vehicle).filter(has_features(db, features))
+    }
+
+
+def _stock(db):
+    dealership_id = factories.dealership(db).id
+    for stock_number, features in [
+        ("A", ["sunroof", "leather", "awd"]),
+        ("B", ["sunroof"]),
+        ("C", None),
+        ("D", ["leather", "awd"]),
+    ]:
+        factories.vehicle(
+            db,
+            dealership_id=dealership_id,
+            stock_number=stock_number,
+            features=features,
+        )
+    db.commit()
+    return dealership_id
+
+
+def test_filter_requires_every_feature(db):
+    _stock(db)
+    assert _matching(db, ["sunroof"]) == {"A", "B"}
+    assert _matching(db, ["leather", "awd"]) == {"A", "D"}
+    assert _matching(db, ["sunroof", "awd"]) == {"A"}
+    assert _matching(db, ["tow package"]) == set()
+
+
+def test_filter_parameter_is_normalized():
+    assert parse_feature_filter(" Leather,,AWD ") == ["leather", "awd"]
+    assert parse_feature_filter(None) == []
+
+
+def test_sqlite_legacy_rows_are_rewritten(db):
+    vehicle_id = factories.vehicle(db).id
+    db.commit()
+    with engine.begin() as conn:
+        conn.execute(
+            text("UPDATE vehicles SET features = 'Sunroof, Navigation' WHERE id = :id"),
+            {"id": vehicle_id},
+        )
+    ensure_features_column(engine)
+    db.expire_all()
+    assert db.get(Vehicle, vehicle_id).features == ["sunroof", "navigation"]
+
+
+def test_postgresql_containment_uses_the_gin_index(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    ensure_features_column(pg_engine)
+    with Session(pg_engine) as db:
+        _stock(db)
+        assert _matching(db, ["leather", "awd"]) == {"A", "D"}
+
+        db.execute(text("SET LOCAL enable_seqscan = off"))
+        # The containment has_features() emits
+        plan = "\n".join(
+            db.execute(
+                text(
+                    "EXPLAIN SELECT id FROM vehicles "
+                    "WHERE features @> CAST(:features AS jsonb)"
+                ),
+                {"features": '["sunroof"]'},
+            ).scalars()
+        )
+    assert FEATURES_INDEX_NAME in plan
+
+
+def test_postgresql_text_column_is_converted(pg_engine):
+    Base.metadata.create_all(bind=pg_engine)
+    with pg_engine.begin() as conn:
+        conn.execute(text("ALTER TABLE vehicles ALTER COLUMN features TYPE text"))
+    with Session(pg_engine) as db:
+        vehicle_id = factories.vehicle(db).id
+        db.commit()
+    with pg_engine.begin() as conn:
+        conn.execute(
+            text("UPDATE vehicles SET features = 'AWD, Sunroof' WHERE id = :id"),
+            {"id": vehicle_id},
+        )
+
+    ensure_features_column(pg_engine)
+    ensure_features_column(pg_engine)
+
+    with Session(pg_engine) as db:
+        column_type = db.execute(
+            text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'vehicles' AND column_name = 'features'"
+            )
+        ).scalar()
+        assert column_type == "jsonb"
+        assert db.get(Vehicle, vehicle_id).features == ["awd", "sunroof"]
+        assert len(_matching(db, ["sunroof"])) == 1
@@ -0,0 +1,122 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from opendms.core.media import ensure_media_dirs, media_path, media_root, temp_root
+from opendms.models.inventory import VehicleImage
+from opendms.services import vehicle_images
+from opendms.services.vehicle_images import generate_renditions, rendition_path
+from tests import factories
+
+
+def _png(color, size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    originals = []
+    monkeypatch.setattr(vehicle_images, "schedule_renditions", originals.extend)
+    return originals
+
+
+def _upload(client, vehicle_id, *colors, **params):
+    return client.post(
+        f"/api/v1/inventory/{vehicle_id}/images",
+        params=params,
+        files=[
+            ("files", (f"{color}.png", _png(color), "image/png")) for color in colors
+        ],
+    )
+
+
+def _primary_url(db, vehicle_id):
+    db.expire_all()
+    return (
+        db.query(VehicleImage.image_url)
+        .filter(VehicleImage.vehicle_id == vehicle_id, VehicleImage.is_primary)
+        .scalar()
+    )
+
+
+def test_upload_stores_photos_after_commit(client, db, scheduled):
+    vehicle_id = factories.vehicle(db).id
+    db.commit()
+
+    response = _upload(client, vehicle_id, "red", "blue", primary=1)
+
+    assert response.status_code == 201
+    images = response.json()["images"]
+    assert [image["is_primary"] for image in images] == [False, True]
+    for image in images:
+        assert os.path.exists(media_path(image["image_url"]))
+    assert scheduled == [media_path(image["image_url"]) for image in images]
+    assert os.listdir(temp_root()) == []
+
+
+def test_uploads_are_received_outside_the_public_mount():
+    ensure_media_dirs()
+    assert os.path.commonpath([media_root(), temp_root()]) != media_root()
+    # Received files are renamed into place
+    assert os.stat(temp_root()).st_dev == os.stat(media_root()).st_dev
+
+
+def test_primary_pointing_at_a_duplicate_promotes_the_existing_photo(
+    client, db, scheduled
+):
+    vehicle_id = factories.vehicle(db).id
+    db.commit()
+    first = _upload(client, vehicle_id, "red", "green").json()["images"]
+    assert _primary_url(db, vehicle_id) == first[0]["image_url"]
+
+    response = _upload(client, vehicle_id, "yellow", "green", primary=1)
+
+    body = response.json()
+    assert body["duplicates"] == ["green.png"]
+    assert [image["is_primary"] for image in body["images"]] == [False]
+    assert _primary_url(db, vehicle_id) == first[1]["image_url"]
+
+
+def test_failed_commit_leaves_no_stored_files(client, db, scheduled, monkeypatch):
+    vehicle_id = factories.vehicle(db).id
+    db.commit()
+
+    def fail():
+        raise RuntimeError("commit failed")
+
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        _upload(client, vehicle_id, "purple")
+
+    monkeypatch.undo()
+    assert db.query(VehicleImage).count() == 0
+    digest = hashlib.sha256(_png("purple")).hexdigest()
+    stored = os.path.join(os.environ["UPLOAD_DIR"], "images", digest[:2], digest)
+    assert not os.path.exists(stored)
+    assert os.listdir(temp_root()) == []
+    assert scheduled == []
+
+
+def test_renditions_are_bounded_and_never_enlarged(tmp_path):
+    original = str(tmp_path / "original.png")
+    Image.new("RGB", (2000, 1000), "white").save(original)
+
+    assert generate_renditions(original) == ["web", "medium", "thumbnail"]
+    sizes = {}
+    for name in vehicle_images.RENDITIONS:
+        with Image.open(rendition_path(original, name)) as rendition:
+            sizes[name] = rendition.size
+    assert sizes == {"web": (1600, 800), "medium": (800, 400), "thumbnail": (320, 160)}
+    assert generate_renditions(original) == []
+
+    small = str(tmp_path / "small" / "original.png")
+    os.makedirs(os.path.dirname(small))
+    Image.new("RGB", (200, 100), "white").save(small)
+    generate_renditions(small)
+    with Image.open(rendition_path(small, "web")) as rendition:
+        assert rendition.size == (200, 100)
@@ -0,0 +1,87 @@
+import pytest
+
+from opendms.services.vin import (
+    check_digit,
+    decode,
+    decode_many,
+    fill_vehicle_fields,
+    model_year,
+)
+from tests import factories
+
+ACCORD = "1HGCM82633A004352"
+
+
+@pytest.mark.parametrize(
+    "vin",
+    [ACCORD, "1M8GDM9AXKP042788", "11111111111111111"],
+)
+def test_check_digit_matches_published_vins(vin):
+    assert check_digit(vin) == vin[8]
+
+
+def test_check_digit_is_enforced_only_in_north_america():
+    wrong = ACCORD[:8] + "4" + ACCORD[9:]
+    decoded = decode(wrong)
+    assert decoded.check_digit_valid is False
+    assert decoded.valid is False
+    assert decoded.errors == ("Check digit does not match",)
+
+    european = "WVWZZZ1KZ8W000001"
+    assert check_digit(european) != european[8]
+    decoded = decode(european)
+    assert decoded.check_digit_valid is False
+    assert decoded.valid is True
+    assert decoded.make == "Volkswagen"
+
+
+@pytest.mark.parametrize(
+    "vin, latest, year",
+    [
+        # North America: a digit in position 7 means the 1980 cycle...
+        ("1HGCM82633A004352", 2027, 2003),
+        ("1HGCM826X1A000000", 2027, 2001),
+        # ...and a letter the 2010 cycle
+        ("1HGCM8A63PA000000", 2027, 2023),
+        ("5YJ3E1EA7LF000000", 2027, 2020),
+        # Elsewhere, the most recent year not after ``latest``
+        ("WVWZZZ1KZ8W000001", 2027, 2008),
+        ("WVWZZZ1KZSW000001", 2027, 2025),
+        ("WVWZZZ1KZSW000001", 2020, 1995),
+    ],
+)
+def test_model_year_cycles(vin, latest, year):
+    assert model_year(vin, latest=latest) == year
+
+
+def test_unknown_year_code_and_bad_input_are_reported():
+    assert model_year(ACCORD[:9] + "U" + ACCORD[10:]) is None
+    assert decode("1HGCM826").errors == ("VIN must be 17 characters",)
+    assert decode("1HGCM82633A00435I").errors == ("VIN contains invalid characters: I",)
+
+
+def test_decode_uses_the_longest_matching_prefix():
+    decoded = decode(" 1hgcm8-2633a004352 ")
+    assert decoded.vin == ACCORD
+    assert (decoded.make, decoded.model, decoded.year) == ("Honda", "Accord", 2003)
+    assert decoded.country == "United States"
+    # Outside the pattern's years only the make is known
+    later = decode("1HGCM8A63PA000000")
+    assert (later.make, later.model) == ("Honda", None)
+
+
+def test_decode_many_keeps_order_and_duplicates():
+    results = decode_many([ACCORD, "bad", ACCORD.lower()])
+    assert [result.valid for result in results] == [True, False, True]
+    assert results[0] is results[2]
+
+
+def test_vehicle_fields_are_filled_from_the_vin(db):
+    assert fill_vehicle_fields({"vin": ACCORD, "make": "Acura"}) == {
+        "vin": ACCORD,
+        "make": "Acura",
+        "model": "Accord",
+        "year": 2003,
+    }
+    vehicle = factories.vehicle(db, vin=ACCORD, year=None, make=None, model=None)
+    assert (vehicle.year, vehicle.make, vehicle.model) == (2003, "Honda", "Accord")